@@ -1,36 +1,460 @@
-import time
+"""
+Benchmarks upload processing over the test corpus and synthetic uploads.
+
+Each case is an upload (a file) that is added to a fresh workspace, which is
+then checked, persisted, and packed, as in :func:`.controllers.upload.upload`.
+Cases are run with each combination of checking strategy and storage adapter.
+Storage calls can be slowed down to simulate a network volume (e.g. EFS).
+
+Results are written as JSON, so that runs can be compared over time::
+
+    python benchmark.py run --output baseline.json
+    # ...change something...
+    python benchmark.py run --output current.json
+    python benchmark.py compare baseline.json current.json --threshold 0.1
+
+``compare`` exits with status 1 if any case got slower by more than the
+threshold.
+
+``serialization`` measures the cost of writing and reading the file index
+(as the database and checkpoints do) with each codec, by number of files::
+
+    python benchmark.py serialization --files 100 --files 10000
+
+``download`` measures the throughput of sending content (see
+:func:`.routes.upload_api._send_content`) with and without the server's
+``wsgi.file_wrapper``, and as a byte range, by file size::
+
+    python benchmark.py download --size-mb 16 --size-mb 256
+"""
+
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tarfile
 import tempfile
+import time
 from datetime import datetime
-from filemanager.domain import Workspace
+from functools import wraps
+from typing import Any, Callable, Dict, IO, Iterator, List, Optional, \
+    Tuple, Type
+
+import click
+from dataclasses import dataclass
+from flask import Flask
+from pytz import UTC
+
+from filemanager.domain import Workspace, UserFile, Reference, \
+    ReferenceKind, codec
+from filemanager.process import timing
+from filemanager.process.check import get_default_checkers
 from filemanager.process.strategy import AsynchronousCheckingStrategy, \
     SynchronousCheckingStrategy
-from filemanager.process.check import get_default_checkers
-from filemanager.services.storage import SimpleStorageAdapter
-
-basedir = tempfile.mkdtemp()
-storage = SimpleStorageAdapter(basedir)
-
-workspace = Workspace(
-    upload_id=1234,
-    owner_user_id='98765',
-    created_datetime=datetime.now(),
-    modified_datetime=datetime.now(),
-    _strategy=SynchronousCheckingStrategy(),
-    checkers=get_default_checkers(),
-    _storage=storage
+from filemanager.routes.upload_api import _send_content
+from filemanager.services.storage import SimpleStorageAdapter, \
+    QuarantineStorageAdapter
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'tests', 'test_files_upload')
+ARCHIVE_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.gz', '.zip')
+
+STRATEGIES = {
+    'sync': SynchronousCheckingStrategy,
+    'async': AsynchronousCheckingStrategy,
+}
+ADAPTERS = ('simple', 'quarantine')
+
+LATENT_METHODS = (
+    'makedirs', 'is_safe', 'set_permissions', 'remove', 'move', 'open',
+    'open_pointer', 'adopt', 'is_tarfile', 'pack_tarfile', 'unpack_tarfile',
+    'persist', 'cmp', 'create', 'copy', 'delete', 'delete_path', 'delete_all',
+    'get_size_bytes', 'get_last_modified', 'set_last_modified'
 )
-workspace.initialize()
+"""Storage adapter methods that touch the volume."""
+
+
+@dataclass
+class Case:
+    """An upload to benchmark."""
+
+    name: str
+    filename: str
+    write: Callable[[IO[bytes]], None]
+    """Writes the content of the upload."""
+
+
+def corpus_cases() -> List[Case]:
+    """Every archive in the test upload corpus."""
+    def copy_from(path: str) -> Callable[[IO[bytes]], None]:
+        def write(f: IO[bytes]) -> None:
+            with open(path, 'rb') as source:
+                shutil.copyfileobj(source, f)
+        return write
+
+    return [Case(f'corpus/{name}', name,
+                 copy_from(os.path.join(CORPUS_PATH, name)))
+            for name in sorted(os.listdir(CORPUS_PATH))
+            if name.endswith(ARCHIVE_SUFFIXES)]
+
+
+def synthetic_cases(scale: float = 1.) -> List[Case]:
+    """Uploads that exercise particular costs, sized by ``scale``."""
+    n_small = max(1, int(2000 * scale))
+    eps_bytes = max(1024, int(20 * 1024 * 1024 * scale))
+    n_crlf = max(1, int(200 * scale))
+    return [
+        Case(f'synthetic/small-files-{n_small}', 'small.tar.gz',
+             _tarball({f'sec{i // 100}/part{i}.tex':
+                       f'\\section{{Part {i}}}\nText.\n'.encode()
+                       for i in range(n_small)})),
+        Case(f'synthetic/huge-eps-3x{eps_bytes}', 'eps.tar.gz',
+             _tarball({f'fig{i}.eps': _eps(eps_bytes) for i in range(3)})),
+        Case('synthetic/deep-nesting-40', 'deep.tar.gz',
+             _tarball({'/'.join(f'd{i}' for i in range(depth)) + '/f.tex':
+                       b'\\relax\n' for depth in range(1, 41)})),
+        Case(f'synthetic/crlf-tex-{n_crlf}', 'crlf.tar.gz',
+             _tarball({f'ch{i}.tex':
+                       b'\\section{Chapter}\r\n' + b'Some text.\r\n' * 500
+                       for i in range(n_crlf)})),
+    ]
+
+
+def _tarball(members: Dict[str, bytes]) -> Callable[[IO[bytes]], None]:
+    def write(f: IO[bytes]) -> None:
+        with tarfile.open(fileobj=f, mode='w:gz') as tar:
+            for name, content in members.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+    return write
+
+
+def _eps(size_bytes: int) -> bytes:
+    header = (b'%!PS-Adobe-3.0 EPSF-3.0\n%%BoundingBox: 0 0 100 100\n'
+              b'%%EndComments\n')
+    line = b'0 0 moveto 100 100 lineto stroke\n'
+    return header + line * ((size_bytes - len(header)) // len(line))
+
+
+def with_latency(adapter_class: Type[SimpleStorageAdapter],
+                 latency: float) -> Type[SimpleStorageAdapter]:
+    """Make a subclass of a storage adapter that sleeps before I/O."""
+    def delayed(method: Callable) -> Callable:
+        @wraps(method)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            time.sleep(latency)
+            return method(*args, **kwargs)
+        return wrapper
+
+    return type(f'Slow{adapter_class.__name__}', (adapter_class,),
+                {name: delayed(getattr(adapter_class, name))
+                 for name in LATENT_METHODS})
+
+
+def run_case(case: Case, strategy: str, adapter: str, latency: float) \
+        -> Tuple[float, Dict[str, Any]]:
+    """Process ``case`` once, and get the total time and stage timings."""
+    basedir = tempfile.mkdtemp()
+    try:
+        adapter_class: Type[SimpleStorageAdapter] = SimpleStorageAdapter
+        params = [basedir]
+        if adapter == 'quarantine':
+            adapter_class = QuarantineStorageAdapter
+            params.append(os.path.join(basedir, 'quarantine'))
+            os.makedirs(params[-1])
+        if latency:
+            adapter_class = with_latency(adapter_class, latency)
+        workspace = Workspace(
+            upload_id=1234,
+            owner_user_id='98765',
+            created_datetime=datetime.now(UTC),
+            modified_datetime=datetime.now(UTC),
+            _strategy=STRATEGIES[strategy](),
+            checkers=get_default_checkers(),
+            _storage=adapter_class(*params)
+        )
+        workspace.initialize()
+        u_file = workspace.create(case.filename)
+        with workspace.open(u_file, 'wb') as f:
+            case.write(f)
+
+        timings = timing.start()
+        try:
+            with timing.stage('check'):
+                workspace.perform_checks()
+            with timing.stage('persist'):
+                workspace.persist_all()
+            with timing.stage('pack'):
+                workspace.source_package.pack()
+        finally:
+            timing.stop(timings)
+        return timings.total_seconds, {t.name: t.to_dict()
+                                       for t in timings.stages.values()}
+    finally:
+        shutil.rmtree(basedir)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode()\
+            .strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@click.group()
+def cli() -> None:
+    """Benchmark upload processing."""
+
+
+@cli.command()
+@click.option('--output', '-o', type=click.Path(dir_okay=False),
+              default='benchmark.json', show_default=True,
+              help='Where to write the results.')
+@click.option('--strategy', type=click.Choice(list(STRATEGIES)),
+              multiple=True, help='Checking strategies (default: all).')
+@click.option('--adapter', type=click.Choice(ADAPTERS), multiple=True,
+              help='Storage adapters (default: all).')
+@click.option('--latency', type=float, default=0., show_default=True,
+              help='Seconds to wait before each storage call.')
+@click.option('--repeat', type=int, default=3, show_default=True,
+              help='Runs per case; the fastest is reported.')
+@click.option('--scale', type=float, default=1., show_default=True,
+              help='Size of the synthetic uploads, relative to default.')
+@click.option('--case', 'pattern', default='',
+              help='Only run cases whose names contain this.')
+def run(output: str, strategy: Tuple[str, ...], adapter: Tuple[str, ...],
+        latency: float, repeat: int, scale: float, pattern: str) -> None:
+    """Run the benchmarks, and write the results as JSON."""
+    cases = [case for case in corpus_cases() + synthetic_cases(scale)
+             if pattern in case.name]
+    results = []
+    for case in cases:
+        for strategy_name in strategy or list(STRATEGIES):
+            for adapter_name in adapter or ADAPTERS:
+                result: Dict[str, Any] = {'case': case.name,
+                                          'strategy': strategy_name,
+                                          'adapter': adapter_name}
+                try:
+                    runs = [run_case(case, strategy_name, adapter_name,
+                                     latency)
+                            for _ in range(repeat)]
+                except Exception as e:  # pylint: disable=broad-except
+                    result['error'] = repr(e)
+                    click.echo(f'{case.name} [{strategy_name}/{adapter_name}]'
+                               f': failed: {e!r}', err=True)
+                else:
+                    seconds, stages = min(runs, key=lambda r: r[0])
+                    result.update({'seconds': seconds,
+                                   'runs': [r[0] for r in runs],
+                                   'stages': stages})
+                    click.echo(f'{seconds:9.3f}s  {case.name}'
+                               f' [{strategy_name}/{adapter_name}]')
+                results.append(result)
+
+    with open(output, 'w') as f:
+        json.dump({
+            'created': datetime.now(UTC).isoformat(),
+            'commit': _git_commit(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'params': {'latency': latency, 'repeat': repeat, 'scale': scale},
+            'results': results
+        }, f, indent=2)
+    click.echo(f'Wrote {len(results)} results to {output}')
+
+
+@cli.command()
+@click.argument('baseline', type=click.File())
+@click.argument('current', type=click.File())
+@click.option('--threshold', type=float, default=0.1, show_default=True,
+              help='Relative slowdown that counts as a regression.')
+@click.option('--min-seconds', type=float, default=0.01, show_default=True,
+              help='Times below this are treated as this, to ignore noise.')
+def compare(baseline: IO[str], current: IO[str], threshold: float,
+            min_seconds: float) -> None:
+    """Compare two sets of results, and flag regressions."""
+    def index(data: dict) -> Dict[Tuple[str, str, str], float]:
+        return {(r['case'], r['strategy'], r['adapter']): r['seconds']
+                for r in data['results'] if 'seconds' in r}
+
+    baseline_data, current_data = json.load(baseline), json.load(current)
+    if baseline_data['params'] != current_data['params']:
+        click.echo(f'Warning: parameters differ: {baseline_data["params"]}'
+                   f' != {current_data["params"]}', err=True)
+    before, after = index(baseline_data), index(current_data)
+    regressions = 0
+    for key in sorted(before.keys() & after.keys()):
+        old = max(before[key], min_seconds)
+        new = max(after[key], min_seconds)
+        change = new / old - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        click.echo(f'{change:+8.1%}  {before[key]:8.3f}s -> {after[key]:8.3f}s'
+                   f'  {key[0]} [{key[1]}/{key[2]}]{flag}')
+    for key in sorted(before.keys() ^ after.keys()):
+        where = 'baseline' if key in before else 'current'
+        click.echo(f'{"":8}  only in {where}: {key[0]} [{key[1]}/{key[2]}]')
+    if regressions:
+        click.echo(f'{regressions} regression(s) above {threshold:.0%}',
+                   err=True)
+        sys.exit(1)
+
+
+def _file_index(n_files: int) -> Dict[str, Dict[str, Any]]:
+    """Make a file index like the one that is stored for a workspace."""
+    source = {}
+    for i in range(n_files):
+        path = f'figures/fig{i}.eps' if i else 'main.tex'
+        u_file = UserFile(workspace=None, path=path, size_bytes=1024 * i,
+                          is_checked=True, is_persisted=True,
+                          content_checksum='a' * 22 + '==')
+        if not i:
+            u_file.references = [
+                Reference(ReferenceKind.GRAPHICS, f'figures/fig{j}.eps')
+                for j in range(1, n_files)
+            ]
+        source[path] = u_file.to_dict()
+    return {'source': source, 'ancillary': {}, 'removed': {}, 'system': {}}
+
+
+@cli.command()
+@click.option('--files', type=int, multiple=True,
+              help='Files in the index (default: 10, 100, 1000, 10000).')
+@click.option('--codec', 'names', type=click.Choice(list(codec.CODECS)),
+              multiple=True, help='Codecs (default: all that are installed).')
+@click.option('--repeat', type=int, default=5, show_default=True,
+              help='Runs per measurement; the fastest is reported.')
+def serialization(files: Tuple[int, ...], names: Tuple[str, ...],
+                  repeat: int) -> None:
+    """Measure the cost of writing and reading a file index."""
+    codecs = []
+    for name in names or list(codec.CODECS):
+        try:
+            codecs.append(codec.get_codec(name))
+        except RuntimeError as e:
+            click.echo(f'Skipping {name}: {e}', err=True)
+
+    click.echo(f'{"files":>6} {"codec":8} {"bytes":>10} {"dumps":>9}'
+               f' {"loads":>9} {"from_dict":>9}')
+    for n_files in files or (10, 100, 1000, 10000):
+        index = _file_index(n_files)
+        for current in codecs:
+            def dumps() -> str:
+                return current.dumps(index)
+
+            def loads() -> Any:
+                return current.loads(encoded)
+
+            def from_dict() -> List[UserFile]:
+                return [UserFile.from_dict(data, None)
+                        for data in current.loads(encoded)['source'].values()]
+
+            encoded = dumps()
+            timings = [min(_seconds(func) for _ in range(repeat))
+                       for func in (dumps, loads, from_dict)]
+            click.echo(f'{n_files:6} {current.name:8} {len(encoded):10}'
+                       + ''.join(f' {t * 1000:7.2f}ms' for t in timings))
+
+
+class SendfileWrapper:
+    """
+    Stands in for uWSGI's ``wsgi.file_wrapper``.
+
+    The server recognizes the wrapper in the response, and sends the file
+    with ``sendfile`` instead of iterating over it (see :func:`_serve`).
+    """
+
+    def __init__(self, pointer: IO[bytes], block_size: int = 8192) -> None:
+        self.pointer = pointer
+        self.block_size = block_size
+
+    def __iter__(self) -> Iterator[bytes]:
+        """Read the file in blocks, for servers that do not send files."""
+        return iter(lambda: self.pointer.read(self.block_size), b'')
+
+    def close(self) -> None:
+        """Close the file, as the server does when it is done."""
+        self.pointer.close()
+
+
+DOWNLOAD_MODES: Dict[str, Tuple[Dict[str, str], Dict[str, Any]]] = {
+    # Without a wrapper, werkzeug reads the file in Python (as when uWSGI
+    # has wsgi-disable-file-wrapper set).
+    'python': ({}, {}),
+    'sendfile': ({}, {'wsgi.file_wrapper': SendfileWrapper}),
+    'range': ({'Range': 'bytes=0-'}, {}),
+}
+"""Request headers and environ for each way of sending content."""
+
+
+def _serve(app: Flask, path: str, mode: str) -> int:
+    """Send the file at ``path`` to /dev/null as a server would; get bytes."""
+    headers, environ = DOWNLOAD_MODES[mode]
+    with app.test_request_context(headers=headers,
+                                  environ_overrides=environ):
+        response = _send_content(open(path, 'rb'), 'application/*', {})
+    body = response.response
+    sent = 0
+    try:
+        with open(os.devnull, 'wb') as out:
+            if isinstance(body, SendfileWrapper):
+                fd = body.pointer.fileno()
+                size = os.fstat(fd).st_size
+                while sent < size:
+                    count = os.sendfile(out.fileno(), fd, sent, size - sent)
+                    if not count:
+                        break
+                    sent += count
+            else:
+                for chunk in body:
+                    out.write(chunk)
+                    sent += len(chunk)
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+    return sent
+
 
-with open('tests/test_files_upload/UploadWithANCDirectory.tar.gz', 'rb') as f:
-    tgz_content = f.read()
+@cli.command()
+@click.option('--size-mb', 'sizes', type=int, multiple=True,
+              help='Sizes of the file to send (default: 1, 16, 128).')
+@click.option('--mode', 'modes', type=click.Choice(list(DOWNLOAD_MODES)),
+              multiple=True, help='Ways of sending (default: all).')
+@click.option('--repeat', type=int, default=3, show_default=True,
+              help='Runs per measurement; the fastest is reported.')
+def download(sizes: Tuple[int, ...], modes: Tuple[str, ...],
+             repeat: int) -> None:
+    """Measure the throughput of sending file content."""
+    app = Flask('benchmark')
+    click.echo(f'{"MiB":>6} {"mode":8} {"seconds":>9} {"MiB/s":>9}')
+    for size_mb in sizes or (1, 16, 128):
+        with tempfile.NamedTemporaryFile() as f:
+            chunk = os.urandom(1024 * 1024)
+            for _ in range(size_mb):
+                f.write(chunk)
+            f.flush()
+            for mode in modes or list(DOWNLOAD_MODES):
+                if _serve(app, f.name, mode) != size_mb * 1024 * 1024:
+                    raise RuntimeError(f'{mode} sent the wrong size')
+                seconds = min(_seconds(lambda: _serve(app, f.name, mode))
+                              for _ in range(repeat))
+                click.echo(f'{size_mb:6} {mode:8} {seconds:9.4f}'
+                           f' {size_mb / seconds:9.1f}')
 
 
+def _seconds(func: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
 
-u_file = workspace.create('upload.tar.gz')
-with workspace.open(u_file, 'wb') as f:
-    f.write(tgz_content)
 
-start = time.time()
-workspace.perform_checks()
-print(time.time() - start)
-workspace.delete_all_files()
+if __name__ == '__main__':
+    cli()
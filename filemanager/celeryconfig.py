@@ -16,3 +16,10 @@ broker_transport_options = {
 }
 worker_prefetch_multiplier = 1
 task_acks_late = True
+
+task_always_eager = bool(int(os.environ.get('CELERY_ALWAYS_EAGER', '0')))
+"""
+If true, tasks are executed in the calling process rather than by a worker.
+
+This is useful for development and testing, where there is no broker.
+"""
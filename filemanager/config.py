@@ -3,7 +3,7 @@
 import os
 import warnings
 import tempfile
-from arxiv.util.serialize import dumps, loads
+from filemanager.domain import codec
 
 VERSION = '0.2'
 APP_VERSION = VERSION
@@ -21,13 +21,38 @@ AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
 LOGFILE = os.environ.get('LOGFILE')
 LOGLEVEL = os.environ.get('LOGLEVEL', 20)
 
+UPLOAD_SERVICE_LOG_DIRECTORY = os.environ.get('UPLOAD_SERVICE_LOG_DIRECTORY',
+                                              '')
+"""Directory in which the service log (``upload.log``) is written."""
+
+SERVICE_LOG_MAX_BYTES = int(os.environ.get('SERVICE_LOG_MAX_BYTES',
+                                           64 * 1024 * 1024))
+"""The service log is rotated once it reaches this size (0 to disable)."""
+
+SERVICE_LOG_MAX_AGE = float(os.environ.get('SERVICE_LOG_MAX_AGE',
+                                           24 * 60 * 60))
+"""The service log is rotated once it is this many seconds old (0 to disable)."""
+
+SERVICE_LOG_BACKUP_COUNT = int(os.environ.get('SERVICE_LOG_BACKUP_COUNT', 30))
+"""Number of compressed service log archives to keep (0 to keep all)."""
+
 SQLALCHEMY_DATABASE_URI = os.environ.get('SQLALCHEMY_DATABASE_URI',
                                          'sqlite:///../filemanager.db')
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
 if 'mysql' in SQLALCHEMY_DATABASE_URI:
-    SQLALCHEMY_ENGINE_OPTIONS = {'json_serializer': dumps,
-                                 'json_deserializer': loads}
+    SQLALCHEMY_ENGINE_OPTIONS = {'json_serializer': codec.dumps,
+                                 'json_deserializer': codec.loads}
+
+SERIALIZATION_CODEC = os.environ.get('SERIALIZATION_CODEC', 'iso8601')
+"""
+Codec used to write file indexes, errors, and checkpoint metadata.
+
+One of ``iso8601`` (the default, and the original format), ``json``, or
+``orjson`` (requires the ``orjson`` package). Only choose ``json`` or
+``orjson`` once every instance can read them. See
+:mod:`filemanager.domain.codec`.
+"""
 
 JWT_SECRET = os.environ.get('JWT_SECRET', 'foosecret')
 
@@ -55,8 +80,66 @@ ARXIV_ACCESSIBILITY_URL = os.environ.get(
 ARXIV_LIBRARY_URL = os.environ.get('ARXIV_LIBRARY_URL',
                                    'https://library.cornell.edu')
 
-# Need to set maximum allowed upload
-MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH',
+                                        1024 * 1024 * 1024))
+"""
+Maximum size in bytes of an upload request, and of any file within it.
+
+Uploaded files are streamed to the staging area of the storage volume as they
+arrive (see :mod:`.routes.ingest`), so memory use does not grow with this limit.
+"""
+
+WORKSPACE_LOCK_TIMEOUT = float(os.environ.get('WORKSPACE_LOCK_TIMEOUT', '10'))
+"""
+Seconds to wait for another request to finish with a workspace.
+
+Requests that modify a workspace hold an exclusive lock on it, shared by all
+application processes. If the lock cannot be acquired in this time, the request
+fails with ``409 Conflict`` so that the client can retry. Set to 0 to fail
+immediately.
+"""
+
+UPLOAD_JOB_RETRIES = int(os.environ.get('UPLOAD_JOB_RETRIES', '30'))
+"""
+Times to retry processing an upload whose workspace is busy.
+
+A worker that cannot lock the workspace within ``WORKSPACE_LOCK_TIMEOUT``
+puts the job back on the queue, to be tried again after
+``UPLOAD_JOB_RETRY_DELAY`` seconds. The job only fails once it has been
+retried this many times.
+"""
+
+UPLOAD_JOB_RETRY_DELAY = float(os.environ.get('UPLOAD_JOB_RETRY_DELAY', '10'))
+"""Seconds to wait before retrying an upload whose workspace is busy."""
+
+UPLOAD_SESSION_EXPIRY_HOURS = float(
+    os.environ.get('UPLOAD_SESSION_EXPIRY_HOURS', '48')
+)
+"""
+Hours after the last chunk is received before a resumable upload is abandoned.
+
+Expired sessions are removed (with their chunks) whenever a new session is
+started, and when garbage is collected (see :mod:`.controllers.retention`),
+along with staged files that have not been written for as long.
+"""
+
+TIMING_ENABLED = bool(int(os.environ.get('TIMING_ENABLED', '0')))
+"""
+If true, record the time and I/O used by each stage of upload processing.
+
+Timings are logged, and returned in the ``Server-Timing`` header of each
+response. See :mod:`.process.timing`.
+"""
+
+TIMING_METRICS_ENABLED = bool(int(os.environ.get('TIMING_METRICS_ENABLED',
+                                                 '0')))
+"""
+If true (and ``TIMING_ENABLED`` is set), expose per-process timing totals.
+
+Totals are served in the Prometheus text format at ``/metrics``. Each scrape
+sees only the totals of the worker process that answers it; see
+:mod:`filemanager.process.timing`.
+"""
 
 UPLOAD_BASE_DIRECTORY = os.environ.get('UPLOAD_BASE_DIRECTORY',
                                        '/tmp/filemanagment/submissions')
@@ -114,3 +197,56 @@ if STORAGE_BASE_PATH is None:
                   STORAGE_BASE_PATH)
 
 STORAGE_QUARANTINE_PATH = os.environ.get('STORAGE_QUARANTINE_PATH', None)
+
+LAZY_SOURCE_PACKAGE = bool(int(os.environ.get('LAZY_SOURCE_PACKAGE', '0')))
+"""
+If true, the source package is not rebuilt when the workspace is mutated.
+
+Instead, the package is built on demand when its content is requested, and
+reused until the next change to the workspace. The ``ETag`` of the package is
+derived from the file index, so that it can be provided without building the
+package.
+"""
+
+USER_QUOTA_BYTES = int(os.environ.get('USER_QUOTA_BYTES', '0'))
+"""
+Most bytes that the workspaces of one user may hold, or 0 for no limit.
+
+Uploads that would take a user over their quota are refused with ``413``.
+Workspaces that have been deleted do not count, nor do checkpoints (see
+``RETENTION_CHECKPOINT_BYTES``).
+"""
+
+RETENTION_REMOVED_DAYS = int(os.environ.get('RETENTION_REMOVED_DAYS', '30'))
+"""
+Days for which removed files (e.g. unpacked archives) are kept, or 0 to keep
+them until their workspace is deleted. See :mod:`.controllers.retention`.
+"""
+
+RETENTION_RELEASED_DAYS = int(os.environ.get('RETENTION_RELEASED_DAYS', '0'))
+"""
+Days after which a released workspace that has not been modified is deleted,
+or 0 to never delete released workspaces.
+"""
+
+RETENTION_CHECKPOINT_BYTES = int(os.environ.get('RETENTION_CHECKPOINT_BYTES',
+                                                '0'))
+"""
+Most bytes that the checkpoints of a workspace may use, or 0 for no limit.
+
+The oldest checkpoints are deleted first; the newest is always kept.
+"""
+
+RETENTION_DELETED_LOG_DAYS = int(os.environ.get('RETENTION_DELETED_LOG_DAYS',
+                                                '0'))
+"""
+Days for which the logs of deleted workspaces are kept, or 0 to keep them.
+"""
+
+RETENTION_BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE', '100'))
+"""Number of workspaces to retrieve from the database at a time."""
+
+RETENTION_BATCH_DELAY = float(os.environ.get('RETENTION_BATCH_DELAY', '1'))
+"""
+Seconds to wait between batches, to limit the I/O used by garbage collection.
+"""
@@ -15,6 +15,12 @@ UPLOAD_DELETED_FILE = 'deleted file'
 UPLOAD_DELETED_WORKSPACE = 'deleted workspace'
 UPLOAD_FILE_NOT_FOUND = 'file not found'
 UPLOAD_DELETED_ALL_FILES = 'deleted all files'
+UPLOAD_APPLIED_OPERATIONS = 'applied file operations'
+UPLOAD_INVALID_OPERATIONS = 'expected a list of file operations'
+UPLOAD_INVALID_OPERATION = 'invalid file operation'
+UPLOAD_INVALID_NEW_PATH = 'new path must name a file in the workspace'
+UPLOAD_FILE_EXISTS = 'a file already exists at that path'
+UPLOAD_RENAMED_FILE = 'renamed file'
 UPLOAD_WORKSPACE_NOT_FOUND = 'workspace not found'
 UPLOAD_LOCKED_WORKSPACE = 'locked workspace'
 UPLOAD_UNLOCKED_WORKSPACE = 'unlocked workspace'
@@ -31,6 +37,19 @@ UPLOAD_WORKSPACE_LOCKED = 'upload workspace is locked.'
 
 UPLOAD_WORKSPACE_ALREADY_DELETED = 'Request failed. Workspace has been deleted.'
 
+UPLOAD_SESSION_NOT_FOUND = 'upload session not found'
+UPLOAD_SESSION_INCOMPLETE = 'upload session is missing chunks'
+UPLOAD_CHUNK_CHECKSUM_MISMATCH = 'chunk content does not match checksum'
+UPLOAD_TOO_LARGE = 'upload exceeds maximum size'
+UPLOAD_QUOTA_EXCEEDED = 'upload would exceed the storage quota of the owner'
+UPLOAD_JOB_NOT_FOUND = 'upload processing job not found'
+UPLOAD_WORKSPACE_BUSY = 'workspace is being modified by another request'
+LOG_INVALID_QUERY = 'since and until must be ISO-8601 datetimes'
+CHECKPOINT_INVALID_QUERY = ('sort must be created, name, or size; order must'
+                            ' be asc or desc; offset and limit must be'
+                            ' non-negative integers')
+RETENTION_INVALID_QUERY = 'after and limit must be non-negative integers'
+
 # upload status codes
 # INVALID_UPLOAD_ID = {'reason': 'invalid upload identifier'}
 # MISSING_UPLOAD_ID = {'reason': 'missing upload id'}
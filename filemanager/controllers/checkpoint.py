@@ -1,14 +1,17 @@
 """Controllers for checkpoint-related operations."""
 
-from typing import Tuple, Optional, Union, IO
+from typing import Any, Callable, Dict, Tuple, Optional, Union, IO
 from http import HTTPStatus as status
+from datetime import datetime
 import traceback
 
+from werkzeug.datastructures import ETags
 from werkzeug.exceptions import NotFound, InternalServerError, SecurityError, \
     Forbidden, BadRequest, HTTPException
 
 from arxiv.users import domain as auth_domain
 
+from ..domain import Checkpoint
 from ..domain.uploads.exceptions import NoSourceFilesToCheckpoint, \
     UploadFileSecurityError
 from ..services import database
@@ -18,9 +21,18 @@ from . import util, transform
 
 Response = Tuple[Optional[Union[dict, IO]], status, dict]
 
+SORT_KEYS: Dict[str, Callable[[Checkpoint], Any]] = {
+    'created': lambda checkpoint: checkpoint.created,
+    'name': lambda checkpoint: checkpoint.name,
+    'size': lambda checkpoint: checkpoint.size_bytes
+}
+"""Ways in which checkpoints can be sorted when they are listed."""
 
+
+@util.exclusive
 @database.atomic
-def create_checkpoint(upload_id: int, user: auth_domain.User) -> Response:
+def create_checkpoint(upload_id: int, user: auth_domain.User,
+                      description: Optional[str] = None) -> Response:
     """
     Create checkpoint.
 
@@ -30,6 +42,8 @@ def create_checkpoint(upload_id: int, user: auth_domain.User) -> Response:
         The unique identifier for upload workspace.
     use : str
         User making create checkpoint request.
+    description : str
+        Optional description of the checkpoint.
 
     Returns
     -------
@@ -44,7 +58,7 @@ def create_checkpoint(upload_id: int, user: auth_domain.User) -> Response:
     try:
         # Make sure we have an upload_db_data to work with
         workspace = database.retrieve(upload_id)
-        checksum = workspace.create_checkpoint(user)
+        checksum = workspace.create_checkpoint(user, description)
 
         ###
         # Lock upload workspace
@@ -74,7 +88,10 @@ def create_checkpoint(upload_id: int, user: auth_domain.User) -> Response:
     return response_data, status_code, {'ETag': checksum}
 
 
-def list_checkpoints(upload_id: int, user: auth_domain.User) -> Response:
+def list_checkpoints(upload_id: int, user: auth_domain.User,
+                     sort: Optional[str] = None, order: Optional[str] = None,
+                     offset: Optional[str] = None,
+                     limit: Optional[str] = None) -> Response:
     """
     List checkpoints.
 
@@ -84,6 +101,14 @@ def list_checkpoints(upload_id: int, user: auth_domain.User) -> Response:
         The unique identifier for upload workspace.
     user : str
         User making create checkpoint request.
+    sort : str
+        One of :const:`SORT_KEYS` (default: ``created``).
+    order : str
+        ``asc`` (the default) or ``desc``.
+    offset : str
+        Number of checkpoints to skip (default: 0).
+    limit : str
+        Maximum number of checkpoints to list (default: all).
 
     Returns
     -------
@@ -95,14 +120,26 @@ def list_checkpoints(upload_id: int, user: auth_domain.User) -> Response:
     """
     user_string = util.format_user_information_for_logging(user)
     logger.info("%s: List checkpoints [%s].", upload_id, user_string)
+    try:
+        sort_key = SORT_KEYS[sort or 'created']
+        if order not in (None, 'asc', 'desc'):
+            raise ValueError(f'Invalid order: {order}')
+        start = int(offset or 0)
+        end = start + int(limit) if limit is not None else None
+        if start < 0 or (end is not None and end < start):
+            raise ValueError('Invalid offset or limit')
+    except (KeyError, ValueError) as e:
+        raise BadRequest(messages.CHECKPOINT_INVALID_QUERY) from e
 
     try:
         workspace = database.retrieve(upload_id)
-        checkpoint_list = workspace.list_checkpoints(user)
+        checkpoint_list = sorted(workspace.list_checkpoints(user),
+                                 key=sort_key, reverse=order == 'desc')
         response_data = {
             'upload_id': upload_id,
+            'total': len(checkpoint_list),
             'checkpoints': [transform.transform_checkpoint(f) for f in
-                            checkpoint_list]
+                            checkpoint_list[start:end]]
         }
         status_code = status.OK
 
@@ -116,6 +153,7 @@ def list_checkpoints(upload_id: int, user: auth_domain.User) -> Response:
     return response_data, status_code, {}
 
 
+@util.exclusive
 @database.atomic
 def restore_checkpoint(upload_id: int, checkpoint_checksum: str,
                        user: auth_domain.User) -> Response:
@@ -145,8 +183,7 @@ def restore_checkpoint(upload_id: int, checkpoint_checksum: str,
         # Make sure we have an upload_db_data to work with
         workspace = database.retrieve(upload_id)
         workspace.restore_checkpoint(checkpoint_checksum, user)
-        if workspace.source_package.is_stale:
-            workspace.source_package.pack()
+        util.update_source_package(workspace)
         database.update(workspace)    # Store in DB
         response_data = {'reason': f"Restored checkpoint "
                                    f"'{checkpoint_checksum}'"}
@@ -166,6 +203,7 @@ def restore_checkpoint(upload_id: int, checkpoint_checksum: str,
     return response_data, status_code, {}
 
 
+@util.exclusive
 @database.atomic
 def delete_checkpoint(upload_id: int, checkpoint_checksum: str,
                       user: auth_domain.User) -> Response:
@@ -196,8 +234,7 @@ def delete_checkpoint(upload_id: int, checkpoint_checksum: str,
         # Make sure we have an upload_db_data to work with
         workspace = database.retrieve(upload_id)
         workspace.delete_checkpoint(checkpoint_checksum, user)
-        if workspace.source_package.is_stale:
-            workspace.source_package.pack()
+        util.update_source_package(workspace)
         database.update(workspace)    # Store in DB
 
         response_data = {'reason': f"Deleted checkpoint "
@@ -218,6 +255,7 @@ def delete_checkpoint(upload_id: int, checkpoint_checksum: str,
     return response_data, status_code, {}
 
 
+@util.exclusive
 @database.atomic
 def delete_all_checkpoints(upload_id: int, user: auth_domain.User) -> Response:
     """
@@ -244,8 +282,7 @@ def delete_all_checkpoints(upload_id: int, user: auth_domain.User) -> Response:
         # Make sure we have an upload_db_data to work with
         workspace = database.retrieve(upload_id)
         workspace.delete_all_checkpoints(user)
-        if workspace.source_package.is_stale:
-            workspace.source_package.pack()
+        util.update_source_package(workspace)
         database.update(workspace)    # Store in DB
 
         response_data = {'reason': f"Deleted all checkpoints."}  # Get rid of pylint error
@@ -323,7 +360,10 @@ def check_checkpoint_file_exists(upload_id: int, checkpoint_checksum: str) \
 
 
 def get_checkpoint_file(upload_id: int, checkpoint_checksum: str,
-                        user: auth_domain.User) -> Response:
+                        user: auth_domain.User,
+                        if_none_match: Optional[ETags] = None,
+                        if_modified_since: Optional[datetime] = None) \
+        -> Response:
     """
     Get the checkpoint file specified by provided checksum.
 
@@ -333,6 +373,10 @@ def get_checkpoint_file(upload_id: int, checkpoint_checksum: str,
         The unique identifier for upload workspace.
     checkpoint_checksum: str
         checksum that uniquely identifies checkpoint.
+    if_none_match : :class:`.ETags`
+        Value of the ``If-None-Match`` request header, if any.
+    if_modified_since : :class:`.datetime`
+        Value of the ``If-Modified-Since`` request header, if any.
 
     Returns
     -------
@@ -359,14 +403,16 @@ def get_checkpoint_file(upload_id: int, checkpoint_checksum: str,
 
     try:
         checkpoint = workspace.get_checkpoint_file(checkpoint_checksum)
-        pointer = workspace.get_checkpoint_file_pointer(checkpoint_checksum)
+        headers = {'ETag': checkpoint_checksum,
+                   'Last-Modified': checkpoint.last_modified}
+        if util.is_not_modified(headers, if_none_match, if_modified_since):
+            return None, status.NOT_MODIFIED, headers
 
-        headers = {
+        pointer = workspace.get_checkpoint_file_pointer(checkpoint_checksum)
+        headers.update({
             "Content-disposition": f"filename={checkpoint.name}",
-            'ETag': checkpoint_checksum,
-            'Content-Length': checkpoint.size_bytes,
-            'Last-Modified': checkpoint.last_modified
-        }
+            'Content-Length': checkpoint.size_bytes
+        })
     except HTTPException as httpe:
         # Werkzeug HTTPExceptions are explicitly raised, so these should always
         # propagate.
@@ -0,0 +1,72 @@
+"""Handles requests for the dependency graph of a workspace."""
+
+from datetime import datetime
+from http import HTTPStatus as status
+from typing import Tuple, Optional
+
+from werkzeug.datastructures import ETags
+from werkzeug.exceptions import NotFound
+
+from ..domain import Workspace
+from ..services import database
+from .service_log import logger
+from . import _messages as messages
+from . import util
+
+Response = Tuple[Optional[dict], status, dict]
+
+
+@database.atomic
+def get_dependencies(upload_id: int, if_none_match: Optional[ETags] = None,
+                     if_modified_since: Optional[datetime] = None) \
+        -> Response:
+    """
+    Describe the files that each TeX source file depends upon.
+
+    This allows a compiler to fetch exactly the files that it needs, and to
+    find out in advance about files that are missing.
+
+    Parameters
+    ----------
+    upload_id : int
+        The unique identifier for upload workspace.
+    if_none_match : :class:`.ETags`
+        Value of the ``If-None-Match`` request header, if any.
+    if_modified_since : :class:`.datetime`
+        Value of the ``If-Modified-Since`` request header, if any.
+
+    Returns
+    -------
+    dict
+        The dependency graph, keyed by the public path of each TeX file, along
+        with unresolved references and unreferenced files.
+    int
+        An HTTP status code.
+    dict
+        Some extra headers to add to the response.
+
+    """
+    try:
+        workspace: Workspace = database.retrieve(upload_id)
+    except database.WorkspaceNotFound as nf:
+        logger.info("%s: Dependencies: '%s'", upload_id, nf)
+        raise NotFound(messages.UPLOAD_NOT_FOUND) from nf
+
+    headers = {'ARXIV-OWNER': workspace.owner_user_id,
+               **util.summary_headers(workspace)}
+    if util.is_not_modified(headers, if_none_match, if_modified_since):
+        return None, status.NOT_MODIFIED, headers
+
+    # Ancillary files are not compiled, so all of these paths are public.
+    response_data = {
+        'upload_id': workspace.upload_id,
+        'dependencies': workspace.dependency_graph,
+        'unresolved': [
+            {'path': u_file.public_path, 'kind': reference.kind.value,
+             'target': reference.target}
+            for u_file, reference in workspace.iter_unresolved_references()
+        ],
+        'unreferenced': [u_file.public_path for u_file
+                         in workspace.iter_unreferenced_files()]
+    }
+    return response_data, status.OK, headers
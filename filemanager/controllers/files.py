@@ -4,17 +4,18 @@ import os
 import io
 import logging
 from http import HTTPStatus as status
-from typing import Optional, Tuple, Union, IO
+from typing import Optional, Tuple, Union, IO, Any, Dict, List
 from datetime import datetime
 
 from flask import current_app
+from werkzeug.datastructures import ETags
 from werkzeug.exceptions import NotFound, InternalServerError, SecurityError, \
-        Forbidden, HTTPException
+        Forbidden, HTTPException, BadRequest
 
 from arxiv.users import domain as auth_domain
 from arxiv.base.globals import get_application_config
 
-from ..domain import Workspace, NoSuchFile
+from ..domain import Workspace, NoSuchFile, UserFile
 from ..domain.uploads.exceptions import UploadFileSecurityError
 from ..services import database, storage
 from ..process import strategy, check
@@ -87,9 +88,12 @@ def check_upload_file_content_exists(upload_id: int, public_file_path: str) \
 
 
 def get_upload_file_content(upload_id: int, public_file_path: str,
-                            user: auth_domain.User) -> Response:
+                            user: auth_domain.User,
+                            if_none_match: Optional[ETags] = None,
+                            if_modified_since: Optional[datetime] = None) \
+        -> Response:
     """
-    Get the source log associated with upload workspace.
+    Get the content of a single file in the upload workspace.
 
     Parameters
     ----------
@@ -97,6 +101,10 @@ def get_upload_file_content(upload_id: int, public_file_path: str,
         The unique identifier for upload workspace.
     public_file_path: str
         relative path of file to be deleted.
+    if_none_match : :class:`.ETags`
+        Value of the ``If-None-Match`` request header, if any.
+    if_modified_since : :class:`.datetime`
+        Value of the ``If-Modified-Since`` request header, if any.
 
     Returns
     -------
@@ -125,6 +133,11 @@ def get_upload_file_content(upload_id: int, public_file_path: str,
         if not workspace.exists(public_file_path):
             raise NotFound(f"File '{public_file_path}' not found.")
         u_file = workspace.get(public_file_path)
+        headers = {'ARXIV-OWNER': workspace.owner_user_id,
+                   'ETag': u_file.checksum,
+                   'Last-Modified': u_file.last_modified}
+        if util.is_not_modified(headers, if_none_match, if_modified_since):
+            return None, status.NOT_MODIFIED, headers
         filepointer = workspace.open_pointer(u_file, 'rb')
     except HTTPException as httpe:
         # Werkzeug HTTPExceptions are explicitly raised, so these should always
@@ -141,14 +154,12 @@ def get_upload_file_content(upload_id: int, public_file_path: str,
         # NotFound in order to provide as little feedback as posible to client.
         raise NotFound(messages.UPLOAD_FILE_NOT_FOUND)
 
-    headers = {'ARXIV-OWNER': workspace.owner_user_id,
-               'ETag': u_file.checksum,
-               'Content-Length': u_file.size_bytes,
-               'Last-Modified': u_file.last_modified,
-               'Content-disposition': f'filename={u_file.name}'}
+    headers.update({'Content-Length': u_file.size_bytes,
+                    'Content-disposition': f'filename={u_file.name}'})
     return filepointer, status.OK, headers
 
 
+@util.exclusive
 @database.atomic
 def client_delete_file(upload_id: int, public_file_path: str,
                        user: auth_domain.User) -> Response:
@@ -187,15 +198,15 @@ def client_delete_file(upload_id: int, public_file_path: str,
 
         # Call routine that will do the actual work.
         try:
-            workspace.delete(workspace.get(public_file_path))
+            u_file = workspace.get(public_file_path)
         except NoSuchFile:
             raise NotFound(messages.UPLOAD_FILE_NOT_FOUND)
+        workspace.delete(u_file)
 
         workspace.set_strategy(strategy.create_strategy(current_app))
         workspace.checkers = check.get_default_checkers()
-        workspace.perform_checks()
-        if workspace.source_package.is_stale:
-            workspace.source_package.pack()
+        workspace.perform_deletion_checks([u_file])
+        util.update_source_package(workspace)
         database.update(workspace)
 
     except HTTPException as httpe:
@@ -220,11 +231,223 @@ def client_delete_file(upload_id: int, public_file_path: str,
     response_data = transform_workspace(workspace)
     response_data.update({'reason': messages.UPLOAD_DELETED_FILE})
     headers = {'ARXIV-OWNER': workspace.owner_user_id,
-               'ETag': workspace.source_package.checksum,
-               'Last-Modified': workspace.source_package.last_modified}
+               **util.source_package_headers(workspace)}
+    return response_data, status.OK, headers
+
+
+@util.exclusive
+@database.atomic
+def client_apply_operations(upload_id: int, operations: Any,
+                            user: auth_domain.User) -> Response:
+    """
+    Delete and rename several files at once.
+
+    The operations are not a transaction: each is accepted or rejected on its
+    own, and an operation that is rejected does not prevent the others from
+    being applied. All of the operations are checked, against the workspace as
+    the operations before them would leave it, before any of them touches the
+    disk; the accepted operations are then applied in order. The workspace is
+    checked, packed and stored just once, rather than once per file as with
+    :func:`client_delete_file`.
+
+    Parameters
+    ----------
+    upload_id : int
+        The unique identifier for the workspace in question.
+    operations : list
+        Each operation is a dict with keys ``op`` (``delete`` or ``rename``)
+        and ``path``; renames also have ``to``, the new path for the file.
+    user : :class:`.auth_domain.User`
+        User (or client) making the request.
+
+    Returns
+    -------
+    dict
+        Complete summary of upload processing, including the outcome of each
+        operation.
+    int
+        An HTTP status code.
+    dict
+        Some extra headers to add to the response.
+
+    """
+    user_string = util.format_user_information_for_logging(user)
+    if not isinstance(operations, list) \
+            or not all(isinstance(op, dict) for op in operations):
+        raise BadRequest(messages.UPLOAD_INVALID_OPERATIONS)
+    logger.info("%s: Apply %i file operations [%s].", upload_id,
+                len(operations), user_string)
+
+    try:
+        workspace: Workspace = database.retrieve(upload_id)
+        if not workspace.is_active:
+            raise Forbidden(messages.UPLOAD_NOT_ACTIVE)
+        if workspace.is_locked:
+            raise Forbidden(messages.UPLOAD_WORKSPACE_LOCKED)
+
+        deleted: List[UserFile] = []
+        results: List[Dict[str, Any]] = []
+        for result, u_file, new_path in _plan_operations(workspace,
+                                                         operations):
+            if u_file is None:
+                pass    # Rejected.
+            elif new_path is None:
+                workspace.delete(u_file)
+                deleted.append(u_file)
+            else:
+                workspace.rename(u_file, new_path)
+            results.append(result)
+        if any(result['status'] == status.OK for result in results):
+            workspace.set_strategy(strategy.create_strategy(current_app))
+            workspace.checkers = check.get_default_checkers()
+            if any(result.get('op') == 'rename'
+                   and result['status'] == status.OK
+                   for result in results):
+                workspace.perform_checks()
+            workspace.perform_deletion_checks(deleted)
+            util.update_source_package(workspace)
+            database.update(workspace)
+    except HTTPException as httpe:
+        # Werkzeug HTTPExceptions are explicitly raised, so these should always
+        # propagate.
+        logger.info("%s: Operation failed: '%s'.", httpe, upload_id)
+        raise httpe
+    except database.WorkspaceNotFound as nf:
+        logger.info("%s: Workspace not found: '%s'", upload_id, nf)
+        raise NotFound(messages.UPLOAD_NOT_FOUND) from nf
+    except IOError as ioe:
+        logger.error("%s: File operations failed: %s ", upload_id, ioe)
+        raise InternalServerError(messages.CANT_DELETE_FILE) from ioe
+
+    response_data = transform_workspace(workspace)
+    response_data.update({'reason': messages.UPLOAD_APPLIED_OPERATIONS,
+                          'operations': results})
+    headers = {'ARXIV-OWNER': workspace.owner_user_id,
+               **util.source_package_headers(workspace)}
     return response_data, status.OK, headers
 
 
+# The outcome of an operation, the file it acts on, and the file's new path.
+Plan = Tuple[Dict[str, Any], Optional[UserFile], Optional[str]]
+
+# Where files will be once the operations planned so far are applied, by path
+# and whether the file is ancillary; ``None`` if the file will be deleted.
+Moves = Dict[Tuple[str, bool], Optional[UserFile]]
+
+
+def _plan_operations(workspace: Workspace,
+                     operations: List[Dict[str, Any]]) -> List[Plan]:
+    """Check a batch of deletes and renames without applying any of them."""
+    moves: Moves = {}
+    return [_plan_operation(workspace, operation, moves)
+            for operation in operations]
+
+
+def _plan_operation(workspace: Workspace, operation: Dict[str, Any],
+                    moves: Moves) -> Plan:
+    """Check a single delete or rename, and describe the outcome."""
+    result = {key: operation.get(key) for key in ('op', 'path', 'to')
+              if key in operation}
+    path, to_path = operation.get('path'), operation.get('to')
+    if not isinstance(path, str) \
+            or operation.get('op') not in ('delete', 'rename'):
+        return _rejected(result, status.BAD_REQUEST,
+                         messages.UPLOAD_INVALID_OPERATION)
+    path, is_ancillary = workspace.is_ancillary_path(path)
+    if _is_in_moved_directory(moves, path, is_ancillary):
+        # We cannot tell what the directory will contain without moving it.
+        return _rejected(result, status.BAD_REQUEST,
+                         messages.UPLOAD_INVALID_OPERATION)
+    u_file = _get_planned(workspace, moves, path, is_ancillary)
+    if u_file is None:
+        return _rejected(result, status.NOT_FOUND,
+                         messages.UPLOAD_FILE_NOT_FOUND)
+    # The file may have been renamed earlier in the batch, in which case its
+    # path is still the one it had before.
+    if u_file.is_directory and not path.endswith('/'):
+        path += '/'
+
+    if operation['op'] == 'delete':
+        moves[(path, is_ancillary)] = None
+        return ({**result, 'status': status.OK,
+                 'reason': messages.UPLOAD_DELETED_FILE}, u_file, None)
+
+    if not isinstance(to_path, str):
+        return _rejected(result, status.BAD_REQUEST,
+                         messages.UPLOAD_INVALID_OPERATION)
+    to_path, to_ancillary = workspace.is_ancillary_path(to_path)
+    new_path = _normalize_new_path(to_path, u_file.is_directory)
+    if new_path is None or to_ancillary != is_ancillary \
+            or not workspace.is_safe(new_path, is_ancillary=is_ancillary) \
+            or _is_in_moved_directory(moves, new_path, is_ancillary) \
+            or not _is_free_for_file(workspace, moves, new_path,
+                                     is_ancillary):
+        return _rejected(result, status.BAD_REQUEST,
+                         messages.UPLOAD_INVALID_NEW_PATH)
+    if _get_planned(workspace, moves, new_path, is_ancillary) is not None:
+        return _rejected(result, status.CONFLICT,
+                         messages.UPLOAD_FILE_EXISTS)
+    moves[(path, is_ancillary)] = None
+    moves[(new_path, is_ancillary)] = u_file
+    return ({**result, 'status': status.OK,
+             'reason': messages.UPLOAD_RENAMED_FILE}, u_file, new_path)
+
+
+def _rejected(result: Dict[str, Any], status_code: status,
+              reason: str) -> Plan:
+    return {**result, 'status': status_code, 'reason': reason}, None, None
+
+
+def _normalize_new_path(path: str, is_directory: bool) -> Optional[str]:
+    """Get the normal form of a new path for a file, or ``None`` if invalid."""
+    if not path.strip('/') or (path.endswith('/') and not is_directory):
+        return None
+    normal_path = os.path.normpath(path)
+    if os.path.isabs(normal_path) or normal_path == '.' \
+            or normal_path.split(os.sep)[0] == '..':
+        return None
+    return normal_path + '/' if is_directory else normal_path
+
+
+def _get_planned(workspace: Workspace, moves: Moves, path: str,
+                 is_ancillary: bool) -> Optional[UserFile]:
+    """Get the file that will be at ``path`` once the planned moves are made."""
+    if (path, is_ancillary) in moves:
+        return moves[(path, is_ancillary)]
+    try:
+        return workspace.get(path, is_ancillary=is_ancillary)
+    except NoSuchFile:
+        return None
+
+
+def _is_in_moved_directory(moves: Moves, path: str,
+                           is_ancillary: bool) -> bool:
+    """Whether ``path`` is within a directory that is deleted or renamed."""
+    parts = path.rstrip('/').split('/')[:-1]
+    return any(('/'.join(parts[:i]) + '/', is_ancillary) in moves
+               for i in range(1, len(parts) + 1))
+
+
+def _is_free_for_file(workspace: Workspace, moves: Moves, path: str,
+                      is_ancillary: bool) -> bool:
+    """Whether a file can be put at ``path`` without clobbering a directory."""
+    parts = path.rstrip('/').split('/')
+    if not path.endswith('/'):
+        if _get_planned(workspace, moves, path + '/',
+                        is_ancillary) is not None:
+            return False    # There is a directory at this path.
+        if any(key[0].startswith(path + '/') and key[1] == is_ancillary
+               for key, u_file in moves.items() if u_file is not None):
+            return False    # A file will be moved into a directory here.
+    for i in range(1, len(parts)):
+        parent = _get_planned(workspace, moves, '/'.join(parts[:i]),
+                              is_ancillary)
+        if parent is not None and not parent.is_directory:
+            return False    # One of the parents is a file.
+    return True
+
+
+@util.exclusive
 @database.atomic
 def client_delete_all_files(upload_id: int, user: auth_domain.User) \
         -> Response:
@@ -262,8 +485,7 @@ def client_delete_all_files(upload_id: int, user: auth_domain.User) \
             raise Forbidden(messages.UPLOAD_WORKSPACE_LOCKED)
 
         workspace.delete_all_files()
-        if workspace.source_package.is_stale:
-            workspace.source_package.pack()
+        util.update_source_package(workspace)
         database.update(workspace)
     except HTTPException as httpe:
         # Werkzeug HTTPExceptions are explicitly raised, so these should always
@@ -285,6 +507,5 @@ def client_delete_all_files(upload_id: int, user: auth_domain.User) \
     response_data = transform_workspace(workspace)
     response_data.update({'reason': messages.UPLOAD_DELETED_ALL_FILES})
     headers = {'ARXIV-OWNER': workspace.owner_user_id,
-               'ETag': workspace.source_package.checksum,
-               'Last-Modified': workspace.source_package.last_modified}
+               **util.source_package_headers(workspace)}
     return response_data, status.OK, headers
@@ -28,6 +28,7 @@ Response = Tuple[Optional[dict], status, dict]
 # TODO: is working on it? These locks currently mean no changes are allowed.
 # TODO: Is there another flavor of lock? Administrative lock? Or do admin
 # TODO: and submitter coordinate on changes to upload workspace.
+@util.exclusive
 @database.atomic
 def upload_lock(upload_id: int, user: auth_domain.User) -> Response:
     """
@@ -72,8 +73,7 @@ def upload_lock(upload_id: int, user: auth_domain.User) -> Response:
             logger.info("%s: Lock: Workspace is already locked.", upload_id)
         else:
             workspace.lock_state = LockState.LOCKED
-            if workspace.source_package.is_stale:
-                workspace.source_package.pack()
+            util.update_source_package(workspace)
             database.update(workspace)
 
         response_data = {'reason': messages.UPLOAD_LOCKED_WORKSPACE}
@@ -87,11 +87,11 @@ def upload_lock(upload_id: int, user: auth_domain.User) -> Response:
         raise NotFound(messages.UPLOAD_NOT_FOUND)
 
     headers = {'ARXIV-OWNER': workspace.owner_user_id,
-               'ETag': workspace.source_package.checksum,
-               'Last-Modified': workspace.source_package.last_modified}
+               **util.source_package_headers(workspace)}
     return response_data, status_code, headers
 
 
+@util.exclusive
 @database.atomic
 def upload_unlock(upload_id: int, user: auth_domain.User) -> Response:
     """
@@ -127,8 +127,7 @@ def upload_unlock(upload_id: int, user: auth_domain.User) -> Response:
                         upload_id)
         else:
             workspace.lock_state = LockState.UNLOCKED
-            if workspace.source_package.is_stale:
-                workspace.source_package.pack()
+            util.update_source_package(workspace)
             database.update(workspace)
 
         response_data = {'reason': messages.UPLOAD_UNLOCKED_WORKSPACE}
@@ -142,6 +141,5 @@ def upload_unlock(upload_id: int, user: auth_domain.User) -> Response:
         raise NotFound(messages.UPLOAD_NOT_FOUND)
 
     headers = {'ARXIV-OWNER': workspace.owner_user_id,
-               'ETag': workspace.source_package.checksum,
-               'Last-Modified': workspace.source_package.last_modified}
+               **util.source_package_headers(workspace)}
     return response_data, status_code, headers
@@ -8,6 +8,7 @@ from typing import Optional, Tuple, Union, IO
 from datetime import datetime
 
 from flask import current_app
+from werkzeug.datastructures import ETags
 from werkzeug.exceptions import NotFound, InternalServerError, SecurityError, \
         Forbidden
 
@@ -56,22 +57,35 @@ def check_upload_content_exists(upload_id: int) -> Response:
 
     logger.info("%s: Upload content summary request.", upload_id)
 
+    # This must not build the package: if packing is deferred and the package
+    # is stale, we just don't know how large it will be.
     headers = {'ARXIV-OWNER': workspace.owner_user_id,
-               'ETag': workspace.source_package.checksum,
-               'Content-Length': workspace.source_package.size_bytes,
-               'Last-Modified': workspace.source_package.last_modified}
+               **util.source_package_headers(workspace)}
+    if not workspace.source_package.is_stale:
+        headers['Content-Length'] = str(workspace.source_package.size_bytes)
     logger.debug('Respond with headers %s', headers)
     return {}, status.OK, headers
 
 
-def get_upload_content(upload_id: int, user: auth_domain.User) -> Response:
+@database.atomic
+def get_upload_content(upload_id: int, user: auth_domain.User,
+                       if_none_match: Optional[ETags] = None,
+                       if_modified_since: Optional[datetime] = None) \
+        -> Response:
     """
     Package up files for downloading as a compressed gzipped tar file.
 
+    If the source package is stale (e.g. because ``LAZY_SOURCE_PACKAGE`` is
+    set), it is rebuilt here and then reused until the workspace next changes.
+
     Parameters
     ----------
     upload_id : int
         The unique identifier for upload workspace.
+    if_none_match : :class:`.ETags`
+        Value of the ``If-None-Match`` request header, if any.
+    if_modified_since : :class:`.datetime`
+        Value of the ``If-Modified-Since`` request header, if any.
 
     Returns
     -------
@@ -98,16 +112,29 @@ def get_upload_content(upload_id: int, user: auth_domain.User) -> Response:
                      "problem connecting to database.", upload_id)
         raise NotFound(messages.UPLOAD_NOT_FOUND) from nf
 
+    headers = {'ARXIV-OWNER': workspace.owner_user_id,
+               **util.source_package_headers(workspace)}
+    if util.is_not_modified(headers, if_none_match, if_modified_since):
+        return None, status.NOT_MODIFIED, headers
+
+    if workspace.source_package.is_stale:
+        # Only one request should rebuild the package; the others wait for
+        # it, and then find that the package is fresh.
+        with util.workspace_lock(upload_id):
+            workspace = database.retrieve(upload_id)
+            if workspace.source_package.is_stale:
+                logger.info("%s: Source package is stale; packing.",
+                            upload_id)
+                workspace.source_package.pack()
+                database.update(workspace)
+
     try:
         filepointer = workspace.source_package.open_pointer('rb')
     except FileNotFoundError as e:
         raise NotFound("No content in workspace") from e
-    headers = {
-        'ARXIV-OWNER': workspace.owner_user_id,
-        'ETag': workspace.source_package.checksum,
-        'Content-Length': workspace.source_package.size_bytes,
-        'Last-Modified': workspace.source_package.last_modified,
+    headers.update({
+        'Content-Length': str(workspace.source_package.size_bytes),
         "Content-disposition": f"filename={workspace.source_package.name}"
-    }
+    })
     logger.debug('Respond with headers %s', headers)
     return filepointer, status.OK, headers
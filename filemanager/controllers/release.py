@@ -25,6 +25,7 @@ from . import util
 Response = Tuple[Optional[dict], status, dict]
 
 
+@util.exclusive
 @database.atomic
 def upload_release(upload_id: int, user: auth_domain.User) -> Response:
     """
@@ -75,8 +76,7 @@ def upload_release(upload_id: int, user: auth_domain.User) -> Response:
             logger.info("%s: Release upload workspace [%s].", upload_id,
                         user_string)
             workspace.status = Status.RELEASED
-            if workspace.source_package.is_stale:
-                workspace.source_package.pack()
+            util.update_source_package(workspace)
             database.update(workspace)
 
             response_data = {'reason': messages.UPLOAD_RELEASED_WORKSPACE}
@@ -90,12 +90,12 @@ def upload_release(upload_id: int, user: auth_domain.User) -> Response:
         raise NotFound(messages.UPLOAD_NOT_FOUND)
 
     headers = {'ARXIV-OWNER': workspace.owner_user_id,
-               'ETag': workspace.source_package.checksum,
-               'Last-Modified': workspace.source_package.last_modified}
+               **util.source_package_headers(workspace)}
 
     return response_data, status_code, headers
 
 
+@util.exclusive
 @database.atomic
 def upload_unrelease(upload_id: int, user: auth_domain.User) -> Response:
     """
@@ -152,8 +152,7 @@ def upload_unrelease(upload_id: int, user: auth_domain.User) -> Response:
                         user_string)
 
             workspace.status = Status.ACTIVE
-            if workspace.source_package.is_stale:
-                workspace.source_package.pack()
+            util.update_source_package(workspace)
             database.update(workspace)
 
             response_data = {'reason': messages.UPLOAD_UNRELEASED_WORKSPACE}
@@ -167,6 +166,5 @@ def upload_unrelease(upload_id: int, user: auth_domain.User) -> Response:
         raise NotFound(messages.UPLOAD_NOT_FOUND)
 
     headers = {'ARXIV-OWNER': workspace.owner_user_id,
-               'ETag': workspace.source_package.checksum,
-               'Last-Modified': workspace.source_package.last_modified}
+               **util.source_package_headers(workspace)}
     return response_data, status_code, headers
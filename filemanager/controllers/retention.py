@@ -0,0 +1,323 @@
+"""
+Garbage collection of upload workspaces, according to retention policies.
+
+Content accumulates on the storage volume long after it is useful: files that
+were removed from workspaces (e.g. archives that were unpacked), old
+checkpoints, released workspaces that nobody will come back to, and the logs
+of deleted workspaces. Since the cost (and the I/O allowance) of the volume
+scales with its size, :func:`collect_garbage` removes such content according
+to a :class:`RetentionPolicy`:
+
+- removed files are deleted after ``RETENTION_REMOVED_DAYS``;
+- the oldest checkpoints of a workspace are deleted while its checkpoints use
+  more than ``RETENTION_CHECKPOINT_BYTES``;
+- released workspaces that have not been modified for
+  ``RETENTION_RELEASED_DAYS`` are deleted;
+- logs of deleted workspaces are deleted after ``RETENTION_DELETED_LOG_DAYS``;
+- upload sessions that have not received a chunk, and staged files that have
+  not been written, for ``UPLOAD_SESSION_EXPIRY_HOURS`` are deleted.
+
+The age of a removed file is measured from when it was removed; files that
+were removed before that was recorded are measured from when they were last
+modified. Lock files (``locks/<upload_id>.lock``) are not deleted: they are
+empty, and deleting one while another process waits on it would let two
+processes hold the lock at once.
+
+Owners whose workspaces hold more than ``USER_QUOTA_BYTES`` are reported;
+further uploads by them are refused (see :func:`.upload.upload`).
+
+Workspaces are visited in order of their ids, in batches of
+``RETENTION_BATCH_SIZE``, waiting ``RETENTION_BATCH_DELAY`` seconds between
+batches. Each is locked while it is collected; workspaces that are busy are
+skipped until the next run. In a dry run, nothing is changed, and the report
+describes what would have been removed.
+
+This can be run with ``python retention.py``, or via the API (see
+:func:`run_retention`).
+"""
+
+import time
+from datetime import datetime, timedelta
+from http import HTTPStatus as status
+from typing import Any, Dict, List, Mapping, Optional, Tuple, cast
+
+from dataclasses import dataclass, field
+from flask import current_app
+from pytz import UTC
+from werkzeug.exceptions import BadRequest, Conflict
+
+from arxiv.users import domain as auth_domain
+from arxiv.base import logging
+from arxiv.base.globals import get_application_config
+
+from ..domain import Workspace, Status
+from ..services import database, storage, upload_sessions
+from . import _messages as messages
+from . import util
+
+logger = logging.getLogger(__name__)
+
+Response = Tuple[Optional[dict], status, dict]
+
+
+@dataclass
+class RetentionPolicy:
+    """What to keep, and for how long. Zero means keep indefinitely."""
+
+    removed_days: int = field(default=0)
+    """Days for which removed files are kept."""
+
+    released_days: int = field(default=0)
+    """Days after its last modification that a released workspace is kept."""
+
+    checkpoint_bytes: int = field(default=0)
+    """Most bytes that the checkpoints of a workspace may use."""
+
+    deleted_log_days: int = field(default=0)
+    """Days for which the logs of deleted workspaces are kept."""
+
+    staging_hours: float = field(default=0.)
+    """Hours for which idle upload sessions and staged files are kept."""
+
+    quota_bytes: int = field(default=0)
+    """Most bytes that the workspaces of one owner may hold."""
+
+    batch_size: int = field(default=100)
+    """Number of workspaces to retrieve from the database at a time."""
+
+    batch_delay: float = field(default=0.)
+    """Seconds to wait between batches."""
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> 'RetentionPolicy':
+        """Get the policy from the application config."""
+        return cls(
+            removed_days=int(config.get('RETENTION_REMOVED_DAYS', 0)),
+            released_days=int(config.get('RETENTION_RELEASED_DAYS', 0)),
+            checkpoint_bytes=int(config.get('RETENTION_CHECKPOINT_BYTES', 0)),
+            deleted_log_days=int(config.get('RETENTION_DELETED_LOG_DAYS', 0)),
+            staging_hours=float(config.get('UPLOAD_SESSION_EXPIRY_HOURS', 0)),
+            quota_bytes=int(config.get('USER_QUOTA_BYTES', 0)),
+            batch_size=int(config.get('RETENTION_BATCH_SIZE', 100)),
+            batch_delay=float(config.get('RETENTION_BATCH_DELAY', 0.))
+        )
+
+
+@dataclass
+class RetentionReport:
+    """What was (or, in a dry run, would be) removed."""
+
+    dry_run: bool
+    workspaces: int = field(default=0)
+    """Number of workspaces visited."""
+
+    removed_files: int = field(default=0)
+    checkpoints: int = field(default=0)
+    deleted_workspaces: int = field(default=0)
+    deleted_logs: int = field(default=0)
+    expired_sessions: int = field(default=0)
+    staged_files: int = field(default=0)
+    freed_bytes: int = field(default=0)
+
+    skipped: List[int] = field(default_factory=list)
+    """Workspaces that were busy, or could not be collected."""
+
+    over_quota: Dict[str, int] = field(default_factory=dict)
+    """Total bytes held by each owner who is over quota."""
+
+    next: Optional[int] = field(default=None)
+    """Workspace id after which to continue, if not all were visited."""
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Generate a dict representation of this report."""
+        return {
+            'dry_run': self.dry_run,
+            'workspaces': self.workspaces,
+            'removed_files': self.removed_files,
+            'checkpoints': self.checkpoints,
+            'deleted_workspaces': self.deleted_workspaces,
+            'deleted_logs': self.deleted_logs,
+            'expired_sessions': self.expired_sessions,
+            'staged_files': self.staged_files,
+            'freed_bytes': self.freed_bytes,
+            'skipped': self.skipped,
+            'over_quota': self.over_quota,
+            'next': self.next
+        }
+
+
+def collect_garbage(policy: RetentionPolicy, dry_run: bool = False,
+                    after: int = 0, limit: Optional[int] = None,
+                    now: Optional[datetime] = None) -> RetentionReport:
+    """
+    Remove content that is no longer to be kept, according to ``policy``.
+
+    Must be called within an application context.
+
+    Parameters
+    ----------
+    policy : :class:`RetentionPolicy`
+    dry_run : bool
+        If true, nothing is removed.
+    after : int
+        Only visit workspaces with ids greater than this, e.g. to continue
+        from the ``next`` of an earlier report. Logs, the staging area, and
+        quotas are only checked when starting from the beginning.
+    limit : int
+        The most workspaces to visit. By default, all are visited.
+    now : :class:`datetime`
+        The time from which ages are measured; defaults to the current time.
+
+    Returns
+    -------
+    :class:`RetentionReport`
+
+    """
+    now = now or datetime.now(UTC)
+    report = RetentionReport(dry_run=dry_run)
+    if after == 0:
+        adapter = storage.create_adapter(current_app)
+        if policy.deleted_log_days:
+            count, size_bytes = adapter.expire_deleted_logs(
+                now - timedelta(days=policy.deleted_log_days), dry_run=dry_run
+            )
+            report.deleted_logs += count
+            report.freed_bytes += size_bytes
+        if policy.staging_hours:
+            before = now - timedelta(hours=policy.staging_hours)
+            # Both of the available adapters keep a staging area on the volume.
+            report.expired_sessions += upload_sessions.expire(
+                cast(storage.SimpleStorageAdapter, adapter), before,
+                dry_run=dry_run
+            )
+            count, size_bytes = adapter.expire_staging_files(before,
+                                                             dry_run=dry_run)
+            report.staged_files += count
+            report.freed_bytes += size_bytes
+        if policy.quota_bytes:
+            report.over_quota = database.get_usage(policy.quota_bytes)
+
+    while limit is None or report.workspaces < limit:
+        size = policy.batch_size
+        if limit is not None:
+            size = min(size, limit - report.workspaces)
+        batch = database.list_upload_ids((Status.ACTIVE, Status.RELEASED),
+                                         after=after, limit=size)
+        for upload_id in batch:
+            _collect_workspace(upload_id, policy, report, now)
+            report.workspaces += 1
+            after = upload_id
+        database.invalidate_cache()     # Don't hold on to the whole batch.
+        if len(batch) < size:
+            report.next = None
+            break
+        report.next = after
+        if limit is None or report.workspaces < limit:
+            time.sleep(policy.batch_delay)
+    logger.info('sys: Collected garbage%s: %s',
+                ' (dry run)' if dry_run else '', report.to_dict())
+    return report
+
+
+def _collect_workspace(upload_id: int, policy: RetentionPolicy,
+                       report: RetentionReport, now: datetime) -> None:
+    try:
+        with util.workspace_lock(upload_id):
+            workspace = database.retrieve(upload_id, skip_cache=True)
+            if policy.released_days and workspace.is_released \
+                    and workspace.modified_datetime \
+                    < now - timedelta(days=policy.released_days):
+                _delete_workspace(workspace, report)
+            else:
+                _trim_workspace(workspace, policy, report, now)
+    except Conflict:
+        logger.info('%s: Workspace busy; not collected', upload_id)
+        report.skipped.append(upload_id)
+    except (IOError, database.WorkspaceNotFound) as e:
+        logger.error('%s: Could not collect workspace: %s', upload_id, e)
+        report.skipped.append(upload_id)
+
+
+def _delete_workspace(workspace: Workspace, report: RetentionReport) -> None:
+    """Delete a released workspace, as :func:`.upload.delete_workspace`."""
+    report.deleted_workspaces += 1
+    report.freed_bytes += workspace.stored_bytes
+    if report.dry_run:
+        return
+    logger.info('%s: Deleting expired workspace, released %s',
+                workspace.upload_id, workspace.modified_datetime)
+    workspace.delete_workspace()
+    workspace.status = Status.DELETED
+    database.update(workspace)
+
+
+def _trim_workspace(workspace: Workspace, policy: RetentionPolicy,
+                    report: RetentionReport, now: datetime) -> None:
+    """Delete old removed files and checkpoints from a workspace."""
+    # Collecting garbage is not a modification by the owner; in particular,
+    # it must not postpone the expiry of a released workspace.
+    modified_datetime = workspace.modified_datetime
+    changed = False
+    if policy.removed_days:
+        cutoff = now - timedelta(days=policy.removed_days)
+        for u_file in workspace.iter_files(allow_removed=True):
+            if not u_file.is_removed \
+                    or (u_file.removed_datetime or u_file.last_modified) \
+                    >= cutoff:
+                continue
+            report.removed_files += 1
+            report.freed_bytes += u_file.size_bytes
+            if not report.dry_run:
+                workspace.delete(u_file)
+                changed = True
+    if policy.checkpoint_bytes:
+        trimmed = workspace.trim_checkpoints(policy.checkpoint_bytes,
+                                             dry_run=report.dry_run)
+        report.checkpoints += len(trimmed)
+        report.freed_bytes += sum(c.size_bytes for c in trimmed)
+        changed = changed or (bool(trimmed) and not report.dry_run)
+    if changed:
+        workspace.modified_datetime = modified_datetime
+        database.update(workspace)
+
+
+def run_retention(user: auth_domain.User, dry_run: bool = False,
+                  after: Optional[str] = None,
+                  limit: Optional[str] = None) -> Response:
+    """
+    Collect garbage according to the configured retention policy.
+
+    Parameters
+    ----------
+    user : :class:`.auth_domain.User`
+        User (or client) making the request.
+    dry_run : bool
+        If true, report what would be removed without removing anything.
+    after : str
+        Only visit workspaces with ids greater than this; the ``next`` of an
+        earlier response.
+    limit : str
+        The most workspaces to visit in this request.
+
+    Returns
+    -------
+    tuple
+        Standard Response tuple containing a :class:`RetentionReport`, HTTP
+        status, and HTTP headers.
+
+    """
+    user_string = util.format_user_information_for_logging(user)
+    logger.info('sys: Collect garbage%s [%s].',
+                ' (dry run)' if dry_run else '', user_string)
+    try:
+        start = int(after or 0)
+        count = int(limit) if limit is not None else None
+        if start < 0 or (count is not None and count < 0):
+            raise ValueError('Invalid after or limit')
+    except ValueError as e:
+        raise BadRequest(messages.RETENTION_INVALID_QUERY) from e
+
+    policy = RetentionPolicy.from_config(get_application_config())
+    report = collect_garbage(policy, dry_run=dry_run, after=start,
+                             limit=count)
+    return report.to_dict(), status.OK, {}
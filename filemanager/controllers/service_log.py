@@ -4,19 +4,28 @@ import os
 import io
 import logging
 from http import HTTPStatus as status
-from typing import Optional, Tuple, Union, IO
+from typing import Optional, Tuple, Union, IO, Iterator
 from datetime import datetime
 from hashlib import md5
 from base64 import urlsafe_b64encode
 
+from backports.datetime_fromisoformat import MonkeyPatch
+from pytz import UTC
+from werkzeug.datastructures import ETags
+from werkzeug.exceptions import BadRequest
+
 from arxiv.users import domain as auth_domain
 from arxiv.base.globals import get_application_config
 
+from ..services import logs
+from . import _messages as messages
 from . import util
 
-Response = Tuple[Optional[Union[dict, IO]], status, dict]
+MonkeyPatch.patch_fromisoformat()
+
+Response = Tuple[Optional[Union[dict, IO, Iterator[bytes]]], status, dict]
 
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=logging.INFO)
 
 logger = logging.getLogger(__name__)
 
@@ -37,32 +46,32 @@ def _get_service_logs_directory() -> str:
 
 service_log_path = os.path.join(_get_service_logs_directory(), 'upload.log')
 
-file_handler = logging.FileHandler(service_log_path, 'a')
+_config = get_application_config()
+file_handler = logs.SegmentedLogHandler(
+    service_log_path,
+    max_bytes=int(_config.get('SERVICE_LOG_MAX_BYTES', 64 * 1024 * 1024)),
+    max_age=float(_config.get('SERVICE_LOG_MAX_AGE', 24 * 60 * 60)),
+    backup_count=int(_config.get('SERVICE_LOG_BACKUP_COUNT', 30))
+)
 
 # Default arXiv log format.
 # fmt = ("application %(asctime)s - %(name)s - %(requestid)s"
 #          " - [arxiv:%(paperid)s] - %(levelname)s: \"%(message)s\"")
-datefmt = '%d/%b/%Y:%H:%M:%S %z'  # Used to format asctime.
-formatter = logging.Formatter('%(asctime)s %(message)s',
-                              '%d/%b/%Y:%H:%M:%S %z')
+datefmt = logs.TIME_FORMAT  # Used to format asctime.
+formatter = logs.formatter('%(asctime)s %(message)s')
 file_handler.setFormatter(formatter)
 # logger.handlers = []
 logger.addHandler(file_handler)
-logger.setLevel(int(os.environ.get('LOGLEVEL', logging.DEBUG)))
+logger.setLevel(int(os.environ.get('LOGLEVEL', logging.INFO)))
 logger.propagate = True
 
-# Service log routine + support routine
-
-def __checksum(filepath: str) -> str:
-    """Return b64-encoded MD5 hash of file."""
-    if os.path.exists(filepath):
-        hash_md5 = md5()
-        with open(filepath, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return urlsafe_b64encode(hash_md5.digest()).decode('utf-8')
-    return ""
+# Requests for the service log are not recorded in it: if they were, each one
+# would change the log, and so its validators, and no request would ever find
+# the log not modified. This logger is not a child of the one above, so its
+# records only reach the handlers of the application.
+access_logger = logging.getLogger(f'{__name__}_access')
 
+# Service log routine + support routine
 
 def __last_modified(filepath: str) -> datetime:
     """Return last modified time of file.
@@ -96,6 +105,19 @@ def __content_pointer(log_path: str) -> IO[bytes]:
     return open(log_path, 'rb')
 
 
+def __parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO-8601 datetime from a query parameter; UTC by default."""
+    if not value:
+        return None
+    try:
+        parsed: datetime = datetime.fromisoformat(value)  # type: ignore
+    except ValueError as e:
+        raise BadRequest(messages.LOG_INVALID_QUERY) from e
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=UTC)
+    return parsed
+
+
 def check_upload_service_log_exists() -> Response:
     """
     Check whether service log exists.
@@ -113,19 +135,24 @@ def check_upload_service_log_exists() -> Response:
     # Need path to upload.log which is currently stored at top level
     # of filemanager service.
 
-    logger.info("%s: Check whether upload service log exists.")
+    access_logger.info("sys: Check whether upload service log exists.")
 
     # service_log_path is global set during startup log init
-    checksum = __checksum(service_log_path)
     size = os.path.getsize(service_log_path)
     modified = __last_modified(service_log_path)
-    headers = {'ETag': checksum,
+    headers = {'ETag': logs.fingerprint(service_log_path),
                'Content-Length': size,
                'Last-Modified': modified}
     return {}, status.OK, headers
 
 
-def get_upload_service_log(user: auth_domain.User) -> Response:
+def get_upload_service_log(user: auth_domain.User,
+                           since: Optional[str] = None,
+                           until: Optional[str] = None,
+                           upload_id: Optional[int] = None,
+                           if_none_match: Optional[ETags] = None,
+                           if_modified_since: Optional[datetime] = None) \
+        -> Response:
     """
     Return the service-level file manager service log.
 
@@ -133,6 +160,27 @@ def get_upload_service_log(user: auth_domain.User) -> Response:
     significant workspace events. Detailed file upload/file checks details
     will be recorded in workspace log.
 
+    The log is rotated (see :mod:`.services.logs`). Without parameters, the
+    current segment is returned in full. With any of ``since``, ``until``, or
+    ``upload_id``, the matching records from the current segment and its
+    archives are returned; only the parts of each that the index says may
+    match are read.
+
+    Parameters
+    ----------
+    user : :class:`.auth_domain.User`
+        User (or client) making the request.
+    since : str
+        ISO-8601 datetime; only records at or after this time are returned.
+    until : str
+        ISO-8601 datetime; only records at or before this time are returned.
+    upload_id : int
+        Only records about this upload workspace are returned.
+    if_none_match : :class:`.ETags`
+        Value of the ``If-None-Match`` request header, if any.
+    if_modified_since : :class:`.datetime`
+        Value of the ``If-Modified-Since`` request header, if any.
+
     Returns
     -------
     tuple
@@ -141,18 +189,31 @@ def get_upload_service_log(user: auth_domain.User) -> Response:
 
     """
     user_string = util.format_user_information_for_logging(user)
-    logger.info("sys: Download file manager service log [%s].",
-                user_string)
-    # service_log_path is global set during startup log init
-    checksum = __checksum(service_log_path)
-    size = os.path.getsize(service_log_path)
-    modified = __last_modified(service_log_path)
-    filepointer = __content_pointer(service_log_path)
-    filename = os.path.basename(service_log_path)
+    access_logger.info("sys: Download file manager service log [%s].",
+                       user_string)
+    is_query = bool(since or until or upload_id is not None)
+    start, end = __parse_datetime(since), __parse_datetime(until)
+    # The log is only appended to, or replaced when it is rotated, so a
+    # validator based on its inode, size and mtime is enough.
+    etag = logs.fingerprint(service_log_path)
+    if is_query:
+        etag = urlsafe_b64encode(md5(
+            f'{etag}:{since}:{until}:{upload_id}'.encode('utf-8')
+        ).digest()).decode('utf-8')
     headers = {
-        "Content-disposition": f"filename={filename}",
-        'ETag': checksum,
-        'Content-Length': size,
-        'Last-Modified': modified
+        'ETag': etag,
+        'Last-Modified': __last_modified(service_log_path)
     }
-    return filepointer, status.OK, headers
+    if util.is_not_modified(headers, if_none_match, if_modified_since):
+        return None, status.NOT_MODIFIED, headers
+
+    if is_query:
+        return (logs.query(service_log_path, since=start, until=end,
+                           upload_id=upload_id),
+                status.OK, headers)
+    filename = os.path.basename(service_log_path)
+    headers.update({
+        "Content-disposition": f"filename={filename}",
+        'Content-Length': os.path.getsize(service_log_path),
+    })
+    return __content_pointer(service_log_path), status.OK, headers
@@ -7,6 +7,7 @@ from http import HTTPStatus as status
 from typing import Optional, Tuple, Union, IO
 from datetime import datetime
 
+from werkzeug.datastructures import ETags
 from werkzeug.exceptions import NotFound, InternalServerError
 
 from arxiv.users import domain as auth_domain
@@ -53,7 +54,7 @@ def check_upload_source_log_exists(upload_id: int) -> Response:
 
     logger.info("%s: Test for source log.", upload_id)
     headers = {
-        'ETag': workspace.log.checksum,
+        'ETag': workspace.log.fingerprint,
         'Content-Length': workspace.log.size_bytes,
         'Last-Modified': workspace.log.last_modified,
         'ARXIV-OWNER': workspace.owner_user_id
@@ -61,7 +62,10 @@ def check_upload_source_log_exists(upload_id: int) -> Response:
     return {}, status.OK, headers
 
 
-def get_upload_source_log(upload_id: int, user: auth_domain.User) -> Response:
+def get_upload_source_log(upload_id: int, user: auth_domain.User,
+                          if_none_match: Optional[ETags] = None,
+                          if_modified_since: Optional[datetime] = None) \
+        -> Response:
     """
     Get upload workspace log.
 
@@ -72,6 +76,10 @@ def get_upload_source_log(upload_id: int, user: auth_domain.User) -> Response:
     ----------
     upload_id : int
         The unique identifier for upload workspace.
+    if_none_match : :class:`.ETags`
+        Value of the ``If-None-Match`` request header, if any.
+    if_modified_since : :class:`.datetime`
+        Value of the ``If-Modified-Since`` request header, if any.
 
     Returns
     -------
@@ -92,12 +100,19 @@ def get_upload_source_log(upload_id: int, user: auth_domain.User) -> Response:
         raise NotFound(messages.UPLOAD_NOT_FOUND) from nf
 
 
-    filepointer = workspace.log.open_pointer('rb')
+    # The log is appended to constantly, so we use a validator based on its
+    # size and modification time rather than reading the whole thing.
     headers = {
-        "Content-disposition": f"filename={workspace.log.name}",
-        'ETag': workspace.log.checksum,
-        'Content-Length': workspace.log.size_bytes,
+        'ETag': workspace.log.fingerprint,
         'Last-Modified': workspace.log.last_modified,
         'ARXIV-OWNER': workspace.owner_user_id
     }
+    if util.is_not_modified(headers, if_none_match, if_modified_since):
+        return None, status.NOT_MODIFIED, headers
+
+    filepointer = workspace.log.open_pointer('rb')
+    headers.update({
+        "Content-disposition": f"filename={workspace.log.name}",
+        'Content-Length': workspace.log.size_bytes,
+    })
     return filepointer, status.OK, headers
@@ -1,7 +1,7 @@
 """Transform domain objects to API-friendly structs for public consumption."""
 
 from typing import Tuple, Optional
-from ..domain import Workspace, UserFile, Error, FileType
+from ..domain import Workspace, UserFile, Error, FileType, Checkpoint
 
 
 def transform_workspace(workspace: Workspace) -> dict:
@@ -20,7 +20,9 @@ def transform_workspace(workspace: Workspace) -> dict:
         'upload_status': workspace.status.value,
         'lock_state': workspace.lock_state.value,
         'source_format': workspace.source_type.value,
-        'checksum': workspace.source_package.checksum
+        'checksum': workspace.source_package.manifest_checksum,
+        'main_tex_files': [transform_main_tex_file(f)
+                           for f in workspace.main_tex_candidates]
     }
 
 
@@ -36,13 +38,26 @@ def transform_file(u_file: UserFile) -> dict:
     }
 
 
-def transform_checkpoint(u_file: UserFile) -> dict:
-    """Make an API-friendly dict from a checkpoint :class:`.UserFile`."""
+def transform_main_tex_file(u_file: UserFile) -> dict:
+    """Make an API-friendly dict from a candidate main TeX file."""
+    assert u_file.tex_facts is not None
     return {
-        'name': u_file.name,
-        'size': u_file.size_bytes,
-        'checksum': u_file.checksum,
-        'modified_datetime': u_file.last_modified,
+        'public_filepath': u_file.public_path,
+        'pdfoutput': u_file.tex_facts.pdfoutput,
+        'engine_hints': u_file.tex_facts.engine_hints
+    }
+
+
+def transform_checkpoint(checkpoint: Checkpoint) -> dict:
+    """Make an API-friendly dict from a :class:`.Checkpoint`."""
+    return {
+        'name': checkpoint.name,
+        'size': checkpoint.size_bytes,
+        'checksum': checkpoint.checksum,
+        'modified_datetime': checkpoint.created,
+        'file_count': checkpoint.file_count,
+        'created_by': checkpoint.created_by,
+        'description': checkpoint.description
     }
 
 
@@ -3,26 +3,27 @@
 import os
 import io
 import logging
-import time
 from http import HTTPStatus as status
 from typing import Tuple, Optional, Union, Any, BinaryIO
 from datetime import datetime
 
 from pytz import UTC
+from celery import Task
 from flask import current_app, url_for
 from werkzeug.exceptions import NotFound, InternalServerError, SecurityError, \
-        Forbidden, BadRequest, HTTPException
-from werkzeug.datastructures import FileStorage
+        Forbidden, BadRequest, HTTPException, RequestEntityTooLarge, Conflict
+from werkzeug.datastructures import FileStorage, ETags
 
 from arxiv.users import domain as auth_domain
 from arxiv.base.globals import get_application_config
 
-from ..domain import Workspace, NoSuchFile, Status
+from ..domain import Workspace, NoSuchFile, Status, UploadJob, JobStage, \
+    UserFile
 from ..domain.uploads.exceptions import EmptyUploadContentError, \
     UploadFileSecurityError, InvalidUploadContentError, \
         NoSourceFilesToCheckpoint
-from ..services import database, storage
-from ..process import strategy, check
+from ..services import database, storage, jobs
+from ..process import strategy, check, timing
 from .transform import transform_workspace
 from .service_log import logger
 from . import _messages as messages
@@ -47,11 +48,12 @@ def _create_workspace(file: FileStorage, user_id: str, user_string: str) \
     return workspace
 
 
+@util.exclusive
 @database.atomic
 def upload(upload_id: Union[int, None], file: Union[FileStorage, Any],
            user: auth_domain.User, ancillary: bool = False,
-           checkpoint: bool = False, clear_source_files: bool = False) \
-        -> Response:
+           checkpoint: bool = False, clear_source_files: bool = False,
+           defer: bool = False) -> Response:
     """
     Upload individual files or compressed archive into specified workspace.
 
@@ -73,6 +75,11 @@ def upload(upload_id: Union[int, None], file: Union[FileStorage, Any],
     checkpoint : bool
         Create a checkpoint (backup) of source files before unpacking and
         installing file payload for this request.
+    defer : bool
+        If ``True``, the file is added to the workspace but checks, persisting
+        and packing are left to a worker (see :func:`.process_upload`). The
+        response is then a summary of the :class:`.UploadJob`, with status
+        ``202 Accepted``.
 
     Returns
     -------
@@ -93,7 +100,6 @@ def upload(upload_id: Union[int, None], file: Union[FileStorage, Any],
     if upload_id is None:
         id_string = "New"
 
-    # start = time.time()
     workspace: Optional[Workspace] = None
 
     # TODO: we need better handling for client-only requests here.
@@ -125,7 +131,6 @@ def upload(upload_id: Union[int, None], file: Union[FileStorage, Any],
         workspace = _create_workspace(file, user_id, user_string)
         upload_id = workspace.upload_id
 
-    # print('upload workspace exists at', time.time() - start)
     # At this point we expect upload to exist in system
     try:
         if workspace is None:
@@ -164,7 +169,6 @@ def upload(upload_id: Union[int, None], file: Union[FileStorage, Any],
         #       database.retrieve
         logger.info("%s: Upload files to existing workspace: file='%s'",
                     workspace.upload_id, file.filename)
-        # print('upload workspace retrieved at', time.time() - start)
 
         # Keep track of how long processing workspace takes.
         start_datetime = datetime.now(UTC)
@@ -174,38 +178,39 @@ def upload(upload_id: Union[int, None], file: Union[FileStorage, Any],
             raise BadRequest('Could not determine filename')
 
         u_file = workspace.create(file.filename, is_ancillary=ancillary)
-        with workspace.open(u_file, 'wb') as f:
-            file.save(f)
+        with timing.stage('receive'):
+            if isinstance(file.stream, storage.StagedFile):
+                # The content was streamed to the storage volume as it
+                # arrived, so we need only move it into place.
+                file.stream.close()
+                workspace.adopt(u_file, file.stream.path,
+                                checksum=file.stream.checksum)
+            else:
+                with workspace.open(u_file, 'wb') as f:
+                    file.save(f)
 
         if u_file.size_bytes == 0:      # Empty uploads are disallowed.
             raise BadRequest(messages.UPLOAD_FILE_EMPTY)
-
-        workspace.perform_checks()      # Runs sanitization, fixes, etc.
-        # print('workspace finished processing upload at', time.time() - start)
-        workspace.persist_all()
-        # print('workspace persisted at', time.time() - start)
-
-        completion_datetime = datetime.now(UTC)
-
-        # Disabling these for now, as it doesn't look like we're using them.
-        # --Erick 2019-06-20
-        #
-        # workspace.last_upload_logs = json.dumps(response_data['errors'])
-        # workspace.last_upload_file_summary = json.dumps(response_data['files'])
-        workspace.last_upload_start_datetime = start_datetime
-        workspace.last_upload_completion_datetime = completion_datetime
-        workspace.last_upload_readiness = workspace.readiness
-        workspace.status = Status.ACTIVE
-        if workspace.source_package.is_stale:
-            workspace.source_package.pack()
-        # print('source packed at', time.time() - start)
-        database.update(workspace)    # Store in DB
-        # print('db updated at', time.time() - start)
+        _check_quota(workspace, u_file)
+
+        if defer:   # Hand the rest off to a worker.
+            database.update(workspace)
+            job = database.create_job(workspace.upload_id)
+            process_upload.delay(workspace.upload_id, job.job_id,
+                                 start_datetime.isoformat())
+            logger.info("%s: Queued upload for processing: job %s",
+                        workspace.upload_id, job.job_id)
+            headers = {'Location': url_for('upload_api.get_upload_job',
+                                           upload_id=workspace.upload_id,
+                                           job_id=job.job_id),
+                       'Preference-Applied': 'respond-async'}
+            return _job_summary(job), status.ACCEPTED, headers
+
+        _process(workspace, start_datetime)
 
         logger.info("%s: Processed upload. Saved to DB. Preparing upload "
                     "summary.", workspace.upload_id)
         response_data = transform_workspace(workspace)
-        # print('workspace serialized at', time.time() - start)
 
         # Do we want affirmative log messages after processing each request
         # or maybe just report errors like:
@@ -217,12 +222,10 @@ def upload(upload_id: Union[int, None], file: Union[FileStorage, Any],
         logger.info("%s: Generating upload summary.", workspace.upload_id)
         headers.update({
             'ARXIV-OWNER': workspace.owner_user_id,
-            'ETag': workspace.source_package.checksum,
-            'Last-Modified': workspace.source_package.last_modified
+            **util.source_package_headers(workspace)
         })
         logger.debug('Response checksum: %s', response_data['checksum'])
         logger.debug('Responding with headers %s', headers)
-        # print('done at', time.time() - start)
 
         # TODO: this should only be 201 Created if it's a new workspace;
         # otherwise just 200 OK. -- Erick
@@ -250,8 +253,175 @@ def upload(upload_id: Union[int, None], file: Union[FileStorage, Any],
         raise InternalServerError(messages.UPLOAD_DB_ERROR) from dbe
 
 
+def _check_quota(workspace: Workspace, u_file: UserFile) -> None:
+    """
+    Refuse an upload that would take the owner over ``USER_QUOTA_BYTES``.
+
+    The uploaded file is counted as it was received, i.e. before it is
+    unpacked.
+    """
+    quota = int(get_application_config().get('USER_QUOTA_BYTES', 0))
+    if not quota:
+        return
+    stored_bytes = workspace.stored_bytes + database.get_stored_bytes(
+        workspace.owner_user_id,
+        exclude=workspace.upload_id
+    )
+    if stored_bytes > quota:
+        logger.info("%s: Upload refused; owner would have %i bytes stored",
+                    workspace.upload_id, stored_bytes)
+        workspace.delete(u_file)
+        raise RequestEntityTooLarge(messages.UPLOAD_QUOTA_EXCEEDED)
+
+
+def _process(workspace: Workspace, start_datetime: datetime,
+             job: Optional[UploadJob] = None) -> None:
+    """Check, persist, and pack a workspace to which a file was added."""
+    _advance(job, JobStage.CHECKING)
+    with timing.stage('check'):
+        workspace.perform_checks()      # Runs sanitization, fixes, etc.
+    _advance(job, JobStage.PERSISTING)
+    with timing.stage('persist'):
+        workspace.persist_all()
+
+    completion_datetime = datetime.now(UTC)
+
+    # Disabling these for now, as it doesn't look like we're using them.
+    # --Erick 2019-06-20
+    #
+    # workspace.last_upload_logs = json.dumps(response_data['errors'])
+    # workspace.last_upload_file_summary = json.dumps(response_data['files'])
+    workspace.last_upload_start_datetime = start_datetime
+    workspace.last_upload_completion_datetime = completion_datetime
+    workspace.last_upload_readiness = workspace.readiness
+    workspace.status = Status.ACTIVE
+    _advance(job, JobStage.PACKING)
+    with timing.stage('pack'):
+        util.update_source_package(workspace)
+    with timing.stage('db'):
+        database.update(workspace)    # Store in DB
+
+
+def _advance(job: Optional[UploadJob], stage: JobStage,
+             reason: Optional[str] = None) -> None:
+    if job is not None:
+        job.advance(stage, reason=reason)
+        database.update_job(job)
+
+
+def _job_summary(job: UploadJob) -> dict:
+    return {'upload_id': job.upload_id,
+            'job_id': job.job_id,
+            'stage': job.stage.value,
+            'created_datetime': job.created_datetime,
+            'modified_datetime': job.modified_datetime,
+            'reason': job.reason}
+
+
+@jobs.celery_app.task(name='filemanager.process_upload', ignore_result=True,
+                      bind=True)
+def process_upload(self: Task, upload_id: int, job_id: str,
+                   start_datetime: str) -> None:
+    """
+    Process a file that was added to a workspace by :func:`.upload`.
+
+    The worker must share the storage volumes (including the quarantine
+    volume, if used) and the database with the web application. Progress is
+    recorded on the :class:`.UploadJob`, and can be polled with
+    :func:`.get_upload_job`.
+
+    If the workspace is busy, e.g. with a request by the client, the task is
+    retried later (see ``UPLOAD_JOB_RETRIES``) rather than failed.
+
+    Parameters
+    ----------
+    self : :class:`celery.Task`
+        The task, which is bound so that it can be retried.
+    upload_id : int
+        The unique identifier for the workspace in question.
+    job_id : str
+        The unique identifier for the job.
+    start_datetime : str
+        When the upload request was received, in ISO-8601 format.
+
+    """
+    with jobs.app_context(), \
+            timing.recording(f'job {job_id}',
+                             current_app.config.get('TIMING_ENABLED', False)):
+        job = database.retrieve_job(job_id)
+        try:
+            with util.workspace_lock(upload_id), database.transaction():
+                workspace = database.retrieve(upload_id, skip_cache=True)
+                workspace.set_strategy(strategy.create_strategy(current_app))
+                workspace.checkers = check.get_default_checkers()
+                # fromisoformat() is backported from 3.7.
+                _process(workspace,
+                         datetime.fromisoformat(start_datetime),  # type: ignore
+                         job)
+        except Conflict as e:
+            retries = current_app.config.get('UPLOAD_JOB_RETRIES', 0)
+            if self.request.retries < retries:
+                logger.info("%s: Workspace busy; will retry job %s",
+                            upload_id, job_id)
+                raise self.retry(
+                    countdown=current_app.config.get('UPLOAD_JOB_RETRY_DELAY',
+                                                     0),
+                    max_retries=retries
+                )
+            logger.error("%s: Upload processing job %s failed: %s",
+                         upload_id, job_id, e)
+            _advance(job, JobStage.FAILED, reason=str(e))
+            return
+        except Exception as e:  # pylint: disable=broad-except
+            # There is no one to re-raise to; record the failure for the
+            # client instead.
+            logger.error("%s: Upload processing job %s failed: %s",
+                         upload_id, job_id, e)
+            _advance(job, JobStage.FAILED, reason=str(e))
+            return
+        _advance(job, JobStage.COMPLETED)
+        logger.info("%s: Completed upload processing job %s", upload_id,
+                    job_id)
+
+
 @database.atomic
-def upload_summary(upload_id: int) -> Response:
+def get_upload_job(upload_id: int, job_id: str) -> Response:
+    """
+    Get the progress of an asynchronous upload processing job.
+
+    Parameters
+    ----------
+    upload_id : int
+        The unique identifier for the workspace in question.
+    job_id : str
+        The unique identifier for the job.
+
+    Returns
+    -------
+    dict
+        The stage of processing that the job has reached.
+    int
+        An HTTP status code.
+    dict
+        Some extra headers to add to the response.
+
+    """
+    try:
+        job = database.retrieve_job(job_id)
+    except database.JobNotFound as nf:
+        raise NotFound(messages.UPLOAD_JOB_NOT_FOUND) from nf
+    if job.upload_id != upload_id:
+        raise NotFound(messages.UPLOAD_JOB_NOT_FOUND)
+    headers = {}
+    if job.stage is JobStage.COMPLETED:
+        headers['Location'] = url_for('upload_api.get_upload_files',
+                                      upload_id=upload_id)
+    return _job_summary(job), status.OK, headers
+
+
+@database.atomic
+def upload_summary(upload_id: int, if_none_match: Optional[ETags] = None,
+                   if_modified_since: Optional[datetime] = None) -> Response:
     """
     Provide summary of important upload workspace details.
 
@@ -259,6 +429,10 @@ def upload_summary(upload_id: int) -> Response:
     ----------
     upload_id : int
         The unique identifier for upload workspace.
+    if_none_match : :class:`.ETags`
+        Value of the ``If-None-Match`` request header, if any.
+    if_modified_since : :class:`.datetime`
+        Value of the ``If-Modified-Since`` request header, if any.
 
     Returns
     -------
@@ -278,6 +452,11 @@ def upload_summary(upload_id: int) -> Response:
         workspace: Workspace = database.retrieve(upload_id)
         logger.info("%s: Upload summary request.", workspace.upload_id)
 
+        headers = {'ARXIV-OWNER': workspace.owner_user_id,
+                   **util.summary_headers(workspace)}
+        if util.is_not_modified(headers, if_none_match, if_modified_since):
+            return None, status.NOT_MODIFIED, headers
+
         status_code = status.OK
         response_data = transform_workspace(workspace)
         logger.info("%s: Upload summary request.", workspace.upload_id)
@@ -288,13 +467,10 @@ def upload_summary(upload_id: int) -> Response:
     except (TypeError, ValueError) as e:
         logger.info("Error updating database.")
         raise InternalServerError(messages.UPLOAD_DB_ERROR)
-
-    headers = {'ARXIV-OWNER': workspace.owner_user_id,
-               'ETag': workspace.source_package.checksum,
-               'Last-Modified': workspace.source_package.last_modified}
     return response_data, status_code, headers
 
 
+@util.exclusive
 @database.atomic
 def delete_workspace(upload_id: int, user: auth_domain.User) -> Response:
     """
@@ -0,0 +1,247 @@
+"""Controllers for resumable (chunked) uploads."""
+
+from datetime import datetime, timedelta
+from typing import Tuple, Optional, Union, IO, cast
+from http import HTTPStatus as status
+
+from flask import current_app, url_for
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import NotFound, Forbidden, BadRequest, \
+    RequestEntityTooLarge
+from pytz import UTC
+
+from arxiv.users import domain as auth_domain
+
+from ..domain import Status
+from ..services import database, storage, upload_sessions
+from .service_log import logger
+from . import _messages as messages
+from . import upload, util
+
+Response = Tuple[Optional[dict], status, dict]
+
+
+def create_session(upload_id: Optional[int], filename: Optional[str],
+                   user: Union[auth_domain.User, auth_domain.Client],
+                   ancillary: bool = False) -> Response:
+    """
+    Start a resumable upload of a single file.
+
+    Parameters
+    ----------
+    upload_id : int or None
+        The workspace to which the file will be added. If ``None``, a new
+        workspace is created when the session is committed.
+    filename : str
+        Name of the file being uploaded.
+    user : :class:`.auth_domain.User`
+        User (or client) making the request.
+    ancillary : bool
+        If ``True``, the file is to be treated as an ancillary file.
+
+    Returns
+    -------
+    dict
+        Summary of the upload session.
+    int
+        An HTTP status code.
+    dict
+        Some extra headers to add to the response.
+
+    """
+    if not filename:
+        raise BadRequest(messages.UPLOAD_MISSING_FILENAME)
+    if upload_id is not None:
+        try:
+            workspace = database.retrieve(upload_id)
+        except database.WorkspaceNotFound as nf:
+            raise NotFound(messages.UPLOAD_NOT_FOUND) from nf
+        if workspace.status != Status.ACTIVE:
+            raise Forbidden(messages.UPLOAD_NOT_ACTIVE)
+        if workspace.is_locked:
+            raise Forbidden(messages.UPLOAD_WORKSPACE_LOCKED)
+
+    # Clean up after clients that gave up, before taking up more space.
+    expiry = timedelta(hours=current_app.config['UPLOAD_SESSION_EXPIRY_HOURS'])
+    upload_sessions.expire(_get_adapter(), datetime.now(UTC) - expiry)
+
+    session = upload_sessions.create(_get_adapter(), _get_user_id(user),
+                                     filename, upload_id=upload_id,
+                                     is_ancillary=ancillary)
+    logger.info("%s: Started upload session %s: file='%s' [%s]", upload_id,
+                session.session_id, filename,
+                util.format_user_information_for_logging(user))
+    headers = {'Location': url_for('upload_api.get_upload_session',
+                                   session_id=session.session_id)}
+    return _session_summary(session), status.CREATED, headers
+
+
+def get_session(session_id: str, list_members: bool = False) -> Response:
+    """
+    Describe the chunks received so far in an upload session.
+
+    Parameters
+    ----------
+    session_id : str
+        Unique identifier for the upload session.
+    list_members : bool
+        If ``True`` and the file is a tar archive, the summary includes the
+        members of the archive that have arrived in full. This reads all of
+        the chunks received so far, so clients that poll for progress should
+        not ask for it every time.
+
+    Returns
+    -------
+    dict
+        Summary of the upload session.
+    int
+        An HTTP status code.
+    dict
+        Some extra headers to add to the response.
+
+    """
+    session = _get_session(session_id)
+    data = _session_summary(session)
+    if list_members:
+        data['members'] = session.list_members()
+    return data, status.OK, {}
+
+
+def put_chunk(session_id: str, index: int, stream: IO[bytes],
+              content_md5: Optional[str] = None) -> Response:
+    """
+    Store (or replace) a chunk of the file in an upload session.
+
+    Parameters
+    ----------
+    session_id : str
+        Unique identifier for the upload session.
+    index : int
+        Position of the chunk in the file, starting at 0.
+    stream : io.BufferedReader
+        Content of the chunk.
+    content_md5 : str or None
+        Value of the ``Content-MD5`` request header, if any. If provided, the
+        chunk is rejected unless its content matches.
+
+    Returns
+    -------
+    dict
+        Summary of the chunk.
+    int
+        An HTTP status code.
+    dict
+        Some extra headers to add to the response.
+
+    """
+    session = _get_session(session_id)
+    checksum: Optional[str] = None
+    if content_md5:     # Content-MD5 uses the standard base64 alphabet.
+        checksum = content_md5.strip().replace('+', '-').replace('/', '_')
+    try:
+        chunk = session.write_chunk(
+            index, stream, checksum=checksum,
+            max_bytes=current_app.config.get('MAX_CONTENT_LENGTH')
+        )
+    except upload_sessions.ChunkChecksumMismatch as e:
+        logger.info('Upload session %s: chunk %i rejected: %s',
+                    session_id, index, e)
+        raise BadRequest(messages.UPLOAD_CHUNK_CHECKSUM_MISMATCH) from e
+    except storage.StagedFileTooLarge as e:
+        raise RequestEntityTooLarge(messages.UPLOAD_TOO_LARGE) from e
+    return ({'index': chunk.index, 'size_bytes': chunk.size_bytes,
+             'checksum': chunk.checksum}, status.OK, {'ETag': chunk.checksum})
+
+
+def commit_session(session_id: str,
+                   user: Union[auth_domain.User, auth_domain.Client]) \
+        -> Response:
+    """
+    Assemble the chunks of an upload session, and process the file.
+
+    The assembled file is handled exactly like a file uploaded in one piece
+    (see :func:`.upload.upload`). If processing fails, the session is kept so
+    that the client can try again.
+
+    Parameters
+    ----------
+    session_id : str
+        Unique identifier for the upload session.
+    user : :class:`.auth_domain.User`
+        User (or client) making the request.
+
+    Returns
+    -------
+    dict
+        Complete summary of upload processing.
+    int
+        An HTTP status code.
+    dict
+        Some extra headers to add to the response.
+
+    """
+    session = _get_session(session_id)
+    staged = storage.StagedFile(
+        _get_adapter().open_staging_file(),
+        max_bytes=current_app.config.get('MAX_CONTENT_LENGTH')
+    )
+    try:
+        session.assemble(staged)
+        file = FileStorage(stream=cast(IO[bytes], staged),
+                           filename=session.filename)
+        response: Response = upload.upload(session.upload_id, file, user,
+                                 ancillary=session.is_ancillary)
+    except upload_sessions.SessionIncomplete as e:
+        raise BadRequest(messages.UPLOAD_SESSION_INCOMPLETE) from e
+    except storage.StagedFileTooLarge as e:
+        raise RequestEntityTooLarge(messages.UPLOAD_TOO_LARGE) from e
+    finally:
+        staged.discard()
+    session.delete()
+    logger.info('Committed upload session %s', session_id)
+    return response
+
+
+def is_session_owner(session_id: str,
+                     user: Union[auth_domain.User, auth_domain.Client]) \
+        -> bool:
+    """Determine whether ``user`` started the upload session."""
+    try:
+        session = _get_session(session_id)
+    except NotFound:
+        return True     # Let the controller respond with 404.
+    return session.owner_user_id == _get_user_id(user)
+
+
+def _get_session(session_id: str) -> upload_sessions.UploadSession:
+    try:
+        return upload_sessions.retrieve(_get_adapter(), session_id)
+    except upload_sessions.SessionNotFound as e:
+        raise NotFound(messages.UPLOAD_SESSION_NOT_FOUND) from e
+
+
+def _get_adapter() -> storage.SimpleStorageAdapter:
+    # Both of the available adapters keep a staging area on the volume.
+    return cast(storage.SimpleStorageAdapter,
+                storage.create_adapter(current_app))
+
+
+def _get_user_id(user: Union[auth_domain.User, auth_domain.Client]) -> str:
+    if isinstance(user, auth_domain.Client):
+        return str(user.owner_id)   # User ID of the client owner.
+    return str(user.user_id)
+
+
+def _session_summary(session: upload_sessions.UploadSession) -> dict:
+    return {
+        'session_id': session.session_id,
+        'upload_id': session.upload_id,
+        'filename': session.filename,
+        'ancillary': session.is_ancillary,
+        'created_datetime': session.created_datetime,
+        'chunks': [{'index': chunk.index, 'size_bytes': chunk.size_bytes,
+                    'checksum': chunk.checksum}
+                   for chunk in session.chunks],
+        'received_bytes': session.received_bytes,
+        'is_complete': session.is_complete
+    }
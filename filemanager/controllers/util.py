@@ -1,6 +1,26 @@
 """Helpers and utilities for controllers."""
 
+from base64 import urlsafe_b64encode
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from hashlib import md5
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from flask import current_app
+from pytz import UTC
+from werkzeug.datastructures import ETags
+from werkzeug.exceptions import Conflict
+
 from arxiv.users import domain as auth_domain
+from arxiv.base import logging
+from arxiv.base.globals import get_application_config
+
+from ..domain import Workspace, SourceLog
+from ..services import database, storage
+from . import _messages as messages
+
+logger = logging.getLogger(__name__)
 
 
 def format_user_information_for_logging(user: auth_domain.User) -> str:
@@ -23,3 +43,179 @@ def format_user_information_for_logging(user: auth_domain.User) -> str:
 
     """
     return f"user:{user.user_id}:{user.username}"
+
+
+@contextmanager
+def workspace_lock(upload_id: int) -> Iterator[None]:
+    """
+    Hold the exclusive lock on a workspace, or fail with ``409 Conflict``.
+
+    Waits for up to ``WORKSPACE_LOCK_TIMEOUT`` seconds for the lock. Workspace
+    data loaded before the lock was acquired may be stale, so it is discarded;
+    callers should retrieve the workspace inside the block. Anything logged to
+    the workspace's source log is written before the lock is released.
+
+    Parameters
+    ----------
+    upload_id : int
+        The workspace to lock.
+
+    Raises
+    ------
+    :class:`werkzeug.exceptions.Conflict`
+        If the lock is not acquired in time, or if the workspace is updated
+        by a process that does not respect the lock.
+
+    """
+    config = get_application_config()
+    timeout = float(config.get('WORKSPACE_LOCK_TIMEOUT', 0))
+    adapter = storage.create_adapter(current_app)
+    try:
+        with adapter.lock(upload_id, timeout=timeout):
+            database.invalidate_cache()
+            try:
+                yield
+            finally:    # Append to the source log while we hold the lock.
+                SourceLog.flush_all(upload_id)
+    except storage.WorkspaceBusy as e:
+        logger.info('%s: Workspace busy: %s', upload_id, e)
+        raise Conflict(messages.UPLOAD_WORKSPACE_BUSY) from e
+    except database.ConcurrentUpdate as e:
+        logger.error('%s: Lost update: %s', upload_id, e)
+        raise Conflict(messages.UPLOAD_WORKSPACE_BUSY) from e
+
+
+def exclusive(func: Callable) -> Callable:
+    """
+    Decorate a controller to hold the lock on its workspace while it runs.
+
+    The workspace is identified by the first argument to the controller,
+    ``upload_id``. If that is ``None`` (i.e. a new workspace will be created),
+    no lock is needed. This should be applied outside of
+    :func:`.database.atomic`, so that the transaction is complete before the
+    lock is released.
+    """
+    @wraps(func)
+    def inner(*args: Any, **kwargs: Any) -> Any:
+        upload_id = kwargs['upload_id'] if 'upload_id' in kwargs else args[0]
+        if upload_id is None:
+            return func(*args, **kwargs)
+        with workspace_lock(upload_id):
+            return func(*args, **kwargs)
+    return inner
+
+
+def is_lazy_packing() -> bool:
+    """Determine whether building the source package is deferred."""
+    config = get_application_config()
+    return bool(config.get('LAZY_SOURCE_PACKAGE', False))
+
+
+def update_source_package(workspace: Workspace) -> None:
+    """
+    Rebuild the source package after the workspace has been changed.
+
+    When ``LAZY_SOURCE_PACKAGE`` is set, this does nothing; the stale package
+    is instead rebuilt the next time that its content is requested.
+
+    Parameters
+    ----------
+    workspace : :class:`.Workspace`
+        A workspace that may have been modified during this request.
+
+    """
+    if is_lazy_packing():
+        return
+    if workspace.source_package.is_stale:
+        workspace.source_package.pack()
+
+
+def source_package_headers(workspace: Workspace) -> Dict[str, Any]:
+    """
+    Get the ``ETag`` and ``Last-Modified`` headers for the source package.
+
+    Both values are derived from the workspace record, so neither requires
+    that the package be built, nor any other file I/O.
+
+    Parameters
+    ----------
+    workspace : :class:`.Workspace`
+
+    Returns
+    -------
+    dict
+        HTTP headers.
+
+    """
+    return {'ETag': workspace.source_package.manifest_checksum,
+            'Last-Modified':
+                workspace.last_modified or workspace.modified_datetime}
+
+
+def summary_headers(workspace: Workspace) -> Dict[str, Any]:
+    """
+    Get the ``ETag`` and ``Last-Modified`` headers for the upload summary.
+
+    In addition to the content of the source package, the summary reflects
+    the status and lock state of the workspace, which can change without
+    modifying any files.
+
+    Parameters
+    ----------
+    workspace : :class:`.Workspace`
+
+    Returns
+    -------
+    dict
+        HTTP headers.
+
+    """
+    headers = source_package_headers(workspace)
+    state = ':'.join([headers['ETag'], workspace.status.value,
+                      workspace.lock_state.value,
+                      workspace.modified_datetime.isoformat()])
+    headers['ETag'] = \
+        urlsafe_b64encode(md5(state.encode('utf-8')).digest()).decode('utf-8')
+    return headers
+
+
+def is_not_modified(headers: Dict[str, Any],
+                    if_none_match: Optional[ETags] = None,
+                    if_modified_since: Optional[datetime] = None) -> bool:
+    """
+    Determine whether a conditional GET can be answered with 304.
+
+    Per :rfc:`7232#section-6`, ``If-Modified-Since`` is only evaluated if the
+    request does not include ``If-None-Match``.
+
+    Parameters
+    ----------
+    headers : dict
+        Response headers, including the ``ETag`` and/or ``Last-Modified``
+        validators for the requested resource.
+    if_none_match : :class:`.ETags`
+        Parsed value of the ``If-None-Match`` request header.
+    if_modified_since : :class:`.datetime`
+        Parsed value of the ``If-Modified-Since`` request header.
+
+    Returns
+    -------
+    bool
+
+    """
+    if if_none_match:
+        etag = headers.get('ETag')
+        return etag is not None \
+            and if_none_match.contains_weak(etag)  # type: ignore
+    last_modified = headers.get('Last-Modified')
+    if if_modified_since is None or last_modified is None:
+        return False
+    # HTTP dates have a resolution of one second.
+    return _as_utc(last_modified).replace(microsecond=0) \
+        <= _as_utc(if_modified_since)
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value.astimezone(UTC)
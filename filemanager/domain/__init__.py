@@ -2,8 +2,11 @@
 
 from .uploads import UserFile, Workspace, IChecker, SourceLog, SourceType, \
     IStorageAdapter, SourcePackage, ICheckableWorkspace, Readiness, \
-    Status, LockState
+    Status, LockState, Checkpoint
 from .file_type import FileType
 from .uploads import ICheckingStrategy
+from .uploaded_file import Reference, ReferenceKind, TeXFacts
 from .error import Error, Severity, Code
 from .index import NoSuchFile, FileIndex
+from .job import UploadJob, JobStage
+from . import codec
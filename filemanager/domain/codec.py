@@ -0,0 +1,183 @@
+"""
+Codecs for persisting the native structs produced by ``to_dict()``.
+
+The file index and errors of a workspace are written to the database on
+every update, and the whole workspace is written with each checkpoint, so the
+cost of encoding and decoding grows with the number of files.
+
+The ``iso8601`` codec is the original format: JSON, with datetimes as
+ISO-8601 strings. When decoding, every string in every object is tried as a
+datetime, which is slow. The ``json`` and ``orjson`` codecs instead write
+datetimes as POSIX timestamps, and decode without any hooks; ``from_dict()``
+methods convert timestamps back (see :func:`to_datetime`). Their documents
+are tagged with :const:`VERSION`, so that the format can change again.
+
+All of the codecs write JSON, so documents written by one can be read by any
+other. Which codec is used to write is set by ``SERIALIZATION_CODEC`` (see
+:func:`use`). It is ``iso8601`` unless one of the others is chosen, which
+should only be done once no instances that only understand the original
+format are running.
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Union, overload
+
+from backports.datetime_fromisoformat import MonkeyPatch
+from pytz import UTC
+from typing_extensions import Protocol
+
+from arxiv.util.serialize import dumps as iso8601_dumps
+
+MonkeyPatch.patch_fromisoformat()
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:     # Optional; see ORJSONCodec.
+    HAS_ORJSON = False
+
+VERSION = 2
+"""Version of the format written by the ``json`` and ``orjson`` codecs."""
+
+_VERSION_KEY = '_version'
+_DATA_KEY = '_data'
+
+
+class Codec(Protocol):
+    """Encodes and decodes native structs."""
+
+    name: str
+
+    def dumps(self, obj: Any) -> str:
+        """Encode ``obj``."""
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """Decode a document written by any codec."""
+
+
+class ISO8601JSONCodec:
+    """The original format, with datetimes as ISO-8601 strings."""
+
+    name = 'iso8601'
+
+    def dumps(self, obj: Any) -> str:
+        """Encode ``obj``, without a version tag."""
+        encoded: str = iso8601_dumps(obj)
+        return encoded
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """Decode a document written by any codec."""
+        return _unwrap(json.loads(data))
+
+
+class JSONCodec:
+    """JSON with datetimes as timestamps, using the standard library."""
+
+    name = 'json'
+
+    def dumps(self, obj: Any) -> str:
+        """Encode ``obj``, tagged with the format version."""
+        return json.dumps({_VERSION_KEY: VERSION, _DATA_KEY: obj},
+                          separators=(',', ':'), default=_default)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """Decode a document written by any codec."""
+        return _unwrap(json.loads(data))
+
+
+class ORJSONCodec:
+    """Like :class:`.JSONCodec`, but using ``orjson`` (if installed)."""
+
+    name = 'orjson'
+
+    def __init__(self) -> None:
+        """Make sure that ``orjson`` is available."""
+        if not HAS_ORJSON:
+            raise RuntimeError('The orjson codec requires the orjson package')
+        # Datetimes are passed to _default() rather than written as strings.
+        # This option was added in orjson 3; the type stubs predate it.
+        option: Optional[int] = getattr(orjson, 'OPT_PASSTHROUGH_DATETIME',
+                                        None)
+        if option is None:
+            raise RuntimeError('The orjson codec requires orjson 3 or later')
+        self._option = option
+
+    def dumps(self, obj: Any) -> str:
+        """Encode ``obj``, tagged with the format version."""
+        encoded: bytes = orjson.dumps({_VERSION_KEY: VERSION, _DATA_KEY: obj},
+                                      default=_default, option=self._option)
+        return encoded.decode('utf-8')
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """Decode a document written by any codec."""
+        return _unwrap(orjson.loads(data))
+
+
+CODECS: Dict[str, Callable[[], Codec]] = {
+    ISO8601JSONCodec.name: ISO8601JSONCodec,
+    JSONCodec.name: JSONCodec,
+    ORJSONCodec.name: ORJSONCodec
+}
+
+_codec: Codec = ISO8601JSONCodec()
+
+
+def get_codec(name: Optional[str] = None) -> Codec:
+    """Get the codec called ``name``, or the one that is in use."""
+    if name is None:
+        return _codec
+    if name not in CODECS:
+        raise ValueError(f'No such codec: {name}')
+    return CODECS[name]()
+
+
+def use(name: str) -> None:
+    """Write with the codec called ``name`` from now on."""
+    global _codec
+    _codec = get_codec(name)
+
+
+def dumps(obj: Any) -> str:
+    """Encode ``obj`` with the codec that is in use."""
+    return _codec.dumps(obj)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Decode a document written by any codec."""
+    return _codec.loads(data)
+
+
+@overload
+def to_datetime(value: None) -> None:  # noqa: D103
+    ...
+
+
+@overload
+def to_datetime(value: Union[datetime, str, float]) -> datetime:  # noqa: D103
+    ...
+
+
+def to_datetime(value: Union[datetime, str, float, None]) \
+        -> Optional[datetime]:
+    """Convert a datetime, as decoded by any codec, back to a datetime."""
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        # fromisoformat() is backported from 3.7.
+        parsed: datetime = datetime.fromisoformat(value)  # type: ignore
+        return parsed
+    return datetime.fromtimestamp(value, tz=UTC)
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, datetime):
+        return obj.timestamp()
+    raise TypeError(f'Cannot encode {type(obj).__name__}')
+
+
+def _unwrap(decoded: Any) -> Any:
+    if isinstance(decoded, dict) and _VERSION_KEY in decoded:
+        data: Dict[str, Any] = decoded[_DATA_KEY]
+        return data
+    return decoded
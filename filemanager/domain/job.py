@@ -0,0 +1,68 @@
+"""Provides :class:`.UploadJob`."""
+
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from dataclasses import dataclass, field
+from pytz import UTC
+
+
+class JobStage(Enum):
+    """Stages of asynchronous upload processing."""
+
+    QUEUED = 'QUEUED'
+    """The upload has been received, and is waiting for a worker."""
+
+    CHECKING = 'CHECKING'
+    """Files are being unpacked and checked."""
+
+    PERSISTING = 'PERSISTING'
+    """Checked files are being moved to permanent storage."""
+
+    PACKING = 'PACKING'
+    """The source package is being rebuilt."""
+
+    COMPLETED = 'COMPLETED'
+    """Processing is finished, and the upload summary is up to date."""
+
+    FAILED = 'FAILED'
+    """Processing could not be completed."""
+
+    @property
+    def is_finished(self) -> bool:
+        """Whether the job will make no further progress."""
+        return self in (JobStage.COMPLETED, JobStage.FAILED)
+
+
+@dataclass
+class UploadJob:
+    """Processing of an upload that happens outside of the request."""
+
+    job_id: str
+    """Unique identifier for the job."""
+
+    upload_id: int
+    """The workspace to which the upload was added."""
+
+    stage: JobStage = field(default=JobStage.QUEUED)
+    """Current stage of processing."""
+
+    created_datetime: datetime = field(
+        default_factory=lambda: datetime.now(UTC)
+    )
+    """When the job was created."""
+
+    modified_datetime: datetime = field(
+        default_factory=lambda: datetime.now(UTC)
+    )
+    """When the job last moved to a new stage."""
+
+    reason: Optional[str] = field(default=None)
+    """Why the job failed, if it did."""
+
+    def advance(self, stage: JobStage, reason: Optional[str] = None) -> None:
+        """Move the job to ``stage``."""
+        self.stage = stage
+        self.reason = reason
+        self.modified_datetime = datetime.now(UTC)
@@ -1,8 +1,9 @@
 """Provides :class:`UserFile`."""
 
 import os
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
+from enum import Enum
 from functools import partial
 
 from typing_extensions import Protocol
@@ -10,6 +11,7 @@ from typing_extensions import Protocol
 from pytz import UTC
 from dataclasses import dataclass, field
 
+from .codec import to_datetime
 from .file_type import FileType
 from .error import Error, Code
 
@@ -28,6 +30,106 @@ class IWorkspace(Protocol):
         ...
 
 
+class ReferenceKind(Enum):
+    """The ways in which a TeX file can depend on another file."""
+
+    INPUT = 'input'
+    INCLUDE = 'include'
+    GRAPHICS = 'graphics'
+    BIBLIOGRAPHY = 'bibliography'
+    PACKAGE = 'package'
+    CLASS = 'class'
+
+    @property
+    def extensions(self) -> Tuple[str, ...]:
+        """Suffixes to try, in order, when resolving a reference."""
+        return _EXTENSIONS[self]
+
+    @property
+    def is_required(self) -> bool:
+        """
+        Whether the referenced file must be in the workspace.
+
+        Packages and classes are usually provided by the TeX installation, so
+        only local copies are of interest.
+        """
+        return self not in (ReferenceKind.PACKAGE, ReferenceKind.CLASS)
+
+
+_EXTENSIONS: Dict[ReferenceKind, Tuple[str, ...]] = {
+    ReferenceKind.INPUT: ('.tex', ''),
+    ReferenceKind.INCLUDE: ('.tex',),
+    ReferenceKind.GRAPHICS: ('', '.pdf', '.png', '.jpg', '.jpeg', '.eps',
+                             '.ps', '.mps'),
+    # We do not run BibTeX, so what is needed is the .bbl file.
+    ReferenceKind.BIBLIOGRAPHY: ('.bbl',),
+    ReferenceKind.PACKAGE: ('.sty',),
+    ReferenceKind.CLASS: ('.cls',),
+}
+
+
+@dataclass
+class Reference:
+    """A reference from one file to another, as written in the source."""
+
+    kind: ReferenceKind
+    """How the file is referenced."""
+
+    target: str
+    """The name of the referenced file, without any implied extension."""
+
+    def to_dict(self) -> Dict[str, str]:
+        """Make a dict representation of the reference."""
+        return {'kind': self.kind.value, 'target': self.target}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, str]) -> 'Reference':
+        """Translate a dict to a :class:`.Reference`."""
+        return cls(kind=ReferenceKind(data['kind']), target=data['target'])
+
+
+@dataclass
+class TeXFacts:
+    """What the preamble of a TeX file says about how it is to be compiled."""
+
+    has_documentclass: bool = field(default=False)
+    """Whether the file has ``\\documentclass`` or ``\\documentstyle``."""
+
+    has_begin_document: bool = field(default=False)
+    """Whether the file has ``\\begin{document}``."""
+
+    pdfoutput: bool = field(default=False)
+    """Whether the file sets ``\\pdfoutput=1``, i.e. requests PDFLaTeX."""
+
+    engine_hints: List[str] = field(default_factory=list)
+    """
+    Engines that the file appears to require, e.g. ``xelatex``.
+
+    These come from ``%!TEX program`` comments, and from packages that only
+    work with certain engines.
+    """
+
+    @property
+    def is_main_candidate(self) -> bool:
+        """Whether the file could be compiled on its own."""
+        return self.has_documentclass or self.has_begin_document
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Make a dict representation of the facts."""
+        return {'has_documentclass': self.has_documentclass,
+                'has_begin_document': self.has_begin_document,
+                'pdfoutput': self.pdfoutput,
+                'engine_hints': self.engine_hints}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TeXFacts':
+        """Translate a dict to a :class:`.TeXFacts`."""
+        return cls(has_documentclass=data.get('has_documentclass', False),
+                   has_begin_document=data.get('has_begin_document', False),
+                   pdfoutput=data.get('pdfoutput', False),
+                   engine_hints=data.get('engine_hints', []))
+
+
 @dataclass
 class UserFile:
     """Represents a single file in an upload workspace."""
@@ -80,6 +182,29 @@ class UserFile:
     last_modified: datetime = field(default_factory=partial(datetime.now, UTC))
 
     reason_for_removal: Optional[str] = field(default=None)
+
+    removed_datetime: Optional[datetime] = field(default=None)
+    """
+    When the file was removed, if it was.
+
+    Moving a file does not change its modification time, so this is when the
+    age of a removed file is measured from.
+    """
+
+    content_checksum: Optional[str] = field(default=None)
+    """
+    Base64-encoded MD5 hash of the file contents, if known.
+
+    This is populated the first time that :attr:`.checksum` is accessed, and
+    cleared when the file is modified.
+    """
+
+    references: List[Reference] = field(default_factory=list)
+    """Other files upon which this (TeX) file depends, as found by scanning."""
+
+    tex_facts: Optional[TeXFacts] = field(default=None)
+    """Facts about a TeX file, recorded when its type is inferred."""
+
     # _errors: List[Error] = field(default_factory=list)
     _errors: Dict[Code, Error] = field(default_factory=dict)
 
@@ -173,7 +298,9 @@ class UserFile:
     @property
     def checksum(self) -> str:
         """Base64-endocded MD5 hash of the file contents."""
-        return self.workspace.get_checksum(self)
+        if self.content_checksum is None:
+            self.content_checksum = self.workspace.get_checksum(self)
+        return self.content_checksum
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -186,8 +313,13 @@ class UserFile:
             'is_checked': self.is_checked,
             'is_persisted': self.is_persisted,
             'is_system': self.is_system,
-            'last_modified': self.last_modified.isoformat(),
+            'last_modified': self.last_modified,
             'reason_for_removal': self.reason_for_removal,
+            'removed_datetime': self.removed_datetime,
+            'content_checksum': self.content_checksum,
+            'references': [ref.to_dict() for ref in self.references],
+            'tex_facts': (self.tex_facts.to_dict()
+                          if self.tex_facts is not None else None),
             'errors': [error.to_dict() for error in self.errors
                        if error.is_persistant]
         }
@@ -195,11 +327,6 @@ class UserFile:
     @classmethod
     def from_dict(cls, data: dict, workspace: IWorkspace) -> 'UserFile':
         """Translate a dict to an :class:`.UserFile`."""
-        last_modified = data['last_modified']
-        if not isinstance(last_modified, datetime):
-            # fromisoformat() is backported from 3.7.
-            last_modified = datetime.fromisoformat(last_modified)  # type: ignore
-
         _errors = [Error.from_dict(error) for error in data.get('errors', [])]
         return cls(
             workspace=workspace,
@@ -211,8 +338,14 @@ class UserFile:
             is_persisted=data.get('is_persisted', False),
             is_system=data.get('is_system', False),
             is_directory=data.get('is_directory', False),
-            last_modified=last_modified,
+            last_modified=to_datetime(data['last_modified']),
             reason_for_removal=data.get('reason_for_removal'),
+            removed_datetime=to_datetime(data.get('removed_datetime')),
+            content_checksum=data.get('content_checksum'),
+            references=[Reference.from_dict(ref)
+                        for ref in data.get('references', [])],
+            tex_facts=(TeXFacts.from_dict(data['tex_facts'])
+                       if data.get('tex_facts') is not None else None),
             _errors={e.code: e for e in _errors},
             file_type=FileType(data['file_type'])
         )
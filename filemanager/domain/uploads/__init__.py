@@ -20,6 +20,8 @@ split out into separate classes.
 - :class:`.SingleFile`, which adds the concept of a "single file submission."
 - :class:`.Lockable`, which adds support for locking/unlocking the workspace.
 - :class:`.Statusable`, which adds the concept of a workspace status.
+- :class:`.Resolvable`, which adds the graph of dependencies between TeX
+  source files.
 
 How to implement new functionality in the workspace
 ===================================================
@@ -102,8 +104,9 @@ from ..uploaded_file import UserFile
 from .base import BaseWorkspace, IStorageAdapter
 from .checkable import Checkable, IChecker, ICheckingStrategy, \
     ICheckableWorkspace
-from .checkpoint import Checkpointable
+from .checkpoint import Checkpointable, Checkpoint
 from .countable import Countable
+from .dependencies import Resolvable
 from .errors_and_warnings import ErrorsAndWarnings
 from .file_mutations import SourceLog, SourcePackage, FileMutations
 from .lock import Lockable, LockState
@@ -123,6 +126,7 @@ class Workspace(ErrorsAndWarnings,
                       FileMutations,
                       Readiable,
                       Countable,
+                      Resolvable,
                       Checkpointable,
                       Checkable,
                       SourceTypeable,
@@ -12,6 +12,7 @@ from dataclasses import dataclass, field
 from pytz import UTC
 from typing_extensions import Protocol
 
+from ..codec import to_datetime
 from ..uploaded_file import UserFile
 from ..index import FileIndex
 from .util import modifies_workspace
@@ -50,6 +51,9 @@ class IBaseWorkspace(Protocol):  # pylint: disable=too-many-public-methods
     upload_id: int
     """Unique ID for the upload workspace."""
 
+    version: int
+    """Version of the stored workspace record, for detecting lost updates."""
+
     @property
     def ancillary_path(self) -> str:
         """Get the path where ancillary files are stored."""
@@ -70,6 +74,10 @@ class IBaseWorkspace(Protocol):  # pylint: disable=too-many-public-methods
     def size_bytes(self) -> int:
         """Total size of the source content (including ancillary files)."""
 
+    @property
+    def stored_bytes(self) -> int:
+        """Total size of the indexed files, including removed and system."""
+
     @property
     def source_path(self) -> str:
         """Get the path where source files are deposited."""
@@ -80,6 +88,10 @@ class IBaseWorkspace(Protocol):  # pylint: disable=too-many-public-methods
     def storage(self) -> 'IStorageAdapter':
         """Get the storage adapter for this workspace."""
 
+    def adopt(self, u_file: UserFile, path: str,
+              checksum: Optional[str] = None) -> None:
+        """Move the staged file at ``path`` into place as ``u_file``."""
+
     def cmp(self, a_file: UserFile,
             b_file: UserFile, shallow: bool = True) -> bool:
         """Compare the contents of two files."""
@@ -162,13 +174,26 @@ class IStorageAdapter(Protocol):  # pylint: disable=too-many-public-methods
     def __init__(self, *args: Any, **kwargs: Any) -> None:  # pylint: disable=super-init-not-called
         """Initialize with implementation-specific configuration params."""
 
+    def adopt(self, workspace: Any, u_file: UserFile, path: str) -> None:
+        """Move the staged file at ``path`` into place as ``u_file``."""
+
+    def cache_stats(self, workspace: Any, path: str,
+                    is_ancillary: bool = False, is_removed: bool = False,
+                    is_persisted: bool = False,
+                    is_system: bool = False) -> None:
+        """Get the sizes and times of everything under ``path`` at once."""
+
     def cmp(self, workspace: Any, a_file: UserFile,
             b_file: UserFile, shallow: bool = True) -> bool:
         """Compare the contents of two files."""
 
     def copy(self, workspace: Any, u_file: UserFile,
-             new_file: UserFile) -> None:
-        """Copy the contents of ``u_file`` into ``new_file``."""
+             new_file: UserFile, link: bool = False) -> None:
+        """
+        Copy the contents of ``u_file`` into ``new_file``.
+
+        If ``link`` is set, ``new_file`` may be a hard link of ``u_file``.
+        """
 
     def create(self, workspace: Any, u_file: UserFile) -> None:
         """
@@ -187,6 +212,14 @@ class IStorageAdapter(Protocol):  # pylint: disable=too-many-public-methods
     def delete_workspace(self, workspace: Any) -> None:
         """Completely delete a workspace and all of its contents."""
 
+    def expire_deleted_logs(self, before: datetime,
+                            dry_run: bool = False) -> Tuple[int, int]:
+        """Delete stashed logs last modified ``before``; get count, bytes."""
+
+    def expire_staging_files(self, before: datetime,
+                             dry_run: bool = False) -> Tuple[int, int]:
+        """Delete staged files last written ``before``; get count, bytes."""
+
     def get_last_modified(self, workspace: Any,
                           u_file: UserFile) -> datetime:
         """Get the datetime when a file was last modified."""
@@ -211,6 +244,10 @@ class IStorageAdapter(Protocol):  # pylint: disable=too-many-public-methods
     def is_tarfile(self, workspace: Any, u_file: UserFile) -> bool:
         """Determine whether or not a file can be opened with ``tarfile``."""
 
+    @contextmanager
+    def lock(self, upload_id: int, timeout: float = 0.) -> Iterator[None]:
+        """Hold an exclusive, advisory lock on a workspace."""
+
     def makedirs(self, workspace: Any, path: str) -> None:
         """Make directories recursively for ``path`` if they don't exist."""
 
@@ -237,6 +274,17 @@ class IStorageAdapter(Protocol):  # pylint: disable=too-many-public-methods
                      flags: str = 'r', **kwargs: Any) -> IO[Any]:
         """Get an open file pointer to a file on disk."""
 
+    def open_staging_file(self) -> IO[bytes]:
+        """
+        Open a new file in the staging area of the storage volume.
+
+        A staged file can be moved into a workspace with :meth:`.adopt`.
+        """
+
+    def pack_files(self, workspace: Any, u_file: UserFile,
+                   members: Dict[str, UserFile]) -> UserFile:
+        """Pack files into ``u_file`` as a tarball, at the given paths."""
+
     def pack_tarfile(self, workspace: Any, u_file: UserFile,
                      path: str) -> UserFile:
         """Pack ``path`` into ``u_file`` as a tarball."""
@@ -251,6 +299,10 @@ class IStorageAdapter(Protocol):  # pylint: disable=too-many-public-methods
     def remove(self, workspace: Any, u_file: UserFile) -> None:
         """Remove a file."""
 
+    def replace_content(self, workspace: Any, u_file: UserFile,
+                        content: bytes) -> None:
+        """Replace the content of a file in one step, never half written."""
+
     def set_last_modified(self, workspace: Any,
                           u_file: UserFile, modified: datetime) -> None:
         """Set the modification datetime on a file."""
@@ -311,6 +363,9 @@ class _BaseFieldsWithDefaults:
     last_upload_file_summary: str = field(default_factory=str)
     """Logs associated with last upload event."""
 
+    version: int = field(default=1)
+    """Version of the stored workspace record, for detecting lost updates."""
+
 
 @dataclass  # pylint: disable=too-many-public-methods
 class BaseWorkspace(_BaseFieldsWithDefaults, _BaseFields, IBaseWorkspace):
@@ -327,11 +382,12 @@ class BaseWorkspace(_BaseFieldsWithDefaults, _BaseFields, IBaseWorkspace):
         return {
             'upload_id': data['upload_id'],
             'owner_user_id': data['owner_user_id'],
-            'created_datetime': data['created_datetime'],
-            'modified_datetime': data['modified_datetime'],
-            'last_upload_start_datetime': data.get('last_upload_start_datetime'),
+            'created_datetime': to_datetime(data['created_datetime']),
+            'modified_datetime': to_datetime(data['modified_datetime']),
+            'last_upload_start_datetime':
+                to_datetime(data.get('last_upload_start_datetime')),
             'last_upload_completion_datetime':
-                data.get('last_upload_completion_datetime'),
+                to_datetime(data.get('last_upload_completion_datetime')),
             'last_upload_logs': data.get('last_upload_logs'),
             'last_upload_file_summary': data.get('last_upload_file_summary')
         }
@@ -405,6 +461,16 @@ class BaseWorkspace(_BaseFieldsWithDefaults, _BaseFields, IBaseWorkspace):
         """Total size of the source content (including ancillary files)."""
         return sum([f.size_bytes for f in self.iter_files()])
 
+    @property
+    def stored_bytes(self) -> int:
+        """
+        Total size of the indexed files, including removed and system files.
+
+        Checkpoint content is not indexed, and so is not included.
+        """
+        return sum([f.size_bytes for f in self.iter_files(allow_removed=True,
+                                                          allow_system=True)])
+
     @property
     def source_path(self) -> str:
         """Get the path where source files are deposited."""
@@ -442,6 +508,37 @@ class BaseWorkspace(_BaseFieldsWithDefaults, _BaseFields, IBaseWorkspace):
             return path, True
         return path, False
 
+    @modifies_workspace()
+    def adopt(self, u_file: UserFile, path: str,
+              checksum: Optional[str] = None) -> None:
+        """
+        Move the staged file at ``path`` into place as ``u_file``.
+
+        This takes ownership of content that was written to the storage volume
+        as it arrived (see :meth:`.IStorageAdapter.open_staging_file`), rather
+        than copying it into the workspace.
+
+        Parameters
+        ----------
+        u_file : :class:`.UserFile`
+            A file in this workspace, e.g. from :meth:`.create`.
+        path : str
+            Absolute path to the staged file.
+        checksum : str or None
+            Checksum of the staged content, if it is already known.
+
+        """
+        if not self.files.contains(
+                u_file.path,
+                is_ancillary=u_file.is_ancillary,
+                is_system=u_file.is_system,
+                is_removed=u_file.is_removed):
+            raise ValueError('No such file')
+        self.storage.adopt(self, u_file, path)
+        self.get_size_bytes(u_file)
+        self.get_last_modified(u_file)
+        u_file.content_checksum = checksum
+
     def cmp(self, a_file: UserFile,
             b_file: UserFile, shallow: bool = True) -> bool:
         """Compare the contents of two files."""
@@ -466,7 +563,9 @@ class BaseWorkspace(_BaseFieldsWithDefaults, _BaseFields, IBaseWorkspace):
     def get_checksum(self, u_file: UserFile) -> str:
         """Get the urlsafe base64-encoded MD5 hash of the file contents."""
         hash_md5 = md5()
-        with self.open(u_file, "rb") as f:
+        # Reading the file does not modify the workspace, so we go straight to
+        # storage rather than through :meth:`.open`.
+        with self.storage.open(self, u_file, "rb") as f:
             for chunk in iter(lambda: bytes(f.read(4096)), b""):
                 hash_md5.update(chunk)
         return urlsafe_b64encode(hash_md5.digest()).decode('utf-8')
@@ -485,7 +584,10 @@ class BaseWorkspace(_BaseFieldsWithDefaults, _BaseFields, IBaseWorkspace):
 
     def get_last_modified(self, u_file: UserFile) -> datetime:
         """Get the datetime when a :class:`.UserFile` was last modified."""
-        u_file.last_modified = self.storage.get_last_modified(self, u_file)
+        last_modified = self.storage.get_last_modified(self, u_file)
+        if last_modified != u_file.last_modified:
+            u_file.content_checksum = None  # Content may have changed.
+        u_file.last_modified = last_modified
         return u_file.last_modified
 
     def get_path(self, u_file_or_path: Union[str, UserFile],
@@ -585,10 +687,14 @@ class BaseWorkspace(_BaseFieldsWithDefaults, _BaseFields, IBaseWorkspace):
                 is_system=u_file.is_system,
                 is_removed=u_file.is_removed):
             raise ValueError('No such file')
+        writes = any(flag in flags for flag in 'wax+')
+        if writes:
+            u_file.content_checksum = None
         with self.storage.open(self, u_file, flags, **kwargs) as f:
             yield f
-        self.get_size_bytes(u_file)
-        self.get_last_modified(u_file)
+        if writes:  # Reading does not change the size or time.
+            self.get_size_bytes(u_file)
+            self.get_last_modified(u_file)
 
     def open_pointer(self, u_file: UserFile, flags: str = 'r',
                      **kwargs: Any) -> IO:
@@ -1,6 +1,6 @@
 """Provides checking functionality to the workspace."""
 
-from typing import List, Optional, Any, Callable, cast
+from typing import List, Optional, Any, Callable, Iterable, cast
 
 from dataclasses import field, dataclass
 from typing_extensions import Protocol
@@ -21,6 +21,11 @@ class IChecker(Protocol):
         """Check the workspace as a whole."""
         ...
 
+    def check_deletions(self, workspace: Any,
+                        deleted: List[UserFile]) -> None:
+        """Check the parts of the workspace affected by deleted files."""
+        ...
+
 
 class ICheckingStrategy(Protocol):
     """Strategy for checking files in a workspace."""
@@ -29,6 +34,11 @@ class ICheckingStrategy(Protocol):
         """Perform checks on all files in the workspace using ``checkers``."""
         ...
 
+    def check_deletions(self, workspace: Any, deleted: List[UserFile],
+                        *checkers: IChecker) -> None:
+        """Update workspace-wide checks after files have been deleted."""
+        ...
+
 
 class IWorkspace(IBaseWorkspace, Protocol):
     """
@@ -66,6 +76,9 @@ class ICheckable(Protocol):
     def perform_checks(self) -> None:
         """Perform all checks on this workspace using the assigned strategy."""
 
+    def perform_deletion_checks(self, deleted: Iterable[UserFile]) -> None:
+        """Re-check only what may have changed when ``deleted`` were deleted."""
+
 
 class ICheckableWorkspace(IWorkspace, ICheckable):
     """Joint API for a workspace that incorporates :class:`ICheckable`."""
@@ -124,3 +137,14 @@ class Checkable(ICheckable):
         """Perform all checks on this workspace using the assigned strategy."""
         self.strategy.check(self, *self.checkers)
 
+    def perform_deletion_checks(self, deleted: Iterable[UserFile]) -> None:
+        """
+        Re-check only what may have changed when ``deleted`` were deleted.
+
+        Files are checked independently of one another, so deleting a file
+        cannot change the outcome of file checks on the files that remain. Only
+        workspace-wide checks need to be revisited, and only for the parts of
+        the workspace near the deleted files.
+        """
+        self.strategy.check_deletions(self, list(deleted), *self.checkers)
+
@@ -1,21 +1,48 @@
-"""Adds checkpoint functionality to the upload workspace."""
+"""
+Adds checkpoint functionality to the upload workspace.
+
+A checkpoint is a snapshot of the source and ancillary files in a workspace.
+The content of each file is stored once, as a "blob" named by its checksum
+(in ``checkpoint/blobs/``), no matter how many checkpoints include it. A
+checkpoint itself is a small manifest (``checkpoint/<name>.manifest.json``)
+that maps paths to blobs, along with the file index and errors of the
+workspace. So creating a checkpoint only copies the files that have changed
+since the last one, and deleting one only deletes blobs that no other
+checkpoint uses. The number of checkpoints that use each blob is kept in
+``checkpoint/blob_references.json``, so that neither needs to read the other
+manifests.
+
+A summary of each checkpoint (a :class:`.Checkpoint`) is recorded in
+``checkpoint/checkpoints.json`` when it is created, so that checkpoints can be
+listed without reading their manifests or tarballs.
+
+Clients still see each checkpoint as a gzipped tarball. It is packed from the
+blobs when it is first requested, and kept (in ``checkpoint/archives/``) until
+the checkpoint is deleted.
+
+Workspaces may also have checkpoints that were made before there were blobs,
+each of which is a tarball and a JSON file with the workspace metadata. These
+can still be listed, downloaded, restored, and deleted.
+"""
 
 import os
+from base64 import urlsafe_b64encode
 from contextlib import contextmanager
 from datetime import datetime
-from json import dump, load
 from typing import IO, List, TypeVar, Type, Iterable, Any, Optional, Dict, \
-    Callable, Iterator, cast
+    Callable, Iterator, Set, Tuple, cast
+from hashlib import md5
 
 from dataclasses import dataclass, field
 from typing_extensions import Protocol
 
 # Not sure why we're running into issues with namespace packages here.
 from arxiv.users.domain import User  # pylint: disable=no-name-in-module
-from arxiv.util.serialize import ISO8601JSONEncoder, ISO8601JSONDecoder  # pylint: disable=no-name-in-module
 
 from .base import IBaseWorkspace
 from .exceptions import UploadFileSecurityError, NoSourceFilesToCheckpoint
+from .source_type import SourceType
+from .. import codec
 from ..error import Error, Severity
 from ..uploaded_file import UserFile
 
@@ -36,6 +63,40 @@ class IFiles(Protocol):
 
 
 class IStorage(Protocol):
+    def copy(self, workspace: 'Checkpointable', u_file: UserFile,
+             new_file: UserFile, link: bool = False) -> None:
+        """Copy the contents of ``u_file`` into ``new_file``."""
+        ...
+
+    def create(self, workspace: 'Checkpointable', u_file: UserFile) -> None:
+        """Create a file, and any non-existant directories in the path."""
+        ...
+
+    def delete(self, workspace: 'Checkpointable', u_file: UserFile) -> None:
+        """Permanently delete a file or directory."""
+        ...
+
+    def get_size_bytes(self, workspace: 'Checkpointable',
+                       u_file: UserFile) -> int:
+        """Get the size of a file in bytes."""
+        ...
+
+    @contextmanager
+    def open(self, workspace: 'Checkpointable', u_file: UserFile,
+             flags: str = 'r', **kwargs: Any) -> Iterator[IO]:
+        """Get an open file pointer to a file on disk."""
+        ...
+
+    def pack_files(self, workspace: 'Checkpointable', u_file: UserFile,
+                   members: Dict[str, UserFile]) -> UserFile:
+        """Pack files into ``u_file`` as a tarball, at the given paths."""
+        ...
+
+    def set_last_modified(self, workspace: 'Checkpointable',
+                          u_file: UserFile, modified: datetime) -> None:
+        """Set the modification datetime on a file."""
+        ...
+
     def unpack_tarfile(self, workspace: 'Checkpointable',
                        u_file: UserFile, path: str) -> None:
         """Unpack tarfile ``u_file`` into ``path``."""
@@ -52,6 +113,7 @@ class IWorkspace(IBaseWorkspace, Protocol):
 
     errors: List[Error]
     log: ILog
+    source_type: SourceType
 
     def add_warning_non_file(self, msg: str,
                              is_persistant: bool = False) -> None:
@@ -75,6 +137,52 @@ class IWorkspace(IBaseWorkspace, Protocol):
         """Delete all source and ancillary files in the workspace."""
 
 
+@dataclass
+class Checkpoint:
+    """Summary of a checkpoint, recorded when it is created."""
+
+    name: str
+    """Name of the checkpoint tarball."""
+
+    checksum: str
+    """Uniquely identifies the checkpoint."""
+
+    size_bytes: int
+    """Total size of the files in the checkpoint (or of the tarball)."""
+
+    created: datetime
+
+    file_count: Optional[int] = field(default=None)
+    """Number of files in the checkpoint, if known."""
+
+    created_by: Optional[str] = field(default=None)
+    """Username of the user who created the checkpoint, if any."""
+
+    description: Optional[str] = field(default=None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Generate a dict representation of this checkpoint."""
+        return {
+            'name': self.name,
+            'checksum': self.checksum,
+            'size_bytes': self.size_bytes,
+            'created': self.created,
+            'file_count': self.file_count,
+            'created_by': self.created_by,
+            'description': self.description
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Checkpoint':
+        """Translate a dict to a :class:`.Checkpoint`."""
+        return cls(name=data['name'], checksum=data['checksum'],
+                   size_bytes=data['size_bytes'],
+                   created=codec.to_datetime(data['created']),
+                   file_count=data.get('file_count'),
+                   created_by=data.get('created_by'),
+                   description=data.get('description'))
+
+
 class ICheckpointable(Protocol):
     """Interface for checkpointable behavior."""
 
@@ -85,7 +193,8 @@ class ICheckpointable(Protocol):
     def checkpoint_file_exists(self, checksum: str) -> bool:
         """Indicate whether checkpoint files exists."""
 
-    def create_checkpoint(self, user: User) -> str:
+    def create_checkpoint(self, user: User,
+                          description: Optional[str] = None) -> str:
         """Create a chckpoint (backup) of workspace source files."""
 
     def delete_all_checkpoints(self, user: User) -> None:
@@ -106,9 +215,13 @@ class ICheckpointable(Protocol):
     def get_checkpoint_file_size(self, checksum: str) -> int:
         """Return size of specified checkpoint file."""
 
-    def list_checkpoints(self, user: User) -> List[UserFile]:
+    def list_checkpoints(self, user: User) -> List[Checkpoint]:
         """Generate a list of checkpoints."""
 
+    def trim_checkpoints(self, max_bytes: int,
+                         dry_run: bool = False) -> List[Checkpoint]:
+        """Delete the oldest checkpoints, until the rest fit in a size."""
+
 
 class ICheckpointableWorkspace(IWorkspace, ICheckpointable, Protocol):
     """Structure of a workspace with checkpointable behavior."""
@@ -129,6 +242,20 @@ class Checkpointable(ICheckpointable):
     CHECKPOINT_PREFIX: str = field(default='checkpoint')
     """The name of the checkpoint directory within the upload workspace."""
 
+    BLOBS_PREFIX: str = field(default='blobs')
+    """The directory (within the checkpoint directory) of file contents."""
+
+    ARCHIVES_PREFIX: str = field(default='archives')
+    """The directory (within the checkpoint directory) of packed tarballs."""
+
+    MANIFEST_SUFFIX: str = field(default='.manifest.json')
+
+    SUMMARIES_NAME: str = field(default='checkpoints.json')
+    """The file (in the checkpoint directory) of :class:`.Checkpoint`s."""
+
+    REFERENCES_NAME: str = field(default='blob_references.json')
+    """The file (in the checkpoint directory) of the uses of each blob."""
+
     # Allow maximum number of checkpoints (100?)
     MAX_CHECKPOINTS: int = field(default=10)  # Use 10 for testing
 
@@ -176,14 +303,24 @@ class Checkpointable(ICheckpointable):
         except FileNotFoundError:
             return False
 
-    def create_checkpoint(self, user: User) -> str:
+    def create_checkpoint(self, user: User,
+                          description: Optional[str] = None) -> str:
         """
         Create a chckpoint (backup) of workspace source files.
 
+        Only files whose contents are not already in a checkpoint are copied.
+
+        Parameters
+        ----------
+        user : :class:`.User`
+            The user creating the checkpoint, if any.
+        description : str
+            Optional description of the checkpoint, e.g. why it was made.
+
         Returns
         -------
         checksum : str
-            Checksum for checkpoint tar gzipped archive we just created.
+            Checksum that uniquely identifies the checkpoint (of its manifest).
 
         """
         # Make sure there are files before we bother to create a checkpoint.
@@ -199,22 +336,60 @@ class Checkpointable(ICheckpointable):
         if count >= self.MAX_CHECKPOINTS:
             return ''   # TODO: Need to throw an error here?
 
-        checkpoint = self.__api.create(self._make_path(user, count + 1),
-                                       is_system=True, is_persisted=True,
-                                       touch=True)
-        self.__api.pack_source(checkpoint)
-
-        metadata = self.__api.create(self._make_metadata_path(user, count + 1),
+        references = self._read_references()
+        stored = set(references)
+        blobs: Dict[str, str] = {}
+        directories: List[str] = []
+        for u_file in self.__api.iter_files(allow_directories=True):
+            path = self.__api.get_public_path(u_file)
+            if u_file.is_directory:
+                directories.append(path)
+                continue
+            checksum = u_file.checksum
+            if checksum not in stored:
+                blob = self._make_blob(checksum)
+                self.__api.storage.create(self, blob)
+                # Blobs are never written to, so may share the file's inode.
+                self.__api.storage.copy(self, u_file, blob, link=True)
+                stored.add(checksum)
+            blobs[path] = checksum
+
+        manifest = self.__api.create(self._make_manifest_path(user, count + 1),
                                      is_system=True, is_persisted=True,
                                      touch=True)
-        with self.__api.open(metadata, 'w') as f:
-            dump(self.__api.to_dict(), f, cls=ISO8601JSONEncoder)
-        return checkpoint.checksum
+        content = codec.dumps({
+            'size_bytes': self.__api.size_bytes,
+            'blobs': blobs,
+            'directories': directories,
+            'workspace': self.__api.to_dict()
+        }).encode('utf-8')
+        with self.__api.open(manifest, 'wb') as f:
+            f.write(content)
+        # We have the content at hand, so there is no need to read it back.
+        manifest.content_checksum = \
+            urlsafe_b64encode(md5(content).digest()).decode('utf-8')
+
+        for checksum in set(blobs.values()):
+            references[checksum] = references.get(checksum, 0) + 1
+        self._write_references(references)
+
+        summaries = self._read_summaries()
+        summaries.append(Checkpoint(
+            name=self._make_archive(manifest).name,
+            checksum=manifest.content_checksum,
+            size_bytes=self.__api.size_bytes,
+            created=manifest.last_modified,
+            file_count=len(blobs),
+            created_by=user.username if user else None,
+            description=description
+        ))
+        self._write_summaries(summaries)
+        return manifest.content_checksum
 
     def delete_all_checkpoints(self, user: User) -> None:
         """Remove all checkpoints."""
-        for checkpoint in self.list_checkpoints(user):
-            self.__api.delete(checkpoint)
+        for checkpoint, manifest in list(self._iter_checkpoints()):
+            self._delete_checkpoint(checkpoint, manifest)
 
         log_msg = f"Deleted ALL checkpoints"
         log_msg += f": ['{user.username}']." if user else "."
@@ -223,14 +398,14 @@ class Checkpointable(ICheckpointable):
     def delete_checkpoint(self, checksum: str, user: User) -> None:
         """Remove specified checkpoint."""
         try:
-            checkpoint = self._get_checkpoint(checksum)
+            checkpoint, manifest = self._get_checkpoint(checksum)
         except FileNotFoundError:
             log_msg = f"ERROR: Checkpoint not found: {checksum}"
             log_msg += f"['{user.username}']" if user else "."
             self.__api.log.info(log_msg)
             raise
 
-        self.__api.delete(checkpoint)
+        self._delete_checkpoint(checkpoint, manifest)
         log_msg = f"Deleted checkpoint: {checkpoint.name}"
         log_msg += f"['{user.username}']." if user else "."
         self.__api.log.info(log_msg)
@@ -247,9 +422,10 @@ class Checkpointable(ICheckpointable):
         Returns
         -------
         :class:`.UserFile`
+            The checkpoint tarball, which is packed if necessary.
 
         """
-        return self._get_checkpoint(checksum)
+        return self._get_checkpoint_archive(checksum)
 
     def get_checkpoint_file_last_modified(self, checksum: str) -> datetime:
         """
@@ -264,7 +440,8 @@ class Checkpointable(ICheckpointable):
         -------
         Last modified date string.
         """
-        return self._get_checkpoint(checksum).last_modified
+        checkpoint, _ = self._get_checkpoint(checksum)
+        return checkpoint.last_modified
 
     def get_checkpoint_file_pointer(self, checksum: str) -> IO[bytes]:
         """
@@ -281,7 +458,8 @@ class Checkpointable(ICheckpointable):
             File pointer or exception string when filepath does not exist.
 
         """
-        return self.__api.open_pointer(self._get_checkpoint(checksum), 'rb')
+        return self.__api.open_pointer(self._get_checkpoint_archive(checksum),
+                                       'rb')
 
     def get_checkpoint_file_size(self, checksum: str) -> int:
         """
@@ -296,22 +474,23 @@ class Checkpointable(ICheckpointable):
         -------
         Size in bytes.
         """
-        u_file = self._get_checkpoint(checksum)
-        if u_file is not None:
-            return int(u_file.size_bytes)
-        raise FileNotFoundError(UPLOAD_CHECKPOINT_FILE_NOT_FOUND)
+        return int(self._get_checkpoint_archive(checksum).size_bytes)
 
-    def list_checkpoints(self, user: User) -> List[UserFile]:
+    def list_checkpoints(self, user: User) -> List[Checkpoint]:
         """
         Generate a list of checkpoints.
 
+        Checkpoints are listed from the summaries recorded when they were
+        created. Tarball checkpoints, from before there were summaries, are
+        described by their tarballs.
+
         Returns
         -------
         list
-            list of checkpoint files, includes date/time checkpoint was
-            created and checksum key.
-
-        TODO: include description? or make one up on the fly?
+            list of :class:`.Checkpoint`s, which include date/time checkpoint
+            was created and checksum key. The size of a checkpoint is the
+            total size of the files in it, unless it is a tarball made before
+            there were summaries.
 
         """
         if user:
@@ -319,18 +498,35 @@ class Checkpointable(ICheckpointable):
         else:
             log_msg = 'Created list of checkpoints.'
         self.__api.log.info(log_msg)
-        return [u for u in self.__api.iter_files(allow_system=True)
-                if u.is_system
-                and u.path.startswith(self.CHECKPOINT_PREFIX)
-                and u.path.endswith('.tar.gz')]
+        summaries = {summary.name: summary
+                     for summary in self._read_summaries()}
+        checkpoints = []
+        for checkpoint, manifest in self._iter_checkpoints():
+            if checkpoint.name in summaries:
+                checkpoints.append(summaries[checkpoint.name])
+                continue
+            if manifest is not None:    # Summary lost; read the manifest.
+                checkpoint.size_bytes = \
+                    self._read_manifest(manifest)['size_bytes']
+            checkpoints.append(Checkpoint(name=checkpoint.name,
+                                          checksum=checkpoint.checksum,
+                                          size_bytes=checkpoint.size_bytes,
+                                          created=checkpoint.last_modified))
+        return checkpoints
 
     def restore_checkpoint(self, checksum: str, user: User) -> None:
         """
         Restore a previous checkpoint.
 
-        First we delete all existing files under workspace source directory.
+        The current source and ancillary files are compared with those in
+        the checkpoint, by path and checksum. Files that are not in the
+        checkpoint are deleted, and files that are missing or different are
+        copied back into place; files that are the same are left alone. The
+        file index and errors are then restored from the checkpoint.
 
-        Next we unpack chackpoint file into src directory.
+        Older checkpoints (tarballs) are restored by deleting all existing
+        files under the workspace source directory, and then unpacking the
+        checkpoint into it.
 
         TODO: Decide whether to checkpoint source we are restoring over.
         TODO: Probably not. Maybe should checkpoint if someone other than owner
@@ -338,13 +534,9 @@ class Checkpointable(ICheckpointable):
         TODO: previous upload was by owner.
 
         """
-        # We probably need to remove all existing source files before we
-        # extract files from checkpoint zipped tar archive.
-        self.__api.delete_all_files()
-
         # Locate the checkpoint we are interested in.
         try:
-            checkpoint = self._get_checkpoint(checksum)
+            checkpoint, manifest = self._get_checkpoint(checksum)
         except FileNotFoundError:
             self.__api.add_error_non_file(
                 'Unable to restore checkpoint. Not found.'
@@ -352,20 +544,82 @@ class Checkpointable(ICheckpointable):
             raise
         if self.__api.storage is None:
             raise RuntimeError('Storage not available')
-        self.__api.storage.unpack_tarfile(self, checkpoint,
-                                          self.__api.source_path)
 
-        # Restore fileindex and errors from previous metadata.
-        meta_path = os.path.join(checkpoint.path.replace('.tar.gz', '.json'))
-        u_chex_file = self.__api.get(meta_path, is_system=True)
-        with self.__api.open(u_chex_file) as f_meta:
-            loaded = self.from_dict(load(f_meta, cls=ISO8601JSONDecoder))
-            self._update_from_checkpoint(cast(IWorkspace, loaded))
+        if manifest is None:
+            self._restore_tarball(checkpoint)
+        else:
+            self._restore_manifest(manifest)
 
         log_msg = f'Restored checkpoint: {checkpoint.name}'
         log_msg += f' [{user.username}].' if user else '.'
         self.__api.log.info(log_msg)
 
+    def trim_checkpoints(self, max_bytes: int,
+                         dry_run: bool = False) -> List[Checkpoint]:
+        """
+        Delete the oldest checkpoints, until the rest fit in ``max_bytes``.
+
+        The bytes used by checkpoints are those of their manifests (or
+        tarballs), the blobs that they use, and any tarballs packed from them.
+        A blob only counts towards the checkpoint that frees it, i.e. the last
+        one to be deleted that uses it. The newest checkpoint is always kept.
+
+        Parameters
+        ----------
+        max_bytes : int
+            The most bytes that the remaining checkpoints may use.
+        dry_run : bool
+            If true, nothing is deleted.
+
+        Returns
+        -------
+        list
+            The :class:`.Checkpoint`s that were (or would be) deleted, oldest
+            first. The ``size_bytes`` of each is the number of bytes freed.
+
+        """
+        # Sizes of blobs and tarballs, in one pass over the directory.
+        self.__api.storage.cache_stats(self, self.CHECKPOINT_PREFIX,
+                                       is_persisted=True, is_system=True)
+        entries = []
+        references: Dict[str, int] = {}
+        for checkpoint, manifest in self._iter_checkpoints():
+            if manifest is None:
+                blobs: Set[str] = set()
+                size_bytes = checkpoint.size_bytes
+            else:
+                blobs = set(self._read_manifest(manifest)['blobs'].values())
+                size_bytes = manifest.size_bytes \
+                    + self._get_size_quietly(checkpoint)
+            for checksum in blobs:
+                references[checksum] = references.get(checksum, 0) + 1
+            entries.append((checkpoint, manifest, blobs, size_bytes))
+        blob_sizes = {
+            checksum: self._get_size_quietly(self._make_blob(checksum))
+            for checksum in references
+        }
+        total = sum(entry[3] for entry in entries) + sum(blob_sizes.values())
+
+        trimmed: List[Checkpoint] = []
+        entries.sort(key=lambda entry: entry[0].last_modified)
+        for checkpoint, manifest, blobs, size_bytes in entries[:-1]:
+            if total <= max_bytes:
+                break
+            for checksum in blobs:
+                references[checksum] -= 1
+                if references[checksum] == 0:
+                    size_bytes += blob_sizes[checksum]
+            total -= size_bytes
+            trimmed.append(Checkpoint(name=checkpoint.name,
+                                      checksum=checkpoint.checksum,
+                                      size_bytes=size_bytes,
+                                      created=checkpoint.last_modified))
+            if not dry_run:
+                self._delete_checkpoint(checkpoint, manifest)
+                self.__api.log.info(f'Deleted checkpoint: {checkpoint.name}'
+                                    f' (checkpoints over {max_bytes} bytes).')
+        return trimmed
+
     @property
     def _all_file_count(self) -> int:
         return len(self.__api.iter_files(allow_ancillary=True))
@@ -373,12 +627,25 @@ class Checkpointable(ICheckpointable):
     def _get_checkpoint_count(self, user: User) -> int:
         count = 0
         while True:
-            _path = self._make_path(user, count + 1)
-            if not self.__api.exists(_path, is_system=True):
+            if not self.__api.exists(self._make_path(user, count + 1),
+                                     is_system=True) \
+                    and not self.__api.exists(
+                        self._make_manifest_path(user, count + 1),
+                        is_system=True):
                 break
             count += 1
         return count
 
+    def _count_references(self) -> Dict[str, int]:
+        """Count the checkpoints that use each blob, from their manifests."""
+        references: Dict[str, int] = {}
+        for _, manifest in self._iter_checkpoints():
+            if manifest is not None:
+                for checksum in \
+                        set(self._read_manifest(manifest)['blobs'].values()):
+                    references[checksum] = references.get(checksum, 0) + 1
+        return references
+
     def _get_checkpoint_file_path(self, checksum: str) -> str:
         """
         Return the absolute path of content file given relative pointer.
@@ -393,37 +660,231 @@ class Checkpointable(ICheckpointable):
         Path to checkpoint specified by unique checksum.
 
         """
-        u_file = self._get_checkpoint(checksum)
-        if u_file is not None:
-            return u_file.path
+        checkpoint, _ = self._get_checkpoint(checksum)
+        return checkpoint.path
 
-        raise FileNotFoundError(UPLOAD_FILE_NOT_FOUND)
-
-    def _is_checkpoint_file(self, u_file: UserFile) -> bool:
-        return bool(u_file.is_system
-                    and u_file.path.startswith(self.CHECKPOINT_PREFIX))
+    def _iter_checkpoints(self) \
+            -> Iterator[Tuple[UserFile, Optional[UserFile]]]:
+        """
+        Get the tarball and manifest (if any) of each checkpoint.
 
-    def _make_metadata_path(self, user: User, count: int) -> str:
+        The tarball of a checkpoint with a manifest may not have been packed
+        yet; its checksum is that of the manifest.
+        """
+        for u_file in self.__api.iter_files(allow_system=True):
+            if not u_file.is_system \
+                    or os.path.dirname(u_file.path) != self.CHECKPOINT_PREFIX:
+                continue
+            if u_file.path.endswith(self.MANIFEST_SUFFIX):
+                yield self._make_archive(u_file), u_file
+            elif u_file.path.endswith('.tar.gz'):
+                yield u_file, None
+
+    def _make_archive(self, manifest: UserFile) -> UserFile:
+        name = manifest.name[:-len(self.MANIFEST_SUFFIX)]
+        return UserFile(cast(IWorkspace, self),
+                        path=os.path.join(self.CHECKPOINT_PREFIX,
+                                          self.ARCHIVES_PREFIX,
+                                          f'{name}.tar.gz'),
+                        size_bytes=0, is_system=True, is_persisted=True,
+                        last_modified=manifest.last_modified,
+                        content_checksum=manifest.checksum)
+
+    def _make_blob(self, checksum: str) -> UserFile:
+        return UserFile(cast(IWorkspace, self),
+                        path=os.path.join(self.CHECKPOINT_PREFIX,
+                                          self.BLOBS_PREFIX, checksum),
+                        size_bytes=0, is_system=True, is_persisted=True,
+                        content_checksum=checksum)
+
+    def _make_manifest_path(self, user: User, count: int) -> str:
         user_string = f'_{user.username}' if user else ''
-        return os.path.join(self.CHECKPOINT_PREFIX,
-                            f'checkpoint_{count}{user_string}.json')
+        return os.path.join(
+            self.CHECKPOINT_PREFIX,
+            f'checkpoint_{count}{user_string}{self.MANIFEST_SUFFIX}'
+        )
 
     def _make_path(self, user: User, count: int) -> str:
         user_string = f'_{user.username}' if user else ''
         return os.path.join(self.CHECKPOINT_PREFIX,
                             f'checkpoint_{count}{user_string}.tar.gz')
 
-    def _get_checkpoint(self, checksum: str) -> UserFile:
-        for u_file in self.__api.iter_files(allow_system=True):
-            if not self._is_checkpoint_file(u_file):
-                continue
-            if u_file.checksum == checksum:
-                return u_file
+    def _get_checkpoint(self, checksum: str) \
+            -> Tuple[UserFile, Optional[UserFile]]:
+        for checkpoint, manifest in self._iter_checkpoints():
+            if checkpoint.checksum == checksum:
+                return checkpoint, manifest
         raise FileNotFoundError(UPLOAD_FILE_NOT_FOUND)
 
+    def _get_checkpoint_archive(self, checksum: str) -> UserFile:
+        """Get the tarball of a checkpoint, packing it if necessary."""
+        checkpoint, manifest = self._get_checkpoint(checksum)
+        if manifest is None:
+            return checkpoint
+        try:
+            checkpoint.size_bytes = \
+                self.__api.storage.get_size_bytes(self, checkpoint)
+        except FileNotFoundError:
+            data = self._read_manifest(manifest)
+            members = {path: self._make_blob(blob_checksum)
+                       for path, blob_checksum in data['blobs'].items()}
+            for path in data['directories']:
+                members[path] = UserFile(cast(IWorkspace, self), path=path,
+                                         size_bytes=0, is_directory=True)
+            self.__api.storage.pack_files(self, checkpoint, members)
+            checkpoint.last_modified = manifest.last_modified
+        return checkpoint
+
+    def _read_manifest(self, manifest: UserFile) -> Dict[str, Any]:
+        # Reading does not modify the workspace, so we go straight to storage.
+        with self.__api.storage.open(self, manifest) as f:
+            data: Dict[str, Any] = codec.loads(f.read())
+        return data
+
+    def _read_summaries(self) -> List[Checkpoint]:
+        path = os.path.join(self.CHECKPOINT_PREFIX, self.SUMMARIES_NAME)
+        if not self.__api.exists(path, is_system=True):
+            return []
+        summaries = self.__api.get(path, is_system=True)
+        with self.__api.storage.open(self, summaries) as f:
+            return [Checkpoint.from_dict(data)
+                    for data in codec.loads(f.read())]
+
+    def _read_references(self) -> Dict[str, int]:
+        """
+        Get the number of checkpoints that use each blob.
+
+        Workspaces with checkpoints from before the references were recorded
+        have them counted instead, until they are next written.
+        """
+        path = os.path.join(self.CHECKPOINT_PREFIX, self.REFERENCES_NAME)
+        if not self.__api.exists(path, is_system=True):
+            return self._count_references()
+        references = self.__api.get(path, is_system=True)
+        with self.__api.storage.open(self, references) as f:
+            data: Dict[str, int] = codec.loads(f.read())
+        return data
+
+    def _write_references(self, references: Dict[str, int]) -> None:
+        self._write_metadata(self.REFERENCES_NAME, codec.dumps(references))
+
+    def _write_summaries(self, checkpoints: List[Checkpoint]) -> None:
+        self._write_metadata(self.SUMMARIES_NAME,
+                             codec.dumps([checkpoint.to_dict()
+                                          for checkpoint in checkpoints]))
+
+    def _write_metadata(self, name: str, content: str) -> None:
+        """
+        Replace a file (in the checkpoint directory) about the checkpoints.
+
+        The file is replaced in one step: were a crash to leave it half
+        written, undercounted references could delete blobs still in use.
+        """
+        path = os.path.join(self.CHECKPOINT_PREFIX, name)
+        if self.__api.exists(path, is_system=True):
+            u_file = self.__api.get(path, is_system=True)
+        else:
+            u_file = self.__api.create(path, is_system=True,
+                                       is_persisted=True, touch=True)
+        self.__api.storage.replace_content(self, u_file,
+                                           content.encode('utf-8'))
+        self.__api.get_size_bytes(u_file)
+        self.__api.get_last_modified(u_file)
+
+    def _delete_checkpoint(self, checkpoint: UserFile,
+                           manifest: Optional[UserFile]) -> None:
+        summaries = self._read_summaries()
+        if any(summary.name == checkpoint.name for summary in summaries):
+            self._write_summaries([summary for summary in summaries
+                                   if summary.name != checkpoint.name])
+        if manifest is None:
+            self.__api.delete(checkpoint)
+            return
+        blobs = set(self._read_manifest(manifest)['blobs'].values())
+        references = self._read_references()
+        self.__api.delete(manifest)
+        for checksum in blobs:
+            references[checksum] = references.get(checksum, 1) - 1
+            if references[checksum] <= 0:
+                del references[checksum]
+                self._delete_quietly(self._make_blob(checksum))
+        self._write_references(references)
+        self._delete_quietly(checkpoint)
+
+    def _get_size_quietly(self, u_file: UserFile) -> int:
+        """Get the size of a file that is not in the index, or 0 if absent."""
+        try:
+            return self.__api.storage.get_size_bytes(self, u_file)
+        except FileNotFoundError:
+            return 0
+
+    def _delete_quietly(self, u_file: UserFile) -> None:
+        """Delete a file that is not in the index, if it exists."""
+        try:
+            self.__api.storage.delete(self, u_file)
+        except FileNotFoundError:
+            pass
+
+    def _restore_manifest(self, manifest: UserFile) -> None:
+        """Bring the files in the workspace into line with a checkpoint."""
+        data = self._read_manifest(manifest)
+        blobs: Dict[str, str] = data['blobs']
+        loaded = cast(IWorkspace, self.from_dict(data['workspace']))
+        target = {loaded.get_public_path(u_file): u_file
+                  for u_file in loaded.iter_files(allow_directories=True)}
+        current = {self.__api.get_public_path(u_file): u_file
+                   for u_file in self.__api.iter_files(allow_directories=True)}
+
+        # Delete files first, and then directories from the bottom up, so
+        # that a directory is only deleted if there is nothing to keep in it.
+        for path, u_file in sorted(current.items(),
+                                   key=lambda item: (item[1].is_directory,
+                                                     -len(item[0]))):
+            if u_file.is_directory:
+                keep = any(other.startswith(path) for other in target)
+            else:
+                keep = path in target \
+                    and not target[path].is_directory \
+                    and target[path].size_bytes == u_file.size_bytes \
+                    and blobs[path] == u_file.checksum
+            if not keep:
+                self.__api.storage.delete(self, u_file)
+                del current[path]
+
+        self._update_from_checkpoint(loaded)
+        for path, u_file in target.items():
+            if path in current:
+                if u_file.is_directory:
+                    continue
+            else:
+                self.__api.storage.create(self, u_file)
+                if u_file.is_directory:
+                    continue
+                self.__api.storage.copy(self, self._make_blob(blobs[path]),
+                                        u_file)
+            # Keep the index consistent with the restored file.
+            self.__api.storage.set_last_modified(self, u_file,
+                                                 u_file.last_modified)
+
+    def _restore_tarball(self, checkpoint: UserFile) -> None:
+        """Unpack a checkpoint from before there were blobs."""
+        # We need to remove all existing source files before we extract files
+        # from checkpoint zipped tar archive.
+        self.__api.delete_all_files()
+        self.__api.storage.unpack_tarfile(self, checkpoint,
+                                          self.__api.source_path)
+
+        # Restore fileindex and errors from previous metadata.
+        meta_path = os.path.join(checkpoint.path.replace('.tar.gz', '.json'))
+        u_chex_file = self.__api.get(meta_path, is_system=True)
+        with self.__api.open(u_chex_file) as f_meta:
+            loaded = self.from_dict(codec.loads(f_meta.read()))
+            self._update_from_checkpoint(cast(IWorkspace, loaded))
+
     def _update_from_checkpoint(self, workspace: IWorkspace) -> None:
         self.__api.files.source = workspace.files.source
         self.__api.files.ancillary = workspace.files.ancillary
-        for u_file in self.__api.iter_files():
+        for u_file in self.__api.iter_files(allow_directories=True):
             u_file.workspace = cast(IWorkspace, self)
+        self.__api.source_type = workspace.source_type
         self._errors = {(e.path, e.code): e for e in workspace.errors}
@@ -0,0 +1,155 @@
+"""Provides :class:`.Resolvable`."""
+
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from dataclasses import dataclass
+from typing_extensions import Protocol
+
+from ..uploaded_file import UserFile, Reference
+from .base import IBaseWorkspace
+
+
+class IWorkspace(IBaseWorkspace, Protocol):
+    """Workspace functionality required by :class:`Resolvable`."""
+
+
+class IResolvable(Protocol):
+    """Interface for resolving references between files."""
+
+    @property
+    def dependency_graph(self) -> Dict[str, List[str]]:
+        """Paths of the files upon which each TeX file depends."""
+
+    @property
+    def main_tex_candidates(self) -> List[UserFile]:
+        """Get TeX files that could be the main document, most likely first."""
+
+    def iter_unreferenced_files(self, min_size_bytes: int = 0) \
+            -> Iterable[UserFile]:
+        """Get source files that no TeX file depends upon."""
+
+    def iter_unresolved_references(self) \
+            -> Iterable[Tuple[UserFile, Reference]]:
+        """Get references to required files that are not in the workspace."""
+
+    def resolve(self, u_file: UserFile,
+                reference: Reference) -> Optional[UserFile]:
+        """Find the file in the workspace to which ``reference`` refers."""
+
+
+class IResolvableWorkspace(IBaseWorkspace, IResolvable, Protocol):
+    """Interface for workspace with reference resolution behavior."""
+
+
+@dataclass
+class Resolvable(IResolvable):
+    """
+    Adds a graph of the dependencies between source files.
+
+    The references found in each TeX file are stored on the file itself (see
+    :attr:`.UserFile.references`), so they need only be found once. They are
+    resolved to files each time the graph is needed, since files may have been
+    added, moved, or deleted in the meantime.
+    """
+
+    __internal_api = None
+
+    def __api_init__(self, api: IWorkspace) -> None:
+        """Register the workspace API."""
+        if hasattr(super(Resolvable, self), '__api_init__'):
+            super(Resolvable, self).__api_init__(api)   # type: ignore
+        self.__internal_api = api
+
+    @property
+    def __api(self) -> IWorkspace:
+        assert self.__internal_api is not None
+        return self.__internal_api
+
+    @property
+    def dependency_graph(self) -> Dict[str, List[str]]:
+        """Paths of the files upon which each TeX file depends."""
+        graph: Dict[str, List[str]] = {}
+        for u_file in self.__api.iter_files(allow_ancillary=False):
+            if not u_file.references:
+                continue
+            resolved = (self.resolve(u_file, ref) for ref in u_file.references)
+            graph[u_file.path] = sorted({dep.path for dep in resolved
+                                         if dep is not None})
+        return graph
+
+    @property
+    def main_tex_candidates(self) -> List[UserFile]:
+        """
+        Get the TeX files that could be the main document, most likely first.
+
+        Candidates are ranked using the :class:`.TeXFacts` recorded when each
+        file's type was inferred, and the dependency graph, so no content is
+        read. A file that is included by another TeX file is unlikely to be
+        the main document; one with a ``.bbl`` file of the same name almost
+        certainly is, since the ``.bbl`` is named for the compiled file.
+        """
+        referenced = {path for deps in self.dependency_graph.values()
+                      for path in deps}
+        scores: Dict[str, int] = {}
+        candidates: List[UserFile] = []
+        for u_file in self.__api.iter_files(allow_ancillary=False):
+            facts = u_file.tex_facts
+            if facts is None or not facts.is_main_candidate:
+                continue
+            scores[u_file.path] = (
+                2 * facts.has_documentclass
+                + facts.has_begin_document
+                + 2 * self.__api.exists(f'{u_file.name_sans_ext}.bbl')
+                + (not u_file.dir)
+                - 4 * (u_file.path in referenced)
+            )
+            candidates.append(u_file)
+        return sorted(candidates, key=lambda f: (-scores[f.path], f.path))
+
+    def iter_unreferenced_files(self, min_size_bytes: int = 0) \
+            -> Iterable[UserFile]:
+        """
+        Get source files that no TeX file depends upon.
+
+        Files that have references of their own (e.g. a main TeX file) are
+        not included, nor are files smaller than ``min_size_bytes``.
+        """
+        graph = self.dependency_graph
+        referenced = {path for deps in graph.values() for path in deps}
+        for u_file in self.__api.iter_files(allow_ancillary=False):
+            if u_file.path in graph or u_file.path in referenced \
+                    or u_file.size_bytes < min_size_bytes:
+                continue
+            yield u_file
+
+    def iter_unresolved_references(self) \
+            -> Iterable[Tuple[UserFile, Reference]]:
+        """Get references to required files that are not in the workspace."""
+        for u_file in self.__api.iter_files(allow_ancillary=False):
+            for reference in u_file.references:
+                if reference.kind.is_required \
+                        and self.resolve(u_file, reference) is None:
+                    yield u_file, reference
+
+    def resolve(self, u_file: UserFile,
+                reference: Reference) -> Optional[UserFile]:
+        """
+        Find the file in the workspace to which ``reference`` refers.
+
+        TeX looks for files relative to the directory in which it is run,
+        which is the root of the source directory. References relative to the
+        directory of the referring file are also accepted, since packages like
+        ``import`` make those work too.
+        """
+        bases = [reference.target]
+        if u_file.dir:
+            bases.append(os.path.join(u_file.dir, reference.target))
+        for base in bases:
+            for ext in reference.kind.extensions:
+                path = os.path.normpath(base + ext)
+                if path.startswith('..'):
+                    continue
+                if self.__api.exists(path):
+                    return self.__api.get(path, is_ancillary=False)
+        return None
@@ -4,15 +4,21 @@ import io
 import logging
 import os
 import re
+import threading
+from base64 import urlsafe_b64encode
 from contextlib import contextmanager
 from datetime import datetime
+from hashlib import md5
 from itertools import accumulate
 from typing import Optional, List, Union, Iterable, Tuple, IO, Iterator, Any, \
-    Callable, cast
+    Callable, Dict, cast
 
 from dataclasses import dataclass, field
+from pytz import UTC
 from typing_extensions import Protocol
 
+from arxiv.base.globals import get_application_global
+
 from ..index import FileIndex
 
 from .source_type import SourceType
@@ -171,7 +177,10 @@ class FileMutations(IFileMutations):
                                 is_ancillary=u_file.is_ancillary,
                                 is_removed=u_file.is_removed,
                                 is_checked=u_file.is_checked,
-                                is_system=u_file.is_system)
+                                is_system=u_file.is_system,
+                                content_checksum=u_file.content_checksum,
+                                references=list(u_file.references),
+                                tex_facts=u_file.tex_facts)
         self.__api.storage.copy(self, u_file, new_file)
         self.__api.files.set(new_path, new_file)
         return new_file
@@ -306,16 +315,19 @@ class FileMutations(IFileMutations):
             reason = f"Removed file '{u_file.name}'."
         logger.debug('Remove file %s: %s', u_file.path, reason)
         self.__api.storage.remove(self, u_file)
+        removed_datetime = datetime.now(UTC)
 
         if u_file.is_directory:
             for _, _file in self.__api.iter_children(u_file):
                 _file.is_removed = True
+                _file.removed_datetime = removed_datetime
                 self.drop_refs(_file.path, is_ancillary=_file.is_ancillary,
                                is_removed=False, is_system=_file.is_system)
                 self.__api.files.set(_file.path, _file)
 
         u_file.is_removed = True
         u_file.reason_for_removal = reason
+        u_file.removed_datetime = removed_datetime
 
         # self.__api.add_error(u_file, reason, severity=Severity.INFO,
         #                      is_persistant=False)
@@ -392,11 +404,13 @@ class FileMutations(IFileMutations):
         self.log.info(f"Move source log for {self.__api.upload_id} to"
                       f" '{self.__api.storage.deleted_logs_path}'.")
         self.log.info(f"Delete workspace '{self.__api.upload_id}'.")
+        self.log.flush()
         try:
             self.__api.storage.stash_deleted_log(self,
                                                             self.log.file)
         except Exception as e:
             self.log.info(f'Saving source.log failed: {e}')
+            self.log.flush()
 
 
 
@@ -480,11 +494,26 @@ class _SpecialSystemFile:
 
 @dataclass
 class SourceLog(_SpecialSystemFile):
-    """Record of upload and processing events for a source workspace."""
+    """
+    Record of upload and processing events for a source workspace.
+
+    Records are kept in memory and appended to the log file in a single write
+    by :meth:`.flush`, rather than written (and flushed) one at a time, since
+    checkers may log something for every file in a large upload. The buffer
+    is flushed when it gets large, when an error is logged, before the log is
+    read, and at the end of each request or task (see :meth:`.flush_all`).
+
+    Records are only buffered if the log is created in an application context
+    (i.e. during a request or task), since that is what ends the buffering;
+    otherwise each record is written as it is logged.
+    """
 
     DEFAULT_LOG_FORMAT = '%(asctime)s %(message)s'
     DEFAULT_TIME_FORMAT = '%d/%b/%Y:%H:%M:%S %z'
 
+    MAX_BUFFERED_RECORDS = 1000
+    """Flush once this many records are waiting to be written."""
+
     log_format: str = field(default=DEFAULT_LOG_FORMAT)
     """Format string for log messages."""
 
@@ -493,44 +522,216 @@ class SourceLog(_SpecialSystemFile):
     level: int = field(default=logging.INFO)
     """Log level."""
 
+    _name: str = field(default='', init=False, repr=False, compare=False)
+
+    _formatter: logging.Formatter = field(default_factory=logging.Formatter,
+                                          init=False, repr=False,
+                                          compare=False)
+
+    _buffer: List[str] = field(default_factory=list, init=False, repr=False,
+                               compare=False)
+    """Formatted records waiting to be written."""
+
+    _lock: Any = field(default_factory=threading.RLock, init=False,
+                       repr=False, compare=False)
+
+    _unflushed: Optional[Dict[int, 'SourceLog']] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    """
+    Logs with buffered records, shared by the logs created in the same
+    application context; ``None`` if this log was created outside of one.
+    """
+
     def __post_init__(self) -> None:
-        # super(SourceLog, self).__post_init__()
-        # Grab standard logger and customize it.
-        log_name = f'source:{self.workspace.upload_id}'
-        self._logger = logging.getLogger(log_name)
-        self._f_path = self.workspace.get_full_path(self.file, is_system=True)
-        self.file_handler = logging.FileHandler(self._f_path)
-        self.file_handler.setLevel(self.level)
+        self.file   # Make sure that the log is in the workspace index.
+        self._name = f'source:{self.workspace.upload_id}'
         self._formatter = logging.Formatter(self.log_format, self.time_format)
-        self.file_handler.setFormatter(self._formatter)
-        self._logger.handlers = []
-        self._logger.addHandler(self.file_handler)
-        self._logger.setLevel(self.level)
-        self._logger.propagate = False
+        self._unflushed = self._get_unflushed()
+
+    @classmethod
+    def flush_all(cls, upload_id: Optional[int] = None) -> None:
+        """Write the buffered records of logs in this application context."""
+        unflushed = cls._get_unflushed()
+        if unflushed is None:
+            return
+        for log in list(unflushed.values()):
+            if upload_id is None or log.workspace.upload_id == upload_id:
+                log.flush()
+
+    @staticmethod
+    def _get_unflushed() -> Optional[Dict[int, 'SourceLog']]:
+        g = get_application_global()
+        if not g:
+            return None
+        if 'source_logs' not in g:
+            g.source_logs = {}
+        unflushed: Dict[int, SourceLog] = g.source_logs
+        return unflushed
+
+    def flush(self) -> None:
+        """
+        Append the buffered records to the log file.
+
+        This does not raise: if the log file cannot be written, the records
+        are written to the service log instead, so that they are not lost.
+        """
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+            if self._unflushed is not None:
+                self._unflushed.pop(id(self), None)
+            if not lines:
+                return
+            try:
+                with super(SourceLog, self).open('ab') as f:
+                    f.write(''.join(lines).encode('utf-8'))
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error('Could not write %i records to %s: %s; records'
+                             ' follow', len(lines), self._name, e)
+                for line in lines:
+                    logger.error('%s: %s', self._name, line.rstrip('\n'))
+
+    def _log(self, level: int, message: str) -> None:
+        if level < self.level:
+            return
+        record = logging.LogRecord(self._name, level, __file__, 0, message,
+                                   (), None)
+        with self._lock:
+            self._buffer.append(self._formatter.format(record) + '\n')
+            n_buffered = len(self._buffer)
+            if self._unflushed is not None:
+                self._unflushed[id(self)] = self
+        if self._unflushed is None or level >= logging.ERROR \
+                or n_buffered >= self.MAX_BUFFERED_RECORDS:
+            self.flush()
+
+    @property
+    def size_bytes(self) -> int:
+        """Get the size of the file in bytes."""
+        self.flush()
+        return super(SourceLog, self).size_bytes
+
+    @property
+    def last_modified(self) -> datetime:
+        """Get the datetime when the file was last modified."""
+        self.flush()
+        return super(SourceLog, self).last_modified
+
+    @property
+    def checksum(self) -> str:
+        """Get the Base64-encoded MD5 hash of the file."""
+        self.flush()
+        return super(SourceLog, self).checksum
+
+    @contextmanager
+    def open(self, flags: str = 'r', **kwargs: Any) -> Iterator[IO]:
+        """
+        Get an open file pointer to the file.
+
+        To be used as a context manager.
+        """
+        self.flush()
+        with super(SourceLog, self).open(flags, **kwargs) as f:
+            yield f
+
+    def open_pointer(self, flags: str = 'r', **kwargs: Any) -> IO:
+        """Get an open file pointer to the file, once records are written."""
+        self.flush()
+        return super(SourceLog, self).open_pointer(flags, **kwargs)
+
+    @property
+    def full_path(self) -> str:
+        """Get the absolute path of the file, once records are written."""
+        self.flush()
+        return super(SourceLog, self).full_path
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Get a cheap validator for the log, based on its size and mtime.
+
+        Since the log is only ever appended to, this changes whenever its
+        content changes, without having to read the whole log like
+        :attr:`.checksum` does.
+        """
+        stamp = f'{self.size_bytes}:{self.last_modified.isoformat()}'
+        return urlsafe_b64encode(md5(stamp.encode('utf-8')).digest()) \
+            .decode('utf-8')
 
     def debug(self, message: str) -> None:
-        self._logger.debug(message)
+        self._log(logging.DEBUG, message)
 
     def info(self, message: str) -> None:
-
-        self._logger.info(message)
+        self._log(logging.INFO, message)
 
     def error(self, message: str) -> None:
-        self._logger.error(message)
+        self._log(logging.ERROR, message)
 
 
 @dataclass
 class SourcePackage(_SpecialSystemFile):
     """An archive containing an entire submission source package."""
 
+    _manifest: Optional[Tuple[datetime, str]] = None
+    """Manifest checksum, and the workspace modification time it reflects."""
+
+    @property
+    def is_built(self) -> bool:
+        """Indicates whether or not the package has ever been packed."""
+        return self._file is not None \
+            or self.workspace.exists(self.path, is_system=True)
+
     @property
     def is_stale(self) -> bool:
         """Indicates whether or not the source package is out of date."""
-        if self.workspace.last_modified is None:
+        if not self.is_built or self.workspace.last_modified is None:
             return True
         stale = self.last_modified < self.workspace.last_modified
         return stale
 
+    @property
+    def size_bytes(self) -> int:
+        """Get the size of the package in bytes, or 0 if it is not built."""
+        if not self.is_built:
+            return 0
+        return self.workspace.get_size_bytes(self.file)
+
+    @property
+    def manifest_checksum(self) -> str:
+        """
+        Get a checksum of the package contents, based on the file index.
+
+        This is the root of a (shallow) Merkle tree: each source or ancillary
+        file contributes a leaf hash of its public path, size, and content
+        hash, and the leaves are hashed together in path order. Content hashes
+        are cached on each :class:`.UserFile` until it changes, so this does
+        not require that the package be built, and only reads files that have
+        changed since the last time it was calculated.
+
+        The result is reused until the workspace is next modified.
+        """
+        stamp = self.workspace.modified_datetime
+        if self._manifest is None or self._manifest[0] != stamp:
+            self._manifest = (stamp, self._calculate_manifest_checksum())
+        return self._manifest[1]
+
+    @manifest_checksum.setter
+    def manifest_checksum(self, checksum: str) -> None:
+        """Set a previously calculated checksum, e.g. from the database."""
+        self._manifest = (self.workspace.modified_datetime, checksum)
+
+    def _calculate_manifest_checksum(self) -> str:
+        leaves = []
+        for u_file in self.workspace.iter_files(allow_directories=True):
+            content = '' if u_file.is_directory else u_file.checksum
+            leaf = f'{u_file.public_path}\t{u_file.size_bytes}\t{content}'
+            leaves.append((u_file.public_path,
+                           md5(leaf.encode('utf-8')).digest()))
+        root = md5()
+        for _, leaf_hash in sorted(leaves):
+            root.update(leaf_hash)
+        return urlsafe_b64encode(root.digest()).decode('utf-8')
+
     def pack(self) -> None:
         if self.workspace.storage is None:
             raise RuntimeError('Storage adapter is not set')
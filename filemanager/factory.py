@@ -1,8 +1,11 @@
 """Application factory for file management app."""
 
+from typing import Optional
+
 from flask import Flask, jsonify, Response
 from werkzeug.exceptions import HTTPException, Forbidden, Unauthorized, \
-    BadRequest, MethodNotAllowed, InternalServerError, NotFound
+    BadRequest, MethodNotAllowed, InternalServerError, NotFound, \
+    RequestEntityTooLarge, Conflict
 
 from arxiv import vault
 from arxiv.base import Base
@@ -10,7 +13,9 @@ from arxiv.base.middleware import wrap
 from arxiv.users import auth
 
 from filemanager import celeryconfig
-from filemanager.routes import upload_api
+from filemanager.domain import SourceLog, codec
+from filemanager.routes import upload_api, ingest
+from filemanager.process import timing
 from filemanager.services import database
 
 from arxiv.users import auth
@@ -22,6 +27,7 @@ from werkzeug.contrib.profiler import ProfilerMiddleware
 def create_web_app() -> Flask:
     """Initialize and configure the filemanager application."""
     app = Flask('filemanager')
+    app.request_class = ingest.StagingRequest
     app.config.from_pyfile('config.py')
     app.json_encoder = ISO8601JSONEncoder
 
@@ -31,7 +37,10 @@ def create_web_app() -> Flask:
     #                                   sort_by=('cumtime', 'calls'))
 
     # Initialize file management app
+    codec.use(app.config['SERIALIZATION_CODEC'])
     database.init_app(app)
+    timing.init_app(app)
+    app.teardown_appcontext(_flush_source_logs)
 
     Base(app)    # Gives us access to the base UI templates and resources.
     auth.Auth(app)
@@ -49,6 +58,11 @@ def create_web_app() -> Flask:
     return app
 
 
+def _flush_source_logs(exception: Optional[BaseException]) -> None:
+    """Write anything logged to source logs during the request or task."""
+    SourceLog.flush_all()
+
+
 def register_error_handlers(app: Flask) -> None:
     """Register error handlers for the Flask app."""
     app.errorhandler(Forbidden)(jsonify_exception)
@@ -57,6 +71,8 @@ def register_error_handlers(app: Flask) -> None:
     app.errorhandler(InternalServerError)(jsonify_exception)
     app.errorhandler(NotFound)(jsonify_exception)
     app.errorhandler(MethodNotAllowed)(jsonify_exception)
+    app.errorhandler(RequestEntityTooLarge)(jsonify_exception)
+    app.errorhandler(Conflict)(jsonify_exception)
 
 
 def jsonify_exception(error: HTTPException) -> Response:
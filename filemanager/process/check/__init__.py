@@ -17,6 +17,7 @@ from .errata import RemoveHyperlinkStyleFiles, RemoveDisallowedFiles, \
 from .tex_generated import RemoveTeXGeneratedFiles, DisallowDVIFiles
 from .cleanup import UnMacify, CleanupPostScript, RepairDOSEPSFiles
 from .tex_format import CheckTeXForm
+from .tex_dependencies import ScanTeXDependencies
 from .images import CheckForUnacceptableImages
 from .uuencoded import CheckForUUEncodedFiles
 from .ancillary import AncillaryFileChecker
@@ -62,6 +63,7 @@ CHECKS = [
     UnMacify,
     CleanupPostScript,
     CheckTeXForm,
+    ScanTeXDependencies,
     CheckForUnacceptableImages,
     CheckForUUEncodedFiles,
     RepairDOSEPSFiles,
@@ -1,6 +1,6 @@
 """."""
 
-from typing import Callable, Optional
+from typing import Callable, List, Optional
 
 from arxiv.base import logging
 
@@ -48,3 +48,14 @@ class BaseChecker:
     def check_workspace(self, workspace: Workspace) -> None:
         """Dummy stub for workspace check, to be implemented by child class."""
         return
+
+    def check_deletions(self, workspace: Workspace,
+                        deleted: List[UserFile]) -> None:
+        """
+        Dummy stub for re-checking after deletions.
+
+        Child classes whose :meth:`check_workspace` may reach a different
+        outcome when files are deleted should implement this, limiting their
+        work to the parts of the workspace affected by ``deleted``.
+        """
+        return
@@ -7,7 +7,7 @@ from typing import Callable, Optional, List, IO
 
 from arxiv.base import logging
 
-from ...domain import FileType, UserFile, Workspace
+from ...domain import FileType, UserFile, Workspace, TeXFacts
 from .base import BaseChecker
 
 
@@ -38,9 +38,14 @@ class InferFileType(BaseChecker):
                 u_file.file_type = file_type
                 return u_file
 
-        file_type = _heavy_introspection(workspace, u_file)
+        # The preamble of a TeX file is scanned for facts as the file is read
+        # to identify its type, so that the preamble is only read once.
+        scanner = _TeXFactsScanner()
+        file_type = _heavy_introspection(workspace, u_file, scanner)
         if file_type is not None:
             u_file.file_type = file_type
+            if file_type.is_tex_type:
+                u_file.tex_facts = _scan_tex_facts(workspace, u_file, scanner)
             return u_file
 
         # Failed type identification
@@ -48,6 +53,15 @@ class InferFileType(BaseChecker):
         u_file.file_type = FileType.FAILED    # , '', ''
         return u_file
 
+    def check_finally(self, workspace: Workspace, u_file: UserFile) \
+            -> UserFile:
+        """Record what a TeX file says about how it is to be compiled."""
+        # Facts are usually recorded when the type is inferred; this covers
+        # TeX files whose type was already known.
+        if u_file.file_type.is_tex_type and u_file.tex_facts is None:
+            u_file.tex_facts = _scan_tex_facts(workspace, u_file)
+        return u_file
+
 
 # These are compiled ahead of time, since we may use them many many times in a
 # single request.
@@ -104,6 +118,26 @@ INCLUDE_GRAPHICS = re.compile(rb'^[^%]*\\includegraphics[^%]*\.'
                               rb'(?:pdf|png|gif|jpg)\s?\}',
                               re.IGNORECASE)
 PDF_OUTPUT = re.compile(rb'^[^%]*\\pdfoutput(?:\s+)?=(?:\s+)?1')
+TEX_PROGRAM = re.compile(rb'^%\s*!\s*TEX\s+(?:TS-)?program\s*=\s*(\w+)',
+                         re.IGNORECASE)
+BEGIN_DOCUMENT = re.compile(rb'\\begin\s*\{document\}')
+USE_PACKAGE = re.compile(rb'\\(?:usepackage|RequirePackage)\s*(?:\[[^\]]*\])?'
+                         rb'\s*\{([^}]+)\}')
+
+ENGINE_PACKAGES = {
+    b'fontspec': ['xelatex', 'lualatex'],
+    b'unicode-math': ['xelatex', 'lualatex'],
+    b'polyglossia': ['xelatex', 'lualatex'],
+    b'xeCJK': ['xelatex'],
+    b'xltxtra': ['xelatex'],
+    b'luacode': ['lualatex'],
+    b'luatexja': ['lualatex'],
+    b'luatextra': ['lualatex'],
+}
+"""Packages that only work with particular TeX engines."""
+
+PREAMBLE_MAX_LINES = 1000
+"""Stop looking for a preamble after this many lines without one."""
 
 
 # def _check_exists(workspace: Workspace,
@@ -362,13 +396,14 @@ def _check_mac(workspace: Workspace, u_file: UserFile,
 
 # TODO: this can use more refactoring, but didn't want to get too deep into
 # it right now. -- Erick
-def _heavy_introspection(workspace: Workspace,
-                         u_file: UserFile) -> Optional[FileType]:
+def _heavy_introspection(workspace: Workspace, u_file: UserFile,
+                         scanner: '_TeXFactsScanner') -> Optional[FileType]:
     """
     Perform final checks that involve heavy reading from the file.
 
     This implementation is stateful, so this should be preserved as one
-    function unless refactored to be less stateful.
+    function unless refactored to be less stateful. Each line that is read is
+    also passed to ``scanner``.
     """
     # Keep track of TeX files
     maybe_tex = 0
@@ -381,6 +416,7 @@ def _heavy_introspection(workspace: Workspace,
         line_no = 1
         accum = b""
         for line in f:
+            scanner.feed(line)
             # Ignore
             if line_no <= 10 and AUTO_IGNORE.search(line):
                 return FileType.IGNORE    # , '', ''
@@ -392,8 +428,8 @@ def _heavy_introspection(workspace: Workspace,
                 return FileType.MULTI_PART_MIME    # , '', ''
 
             # LaTeX2e/PDFLaTeX
-            if line[0:6] == '%!TEX ' and line_no == 1:
-                return _type_of_latex2e(f, line_no)
+            if line[0:6] == b'%!TEX ' and line_no == 1:
+                return _type_of_latex2e(f, line_no, scanner)
 
             accum += line   # Accumulate what we've already seen.
 
@@ -458,7 +494,7 @@ def _heavy_introspection(workspace: Workspace,
 
             # LaTeX2e/PDFLaTeX
             if LATEX2E_PDFLATEX.search(line):
-                return _type_of_latex2e(f, line_no)
+                return _type_of_latex2e(f, line_no, scanner)
 
             if MAYBE_TEX.search(line):
                 maybe_tex = 1
@@ -509,13 +545,83 @@ def _heavy_introspection(workspace: Workspace,
     return None
 
 
+def _scan_tex_facts(workspace: Workspace, u_file: UserFile,
+                    scanner: Optional['_TeXFactsScanner'] = None) -> TeXFacts:
+    """
+    Scan the preamble of a TeX file for facts used to find the main file.
+
+    If a ``scanner`` has already seen the start of the file, only the rest of
+    the preamble is read.
+    """
+    if scanner is None:
+        scanner = _TeXFactsScanner()
+    if not scanner.done:
+        with workspace.open(u_file, 'rb') as f:    # type: IO[bytes]
+            f.seek(scanner.offset)
+            for line in f:
+                scanner.feed(line)
+                if scanner.done:
+                    break
+    return scanner.facts
+
+
+class _TeXFactsScanner:
+    r"""
+    Collects :class:`.TeXFacts` from the lines of a TeX file, in order.
+
+    Scanning stops at ``\begin{document}``, so the body of the document is
+    not needed.
+    """
+
+    def __init__(self) -> None:
+        self.facts = TeXFacts()
+        self.done = False
+        self.line_no = 0
+        self.offset = 0     # Bytes scanned so far.
+
+    def feed(self, line: bytes) -> None:
+        """Scan the next line of the file."""
+        if self.done:
+            return
+        self.line_no += 1
+        self.offset += len(line)
+        facts = self.facts
+        match = TEX_PROGRAM.search(line)
+        if match:
+            _add_engine_hints(facts, [match.group(1).decode().lower()])
+        if PDF_OUTPUT.search(line):
+            facts.pdfoutput = True
+        line = re.sub(PERCENT_COMMENT, b'', line)
+        if LATEX.search(line) or LATEX2E_PDFLATEX.search(line):
+            facts.has_documentclass = True
+        for match in USE_PACKAGE.finditer(line):
+            for package in match.group(1).split(b','):
+                _add_engine_hints(facts,
+                                  ENGINE_PACKAGES.get(package.strip(), []))
+        if BEGIN_DOCUMENT.search(line):
+            facts.has_begin_document = True
+            self.done = True
+        elif self.line_no >= PREAMBLE_MAX_LINES \
+                and not facts.has_documentclass:
+            self.done = True
+
+
+def _add_engine_hints(facts: TeXFacts, engines: List[str]) -> None:
+    for engine in engines:
+        if engine not in facts.engine_hints:
+            facts.engine_hints.append(engine)
+
+
 # Select bewteen PDFLATEX and LATEX2e types.
-def _type_of_latex2e(f: IO[bytes], count: int) -> FileType:
+def _type_of_latex2e(f: IO[bytes], count: int,
+                     scanner: _TeXFactsScanner) -> FileType:
     """Determine whether file is PDFLATEX or LATEX2e."""
     limit = count + 5
     f.seek(0, 0)    # Rewind to beginning of file
     line_no = 1
     for line in f:
+        if line_no > scanner.line_no:
+            scanner.feed(line)
         if INCLUDE_GRAPHICS.search(line) \
                 or (line_no < limit and PDF_OUTPUT.search(line)):
             return FileType.PDFLATEX    # ', '', ''
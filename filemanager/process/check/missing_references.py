@@ -2,6 +2,8 @@
 
 import os
 import re
+from typing import List
+
 from arxiv.base import logging
 
 from ...domain import FileType, UserFile, Workspace, Code
@@ -52,6 +54,18 @@ class CheckForMissingReferences(BaseChecker):
             if self.BIB_FILE.search(u_file.name):
                 self._check_for_missing_bbl_file(workspace, u_file)
 
+    def check_deletions(self, workspace: Workspace,
+                        deleted: List[UserFile]) -> None:
+        """Check .bib files alongside any .bbl files that were deleted."""
+        for u_file in deleted:
+            base_path, name = os.path.split(u_file.path)
+            base, ext = os.path.splitext(name)
+            if u_file.is_ancillary or ext.lower() != '.bbl':
+                continue
+            bib_path = os.path.join(base_path, f'{base}.bib')
+            if workspace.exists(bib_path):
+                self._check_for_missing_bbl_file(workspace,
+                                                 workspace.get(bib_path))
 
     def _check_for_missing_bbl_file(self, workspace: Workspace,
                                     u_file: UserFile) -> None:
@@ -1,6 +1,7 @@
 """Check overall source type."""
 
 import os
+from typing import List
 
 from arxiv.base import logging
 
@@ -91,6 +92,18 @@ class InferSourceType(BaseChecker):
             workspace.remove_error(INVALID_SOURCE_TYPE)
             workspace.source_type = SourceType.TEX
 
+    def check_deletions(self, workspace: Workspace,
+                        deleted: List[UserFile]) -> None:
+        """Infer the source type again from the files that remain."""
+        if all(u_file.is_ancillary for u_file in deleted):
+            return      # Ancillary files do not bear on the source type.
+        if workspace.file_count == 1:   # Single-file rules apply.
+            for u_file in workspace.iter_files(allow_ancillary=False):
+                self(workspace, u_file)
+            return
+        workspace.source_type = SourceType.UNKNOWN
+        self.check_workspace(workspace)
+
     def check_tex_types(self, workspace: Workspace,
                         u_file: UserFile) -> UserFile:
         """Check for single-file TeX source package."""
@@ -0,0 +1,86 @@
+"""Tests for re-checking a workspace after files are deleted."""
+
+import shutil
+import tempfile
+from datetime import datetime
+from unittest import TestCase, mock
+
+from ....services.storage import SimpleStorageAdapter
+from ....domain import Workspace, SourceType, FileType
+from ...strategy import SynchronousCheckingStrategy
+from ..missing_references import CheckForMissingReferences
+from ..source_types import InferSourceType
+from ..top_level_directory import RemoveTopLevelDirectory
+
+
+class TestDeletionChecks(TestCase):
+    """Only checks affected by a deletion are run again."""
+
+    def setUp(self):
+        """Create a workspace."""
+        self.basedir = tempfile.mkdtemp()
+        self.workspace = Workspace(
+            upload_id=1234,
+            owner_user_id='98765',
+            created_datetime=datetime.now(),
+            modified_datetime=datetime.now(),
+            _strategy=SynchronousCheckingStrategy(),
+            _storage=SimpleStorageAdapter(self.basedir)
+        )
+        self.workspace.initialize()
+
+    def tearDown(self):
+        """Remove the temporary workspace files."""
+        shutil.rmtree(self.basedir)
+
+    def delete(self, path):
+        u_file = self.workspace.get(path)
+        self.workspace.delete(u_file)
+        return u_file
+
+    def test_source_type(self):
+        """The source type is inferred again from the remaining files."""
+        self.workspace.create('main.tex', touch=True,
+                              file_type=FileType.LATEX2e)
+        self.workspace.create('fig.pdf', touch=True, file_type=FileType.PDF)
+        self.workspace.source_type = SourceType.TEX
+
+        self.workspace.checkers = [InferSourceType()]
+        self.workspace.perform_deletion_checks([self.delete('main.tex')])
+        self.assertEqual(self.workspace.source_type, SourceType.PDF,
+                         'A single PDF file remains')
+
+        self.workspace.perform_deletion_checks([self.delete('fig.pdf')])
+        self.assertEqual(self.workspace.source_type, SourceType.INVALID,
+                         'No files remain')
+
+    def test_missing_references(self):
+        """A .bib file is flagged when its .bbl file is deleted."""
+        self.workspace.create('ms/refs.bib', touch=True)
+        self.workspace.create('ms/refs.bbl', touch=True)
+        self.workspace.create('other.bbl', touch=True)
+        checker = CheckForMissingReferences()
+
+        with mock.patch.object(checker, '_check_for_missing_bbl_file') as chk:
+            checker.check_deletions(self.workspace, [self.delete('other.bbl')])
+            self.assertEqual(chk.call_count, 0, 'No sibling .bib file')
+
+        checker.check_deletions(self.workspace, [self.delete('ms/refs.bbl')])
+        self.assertTrue(self.workspace.get('ms/refs.bib').errors)
+
+    def test_top_level_directory(self):
+        """A lone top-level directory is removed after a top-level delete."""
+        self.workspace.create('foo/bar.tex', touch=True)
+        self.workspace.create('foo/baz/qux.tex', touch=True)
+        self.workspace.create('readme.txt', touch=True)
+        checker = RemoveTopLevelDirectory()
+
+        with mock.patch.object(checker, 'check_workspace') as check_workspace:
+            checker.check_deletions(self.workspace,
+                                    [self.delete('foo/baz/qux.tex')])
+            self.assertEqual(check_workspace.call_count, 0,
+                             'Nested deletions cannot leave a lone directory')
+
+        checker.check_deletions(self.workspace, [self.delete('readme.txt')])
+        self.assertTrue(self.workspace.exists('bar.tex'))
+        self.assertFalse(self.workspace.exists('foo/bar.tex'))
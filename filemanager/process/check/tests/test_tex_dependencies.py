@@ -0,0 +1,90 @@
+"""Tests for :mod:`filemanager.process.check.tex_dependencies`."""
+
+import shutil
+import tempfile
+from datetime import datetime
+from unittest import TestCase
+
+from ....services.storage import SimpleStorageAdapter
+from ....domain import Workspace, FileType, Reference, ReferenceKind
+from ...strategy import SynchronousCheckingStrategy
+from ..tex_dependencies import ScanTeXDependencies, UNRESOLVED_REFERENCE, \
+    UNREFERENCED_FILE
+
+MAIN = rb"""
+\documentclass[12pt]{article}
+\usepackage{amsmath,mymacros}
+\begin{document}
+\input{sections/intro}
+% \input{sections/old}
+\includegraphics[width=\textwidth]{figures/plot}
+\includegraphics{figures/missing.png}
+\bibliography{refs}
+\end{document}
+"""
+
+
+class TestScanTeXDependencies(TestCase):
+    """Find the files referenced by TeX sources."""
+
+    def setUp(self):
+        """Create a workspace with a main TeX file."""
+        self.basedir = tempfile.mkdtemp()
+        self.workspace = Workspace(
+            upload_id=1234,
+            owner_user_id='98765',
+            created_datetime=datetime.now(),
+            modified_datetime=datetime.now(),
+            _strategy=SynchronousCheckingStrategy(),
+            _storage=SimpleStorageAdapter(self.basedir)
+        )
+        self.workspace.initialize()
+        self.main = self.workspace.create('ms.tex', file_type=FileType.LATEX2e)
+        with self.workspace.open_pointer(self.main, 'wb') as f:
+            f.write(MAIN)
+        for path in ['sections/intro.tex', 'figures/plot.pdf', 'ms.bbl',
+                     'mymacros.sty', 'notes.txt']:
+            self.workspace.create(path, touch=True)
+        self.checker = ScanTeXDependencies()
+
+    def tearDown(self):
+        """Remove the temporary workspace files."""
+        shutil.rmtree(self.basedir)
+
+    def test_references(self):
+        """References in commands are recorded, but not in comments."""
+        self.checker(self.workspace, self.main)
+        self.assertEqual(self.main.references, [
+            Reference(ReferenceKind.INPUT, 'sections/intro'),
+            Reference(ReferenceKind.GRAPHICS, 'figures/plot'),
+            Reference(ReferenceKind.GRAPHICS, 'figures/missing.png'),
+            Reference(ReferenceKind.BIBLIOGRAPHY, 'ms'),
+            Reference(ReferenceKind.PACKAGE, 'amsmath'),
+            Reference(ReferenceKind.PACKAGE, 'mymacros'),
+            Reference(ReferenceKind.CLASS, 'article'),
+        ])
+
+    def test_dependency_graph(self):
+        """References are resolved to files in the workspace."""
+        self.checker(self.workspace, self.main)
+        self.checker.check_workspace(self.workspace)
+        self.assertEqual(self.workspace.dependency_graph, {
+            'ms.tex': ['figures/plot.pdf', 'ms.bbl', 'mymacros.sty',
+                       'sections/intro.tex']
+        })
+        errors = {e.code: e.message for e in self.main.errors}
+        self.assertIn(UNRESOLVED_REFERENCE, errors, 'Missing file is flagged')
+        self.assertIn('figures/missing.png', errors[UNRESOLVED_REFERENCE])
+        self.assertNotIn('amsmath', errors[UNRESOLVED_REFERENCE],
+                         'System packages are not flagged')
+
+    def test_unreferenced(self):
+        """Large files that nothing refers to are flagged."""
+        self.checker.UNREFERENCED_MIN_BYTES = 0
+        self.checker(self.workspace, self.main)
+        self.checker.check_workspace(self.workspace)
+        notes = self.workspace.get('notes.txt')
+        self.assertEqual([f.path for f in
+                          self.workspace.iter_unreferenced_files()],
+                         ['notes.txt'])
+        self.assertIn(UNREFERENCED_FILE, [e.code for e in notes.errors])
@@ -0,0 +1,107 @@
+"""Finds the files upon which TeX sources depend."""
+
+import re
+from typing import Dict, List, Tuple
+
+from arxiv.base import logging
+
+from ...domain import UserFile, Workspace, Code, Severity, Reference, \
+    ReferenceKind
+from .base import BaseChecker
+
+logger = logging.getLogger(__name__)
+
+UNRESOLVED_REFERENCE: Code = 'unresolved_reference'
+UNREFERENCED_FILE: Code = 'unreferenced_file'
+
+COMMENT = re.compile(rb'(?<!\\)%.*$', re.MULTILINE)
+OPTIONS = rb'\s*(?:\[[^\]]*\])?\s*'
+PATTERNS = [
+    (ReferenceKind.INPUT, re.compile(rb'\\input\s*\{([^}]+)\}')),
+    (ReferenceKind.INPUT, re.compile(rb'\\input\s+([^\s{}\\]+)')),
+    (ReferenceKind.INCLUDE, re.compile(rb'\\include\s*\{([^}]+)\}')),
+    (ReferenceKind.GRAPHICS,
+     re.compile(rb'\\includegraphics\*?' + OPTIONS + rb'\{([^}]+)\}')),
+    (ReferenceKind.BIBLIOGRAPHY,
+     re.compile(rb'\\bibliography\s*\{([^}]+)\}')),
+    (ReferenceKind.PACKAGE,
+     re.compile(rb'\\(?:usepackage|RequirePackage)' + OPTIONS
+                + rb'\{([^}]+)\}')),
+    (ReferenceKind.CLASS,
+     re.compile(rb'\\documentclass' + OPTIONS + rb'\{([^}]+)\}')),
+]
+"""Commands that refer to other files, and how their arguments are used."""
+
+
+class ScanTeXDependencies(BaseChecker):
+    r"""
+    Records the files referenced by each TeX file.
+
+    The references are kept on the :class:`.UserFile`, and together form the
+    dependency graph of the workspace (see :class:`.Resolvable`). Once all
+    files are checked, references that cannot be resolved are flagged, as are
+    large files that nothing refers to. Since the scan does not expand macros
+    or follow ``\graphicspath``, these are informational only, and do not
+    affect the readiness of the workspace.
+    """
+
+    UNREFERENCED_MIN_BYTES = 1024 * 1024
+    """Files smaller than this are not worth warning about."""
+
+    UNRESOLVED_MESSAGE = "Could not find {kind} file '{target}'."
+    UNREFERENCED_MESSAGE = ("This file is not used by any TeX file; consider"
+                            " removing it to reduce the size of the"
+                            " submission.")
+
+    def check_tex_types(self, workspace: Workspace,
+                        u_file: UserFile) -> UserFile:
+        """Find the files referenced by a TeX file."""
+        with workspace.open_pointer(u_file, 'rb') as f:
+            content = COMMENT.sub(b'', f.read())
+        references: List[Reference] = []
+        for kind, pattern in PATTERNS:
+            for match in pattern.finditer(content):
+                targets = match.group(1).decode('utf-8', errors='replace')
+                for target in targets.split(','):
+                    target = target.strip()
+                    if kind is ReferenceKind.BIBLIOGRAPHY:
+                        # The .bbl file is named for the file that is
+                        # compiled, not for the .bib file(s).
+                        target = u_file.name_sans_ext
+                    if target and Reference(kind, target) not in references:
+                        references.append(Reference(kind, target))
+        u_file.references = references
+        return u_file
+
+    def check_workspace(self, workspace: Workspace) -> None:
+        """Flag unresolved references, and large unreferenced files."""
+        has_references = False
+        for u_file in workspace.iter_files(allow_ancillary=False):
+            u_file.remove_error(UNRESOLVED_REFERENCE)
+            u_file.remove_error(UNREFERENCED_FILE)
+            has_references = has_references or bool(u_file.references)
+        if not has_references:   # Not a TeX submission, or nothing to go on.
+            return
+
+        # A file has at most one error per code, so missing files are listed
+        # together.
+        unresolved: Dict[str, Tuple[UserFile, List[str]]] = {}
+        for u_file, reference in workspace.iter_unresolved_references():
+            _, messages = unresolved.setdefault(u_file.path, (u_file, []))
+            messages.append(self.UNRESOLVED_MESSAGE.format(
+                kind=reference.kind.value,
+                target=reference.target
+            ))
+        for u_file, messages in unresolved.values():
+            workspace.add_error(u_file, UNRESOLVED_REFERENCE,
+                                ' '.join(messages), severity=Severity.INFO)
+        for u_file in workspace.iter_unreferenced_files(
+                min_size_bytes=self.UNREFERENCED_MIN_BYTES):
+            workspace.add_error(u_file, UNREFERENCED_FILE,
+                                self.UNREFERENCED_MESSAGE,
+                                severity=Severity.INFO)
+
+    def check_deletions(self, workspace: Workspace,
+                        deleted: List[UserFile]) -> None:
+        """A deleted file may have been referenced, or referred to others."""
+        self.check_workspace(workspace)
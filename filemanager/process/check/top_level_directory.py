@@ -1,6 +1,7 @@
 """Remove a top level directory."""
 
 import os
+from typing import List
 
 from arxiv.base import logging
 
@@ -23,6 +24,14 @@ class RemoveTopLevelDirectory(BaseChecker):
     TOP_LEVEL_DIRECTORY: Code = 'top_level_directory_removed'
     TOP_LEVEL_DIRECTORY_MESSAGE = "Removed top level directory"
 
+    def check_deletions(self, workspace: Workspace,
+                        deleted: List[UserFile]) -> None:
+        """Eliminate a top-level directory that is now the only entry."""
+        # Only the deletion of a top-level entry can leave a single one.
+        if any('/' not in u_file.path.rstrip('/') and not u_file.is_ancillary
+               for u_file in deleted):
+            self.check_workspace(workspace)
+
     def check_workspace(self, workspace: Workspace) -> None:
         """Eliminate single top-level directory."""
         # source_directory = self.source_path
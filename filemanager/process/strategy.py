@@ -3,12 +3,13 @@
 from functools import partial
 from queue import Queue
 from threading import Thread
-from typing import Optional, Callable, List, Tuple, Iterable
+from typing import Any, Optional, Callable, List, Iterable
 
 from flask import Flask
 
 from arxiv.base import logging
 from .check.base import StopCheck
+from . import timing
 from ..domain import Workspace, IChecker, ICheckingStrategy, \
     UserFile
 
@@ -18,7 +19,19 @@ logger.propagate = False
 
 class BaseCheckingStrategy:
     """Base class for checking strategies."""
-    pass
+
+    def check_deletions(self, workspace: 'Workspace', deleted: List[UserFile],
+                        *checkers: IChecker) -> None:
+        """
+        Update workspace-wide checks after files have been deleted.
+
+        Unlike :meth:`check`, this does not revisit every file in the
+        workspace. Each checker that implements ``check_deletions`` is given
+        the deleted files, and re-checks only what they may have affected.
+        """
+        for checker in checkers:
+            if hasattr(checker, 'check_deletions'):
+                checker.check_deletions(workspace, deleted)
 
 
 class Worker(Thread):
@@ -52,7 +65,7 @@ class ThreadPool:
         for _ in range(workers):
             Worker(self.tasks)
 
-    def map(self, func: Callable, args_list: List[Tuple]) -> None:
+    def map(self, func: Callable, args_list: Iterable[Any]) -> None:
         """Apply ``func`` to each of the elements of ``args_list``."""
         for args in args_list:
             self.tasks.put((func, (args,)))
@@ -70,7 +83,11 @@ class AsynchronousCheckingStrategy(BaseCheckingStrategy):
         """Run checks in parallel threads."""
         pool = ThreadPool(10)
         while workspace.has_unchecked_files:
-            pool.map(partial(self._check_file, workspace, checkers), [(u_file,) for u_file in workspace.iter_files(allow_directories=True)])
+            # Each item is passed to the worker as the sole argument.
+            pool.map(partial(self._check_file, workspace, checkers),
+                     [u_file for u_file
+                      in workspace.iter_files(allow_directories=True)
+                      if not u_file.is_checked])
             pool.await_completion()
 
             # Perform workspace-wide checks.
@@ -95,20 +112,22 @@ class AsynchronousCheckingStrategy(BaseCheckingStrategy):
 
 
 
-class SynchronousCheckingStrategy:
+class SynchronousCheckingStrategy(BaseCheckingStrategy):
     """Runs checks one file at a time."""
 
     def check(self, workspace: 'Workspace',
               *checkers: IChecker) -> None:
         """Run checks one file at a time."""
+        stages = [stage_name(checker) for checker in checkers]
         # This may take a few passes, as we may be unpacking compressed files.
         while workspace.has_unchecked_files:
             for u_file in workspace.iter_files(allow_directories=True):
                 if u_file.is_checked:   # Don't run checks twice on the same
                     continue            # file.
-                for checker in checkers:
+                for checker, stage in zip(checkers, stages):
                     try:
-                        u_file = checker(workspace, u_file)
+                        with timing.stage(stage):
+                            u_file = checker(workspace, u_file)
                     except StopCheck as e:
                         logger.debug('Got StopCheck from %s on %s: %s',
                                      checker.__class__.__name__, u_file.path,
@@ -118,9 +137,15 @@ class SynchronousCheckingStrategy:
                 u_file.is_checked = True
 
             # Perform workspace-wide checks.
-            for checker in checkers:
+            for checker, stage in zip(checkers, stages):
                 if hasattr(checker, 'check_workspace'):
-                    checker.check_workspace(workspace)
+                    with timing.stage(stage):
+                        checker.check_workspace(workspace)
+
+
+def stage_name(checker: IChecker) -> str:
+    """Get the name of the :mod:`.timing` stage for a checker."""
+    return f'check.{type(checker).__name__}'
 
 
 def create_strategy(app: Flask) -> ICheckingStrategy:
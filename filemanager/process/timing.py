@@ -0,0 +1,285 @@
+"""
+Records the time and I/O used by each stage of upload processing.
+
+Code that does something worth measuring wraps it in :func:`stage`, e.g.::
+
+    with timing.stage('persist'):
+        workspace.persist_all()
+
+Measurements are only taken while a :class:`.Timings` is being recorded on the
+current thread (see :func:`start` and :func:`recording`). At all other times
+:func:`stage` returns a shared context manager that does nothing, so
+instrumented code costs no more than a thread-local lookup when timing is
+disabled.
+
+When ``TIMING_ENABLED`` is set, :func:`init_app` records each request. The
+timings are logged, returned in the ``Server-Timing`` response header, and (if
+``TIMING_METRICS_ENABLED`` is also set) summed into per-process totals that
+are exposed in the Prometheus text format at ``/metrics``.
+
+The totals are not shared between processes. Under uWSGI, each scrape of
+``/metrics`` is answered by whichever worker accepts it, and so sees only the
+counters of that worker. Each series is labelled with the id of the worker
+process, so that the counters of different workers are not taken for one
+counter that goes backwards; the totals of the service are the sum of the
+rates of each worker's series, once every worker has been scraped.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, ContextManager, Dict, Iterator, List, \
+    Optional, Tuple
+
+from dataclasses import dataclass, asdict
+from flask import Flask, Response, request, make_response
+
+from arxiv.base import logging
+
+logger = logging.getLogger(__name__)
+
+IO_COUNTERS_PATH = '/proc/thread-self/io'
+"""Per-thread I/O counters (Linux only)."""
+
+if hasattr(time, 'CLOCK_THREAD_CPUTIME_ID'):
+    _thread_time = partial(time.clock_gettime, time.CLOCK_THREAD_CPUTIME_ID)
+else:   # CPU time of other threads will be counted, too.
+    _thread_time = time.process_time    # type: ignore
+
+_local = threading.local()
+
+
+@dataclass
+class StageTiming:
+    """Resources used by a stage, summed over each time it was entered."""
+
+    name: str
+    count: int = 0
+    wall_seconds: float = 0.
+    cpu_seconds: float = 0.
+    read_bytes: int = 0
+    """Bytes read by the thread, including reads served by the page cache."""
+    written_bytes: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Make a dict representation of the timing."""
+        return asdict(self)
+
+
+class Timings:
+    """Resources used by each stage, within a request or task."""
+
+    def __init__(self, previous: Optional['Timings'] = None) -> None:
+        """Start recording, remembering any recording that this interrupts."""
+        self.previous = previous
+        self.started = time.monotonic()
+        self.stages: Dict[str, StageTiming] = {}
+
+    @property
+    def total_seconds(self) -> float:
+        """Wall time since recording started."""
+        return time.monotonic() - self.started
+
+    def get(self, name: str) -> StageTiming:
+        """Get the timing for stage ``name``, in the order first entered."""
+        if name not in self.stages:
+            self.stages[name] = StageTiming(name)
+        return self.stages[name]
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Make a list of dict representations of the stages."""
+        return [timing.to_dict() for timing in self.stages.values()]
+
+    def server_timing(self) -> str:
+        """Describe the stages as the value of a ``Server-Timing`` header."""
+        metrics = [f'{timing.name};dur={timing.wall_seconds * 1000:.1f}'
+                   for timing in self.stages.values()]
+        metrics.append(f'total;dur={self.total_seconds * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+class _Stage:
+    """Measures one pass through a stage."""
+
+    __slots__ = ('timing', 'wall', 'cpu', 'io')
+
+    def __init__(self, timing: StageTiming) -> None:
+        self.timing = timing
+
+    def __enter__(self) -> None:
+        self.io = _read_io_counters()
+        self.cpu = _thread_time()
+        self.wall = time.monotonic()
+
+    def __exit__(self, *args: Any) -> None:
+        wall = time.monotonic()
+        cpu = _thread_time()
+        read, written = _read_io_counters()
+        self.timing.count += 1
+        self.timing.wall_seconds += wall - self.wall
+        self.timing.cpu_seconds += cpu - self.cpu
+        self.timing.read_bytes += read - self.io[0]
+        self.timing.written_bytes += written - self.io[1]
+
+
+class _NullStage:
+    """Stands in for :class:`._Stage` when nothing is being recorded."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *args: Any) -> None:
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name: str) -> ContextManager[None]:
+    """
+    Measure the code run in this context as part of stage ``name``.
+
+    Names should be valid HTTP tokens (letters, digits, and ``.-_``), since
+    they are used as ``Server-Timing`` metric names.
+    """
+    timings: Optional[Timings] = getattr(_local, 'timings', None)
+    if timings is None:
+        return _NULL_STAGE
+    return _Stage(timings.get(name))
+
+
+def start() -> Timings:
+    """Start recording stages entered by the current thread."""
+    timings = Timings(previous=getattr(_local, 'timings', None))
+    _local.timings = timings
+    return timings
+
+
+def stop(timings: Timings) -> None:
+    """Stop recording, and add what was recorded to the process totals."""
+    _local.timings = timings.previous
+    _totals.add(timings)
+
+
+@contextmanager
+def recording(label: str, enabled: bool = True) -> Iterator[None]:
+    """Record the stages entered within this context, and log them."""
+    if not enabled:
+        yield
+        return
+    timings = start()
+    try:
+        yield
+    finally:
+        stop(timings)
+        log(label, timings)
+
+
+def log(label: str, timings: Timings) -> None:
+    """Log the recorded stages as a single structured record."""
+    stages = timings.to_list()
+    logger.info('Timings for %s: %s', label, json.dumps(stages),
+                extra={'timings': stages,
+                       'total_seconds': timings.total_seconds})
+
+
+class _Totals:
+    """Resources used by each stage since the process started."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.stages: Dict[str, StageTiming] = {}
+
+    def add(self, timings: Timings) -> None:
+        with self.lock:
+            for timing in timings.stages.values():
+                total = self.stages.setdefault(timing.name,
+                                               StageTiming(timing.name))
+                total.count += timing.count
+                total.wall_seconds += timing.wall_seconds
+                total.cpu_seconds += timing.cpu_seconds
+                total.read_bytes += timing.read_bytes
+                total.written_bytes += timing.written_bytes
+
+    def render(self) -> str:
+        """Render the totals in the Prometheus text exposition format."""
+        metrics = [
+            ('calls_total', 'Number of times the stage was entered.',
+             'count'),
+            ('seconds_total', 'Wall time spent in the stage.',
+             'wall_seconds'),
+            ('cpu_seconds_total', 'CPU time spent in the stage.',
+             'cpu_seconds'),
+            ('read_bytes_total', 'Bytes read during the stage.',
+             'read_bytes'),
+            ('written_bytes_total', 'Bytes written during the stage.',
+             'written_bytes'),
+        ]
+        with self.lock:
+            stages = list(self.stages.values())
+        lines = []
+        process = os.getpid()
+        for suffix, description, attr in metrics:
+            name = f'filemanager_stage_{suffix}'
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} counter')
+            for timing in stages:
+                lines.append(f'{name}{{stage="{timing.name}"'
+                             f',process="{process}"}}'
+                             f' {getattr(timing, attr)}')
+        return '\n'.join(lines) + '\n'
+
+
+_totals = _Totals()
+
+
+def _read_io_counters() -> Tuple[int, int]:
+    """Get the total bytes read and written by the current thread."""
+    try:
+        with open(IO_COUNTERS_PATH, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return 0, 0
+    counters = dict(line.split(b': ')  # type: ignore
+                    for line in data.splitlines())
+    return int(counters[b'rchar']), int(counters[b'wchar'])
+
+
+def init_app(app: Flask) -> None:
+    """Record timings for each request, if enabled in the app config."""
+    if not app.config.get('TIMING_ENABLED'):
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+    if app.config.get('TIMING_METRICS_ENABLED'):
+        app.add_url_rule('/metrics', 'timing_metrics', _metrics)
+
+
+def _start_request() -> None:
+    start()
+
+
+def _finish_request(response: Response) -> Response:
+    timings: Optional[Timings] = getattr(_local, 'timings', None)
+    if timings is not None:
+        response.headers['Server-Timing'] = timings.server_timing()
+        log(f'{request.method} {request.path}', timings)
+    return response
+
+
+def _teardown_request(exception: Optional[BaseException]) -> None:
+    timings: Optional[Timings] = getattr(_local, 'timings', None)
+    if timings is not None:
+        stop(timings)
+
+
+def _metrics() -> Response:
+    response: Response = make_response(_totals.render())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4'
+    return response
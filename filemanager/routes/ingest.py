@@ -0,0 +1,54 @@
+"""Streams uploaded file content to the storage volume as it arrives."""
+
+from typing import Any, List, Optional
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from ..services import storage
+from ..process import timing
+
+
+class StagingRequest(Request):
+    """
+    A request that writes uploaded files straight to the storage volume.
+
+    Werkzeug's default stream factory spools each file part to an anonymous
+    temporary file (or to memory), after which the upload controller copies it
+    into the workspace. Here file parts are instead written to the staging area
+    of the storage volume, and are hashed and size-capped as they arrive. The
+    controller can then move the file into place without reading it again.
+
+    Staged files that are not adopted by a workspace are removed when the
+    request is closed.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Initialize the request with no staged files."""
+        super(StagingRequest, self).__init__(*args, **kwargs)
+        self._staged: List[storage.StagedFile] = []
+
+    def _get_file_stream(self, total_content_length: Optional[int],
+                         content_type: Optional[str],
+                         filename: Optional[str] = None,
+                         content_length: Optional[int] = None) \
+            -> storage.StagedFile:
+        adapter = storage.create_adapter(current_app)
+        staged = storage.StagedFile(adapter.open_staging_file(),
+                                    max_bytes=self.max_content_length)
+        self._staged.append(staged)
+        return staged
+
+    def _load_form_data(self) -> None:
+        """Parse the form data, streaming files to the staging area."""
+        try:
+            with timing.stage('receive'):
+                super(StagingRequest, self)._load_form_data()  # type: ignore
+        except storage.StagedFileTooLarge as e:
+            raise RequestEntityTooLarge() from e
+
+    def close(self) -> None:
+        """Close the request, and clean up any abandoned staged files."""
+        super(StagingRequest, self).close()
+        for staged in self._staged:
+            staged.discard()
@@ -1,14 +1,20 @@
 """Provides routes for the external API."""
 
-from typing import Optional, Union, Any, Dict
+from typing import Optional, Union, Any, Dict, IO, Iterator, List, Tuple, cast
+import io
 import json
+import os
+from datetime import datetime
 from http import HTTPStatus
+from uuid import uuid4
 
 from flask.json import jsonify
 from flask import Blueprint, render_template, redirect, request, url_for, \
     Response, make_response, send_file
 from werkzeug.exceptions import NotFound, Forbidden, Unauthorized, \
-    InternalServerError, HTTPException, BadRequest
+    InternalServerError, HTTPException, BadRequest, Conflict
+from werkzeug.http import http_date
+from werkzeug.wsgi import wrap_file
 
 from arxiv.base import routes as base_routes
 from arxiv.base import logging
@@ -18,12 +24,16 @@ from arxiv.users.auth.decorators import scoped
 
 from ..services import database
 from ..controllers import upload, status, service_log, source_log, lock, \
-    release, package, files, checkpoint
+    release, package, files, checkpoint, upload_session, dependencies, \
+    retention
 
 
 logger = logging.getLogger(__name__)
 blueprint = Blueprint('upload_api', __name__, url_prefix='/filemanager/api')
 
+RANGE_CHUNK_SIZE = 64 * 1024
+"""Number of bytes to read at a time when sending partial content."""
+
 
 def is_owner(session: auth_domain.Session, upload_id: int,
              **kwargs: Any) -> bool:
@@ -43,6 +53,12 @@ def is_owner(session: auth_domain.Session, upload_id: int,
     return owner_id == str(workspace.owner_user_id)
 
 
+def is_session_owner(session: auth_domain.Session, session_id: str,
+                     **kwargs: Any) -> bool:
+    """User must be the owner of the resumable upload session."""
+    return upload_session.is_session_owner(session_id, _get_user_or_client())
+
+
 @blueprint.route('/status', methods=['GET'])
 def service_status() -> Response:
     """
@@ -83,7 +99,8 @@ def new_upload() -> Response:
         raise Unauthorized('No user or client on authenticated session')
 
     # Collect arguments and call main upload controller
-    data, status_code, headers = upload.upload(None, file, user_or_client)
+    data, status_code, headers = upload.upload(None, file, user_or_client,
+                                               defer=_prefers_async())
 
     response: Response = make_response(jsonify(data))
     response = _update_headers(jsonify(data), headers)
@@ -139,13 +156,134 @@ def upload_files(upload_id: int) -> Response:
     # Attempt to process upload
     data, status_code, headers = upload.upload(upload_id, file,
                                                request.session.user,
-                                               ancillary=ancillary)
+                                               ancillary=ancillary,
+                                               defer=_prefers_async())
     response: Response = make_response(jsonify(data))
     response = _update_headers(jsonify(data), headers)
     response.status_code = status_code
     return response
 
 
+@blueprint.route('<int:upload_id>/job/<job_id>', methods=['GET'])
+@scoped(scopes.READ_UPLOAD, authorizer=is_owner)
+def get_upload_job(upload_id: int, job_id: str) -> Response:
+    """
+    Get the progress of an upload that is being processed asynchronously.
+
+    Parameters
+    ----------
+    upload_id : int
+        Workspace identifier
+    job_id : str
+        Job identifier, from the ``202 Accepted`` upload response.
+
+    """
+    data, status_code, headers = upload.get_upload_job(upload_id, job_id)
+    response: Response = make_response(jsonify(data))
+    response = _update_headers(response, headers)
+    response.status_code = status_code
+    return response
+
+
+# Resumable uploads
+
+@blueprint.route('/upload_session', methods=['POST'])
+@scoped(scopes.WRITE_UPLOAD)
+def new_upload_session() -> Response:
+    """Start a resumable upload that will create a new workspace."""
+    return _create_upload_session(None)
+
+
+@blueprint.route('<int:upload_id>/upload_session', methods=['POST'])
+@scoped(scopes.WRITE_UPLOAD, authorizer=is_owner)
+def create_upload_session(upload_id: int) -> Response:
+    """
+    Start a resumable upload to an existing workspace.
+
+    Parameters
+    ----------
+    upload_id : int
+        Workspace identifier
+
+    """
+    return _create_upload_session(upload_id)
+
+
+@blueprint.route('/upload_session/<session_id>', methods=['GET'])
+@scoped(scopes.WRITE_UPLOAD, authorizer=is_session_owner)
+def get_upload_session(session_id: str) -> Response:
+    """
+    Get the chunks received so far in a resumable upload.
+
+    If the ``members`` query parameter is ``1``, the members of a tar archive
+    that have arrived in full are included.
+    """
+    data, status_code, headers = upload_session.get_session(
+        session_id,
+        list_members=request.args.get('members', '0').lower() in ('1', 'true')
+    )
+    response: Response = make_response(jsonify(data))
+    response = _update_headers(response, headers)
+    response.status_code = status_code
+    return response
+
+
+@blueprint.route('/upload_session/<session_id>/<int:index>', methods=['PUT'])
+@scoped(scopes.WRITE_UPLOAD, authorizer=is_session_owner)
+def put_upload_chunk(session_id: str, index: int) -> Response:
+    """
+    Store a chunk of a resumable upload.
+
+    The request body is the raw content of the chunk. If the ``Content-MD5``
+    header is set, the chunk is rejected unless its content matches.
+    """
+    data, status_code, headers = upload_session.put_chunk(
+        session_id, index, cast(IO[bytes], request.stream),
+        content_md5=request.headers.get('Content-MD5')
+    )
+    response: Response = make_response(jsonify(data))
+    response = _update_headers(response, headers)
+    response.status_code = status_code
+    return response
+
+
+@blueprint.route('/upload_session/<session_id>/commit', methods=['POST'])
+@scoped(scopes.WRITE_UPLOAD, authorizer=is_session_owner)
+def commit_upload_session(session_id: str) -> Response:
+    """Assemble and process the file from a resumable upload."""
+    data, status_code, headers = upload_session.commit_session(
+        session_id, _get_user_or_client()
+    )
+    response: Response = make_response(jsonify(data))
+    response = _update_headers(response, headers)
+    response.status_code = status_code
+    return response
+
+
+def _create_upload_session(upload_id: Optional[int]) -> Response:
+    data, status_code, headers = upload_session.create_session(
+        upload_id, request.form.get('filename', None), _get_user_or_client(),
+        ancillary=request.form.get('ancillary', None) == 'True'
+    )
+    response: Response = make_response(jsonify(data))
+    response = _update_headers(response, headers)
+    response.status_code = status_code
+    return response
+
+
+def _prefers_async() -> bool:
+    """Whether the client asked for processing to happen after responding."""
+    return 'respond-async' in request.headers.get('Prefer', '')
+
+
+def _get_user_or_client() -> Union[auth_domain.User, auth_domain.Client]:
+    if request.session.user:
+        return request.session.user
+    elif request.session.client:
+        return request.session.client
+    raise Unauthorized('No user or client on authenticated session')
+
+
 # Separated this out so that we can support auth granularity. -E
 @blueprint.route('<int:upload_id>', methods=['GET'])
 @scoped(scopes.READ_UPLOAD, authorizer=is_owner)
@@ -159,7 +297,38 @@ def get_upload_files(upload_id: int) -> Response:
         Workspace identifier
 
     """
-    data, status_code, headers = upload.upload_summary(upload_id)
+    data, status_code, headers = upload.upload_summary(
+        upload_id,
+        if_none_match=request.if_none_match,
+        if_modified_since=request.if_modified_since
+    )
+    if status_code == HTTPStatus.NOT_MODIFIED:
+        return _not_modified(headers)
+    response: Response = make_response(jsonify(data))
+    response = _update_headers(response, headers)
+    response.status_code = status_code
+    return response
+
+
+@blueprint.route('<int:upload_id>/dependencies', methods=['GET'])
+@scoped(scopes.READ_UPLOAD, authorizer=is_owner)
+def get_dependencies(upload_id: int) -> Response:
+    """
+    Dependency graph of the TeX sources in a workspace.
+
+    Parameters
+    ----------
+    upload_id : int
+        Workspace identifier
+
+    """
+    data, status_code, headers = dependencies.get_dependencies(
+        upload_id,
+        if_none_match=request.if_none_match,
+        if_modified_since=request.if_modified_since
+    )
+    if status_code == HTTPStatus.NOT_MODIFIED:
+        return _not_modified(headers)
     response: Response = make_response(jsonify(data))
     response = _update_headers(response, headers)
     response.status_code = status_code
@@ -191,6 +360,30 @@ def delete_file(upload_id: int, public_file_path: str) -> Response:
     return response
 
 
+@blueprint.route('<int:upload_id>/operations', methods=['POST'])
+@scoped(scopes.WRITE_UPLOAD, authorizer=is_owner)
+def apply_file_operations(upload_id: int) -> Response:
+    """
+    Delete and/or rename several files in one request.
+
+    Parameters
+    ----------
+    upload_id : int
+        Workspace identifier
+
+    """
+    payload = request.get_json(silent=True) or {}
+    data, status_code, headers = files.client_apply_operations(
+        upload_id,
+        payload.get('operations') if isinstance(payload, dict) else None,
+        request.session.user or request.session.client
+    )
+    response: Response = make_response(jsonify(data))
+    response = _update_headers(response, headers)
+    response.status_code = status_code
+    return response
+
+
 # File and workspace deletion
 
 @blueprint.route('<int:upload_id>/delete_all', methods=['POST'])
@@ -238,6 +431,29 @@ def workspace_delete(upload_id: int) -> Response:
     return response
 
 
+@blueprint.route('/retention', methods=['POST'])
+@scoped(scopes.DELETE_UPLOAD_WORKSPACE)
+def collect_garbage() -> Response:
+    """
+    Remove content that is no longer to be kept, per the retention policy.
+
+    With the query parameter ``dry_run=1``, nothing is removed. ``after``
+    and ``limit`` select a range of workspaces to visit; the response gives
+    the ``next`` value of ``after``, if there are more.
+
+    """
+    data, status_code, headers = retention.run_retention(
+        request.session.user or request.session.client,
+        dry_run=request.args.get('dry_run', '0').lower() in ('1', 'true'),
+        after=request.args.get('after'),
+        limit=request.args.get('limit')
+    )
+    response: Response = make_response(jsonify(data))
+    response = _update_headers(response, headers)
+    response.status_code = status_code
+    return response
+
+
 
 # Lock and unlock upload workspace
 
@@ -352,13 +568,13 @@ def get_upload_content(upload_id: int) -> Response:
     # Note: status_code is not used
     data, status_code, headers = package.get_upload_content(
         upload_id,
-        request.session.user or request.session.client
+        request.session.user or request.session.client,
+        if_none_match=request.if_none_match,
+        if_modified_since=request.if_modified_since
     )
-    response: Response = send_file(data, mimetype="application/tar+gzip")
-    response = _update_headers(response, headers)
-    response.status_code = status_code
-    # response.set_etag(headers.get('ETag'))
-    return response
+    if status_code == HTTPStatus.NOT_MODIFIED:
+        return _not_modified(headers)
+    return _send_content(_get_pointer(data), "application/tar+gzip", headers)
 
 @blueprint.route('/<int:upload_id>/<path:public_file_path>/content',
                  methods=['HEAD'])
@@ -391,13 +607,13 @@ def get_file_content(upload_id: int, public_file_path: str) -> Response:
     data, status_code, headers = files.get_upload_file_content(
         upload_id,
         public_file_path,
-        request.session.user or request.session.client
+        request.session.user or request.session.client,
+        if_none_match=request.if_none_match,
+        if_modified_since=request.if_modified_since
     )
-    response: Response = send_file(data, mimetype="application/*")
-    response = _update_headers(response, headers)
-    response.status_code = status_code
-    # response.set_etag(headers.get('ETag'))
-    return response
+    if status_code == HTTPStatus.NOT_MODIFIED:
+        return _not_modified(headers)
+    return _send_content(_get_pointer(data), "application/*", headers)
 
 
 # Get logs
@@ -445,13 +661,13 @@ def get_upload_source_log(upload_id: int) -> Response:
     """
     data, status_code, headers = source_log.get_upload_source_log(
         upload_id,
-        request.session.user or request.session.client
+        request.session.user or request.session.client,
+        if_none_match=request.if_none_match,
+        if_modified_since=request.if_modified_since
     )
-    response: Response = send_file(data, mimetype="application/tar+gzip")
-    response = _update_headers(response, headers)
-    response.status_code = status_code
-    # response.set_etag(headers.get('ETag'))
-    return response
+    if status_code == HTTPStatus.NOT_MODIFIED:
+        return _not_modified(headers)
+    return _send_content(_get_pointer(data), "application/tar+gzip", headers)
 
 
 @blueprint.route('/log', methods=['HEAD'])
@@ -483,18 +699,29 @@ def get_upload_service_log() -> Response:
 
     Does not include etails for a specific upload workspace.
 
+    The query parameters ``since`` and ``until`` (ISO-8601 datetimes) and
+    ``upload_id`` select matching records from the log and its archives.
+
     Returns
     -------
     The log file for upload file manager service.
 
     """
-    # Note: status_code not used
-    data, _, headers = service_log.get_upload_service_log(
-        request.session.user or request.session.client
+    data, status_code, headers = service_log.get_upload_service_log(
+        request.session.user or request.session.client,
+        since=request.args.get('since'),
+        until=request.args.get('until'),
+        upload_id=request.args.get('upload_id', type=int),
+        if_none_match=request.if_none_match,
+        if_modified_since=request.if_modified_since
     )
-    response: Response = send_file(data, mimetype="application/tar+gzip")
+    if status_code == HTTPStatus.NOT_MODIFIED:
+        return _not_modified(headers)
+    if isinstance(data, io.IOBase):
+        response: Response = send_file(data, mimetype="application/tar+gzip")
+    else:   # Records that match the query.
+        response = Response(data, mimetype='text/plain')
     response = _update_headers(response, headers)
-    # response.set_etag(headers.get('ETag'))
     return response
 
 # Checkpoint related requests
@@ -514,14 +741,20 @@ def create_checkpoint(upload_id: int) -> tuple:
     """
     Create checkpoint from current files in specified workspace.
 
+    A ``description`` of the checkpoint may be given in a JSON payload.
+
     Parameters
     ----------
     upload_id : int
         Workspace identifier
 
     """
-    data, code, headers = checkpoint.create_checkpoint(upload_id,
-                                                       request.session.user)
+    payload = request.get_json(silent=True) or {}
+    data, code, headers = checkpoint.create_checkpoint(
+        upload_id,
+        request.session.user,
+        payload.get('description') if isinstance(payload, dict) else None
+    )
     return jsonify(data), code, headers
 
 # List checkpoints
@@ -531,14 +764,23 @@ def list_checkpoints(upload_id: int) -> tuple:
     """
     List checkpoint files associated with specified workspace.
 
+    The query parameters ``sort`` and ``order`` sort the checkpoints, and
+    ``offset`` and ``limit`` select a page of them.
+
     Parameters
     ----------
     upload_id : int
         Workspace identifier
 
     """
-    data, code, headers = checkpoint.list_checkpoints(upload_id,
-                                                      request.session.user)
+    data, code, headers = checkpoint.list_checkpoints(
+        upload_id,
+        request.session.user,
+        sort=request.args.get('sort'),
+        order=request.args.get('order'),
+        offset=request.args.get('offset'),
+        limit=request.args.get('limit')
+    )
     return jsonify(data), code, headers
 
 # Restore checkpoint
@@ -634,12 +876,16 @@ def get_checkpoint_file(upload_id: int, checkpoint_checksum: str) -> Response:
     logger.debug('Request for upload content: %s (%s)',
                  upload_id, type(upload_id))
     # Note: status_code is not used
-    data, _, headers = checkpoint.get_checkpoint_file(upload_id,
-                                                      checkpoint_checksum,
-                                                      request.session.user)
-    response: Response = send_file(data, mimetype="application/tar+gzip")
-    response.set_etag(headers.get('ETag'))
-    return response
+    data, status_code, headers = checkpoint.get_checkpoint_file(
+        upload_id,
+        checkpoint_checksum,
+        request.session.user,
+        if_none_match=request.if_none_match,
+        if_modified_since=request.if_modified_since
+    )
+    if status_code == HTTPStatus.NOT_MODIFIED:
+        return _not_modified(headers)
+    return _send_content(_get_pointer(data), "application/tar+gzip", headers)
 
 
 
@@ -652,6 +898,7 @@ def get_checkpoint_file(upload_id: int, checkpoint_checksum: str) -> Response:
 @blueprint.errorhandler(Forbidden)
 @blueprint.errorhandler(Unauthorized)
 @blueprint.errorhandler(BadRequest)
+@blueprint.errorhandler(Conflict)
 @blueprint.errorhandler(NotImplementedError)
 def handle_exception(error: HTTPException) -> Response:
     """
@@ -670,10 +917,139 @@ def handle_exception(error: HTTPException) -> Response:
     return response
 
 
+def _get_pointer(data: Union[Dict, IO, None]) -> IO[bytes]:
+    """Get the open file returned by a content controller."""
+    if data is None or isinstance(data, dict):
+        raise InternalServerError('No content to send')
+    pointer: IO[bytes] = data
+    return pointer
+
+
+def _send_content(pointer: IO[bytes], mimetype: str,
+                  headers: Dict[str, Any]) -> Response:
+    """
+    Generate a response with the content of an open file.
+
+    Supports single and multiple byte ranges (:rfc:`7233`). Complete bodies
+    are handed to the server's ``wsgi.file_wrapper`` (if it has one), so that
+    they can be sent with ``sendfile`` rather than read into Python.
+
+    Parameters
+    ----------
+    pointer : io.BufferedReader
+        An open file pointer, as returned by a content controller.
+    mimetype : str
+        Content type of the file.
+    headers : dict
+        Headers returned by the controller, including validators.
+
+    Returns
+    -------
+    :class:`.Response`
+
+    """
+    size = os.fstat(pointer.fileno()).st_size
+    headers = {k: v for k, v in headers.items() if k != 'Content-Length'}
+    ranges = _get_byte_ranges(size, headers)
+    if ranges is None:      # Send the whole thing.
+        response = Response(wrap_file(request.environ, pointer),
+                            mimetype=mimetype, direct_passthrough=True)
+        response.content_length = size
+    elif not ranges:
+        pointer.close()
+        response = Response(status=HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+        response.headers['Content-Range'] = f'bytes */{size}'
+    elif len(ranges) == 1:
+        start, stop = ranges[0]
+        response = Response(_iter_ranges(pointer, ranges), mimetype=mimetype,
+                            status=HTTPStatus.PARTIAL_CONTENT,
+                            direct_passthrough=True)
+        response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+        response.content_length = stop - start
+    else:
+        boundary = uuid4().hex
+        parts = [(f'--{boundary}\r\nContent-Type: {mimetype}\r\n'
+                  f'Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n'
+                  ).encode('ascii') for start, stop in ranges]
+        closing = f'\r\n--{boundary}--\r\n'.encode('ascii')
+        response = Response(
+            _iter_ranges(pointer, ranges, parts, closing),
+            mimetype=f'multipart/byteranges; boundary={boundary}',
+            status=HTTPStatus.PARTIAL_CONTENT,
+            direct_passthrough=True
+        )
+        response.content_length = \
+            sum(len(p) for p in parts) + 2 * (len(parts) - 1) \
+            + sum(stop - start for start, stop in ranges) + len(closing)
+    response.headers['Accept-Ranges'] = 'bytes'
+    return _update_headers(response, headers)
+
+
+def _get_byte_ranges(size: int, headers: Dict[str, Any]) \
+        -> Optional[List[Tuple[int, int]]]:
+    """
+    Get the satisfiable byte ranges requested by the client.
+
+    Returns ``None`` if the complete content should be sent, or a (possibly
+    empty) list of ``(start, stop)`` tuples where ``stop`` is exclusive.
+    """
+    byte_range = request.range
+    if byte_range is None or byte_range.units != 'bytes':
+        return None
+    # If-Range asks for the range only if the content has not changed.
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != headers.get('ETag'):
+        return None
+    if if_range.date is not None:
+        last_modified = headers.get('Last-Modified')
+        if last_modified is None \
+                or http_date(last_modified) != http_date(if_range.date):
+            return None
+    ranges = []
+    for start, stop in byte_range.ranges:
+        if start < 0:   # Suffix range, e.g. the last 500 bytes.
+            start, stop = max(size + start, 0), size
+        elif stop is None or stop > size:
+            stop = size
+        if start < stop:
+            ranges.append((start, stop))
+    return ranges
+
+
+def _iter_ranges(pointer: IO[bytes], ranges: List[Tuple[int, int]],
+                 parts: Optional[List[bytes]] = None,
+                 closing: Optional[bytes] = None) -> Iterator[bytes]:
+    """Read ``ranges`` from ``pointer``, with optional multipart framing."""
+    try:
+        for i, (start, stop) in enumerate(ranges):
+            if parts is not None:
+                yield (b'\r\n' if i > 0 else b'') + parts[i]
+            pointer.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = pointer.read(min(RANGE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        if closing is not None:
+            yield closing
+    finally:
+        pointer.close()
+
+
+def _not_modified(headers: Dict[str, Any]) -> Response:
+    """Generate a ``304 Not Modified`` response to a conditional request."""
+    response: Response = make_response('', HTTPStatus.NOT_MODIFIED)
+    return _update_headers(response, headers)
+
+
 def _update_headers(response: Response, headers: Dict[str, Any]) -> Response:
     for key, value in headers.items():
         if key in response.headers:     # Avoid duplicate headers.
             response.headers.remove(key)   # type: ignore
+        if isinstance(value, datetime):
+            value = http_date(value)
         response.headers.add(key, value)   # type: ignore
     # if 'Content-Length' in response.headers:
     #     response.headers.remove('Content-Length') # type: ignore
@@ -1,7 +1,8 @@
 """Provides access to the uploads data store."""
 
-from typing import Any, Dict, Optional, Callable, Generator
+from typing import Any, Dict, Optional, Callable, Generator, Iterable, List
 import time
+from uuid import uuid4
 from datetime import datetime
 from pytz import UTC
 from contextlib import contextmanager
@@ -10,15 +11,17 @@ from pprint import pprint
 
 from flask import Flask, current_app
 from werkzeug.local import LocalProxy
+from sqlalchemy import func
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.exc import StaleDataError
 from retry import retry
 
 from arxiv.base.globals import get_application_global
 from arxiv.base import logging
 
 from filemanager.domain import Workspace, FileIndex, UserFile, Error, \
-    Readiness, LockState, SourceType, Status
-from .models import db, DBUpload
+    Readiness, LockState, SourceType, Status, UploadJob, JobStage
+from .models import db, DBUpload, DBUploadJob
 from ..storage import create_adapter
 
 logger = logging.getLogger(__name__)
@@ -28,6 +31,14 @@ class WorkspaceNotFound(RuntimeError):
     """Workspace not found in file manager database."""
 
 
+class JobNotFound(RuntimeError):
+    """Upload processing job not found in file manager database."""
+
+
+class ConcurrentUpdate(RuntimeError):
+    """The workspace was updated by someone else since it was retrieved."""
+
+
 def init_app(app: Flask) -> None:
     """Set configuration defaults and attach session to the application."""
     db.init_app(app)
@@ -129,6 +140,7 @@ def retrieve(upload_id: int, skip_cache: bool = False) -> Workspace:
     args['status'] = Status(upload_data.status)
     args['lock_state'] = LockState(upload_data.lock_state)
     args['source_type'] = SourceType(upload_data.source_type)
+    args['version'] = upload_data.version
 
     if upload_data.last_upload_start_datetime is not None:
         args['last_upload_start_datetime'] = \
@@ -166,6 +178,9 @@ def retrieve(upload_id: int, skip_cache: bool = False) -> Workspace:
         for datum in upload_data.errors:
             workspace._insert_error(Error.from_dict(datum))
     workspace.initialize()
+    if upload_data.manifest_checksum is not None:
+        workspace.source_package.manifest_checksum \
+            = upload_data.manifest_checksum
     return workspace
 
 
@@ -223,6 +238,8 @@ def update(workspace: Workspace) -> None:
     ------
     IOError
         When there is a problem querying the database.
+    :class:`.ConcurrentUpdate`
+        When the record has been updated since ``workspace`` was retrieved.
     RuntimeError
         When there is some other problem.
 
@@ -236,7 +253,14 @@ def update(workspace: Workspace) -> None:
         raise IOError('Could not query database: %s' % e.detail) from e
     if upload_data is None:
         raise RuntimeError('Cannot find the thing!')
-
+    # The row may already have been refreshed with someone else's changes;
+    # otherwise, the version is checked again when the row is written.
+    if upload_data.version != workspace.version:
+        raise ConcurrentUpdate(f'Workspace {workspace.upload_id} is at version'
+                               f' {upload_data.version}, not'
+                               f' {workspace.version}')
+
+    upload_data.version = workspace.version + 1
     upload_data.owner_user_id = workspace.owner_user_id
 
     # We won't let client update created_datetime
@@ -263,6 +287,13 @@ def update(workspace: Workspace) -> None:
     }
     upload_data.errors = [e.to_dict() for e in workspace._errors.values()
                           if e.is_persistant]
+    if workspace.is_deleted:    # There is no longer any content to describe.
+        upload_data.manifest_checksum = None
+        upload_data.stored_bytes = 0
+    else:
+        upload_data.manifest_checksum \
+            = workspace.source_package.manifest_checksum
+        upload_data.stored_bytes = workspace.stored_bytes
 
     # 2019-06-28: In earlier versions, the ``modified_datetime`` of the
     # workspace was set here. This would make sense when we think about the
@@ -277,4 +308,163 @@ def update(workspace: Workspace) -> None:
     # --Erick
 
     db.session.add(upload_data)
+    try:
+        db.session.commit()
+    except StaleDataError as e:
+        db.session.rollback()
+        raise ConcurrentUpdate(f'Workspace {workspace.upload_id} was updated'
+                               ' concurrently') from e
+    workspace.version = upload_data.version
+
+
+def invalidate_cache() -> None:
+    """
+    Forget any workspace data loaded so far in this request.
+
+    This should be called after acquiring a workspace lock, so that the
+    workspace is retrieved afresh rather than from a possibly stale copy.
+    """
+    g = get_application_global()
+    if g and 'uploads' in g:
+        g.uploads.clear()
+    db.session.expire_all()
+
+
+def list_upload_ids(statuses: Iterable[Status], after: int = 0,
+                    limit: int = 100) -> List[int]:
+    """
+    Get the ids of workspaces with any of ``statuses``, in order.
+
+    Parameters
+    ----------
+    statuses : iterable
+        :class:`.Status`es of the workspaces to list.
+    after : int
+        Only workspaces with ids greater than this are listed, so that
+        workspaces can be visited in batches.
+    limit : int
+        The most ids to get.
+
+    """
+    try:
+        rows = db.session.query(DBUpload.upload_id) \
+            .filter(DBUpload.status.in_([s.value for s in statuses])) \
+            .filter(DBUpload.upload_id > after) \
+            .order_by(DBUpload.upload_id) \
+            .limit(limit)
+        return [upload_id for upload_id, in rows]
+    except OperationalError as e:
+        raise IOError('Could not query database: %s' % e.detail) from e
+
+
+def get_stored_bytes(owner_user_id: str,
+                     exclude: Optional[int] = None) -> int:
+    """
+    Get the total size of the workspaces of an owner that are not deleted.
+
+    Parameters
+    ----------
+    owner_user_id : str
+        The owner of the workspaces.
+    exclude : int
+        A workspace to leave out, e.g. because it is being updated.
+
+    """
+    query = db.session.query(func.sum(DBUpload.stored_bytes)) \
+        .filter(DBUpload.owner_user_id == owner_user_id) \
+        .filter(DBUpload.status != Status.DELETED.value)
+    if exclude is not None:
+        query = query.filter(DBUpload.upload_id != exclude)
+    try:
+        return int(query.scalar() or 0)
+    except OperationalError as e:
+        raise IOError('Could not query database: %s' % e.detail) from e
+
+
+def get_usage(min_bytes: int = 0) -> Dict[str, int]:
+    """
+    Get the total size of the workspaces of each owner, if over ``min_bytes``.
+
+    Workspaces that are deleted are not counted.
+    """
+    total = func.sum(DBUpload.stored_bytes)
+    try:
+        rows = db.session.query(DBUpload.owner_user_id, total) \
+            .filter(DBUpload.status != Status.DELETED.value) \
+            .group_by(DBUpload.owner_user_id) \
+            .having(total > min_bytes)
+        return {owner_user_id: int(size_bytes)
+                for owner_user_id, size_bytes in rows}
+    except OperationalError as e:
+        raise IOError('Could not query database: %s' % e.detail) from e
+
+
+def create_job(upload_id: int) -> UploadJob:
+    """
+    Create a new record for an :class:`.UploadJob` in the database.
+
+    Parameters
+    ----------
+    upload_id : int
+        The upload workspace that will be processed.
+
+    Returns
+    -------
+    :class:`.UploadJob`
+
+    """
+    job = UploadJob(job_id=str(uuid4()), upload_id=upload_id)
+    db.session.add(DBUploadJob(job_id=job.job_id, upload_id=upload_id,
+                               stage=job.stage.value,
+                               created_datetime=job.created_datetime,
+                               modified_datetime=job.modified_datetime))
+    db.session.commit()
+    return job
+
+
+def retrieve_job(job_id: str) -> UploadJob:
+    """
+    Get the current state of an upload processing job.
+
+    Raises
+    ------
+    :class:`.JobNotFound`
+        If there is no such job.
+    IOError
+        When there is a problem querying the database.
+
+    """
+    try:
+        job_data = db.session.query(DBUploadJob).get(job_id)
+    except OperationalError as e:
+        raise IOError('Could not query database: %s' % e.detail) from e
+    if job_data is None:
+        raise JobNotFound(f"Job '{job_id}' not found in database.")
+    return UploadJob(
+        job_id=job_data.job_id,
+        upload_id=job_data.upload_id,
+        stage=JobStage(job_data.stage),
+        created_datetime=job_data.created_datetime.replace(tzinfo=UTC),
+        modified_datetime=job_data.modified_datetime.replace(tzinfo=UTC),
+        reason=job_data.reason
+    )
+
+
+def update_job(job: UploadJob) -> None:
+    """
+    Update the database with the latest state of an :class:`.UploadJob`.
+
+    The change is committed immediately, so that the progress of the job is
+    visible to other processes while the job is running.
+    """
+    try:
+        job_data = db.session.query(DBUploadJob).get(job.job_id)
+    except OperationalError as e:
+        raise IOError('Could not query database: %s' % e.detail) from e
+    if job_data is None:
+        raise JobNotFound(f"Job '{job.job_id}' not found in database.")
+    job_data.stage = job.stage.value
+    job_data.modified_datetime = job.modified_datetime
+    job_data.reason = job.reason
+    db.session.add(job_data)
     db.session.commit()
@@ -3,12 +3,11 @@
 from typing import Optional
 
 import sqlalchemy.types as types
-from sqlalchemy import Column, DateTime, Integer, String, Text, JSON
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, Text, \
+    JSON
 from flask_sqlalchemy import SQLAlchemy, Model
 
-from arxiv.util.serialize import dumps, loads
-
-from ...domain import Workspace, LockState, SourceType, Status
+from ...domain import codec, Workspace, LockState, SourceType, Status, JobStage
 
 
 db: SQLAlchemy = SQLAlchemy()
@@ -23,14 +22,14 @@ class FriendlyJSONType(types.TypeDecorator):
             -> Optional[str]:
         """Serialize a dict to JSON."""
         if obj is not None:
-            value: str = dumps(obj)
+            value: str = codec.dumps(obj)
             return value
         return obj
 
     def process_result_value(self, value: str, dialect: str) -> Optional[dict]:
         """Deserialize JSON content to a dict."""
         if value is not None:
-            obj: dict = loads(value)
+            obj: dict = codec.loads(value)
             return obj
         return None
 
@@ -82,3 +81,41 @@ class DBUpload(db.Model):
     """Lock state of upload workspace. UNLOCKED or LOCKED."""
 
     source_type = Column(String(30), default=SourceType.UNKNOWN.value)
+
+    manifest_checksum = Column(String(24), nullable=True)
+    """Checksum of the source package manifest; used as the package ETag."""
+
+    stored_bytes = Column(BigInteger, nullable=True)
+    """Total size of the files in the workspace; used for per-user quotas."""
+
+    version = Column(Integer, nullable=False, default=1)
+    """Incremented on each update; guards against lost updates."""
+
+    # The version is set explicitly by :func:`.database.update`, and is
+    # checked in the WHERE clause of the UPDATE statement.
+    __mapper_args__ = {'version_id_col': version,
+                       'version_id_generator': False}
+
+
+class DBUploadJob(db.Model):
+    """Model for asynchronous upload processing jobs."""
+
+    __tablename__ = 'upload_jobs'
+
+    job_id = Column(String(36), primary_key=True)
+    """The unique identifier for the job."""
+
+    upload_id = Column(Integer, index=True)
+    """The upload workspace being processed."""
+
+    stage = Column(String(30), default=JobStage.QUEUED.value)
+    """Current stage of processing."""
+
+    created_datetime = Column(DateTime)
+    """The datetime when the job was created."""
+
+    modified_datetime = Column(DateTime)
+    """The datetime when the job last moved to a new stage."""
+
+    reason = Column(Text, nullable=True)
+    """Why the job failed, if it did."""
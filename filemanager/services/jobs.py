@@ -0,0 +1,48 @@
+"""
+Queue for work that happens outside of the request context.
+
+Tasks are executed by a Celery worker (see :mod:`filemanager.worker`), which
+shares the storage volume and database with the web application. The worker is
+configured by :mod:`filemanager.celeryconfig`.
+"""
+
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from celery import Celery
+from flask import Flask, has_app_context
+
+from arxiv.base import logging
+
+from .. import celeryconfig
+
+logger = logging.getLogger(__name__)
+
+celery_app = Celery('filemanager')
+celery_app.config_from_object(celeryconfig)
+
+_worker_app: Optional[Flask] = None
+
+
+def init_worker(app: Flask) -> None:
+    """Set the Flask application in which tasks are executed by the worker."""
+    global _worker_app
+    _worker_app = app
+
+
+@contextmanager
+def app_context() -> Iterator[None]:
+    """
+    Run a task in an application context.
+
+    If the task is executed eagerly (e.g. in tests), it runs in the context of
+    the calling request. Otherwise, each task gets a fresh context of the
+    worker application, so that nothing is cached between tasks.
+    """
+    if has_app_context():   # type: ignore
+        yield
+        return
+    if _worker_app is None:
+        raise RuntimeError('Worker is not initialized; see init_worker()')
+    with _worker_app.app_context():
+        yield
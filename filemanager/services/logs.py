@@ -0,0 +1,368 @@
+"""
+Rotated, indexed log files that can be queried by time and upload ID.
+
+:class:`SegmentedLogHandler` appends records to a log file (the current
+*segment*). When the segment gets too large or too old, it is renamed with
+the time of rotation as a suffix, and compressed. Only the most recent
+archives are kept.
+
+Each segment has a sidecar index (``<segment>.idx``). The segment is divided
+into fixed-size blocks of :const:`BLOCK_BYTES`, and the index records the
+time of the first record in each block and the upload IDs (the leading
+``<upload_id>:`` of the message, as used throughout the service) of records
+in each block. :func:`query` uses the index to read only the blocks that can
+contain matching records. Archives are compressed one block per gzip member,
+so that these blocks can be found without decompressing everything before
+them.
+
+Several processes (e.g. uWSGI workers) may write to the same log. Writes,
+indexing, and rotation are serialized with an exclusive lock on
+``<log>.lock``; each process reopens the log if another has rotated it.
+"""
+
+import fcntl
+import glob
+import gzip
+import logging
+import os
+import re
+import time
+from base64 import urlsafe_b64encode
+from bisect import bisect_right
+from datetime import datetime
+from hashlib import md5
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Set, Tuple, \
+    Union
+
+from pytz import UTC
+
+BLOCK_BYTES = 256 * 1024
+"""Size of the blocks of a segment that are indexed."""
+
+UPLOAD_ID = re.compile(r'^(\d+): ')
+"""Leading upload ID of a log message."""
+
+LINE_PREFIX = re.compile(rb'^(\d{2}/\w{3}/\d{4}:\d{2}:\d{2}:\d{2} [+-]\d{4})'
+                         rb' (?:(\d+): )?')
+"""Time and (optional) upload ID at the start of a formatted record."""
+
+TIME_FORMAT = '%d/%b/%Y:%H:%M:%S %z'
+"""Format of the time of each record; see :func:`formatter`."""
+
+ARCHIVE_SUFFIX = '%Y%m%dT%H%M%S'
+
+ARCHIVE_FILES = ('', '.idx', '.offsets', '.gz', '.gz.tmp')
+"""Suffixes of the files that make up an archived segment."""
+
+
+def formatter(fmt: str = '%(asctime)s %(message)s') -> logging.Formatter:
+    """
+    Get a formatter for records that :func:`query` can filter by time.
+
+    ``fmt`` must start with ``%(asctime)s``. Times are written in UTC, so that
+    they can be parsed reliably.
+    """
+    return _UTCFormatter(fmt, TIME_FORMAT)
+
+
+class _UTCFormatter(logging.Formatter):
+    """Formats the times of records in UTC."""
+
+    def converter(self, timestamp: Optional[float]) -> time.struct_time:
+        return time.gmtime(timestamp)
+
+
+class SegmentedLogHandler(logging.Handler):
+    """Writes records to a log that is rotated, indexed, and compressed."""
+
+    def __init__(self, path: str, max_bytes: int = 0, max_age: float = 0,
+                 backup_count: int = 0) -> None:
+        """
+        Open the log at ``path``.
+
+        Parameters
+        ----------
+        path : str
+            Path to the current segment of the log.
+        max_bytes : int
+            The segment is rotated once it is this large. If 0, size is not
+            considered.
+        max_age : float
+            The segment is rotated once its first record is this many seconds
+            old. If 0, age is not considered.
+        backup_count : int
+            Number of archived segments to keep. If 0, all are kept.
+
+        """
+        super(SegmentedLogHandler, self).__init__()
+        self.setFormatter(formatter())
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backup_count = backup_count
+        self._lock_file = open(f'{self.path}.lock', 'a')
+        self._stream: Optional[IO[bytes]] = None
+        self._index: Optional[IO[str]] = None
+        self._started = 0.
+        self._indexed: Set[Tuple[int, str]] = set()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Append ``record`` to the log, indexing and rotating as needed."""
+        try:
+            data = (self.format(record) + '\n').encode('utf-8')
+            match = UPLOAD_ID.match(record.getMessage())
+            archived: Optional[str] = None
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                if self._should_rotate(record.created):
+                    archived = self._rotate(record.created)
+                stream, index = self._open()
+                stream.write(data)
+                # Writes are not buffered, so this is where the record ended.
+                block = (stream.tell() - len(data)) // BLOCK_BYTES
+                keys = [(block, '-')]
+                if match:
+                    keys.append((block, match.group(1)))
+                for key in keys:
+                    if key not in self._indexed:
+                        index.write(f'{key[0]}\t{record.created:.3f}'
+                                    f'\t{key[1]}\n')
+                        self._indexed.add(key)
+                index.flush()
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            if archived is not None:
+                compress(archived)
+                self._remove_old_archives()
+        except Exception:   # pylint: disable=broad-except
+            self.handleError(record)
+
+    def close(self) -> None:
+        """Close the log files."""
+        self.acquire()
+        try:
+            self._close_segment()
+            self._lock_file.close()
+        finally:
+            self.release()
+        super(SegmentedLogHandler, self).close()
+
+    def _open(self) -> Tuple[IO[bytes], IO[str]]:
+        """Get the current segment, reopening it if it has been rotated."""
+        if self._stream is not None and self._index is not None:
+            try:
+                if os.stat(self.path).st_ino \
+                        == os.fstat(self._stream.fileno()).st_ino:
+                    return self._stream, self._index
+            except FileNotFoundError:
+                pass
+            self._close_segment()
+        self._stream = open(self.path, 'ab', buffering=0)
+        self._index = open(f'{self.path}.idx', 'a+')
+        self._index.seek(0)
+        first = self._index.readline().split('\t')
+        self._started = float(first[1]) if len(first) == 3 else time.time()
+        self._index.seek(0, os.SEEK_END)
+        self._indexed = set()
+        return self._stream, self._index
+
+    def _close_segment(self) -> None:
+        for f in (self._stream, self._index):
+            if f is not None:
+                f.close()
+        self._stream = self._index = None
+
+    def _should_rotate(self, now: float) -> bool:
+        stream, _ = self._open()
+        size = os.fstat(stream.fileno()).st_size
+        if size == 0:
+            return False
+        return bool(self.max_bytes and size >= self.max_bytes
+                    or self.max_age and now - self._started >= self.max_age)
+
+    def _rotate(self, now: float) -> str:
+        """Rename the current segment, and get its new path."""
+        self._close_segment()
+        suffix = datetime.fromtimestamp(now, tz=UTC).strftime(ARCHIVE_SUFFIX)
+        archived = f'{self.path}.{suffix}'
+        n = 0
+        while os.path.exists(f'{archived}.idx'):
+            n += 1  # Rotated more than once in a second.
+            archived = f'{self.path}.{suffix}-{n}'
+        os.rename(self.path, archived)
+        os.rename(f'{self.path}.idx', f'{archived}.idx')
+        return archived
+
+    def _remove_old_archives(self) -> None:
+        if not self.backup_count:
+            return
+        for archived in list_archives(self.path)[:-self.backup_count]:
+            for suffix in ARCHIVE_FILES:
+                if os.path.exists(archived + suffix):
+                    os.remove(archived + suffix)
+
+
+def compress(path: str) -> None:
+    """
+    Compress an archived segment, one block per gzip member.
+
+    The (compressed) offset of each member, and whether the block starts with
+    a new line, are written to ``<path>.offsets``. The uncompressed segment is
+    removed once the archive is complete, so that it is always possible to
+    read one or the other.
+    """
+    offsets = []
+    with open(path, 'rb') as source, open(f'{path}.gz.tmp', 'wb') as target:
+        aligned = True
+        for chunk in iter(lambda: source.read(BLOCK_BYTES), b''):
+            offsets.append(f'{target.tell()}\t{int(aligned)}\n')
+            target.write(gzip.compress(chunk))
+            aligned = chunk.endswith(b'\n')
+    with open(f'{path}.offsets', 'w') as f:
+        f.write(''.join(offsets))
+    os.rename(f'{path}.gz.tmp', f'{path}.gz')
+    os.remove(path)
+
+
+def list_archives(path: str) -> List[str]:
+    """Get the (uncompressed) paths of archived segments, oldest first."""
+    return sorted(p[:-len('.idx')]
+                  for p in glob.glob(f'{glob.escape(path)}.*.idx'))
+
+
+def fingerprint(path: str) -> str:
+    """
+    Get a cheap validator for a log, based on its inode, size, and mtime.
+
+    Since the log is only appended to (or replaced, when it is rotated), this
+    changes whenever its content changes, without reading it.
+    """
+    stat = os.stat(path)
+    stamp = f'{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}'
+    return urlsafe_b64encode(md5(stamp.encode('utf-8')).digest()) \
+        .decode('utf-8')
+
+
+def query(path: str, since: Optional[datetime] = None,
+          until: Optional[datetime] = None,
+          upload_id: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Get the records in a log, and its archives, that match the parameters.
+
+    Parameters
+    ----------
+    path : str
+        Path to the current segment of the log.
+    since : :class:`datetime`
+        Only records at or after this time are included.
+    until : :class:`datetime`
+        Only records at or before this time are included.
+    upload_id : int
+        Only records about this upload are included.
+
+    Returns
+    -------
+    iterator
+        Lines of the matching records, oldest first.
+
+    """
+    start = since.timestamp() if since else None
+    end = until.timestamp() if until else None
+    for segment in list_archives(path) + [path]:
+        blocks = _select_blocks(_read_index(f'{segment}.idx'), start, end,
+                                upload_id)
+        if blocks:
+            yield from _filter(_read_blocks(segment, blocks), start, end,
+                               upload_id)
+
+
+def _read_index(path: str) -> Dict[int, Tuple[float, Set[str]]]:
+    """Get the time of the first record, and the upload IDs, per block."""
+    index: Dict[int, Tuple[float, Set[str]]] = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.rstrip('\n').split('\t')
+                if len(parts) != 3:     # Being written.
+                    continue
+                block, created = int(parts[0]), float(parts[1])
+                first, ids = index.get(block, (created, set()))
+                if parts[2] != '-':
+                    ids.add(parts[2])
+                index[block] = (min(first, created), ids)
+    except FileNotFoundError:   # Rotated in the meantime.
+        pass
+    return index
+
+
+def _select_blocks(index: Dict[int, Tuple[float, Set[str]]],
+                   start: Optional[float], end: Optional[float],
+                   upload_id: Optional[int]) -> List[int]:
+    blocks = sorted(index)
+    firsts = [index[block][0] for block in blocks]
+    # The block before the first that starts after ``start`` may contain
+    # records after ``start``, too. Times in the log are only to the second.
+    lo = 0 if start is None else max(0, bisect_right(firsts, start - 1) - 1)
+    hi = len(blocks) if end is None else bisect_right(firsts, end + 1)
+    return [block for block in blocks[lo:hi]
+            if upload_id is None or str(upload_id) in index[block][1]]
+
+
+def _read_blocks(segment: str, blocks: List[int]) -> Iterator[bytes]:
+    """Get the lines of the records that start in each of ``blocks``."""
+    offsets: Optional[List[Tuple[int, bool]]] = None
+    try:
+        raw = open(segment, 'rb')
+    except FileNotFoundError:   # Compressed.
+        with open(f'{segment}.offsets') as f:
+            offsets = [(int(offset), aligned == '1') for offset, aligned
+                       in (line.split() for line in f)]
+        raw = open(f'{segment}.gz', 'rb')
+    with raw:
+        reader: Union[IO[bytes], gzip.GzipFile] = raw
+        position = -1
+        for block in blocks:
+            begin, end = block * BLOCK_BYTES, (block + 1) * BLOCK_BYTES
+            if position != begin:   # Not contiguous with the last block.
+                if offsets is None:
+                    raw.seek(max(0, begin - 1))
+                    aligned = begin == 0 or raw.read(1) == b'\n'
+                elif block < len(offsets):
+                    offset, aligned = offsets[block]
+                    raw.seek(offset)
+                    reader = gzip.GzipFile(fileobj=raw, mode='rb')
+                else:
+                    break
+                position = begin
+                if not aligned:     # Belongs to the previous block.
+                    position += len(reader.readline())
+            while position < end:
+                line = reader.readline()
+                if not line:
+                    break
+                yield line
+                position += len(line)
+
+
+def _filter(lines: Iterable[bytes], start: Optional[float],
+            end: Optional[float], upload_id: Optional[int]) -> Iterator[bytes]:
+    """
+    Get the lines of the records that match.
+
+    Lines that do not start with a time (e.g. tracebacks) belong to the
+    record before them. Times in the log are only to the second.
+    """
+    wanted = None if upload_id is None else str(upload_id).encode('ascii')
+    if start is not None:
+        start = float(int(start))
+    keep = False
+    for line in lines:
+        match = LINE_PREFIX.match(line)
+        if match:
+            created = datetime.strptime(match.group(1).decode('ascii'),
+                                        TIME_FORMAT).timestamp()
+            keep = (start is None or created >= start) \
+                and (end is None or created <= end) \
+                and (wanted is None or match.group(2) == wanted)
+        if keep:
+            yield line
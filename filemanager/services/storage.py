@@ -1,9 +1,13 @@
 """On-disk storage for uploads."""
 
-from typing import Any, Union, Iterator, Type, Dict, Tuple, IO
+from typing import Any, Union, Iterator, Type, Dict, Tuple, IO, Optional
+import fcntl
 import io
 import os
 import tarfile
+import tempfile
+import threading
+import time
 import zipfile
 import shutil
 import subprocess
@@ -12,6 +16,9 @@ from pathlib import Path
 from contextlib import contextmanager
 from datetime import datetime
 
+from base64 import urlsafe_b64encode
+from hashlib import md5
+
 from pytz import UTC
 from flask import Flask
 
@@ -21,15 +28,122 @@ from ..domain import Workspace, UserFile, IStorageAdapter
 logger = logging.getLogger(__name__)
 logger.propagate = False
 
+LOCK_POLL_INTERVAL = 0.05
+"""Seconds to wait between attempts to acquire a workspace lock."""
+
+FICLONE = 0x40049409
+"""``ioctl`` request that makes a file a reflink of another (Linux)."""
+
+COPY_CHUNK_BYTES = 1024 * 1024 * 1024
+"""Most bytes to ask ``copy_file_range`` to copy at a time."""
+
+ROOT_CACHE_SIZE = 4096
+"""Most absolute workspace roots that an adapter keeps (see ``_get_root``)."""
+
+_held_locks = threading.local()
+
+
+class WorkspaceBusy(RuntimeError):
+    """A workspace lock could not be acquired in time."""
+
+
+def copy_content(src_path: str, dest_path: str) -> None:
+    """
+    Copy the content of a file.
+
+    Where the filesystem supports it (e.g. XFS, Btrfs), ``dest_path`` becomes
+    a reflink of ``src_path``, sharing blocks until either is written to.
+    Otherwise the kernel copies the content with ``copy_file_range`` where
+    Python provides it (3.8 and later). Failing both, as on Python 3.6 with
+    NFS (including EFS), the content is copied in the usual way, at the usual
+    cost; only a hard link (see :meth:`SimpleStorageAdapter.copy`) avoids it.
+    """
+    with open(src_path, 'rb') as src, open(dest_path, 'wb') as dest:
+        try:
+            fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+            return
+        except OSError:     # Not supported by the filesystem (or platform).
+            pass
+        copy_file_range = getattr(os, 'copy_file_range', None)
+        if copy_file_range is not None:
+            try:
+                while copy_file_range(src.fileno(), dest.fileno(),
+                                      COPY_CHUNK_BYTES):
+                    pass
+                return
+            except OSError:     # E.g. across filesystems, on older kernels.
+                src.seek(0)
+                dest.seek(0)
+                dest.truncate()
+        shutil.copyfileobj(src, dest, 1024 * 1024)  # type: ignore
+
+
+class StagedFileTooLarge(IOError):
+    """More content was written to a :class:`.StagedFile` than allowed."""
+
+
+class StagedFile:
+    """
+    A file in the staging area to which incoming content is streamed.
+
+    Content is hashed and counted as it is written, so that neither requires
+    another pass over the file once it has arrived. Other file methods are
+    delegated to the underlying file pointer.
+    """
+
+    def __init__(self, pointer: IO[bytes],
+                 max_bytes: Optional[int] = None) -> None:
+        """Wrap a file pointer from :meth:`.open_staging_file`."""
+        self._pointer = pointer
+        self._md5 = md5()
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+
+    def __getattr__(self, name: str) -> Any:
+        """Delegate other attributes to the underlying file pointer."""
+        return getattr(self._pointer, name)
+
+    @property
+    def path(self) -> str:
+        """Absolute path to the staged file."""
+        return str(self._pointer.name)
+
+    @property
+    def checksum(self) -> str:
+        """URL-safe base64-encoded MD5 hash of the content written so far."""
+        return urlsafe_b64encode(self._md5.digest()).decode('utf-8')
+
+    def write(self, chunk: bytes) -> int:
+        """Write a chunk of content."""
+        self.size_bytes += len(chunk)
+        if self.max_bytes is not None and self.size_bytes > self.max_bytes:
+            raise StagedFileTooLarge(f'Exceeded {self.max_bytes} bytes')
+        self._md5.update(chunk)
+        return self._pointer.write(chunk)
+
+    def discard(self) -> None:
+        """Close and remove the staged file, if it has not been adopted."""
+        self._pointer.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
 
 class SimpleStorageAdapter(IStorageAdapter):
     """Simple storage adapter for a workspace."""
 
     PARAMS: Tuple[str, ...] = ('base_path', )
+    STAGING_PATH = 'staging'
+    """Path (relative to the volume) where incoming content is staged."""
+    LOCKS_PATH = 'locks'
+    """Path (relative to the permanent volume) of workspace lock files."""
 
     def __init__(self, base_path: str) -> None:
         """Initialize with a base path."""
         self._base_path = base_path
+        self._roots: Dict[Tuple[str, str, bool], str] = {}
+        self._stats: Dict[str, os.stat_result] = {}
         self.deleted_logs_path = os.path.join(self._base_path,
                                                'deleted_workspace_logs')
         if not os.path.exists(self._base_path):
@@ -38,6 +152,60 @@ class SimpleStorageAdapter(IStorageAdapter):
             os.makedirs(self.deleted_logs_path)
         logger.debug('New SimpleStorageAdapter at %s', self._base_path)
 
+    @contextmanager
+    def lock(self, upload_id: int, timeout: float = 0.) -> Iterator[None]:
+        """
+        Hold an exclusive, advisory lock on a workspace.
+
+        The lock file is kept on the permanent volume, so that the lock is
+        shared by all processes that mount it. Locks are re-entrant within a
+        thread, e.g. when a task is executed eagerly by a request that already
+        holds the lock.
+
+        Parameters
+        ----------
+        upload_id : int
+            The workspace to lock.
+        timeout : float
+            Seconds to wait for the lock before giving up. If 0, fail
+            immediately if the lock is held elsewhere.
+
+        Raises
+        ------
+        :class:`.WorkspaceBusy`
+            If the lock could not be acquired within ``timeout``.
+
+        """
+        held: Dict[str, int] = _held_locks.__dict__.setdefault('counts', {})
+        lock_path = os.path.join(self._base_path, self.LOCKS_PATH,
+                                 f'{upload_id}.lock')
+        if held.get(lock_path):
+            held[lock_path] += 1
+            try:
+                yield
+            finally:
+                held[lock_path] -= 1
+            return
+
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        with open(lock_path, 'a') as f:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError as e:
+                    if time.monotonic() >= deadline:
+                        raise WorkspaceBusy(f'Workspace {upload_id} is busy') \
+                            from e
+                    time.sleep(LOCK_POLL_INTERVAL)
+            held[lock_path] = 1
+            try:
+                yield
+            finally:
+                del held[lock_path]
+                fcntl.flock(f, fcntl.LOCK_UN)
+
     def makedirs(self, workspace: Workspace, path: str) -> None:
         """Make directories recursively for ``path``."""
         abs_path = self.get_path_bare(path)
@@ -62,25 +230,96 @@ class SimpleStorageAdapter(IStorageAdapter):
             return False
         return True
 
-    def _check_safe(self, workspace: Workspace, full_path: str,
-                    is_ancillary: bool = False, is_removed: bool = False,
-                    is_persisted: bool = False, is_system: bool = False,
-                    strict: bool = True) -> None:
+    def _get_root(self, workspace: Workspace, is_ancillary: bool = False,
+                  is_removed: bool = False, is_persisted: bool = False,
+                  is_system: bool = False, strict: bool = True) -> str:
+        """
+        Get the absolute, normalized path of a part of a workspace.
+
+        Which part (the whole workspace, or the source, ancillary or removed
+        files) follows :meth:`.Workspace.get_path`. Roots depend only on the
+        base path of the workspace, so they are kept (up to
+        :const:`ROOT_CACHE_SIZE` of them) rather than computed for each path.
+        """
         if not strict or is_system:
-            wks_full_path = self.get_path_bare(workspace.base_path,
-                                               is_persisted=is_persisted)
+            kind = 'base'
         elif is_ancillary:
-            wks_full_path = self.get_path_bare(workspace.ancillary_path,
-                                               is_persisted=is_persisted)
+            kind = 'ancillary'
         elif is_removed:
-            wks_full_path = self.get_path_bare(workspace.removed_path,
-                                               is_persisted=is_persisted)
+            kind = 'removed'
         else:
-            wks_full_path = self.get_path_bare(workspace.source_path,
-                                               is_persisted=is_persisted)
-        if wks_full_path not in full_path:
+            kind = 'source'
+        key = (workspace.base_path, kind, is_persisted)
+        root = self._roots.get(key)
+        if root is None:
+            if len(self._roots) >= ROOT_CACHE_SIZE:
+                self._roots.clear()
+            root = self.get_path_bare(getattr(workspace, f'{kind}_path'),
+                                      is_persisted=is_persisted)
+            self._roots[key] = root
+        return root
+
+    def _check_safe(self, workspace: Workspace, full_path: str,
+                    is_ancillary: bool = False, is_removed: bool = False,
+                    is_persisted: bool = False, is_system: bool = False,
+                    strict: bool = True) -> None:
+        """Make sure that ``full_path`` (normalized) is within the workspace."""
+        root = self._get_root(workspace, is_ancillary=is_ancillary,
+                              is_removed=is_removed, is_persisted=is_persisted,
+                              is_system=is_system, strict=strict)
+        if full_path != root and not full_path.startswith(root + os.sep):
             raise ValueError(f'Not a valid path for workspace: {full_path}')
 
+    def _stat(self, path: str) -> os.stat_result:
+        """
+        Get the status of ``path``, from the cache if possible.
+
+        An adapter is created for each workspace that is retrieved, so the
+        cache lasts as long as the request. Methods that change files drop
+        what they change (see :meth:`._forget`); files must not be changed
+        except via the adapter (or :meth:`.set_last_modified` afterwards).
+        """
+        stat = self._stats.get(path)
+        if stat is None:
+            stat = self._stats[path] = os.stat(path)
+        return stat
+
+    def _forget(self, path: str, is_directory: bool = False) -> None:
+        """Drop the cached status of ``path`` (or of all, for a directory)."""
+        if is_directory:
+            self._stats.clear()
+        else:
+            self._stats.pop(path, None)
+
+    def cache_stats(self, workspace: Workspace, path: str,
+                    is_ancillary: bool = False, is_removed: bool = False,
+                    is_persisted: bool = False,
+                    is_system: bool = False) -> None:
+        """
+        Get the sizes and times of everything under ``path`` at once.
+
+        The directory is walked with :func:`os.scandir`, and the results are
+        kept for later calls to :meth:`.get_size_bytes` and
+        :meth:`.get_last_modified`. On NFS, entries are listed with their
+        attributes, so this saves a round trip for each file.
+        """
+        try:
+            stack = [self.get_path(workspace, path, is_ancillary=is_ancillary,
+                                   is_removed=is_removed,
+                                   is_persisted=is_persisted,
+                                   is_system=is_system)]
+        except ValueError:
+            return
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        self._stats[entry.path] = entry.stat()
+                        if entry.is_dir():
+                            stack.append(entry.path)
+            except FileNotFoundError:
+                continue
+
     def set_permissions(self, workspace: Workspace,
                         file_mode: int = 0o664, dir_mode: int = 0o775) -> None:
         """
@@ -109,6 +348,32 @@ class SimpleStorageAdapter(IStorageAdapter):
                          is_persisted=u_file.is_persisted)
         self._make_way(dest_path)
         shutil.move(src_path, dest_path)
+        self._forget(src_path, is_directory=u_file.is_directory)
+        self._forget(dest_path, is_directory=u_file.is_directory)
+
+    def replace_content(self, workspace: Workspace, u_file: UserFile,
+                        content: bytes) -> None:
+        """
+        Replace the content of a file in one step.
+
+        The content is written to a temporary file beside ``u_file``, which
+        is then renamed over it. So if the process dies part way through,
+        the file still has its old content rather than part of the new.
+        """
+        path = self.get_path(workspace, u_file)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                         prefix=f'.{os.path.basename(path)}.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(temp_path, 0o664)  # Temporary files are created private.
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self._forget(path)
 
     def _make_way(self, dest_path: str) -> None:
         """Prepare a path to receive moved/copied files."""
@@ -120,8 +385,10 @@ class SimpleStorageAdapter(IStorageAdapter):
         if os.path.exists(dest_path):
             if os.path.isdir(dest_path):
                 shutil.rmtree(dest_path)
+                self._forget(dest_path, is_directory=True)
             else:
                 os.unlink(dest_path)
+                self._forget(dest_path)
 
     def stash_deleted_log(self, workspace: Workspace,
                           u_file: UserFile) -> None:
@@ -131,7 +398,71 @@ class SimpleStorageAdapter(IStorageAdapter):
         new_filename = padded_id + "_source.log"
 
         deleted_logs_path = os.path.join(self.deleted_logs_path, new_filename)
-        shutil.move(u_file.full_path, deleted_logs_path)
+        src_path = u_file.full_path
+        shutil.move(src_path, deleted_logs_path)
+        self._forget(src_path)
+
+    def expire_deleted_logs(self, before: datetime,
+                            dry_run: bool = False) -> Tuple[int, int]:
+        """
+        Delete the logs of deleted workspaces that were stashed ``before``.
+
+        Returns
+        -------
+        int
+            Number of logs deleted (or that would be, if ``dry_run``).
+        int
+            Total size of those logs in bytes.
+
+        """
+        count, size_bytes = 0, 0
+        cutoff = before.timestamp()
+        with os.scandir(self.deleted_logs_path) as entries:
+            for entry in entries:
+                stat = entry.stat()
+                if not entry.is_file() or stat.st_mtime >= cutoff:
+                    continue
+                if not dry_run:
+                    os.unlink(entry.path)
+                count += 1
+                size_bytes += stat.st_size
+        return count, size_bytes
+
+    def expire_staging_files(self, before: datetime,
+                             dry_run: bool = False) -> Tuple[int, int]:
+        """
+        Delete files in the staging area that were last written ``before``.
+
+        A staged file is adopted (or deleted) by the request that wrote it,
+        so any that are left behind were orphaned, e.g. by a worker that was
+        killed. Directories (such as those of upload sessions) are left alone.
+
+        Returns
+        -------
+        int
+            Number of files deleted (or that would be, if ``dry_run``).
+        int
+            Total size of those files in bytes.
+
+        """
+        count, size_bytes = 0, 0
+        cutoff = before.timestamp()
+        try:
+            entries = os.scandir(self.get_staging_path())
+        except FileNotFoundError:
+            return count, size_bytes
+        with entries:
+            for entry in entries:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat()
+                if stat.st_mtime >= cutoff:
+                    continue
+                if not dry_run:
+                    os.unlink(entry.path)
+                count += 1
+                size_bytes += stat.st_size
+        return count, size_bytes
 
     def move(self, workspace: Workspace, u_file: UserFile,
              from_path: str, to_path: str) -> None:
@@ -158,17 +489,59 @@ class SimpleStorageAdapter(IStorageAdapter):
         parent, _ = os.path.split(dest_path)
         self._make_way(dest_path)
         shutil.move(src_path, dest_path)
+        self._forget(src_path, is_directory=u_file.is_directory)
+        self._forget(dest_path, is_directory=u_file.is_directory)
 
     @contextmanager
     def open(self, workspace: Workspace, u_file: UserFile,
              flags: str = 'r', **kwargs: Any) -> Iterator[IO]:
         """Get an open file pointer to a file on disk."""
-        with open(self.get_path(workspace, u_file), flags, **kwargs) as f:
-            yield f
+        path = self.get_path(workspace, u_file)
+        if any(flag in flags for flag in 'wax+'):
+            self._unshare(path, keep_content='w' not in flags)
+        try:
+            with open(path, flags, **kwargs) as f:
+                yield f
+        finally:
+            if any(flag in flags for flag in 'wax+'):
+                self._forget(path)
 
     def open_pointer(self, workspace: Workspace, u_file: UserFile,
                      flags: str = 'r', **kwargs: Any) -> IO[Any]:
-        return open(self.get_path(workspace, u_file), flags, **kwargs)
+        path = self.get_path(workspace, u_file)
+        # The pointer outlives this call, so writing through it is only
+        # noticed if the size and time are not asked for before it is closed.
+        if any(flag in flags for flag in 'wax+'):
+            self._unshare(path, keep_content='w' not in flags)
+            self._forget(path)
+        return open(path, flags, **kwargs)
+
+    def get_staging_path(self, *parts: str) -> str:
+        """Get the absolute path to ``parts`` in the staging area."""
+        return self.get_path_bare(os.path.join(self.STAGING_PATH, *parts),
+                                  is_persisted=False)
+
+    def open_staging_file(self) -> IO[bytes]:
+        """Open a new file in the staging area of the storage volume."""
+        staging_path = self.get_staging_path()
+        if not os.path.exists(staging_path):
+            os.makedirs(staging_path, exist_ok=True)
+        pointer: IO[bytes] = tempfile.NamedTemporaryFile(
+            dir=staging_path, prefix='upload-', delete=False
+        )
+        return pointer
+
+    def adopt(self, workspace: Workspace, u_file: UserFile,
+              path: str) -> None:
+        """Move the staged file at ``path`` into place as ``u_file``."""
+        staging_path = self.get_staging_path()
+        if os.path.dirname(os.path.normpath(path)) != staging_path:
+            raise ValueError(f'Not a staged file: {path}')
+        dest_path = self.get_path(workspace, u_file)
+        self._make_way(dest_path)
+        shutil.move(path, dest_path)
+        os.chmod(dest_path, 0o664)  # Staged files are created private.
+        self._forget(dest_path)
 
     def is_tarfile(self, workspace: Workspace,
                    u_file: UserFile) -> bool:
@@ -203,22 +576,89 @@ class SimpleStorageAdapter(IStorageAdapter):
         # gzip routines, and this is further exascerbated by slower I/O on
         # networked filesystems. This is around 10x faster than the original
         # ``tarfile``-based implementation. --Erick 2019-07-10
-        result = subprocess.Popen(['tar', '-czf',
-                                   self.get_path(workspace, u_file),
-                                   '-C', self.get_path_bare(path),
-                                   '.']).wait()
-        if result != 0:
-            raise RuntimeError('tar exited with %i', result)
+        self._tar(self.get_path_bare(path), self.get_path(workspace, u_file))
+        u_file.size_bytes = self.get_size_bytes(workspace, u_file)
+        u_file.last_modified = self.get_last_modified(workspace, u_file)
+        return u_file
+
+    def pack_files(self, workspace: Workspace, u_file: UserFile,
+                   members: Dict[str, UserFile]) -> UserFile:
+        """
+        Pack files from ``workspace`` into a gzipped tarball ``u_file``.
+
+        Unlike :meth:`.pack_tarfile`, the files need not already be laid out
+        as they should be in the tarball. They are hard-linked (or, failing
+        that, copied) into a directory alongside ``u_file``, which is then
+        packed with ``tar``. The directory is only read, and is removed
+        afterwards, so the links are never written through.
+
+        Parameters
+        ----------
+        workspace : :class:`.Workspace`
+            The workspace in which the files and tarball reside.
+        u_file : :class:`.UserFile`
+            A file in ``workspace`` into which the files should be packed.
+        members : dict
+            Maps paths in the tarball to the :class:`.UserFile`s that should
+            be packed there. Directories are created, but not linked.
+
+        Returns
+        -------
+        :class:`.UserFile`
+            The passed ``u_file``, with size and time properties updated.
+
+        """
+        full_path = self.get_path(workspace, u_file)
+        tree = f'{full_path}.{os.getpid()}.d'
+        shutil.rmtree(tree, ignore_errors=True)     # Left by a crash?
+        try:
+            os.makedirs(tree)
+            for path, member in members.items():
+                dest_path = os.path.normpath(os.path.join(tree,
+                                                          path.lstrip('/')))
+                if member.is_directory and dest_path == tree:
+                    continue
+                if not dest_path.startswith(tree + os.sep):
+                    raise ValueError(f'Not a valid path in tarball: {path}')
+                if member.is_directory:
+                    os.makedirs(dest_path, exist_ok=True)
+                    continue
+                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                src_path = self.get_path(workspace, member)
+                try:
+                    os.link(src_path, dest_path)
+                except OSError:     # E.g. on another volume.
+                    copy_content(src_path, dest_path)
+            self._tar(tree, full_path)
+        finally:
+            shutil.rmtree(tree, ignore_errors=True)
         u_file.size_bytes = self.get_size_bytes(workspace, u_file)
         u_file.last_modified = self.get_last_modified(workspace, u_file)
         return u_file
 
+    def _tar(self, src_path: str, full_path: str) -> None:
+        """Pack directory ``src_path`` into a gzipped tarball."""
+        # The tarball is built alongside the old one and then moved into
+        # place, so that concurrent readers see either the old or the new
+        # package, never a partial one.
+        tmp_path = f'{full_path}.{os.getpid()}.tmp'
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        result = subprocess.Popen(['tar', '-czf', tmp_path,
+                                   '-C', src_path, '.']).wait()
+        if result != 0:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise RuntimeError('tar exited with %i', result)
+        os.replace(tmp_path, full_path)
+        self._forget(full_path)
+
     def unpack_tarfile(self, workspace: Workspace,
                        u_file: UserFile, path: str) -> None:
         """Unpack tarfile ``u_file`` into ``path``."""
         result = subprocess.Popen(['tar', '-xzf',
                                    self.get_path(workspace, u_file),
                                    '-C', self.get_path_bare(path)]).wait()
+        self._forget(path, is_directory=True)
         if result != 0:
             raise RuntimeError('tar exited with %i', result)
 
@@ -229,7 +669,12 @@ class SimpleStorageAdapter(IStorageAdapter):
                  is_removed: bool = False,
                  is_persisted: bool = False,
                  is_system: bool = False) -> str:
-        """Get the absolute path to an :class:`.UserFile`."""
+        """
+        Get the absolute path to an :class:`.UserFile`.
+
+        Raises :class:`ValueError` if the path is outside of its part of the
+        workspace (see :meth:`._check_safe`).
+        """
         if isinstance(u_file_or_path, UserFile):
             is_ancillary = u_file_or_path.is_ancillary
             is_removed = u_file_or_path.is_removed
@@ -275,13 +720,62 @@ class SimpleStorageAdapter(IStorageAdapter):
             os.makedirs(full_path)
         else:
             Path(full_path).touch()
+        self._forget(full_path)
         logger.debug('Touched %s', full_path)
 
     def copy(self, workspace: Workspace, u_file: UserFile,
-             new_file: UserFile) -> None:
-        """Copy the contents of ``u_file`` into ``new_file``."""
-        shutil.copy(self.get_path(workspace, u_file),
-                    self.get_path(workspace, new_file))
+             new_file: UserFile, link: bool = False) -> None:
+        """
+        Copy the contents of ``u_file`` into ``new_file``.
+
+        The copy is a reflink where possible (see :func:`copy_content`). If
+        ``link`` is set, ``new_file`` is instead made a hard link of
+        ``u_file`` where they are on the same volume, which costs nothing on
+        any filesystem. That is meant for copies that are never written to,
+        such as checkpoint blobs: the files then share a mode and a time as
+        well as content, though a file that is opened for writing through
+        this adapter is first given its own copy (see :meth:`_unshare`).
+        """
+        src_path = self.get_path(workspace, u_file)
+        dest_path = self.get_path(workspace, new_file)
+        if link:
+            if os.path.lexists(dest_path):
+                os.unlink(dest_path)
+            try:
+                os.link(src_path, dest_path)
+                self._forget(src_path)      # Its link count has changed.
+                self._forget(dest_path)
+                return
+            except OSError:     # E.g. on another volume.
+                pass
+        copy_content(src_path, dest_path)
+        shutil.copymode(src_path, dest_path)
+        self._forget(dest_path)
+
+    def _unshare(self, path: str, keep_content: bool = True) -> None:
+        """
+        Break the hard links to ``path``, before it is written to.
+
+        The file is replaced by a copy of itself (or, unless ``keep_content``,
+        by an empty file), so that the other links keep the old content.
+        """
+        try:
+            if self._stat(path).st_nlink < 2:
+                return
+        except FileNotFoundError:
+            return
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                         prefix=f'.{os.path.basename(path)}.')
+        os.close(fd)
+        try:
+            if keep_content:
+                copy_content(path, temp_path)
+            shutil.copymode(path, temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self._forget(path)
 
     def delete(self, workspace: Workspace, u_file: UserFile,
                is_ancillary: bool = False,
@@ -294,34 +788,41 @@ class SimpleStorageAdapter(IStorageAdapter):
             shutil.rmtree(path)
         else:
             os.unlink(path)
+        self._forget(path, is_directory=u_file.is_directory)
 
     def delete_path(self, workspace: Workspace, path: str) -> None:
-        shutil.rmtree(self.get_path(workspace, path))
+        full_path = self.get_path(workspace, path)
+        shutil.rmtree(full_path)
+        self._forget(full_path, is_directory=True)
 
     def delete_all(self, workspace: Workspace) -> None:
         shutil.rmtree(self.get_path_bare(workspace.ancillary_path))
         shutil.rmtree(self.get_path_bare(workspace.source_path))
+        self._stats.clear()
 
     def get_size_bytes(self, workspace: Workspace,
                        u_file: UserFile) -> int:
         """Get the size in bytes of a file."""
-        return os.path.getsize(self.get_path(workspace, u_file))
+        return self._stat(self.get_path(workspace, u_file)).st_size
 
     def get_last_modified(self, workspace: Workspace,
                           u_file: UserFile) -> datetime:
         _path = self.get_path(workspace, u_file)
-        ts = datetime.utcfromtimestamp(os.path.getmtime(_path))
+        ts = datetime.utcfromtimestamp(self._stat(_path).st_mtime)
         return ts.replace(tzinfo=UTC)
 
     def set_last_modified(self, workspace: Workspace,
                           u_file: UserFile, modified: datetime) -> None:
         mtime = modified.timestamp()
-        os.utime(self.get_path(workspace, u_file), (mtime, mtime))
+        path = self.get_path(workspace, u_file)
+        os.utime(path, (mtime, mtime))
+        self._forget(path)
 
     def delete_workspace(self, workspace: Workspace) -> None:
         """Completely delete a workspace and all of its contents."""
         shutil.rmtree(self.get_path_bare(workspace.base_path,
                                          is_persisted=True))
+        self._stats.clear()
 
 
 class QuarantineStorageAdapter(SimpleStorageAdapter):
@@ -333,6 +834,8 @@ class QuarantineStorageAdapter(SimpleStorageAdapter):
         """Initialize with two distinct base paths."""
         self._base_path = base_path
         self._quarantine_path = quarantine_path
+        self._roots: Dict[Tuple[str, str, bool], str] = {}
+        self._stats: Dict[str, os.stat_result] = {}
         self.deleted_logs_path = os.path.join(self._base_path,
                                                'deleted_workspace_logs')
         if not os.path.exists(self._base_path):
@@ -372,8 +875,11 @@ class QuarantineStorageAdapter(SimpleStorageAdapter):
     def persist(self, workspace: Workspace,
                 u_file: UserFile) -> None:
         """Move a file or directory from quarantine to permanent storage."""
-        src_path = self._get_quarantine_path(workspace.get_path(u_file))
-        dst_path = self._get_permanent_path(workspace.get_path(u_file))
+        # Normalized, as the safety checks expect.
+        src_path = self.get_path_bare(workspace.get_path(u_file),
+                                      is_persisted=False)
+        dst_path = self.get_path_bare(workspace.get_path(u_file),
+                                      is_persisted=True)
         self._check_safe(workspace, src_path,
                          is_ancillary=u_file.is_ancillary,
                          is_removed=u_file.is_removed,
@@ -389,6 +895,8 @@ class QuarantineStorageAdapter(SimpleStorageAdapter):
             os.makedirs(parent)
         logger.debug('Persist from %s to %s', src_path, dst_path)
         shutil.move(src_path, dst_path)
+        self._forget(src_path, is_directory=u_file.is_directory)
+        self._forget(dst_path, is_directory=u_file.is_directory)
         u_file.is_persisted = True
 
         # Since we are working on a conventional file system, if we just copied
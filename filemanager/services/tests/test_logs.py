@@ -0,0 +1,90 @@
+"""Tests for :mod:`filemanager.services.logs`."""
+
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from unittest import TestCase, mock
+
+from pytz import UTC
+
+from .. import logs
+
+
+class TestSegmentedLog(TestCase):
+    """The log is rotated, and can be queried across rotations."""
+
+    def setUp(self):
+        """Log to a handler in a temporary directory."""
+        self.workdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.workdir, 'upload.log')
+        self.handler = logs.SegmentedLogHandler(self.path, max_bytes=1024,
+                                                backup_count=3)
+        self.logger = logging.getLogger(f'test_logs.{id(self)}')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        """Remove the log."""
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
+        shutil.rmtree(self.workdir)
+
+    def log(self, n, upload_id=None, created=None):
+        """Log ``n`` records."""
+        with mock.patch('time.time', return_value=created or time_now()):
+            for i in range(n):
+                prefix = f'{upload_id}: ' if upload_id else 'sys: '
+                self.logger.info('%sRecord %i', prefix, i)
+
+    def test_rotate(self):
+        """The log is rotated once it is too large, and archives compressed."""
+        self.log(200)
+        archives = logs.list_archives(self.path)
+        self.assertEqual(len(archives), 3, 'Only the newest are kept')
+        for archived in archives:
+            self.assertTrue(os.path.exists(f'{archived}.gz'))
+            self.assertFalse(os.path.exists(archived))
+        self.assertLess(os.path.getsize(self.path), 1024)
+
+    def test_query_upload_id(self):
+        """Records about an upload are found in the log and its archives."""
+        self.log(30)
+        self.log(5, upload_id=42)
+        self.log(30)
+        self.log(5, upload_id=42)
+        self.assertTrue(logs.list_archives(self.path), 'The log was rotated')
+
+        lines = list(logs.query(self.path, upload_id=42))
+        self.assertEqual(len(lines), 10)
+        self.assertTrue(all(b' 42: Record ' in line for line in lines))
+
+    def test_query_since(self):
+        """Records are selected by time, using the index."""
+        an_hour_ago = time_now() - 3600
+        with mock.patch.object(logs, 'BLOCK_BYTES', 512):
+            self.log(30, created=an_hour_ago)
+            self.log(3, upload_id=7)
+            since = datetime.fromtimestamp(time_now() - 60, tz=UTC)
+            with mock.patch.object(logs, '_read_blocks',
+                                   wraps=logs._read_blocks) as m_read:
+                lines = list(logs.query(self.path, since=since))
+        self.assertEqual(len(lines), 3)
+        read = [block for call in m_read.call_args_list
+                for block in call[0][1]]
+        self.assertLess(len(read), 4, 'Older blocks are not read')
+
+    def test_fingerprint(self):
+        """The fingerprint changes when the log is appended to."""
+        self.log(1)
+        before = logs.fingerprint(self.path)
+        self.assertEqual(before, logs.fingerprint(self.path))
+        self.log(1)
+        self.assertNotEqual(before, logs.fingerprint(self.path))
+
+
+def time_now():
+    """Get the current time, without :func:`time.time` (which is mocked)."""
+    return datetime.now(UTC).timestamp()
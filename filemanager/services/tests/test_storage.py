@@ -1,12 +1,15 @@
 """Tests for :mod:`.storage`."""
 
 from unittest import TestCase, mock
+import fcntl
 import os
 import shutil
+import threading
 from datetime import datetime
 import tempfile
 from ...domain import Workspace, UserFile
-from ..storage import SimpleStorageAdapter, QuarantineStorageAdapter
+from ..storage import SimpleStorageAdapter, QuarantineStorageAdapter, \
+    WorkspaceBusy
 
 
 class TestSimpleStorage(TestCase):
@@ -58,6 +61,18 @@ class TestSimpleStorage(TestCase):
             with self.adapter.open(self.mock_workspace, mock_file, mode) as f:
                 self.assertEqual(f.mode, mode, 'Opens file in specified mode')
 
+    def test_is_safe(self):
+        """Only paths within the part of the workspace are safe."""
+        self.assertTrue(self.adapter.is_safe(self.mock_workspace, 'a/../b'))
+        self.assertTrue(self.adapter.is_safe(self.mock_workspace, 'a/..'))
+        self.assertFalse(self.adapter.is_safe(self.mock_workspace, '../b'))
+        self.assertFalse(self.adapter.is_safe(self.mock_workspace, '../src2'),
+                         'Sharing a prefix with the source path is not enough')
+        self.assertTrue(self.adapter.is_safe(self.mock_workspace, '../src2',
+                                             strict=False))
+        with self.assertRaises(ValueError):
+            self.adapter.get_path(self.mock_workspace, '../src.tar')
+
     def test_getsize(self):
         """Get the size in bytes of a file."""
         _, fpath = tempfile.mkstemp(dir=self.source_path)
@@ -139,6 +154,56 @@ class TestSimpleStorage(TestCase):
         with self.adapter.open(self.mock_workspace, mock_new_file) as f:
             self.assertEqual(f.read(), 'Thanks for all the fish')
 
+    def test_copy_is_independent(self):
+        """A copy keeps the mode, and can be changed without the original."""
+        fpath = os.path.join(self.source_path, 'orig')
+        with open(fpath, 'w') as f:
+            f.write('Thanks for all the fish')
+        os.chmod(fpath, 0o640)
+        mock_file = mock.MagicMock(path='orig', is_directory=False)
+        mock_new_file = mock.MagicMock(path='alt')
+        new_path = os.path.join(self.source_path, 'alt')
+
+        # Whether or not the filesystem supports reflinks.
+        for ioctl in (fcntl.ioctl, mock.MagicMock(side_effect=OSError(95))):
+            with mock.patch('filemanager.services.storage.fcntl.ioctl',
+                            ioctl):
+                self.adapter.copy(self.mock_workspace, mock_file,
+                                  mock_new_file)
+            self.assertEqual(os.stat(new_path).st_mode & 0o777, 0o640)
+            with open(new_path, 'r+') as f:
+                self.assertEqual(f.read(), 'Thanks for all the fish')
+                f.seek(0)
+                f.write('So long')
+            with open(fpath) as f:
+                self.assertEqual(f.read(), 'Thanks for all the fish')
+
+    def test_linked_copy_is_unshared_before_writing(self):
+        """A linked copy shares the original until either is written to."""
+        fpath = os.path.join(self.source_path, 'orig')
+        with open(fpath, 'w') as f:
+            f.write('Thanks for all the fish')
+        os.chmod(fpath, 0o640)
+        mock_file = mock.MagicMock(path='orig', is_directory=False)
+        mock_new_file = mock.MagicMock(path='alt')
+        new_path = os.path.join(self.source_path, 'alt')
+
+        for flags, content in (('r+', 'So longfor all the fish'),
+                               ('a', 'Thanks for all the fish. So long'),
+                               ('w', 'So long')):
+            self.adapter.copy(self.mock_workspace, mock_file, mock_new_file,
+                              link=True)
+            self.assertTrue(os.path.samefile(fpath, new_path))
+            with self.adapter.open(self.mock_workspace, mock_new_file,
+                                   flags) as out:
+                out.write('So long' if flags != 'a' else '. So long')
+            self.assertFalse(os.path.samefile(fpath, new_path))
+            self.assertEqual(os.stat(new_path).st_mode & 0o777, 0o640)
+            with open(new_path) as f:
+                self.assertEqual(f.read(), content)
+            with open(fpath) as f:
+                self.assertEqual(f.read(), 'Thanks for all the fish')
+
     def test_move_file(self):
         """Move a file to a new path."""
         _, fpath = tempfile.mkstemp(dir=self.source_path)
@@ -180,6 +245,31 @@ class TestSimpleStorage(TestCase):
         with self.adapter.open(self.mock_workspace, mock_file) as f:
             self.assertEqual(f.read(), 'Thanks for all the fish')
 
+    def test_replace_content(self):
+        """Content is replaced in one step, or not at all."""
+        fpath = os.path.join(self.source_path, 'index.json')
+        with open(fpath, 'w') as f:
+            f.write('{"old": 1}')
+        mock_file = mock.MagicMock(path='index.json', is_directory=False,
+                                   is_ancillary=False, is_removed=False,
+                                   is_persisted=False, is_system=False)
+
+        with mock.patch('filemanager.services.storage.os.fsync') as m_fsync:
+            m_fsync.side_effect = OSError(28, 'No space left on device')
+            with self.assertRaises(OSError):
+                self.adapter.replace_content(self.mock_workspace, mock_file,
+                                             b'{"new": 2}')
+        with open(fpath) as f:
+            self.assertEqual(f.read(), '{"old": 1}', 'The old content is kept')
+        self.assertEqual(os.listdir(self.source_path), ['index.json'],
+                         'The partial content is cleaned up')
+
+        self.adapter.replace_content(self.mock_workspace, mock_file,
+                                     b'{"new": 2}')
+        with open(fpath) as f:
+            self.assertEqual(f.read(), '{"new": 2}')
+        self.assertEqual(os.listdir(self.source_path), ['index.json'])
+
     def test_create_file(self):
         """Create a new (empty) file."""
         mock_file = mock.MagicMock(path='foo.txt', is_directory=False)
@@ -583,3 +673,109 @@ class TestStorageWithWorkspace(TestCase):
                          f'{self.wks.source_path}/path/to/file'),
             'File path is inside workspace.'
         )
+
+    def test_stats_are_cached(self):
+        """Sizes are read once, until the file is changed."""
+        u_file = self.wks.create('main.tex')
+        with self.wks.open(u_file, 'w') as f:
+            f.write('Thanks for all the fish')
+        with mock.patch('filemanager.services.storage.os.stat',
+                        wraps=os.stat) as stat:
+            with self.wks.open(u_file) as f:
+                f.read()
+            self.assertEqual(u_file.size_bytes, 23)
+            self.assertEqual(self.wks.get_size_bytes(u_file), 23)
+            self.wks.get_last_modified(u_file)
+            self.assertEqual(stat.call_count, 0, 'Already known after write')
+
+            with self.wks.open(u_file, 'a') as f:
+                f.write('!')
+            self.assertEqual(self.wks.get_size_bytes(u_file), 24)
+            self.assertEqual(stat.call_count, 1)
+
+    def test_cache_stats(self):
+        """Everything under a directory can be stat'ed in one walk."""
+        for path in ('a.tex', 'figs/b.eps', 'figs/more/c.eps'):
+            with self.wks.open(self.wks.create(path), 'w') as f:
+                f.write(path)
+        self.adapter._stats.clear()
+        with mock.patch('filemanager.services.storage.os.stat',
+                        wraps=os.stat) as stat:
+            self.adapter.cache_stats(self.wks, 'figs')
+            self.assertEqual(
+                self.wks.get_size_bytes(self.wks.get('figs/more/c.eps')), 15
+            )
+            self.assertEqual(stat.call_count, 0)
+            self.assertEqual(self.wks.get_size_bytes(self.wks.get('a.tex')),
+                             5)
+            self.assertEqual(stat.call_count, 1, 'Not under the directory')
+
+
+class TestWorkspaceLock(TestCase):
+    """Test the workspace lock of a :class:`.SimpleStorageAdapter`."""
+
+    def setUp(self):
+        """We have a :class:`.SimpleStorageAdapter`."""
+        self.base_path = tempfile.mkdtemp()
+        self.adapter = SimpleStorageAdapter(self.base_path)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.base_path)
+
+    def hold_lock_elsewhere(self, upload_id):
+        """Hold the lock in another thread until the returned event is set."""
+        acquired, release = threading.Event(), threading.Event()
+
+        def hold():
+            with self.adapter.lock(upload_id):
+                acquired.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        acquired.wait()
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+        return release
+
+    def try_lock_elsewhere(self, upload_id):
+        """Try to acquire the lock in another thread, re-raising any error."""
+        errors = []
+
+        def attempt():
+            try:
+                with self.adapter.lock(upload_id):
+                    pass
+            except WorkspaceBusy as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=attempt)
+        thread.start()
+        thread.join()
+        if errors:
+            raise errors[0]
+
+    def test_lock_is_exclusive(self):
+        """Only one holder of the lock is allowed at a time."""
+        self.hold_lock_elsewhere(1)
+        with self.assertRaises(WorkspaceBusy):
+            with self.adapter.lock(1, timeout=0.1):
+                pass
+        with self.adapter.lock(2):  # Other workspaces are not affected.
+            pass
+
+    def test_lock_is_released(self):
+        """The lock can be acquired once the holder releases it."""
+        release = self.hold_lock_elsewhere(1)
+        release.set()
+        with self.adapter.lock(1, timeout=5):
+            pass
+
+    def test_lock_is_reentrant(self):
+        """The holder of the lock may acquire it again."""
+        with self.adapter.lock(1):
+            with self.adapter.lock(1):
+                pass
+            with self.assertRaises(WorkspaceBusy):
+                self.try_lock_elsewhere(1)
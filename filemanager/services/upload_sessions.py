@@ -0,0 +1,343 @@
+"""
+Stores the parts of resumable (chunked) uploads.
+
+A resumable upload session collects numbered chunks of a single file in the
+staging area of the storage volume, so that a client on a poor connection can
+retry or resume individual chunks rather than the whole file. When all of the
+chunks have arrived, they are assembled into a :class:`.StagedFile` that can be
+adopted by a workspace like any other upload.
+"""
+
+import io
+import os
+import json
+import shutil
+import tarfile
+import zlib
+from datetime import datetime
+from typing import Any, Dict, IO, Iterator, List, Optional, cast
+from uuid import uuid4
+
+from backports.datetime_fromisoformat import MonkeyPatch
+from dataclasses import dataclass, asdict, field
+from pytz import UTC
+
+from arxiv.base import logging
+from .storage import SimpleStorageAdapter, StagedFile
+
+logger = logging.getLogger(__name__)
+
+MonkeyPatch.patch_fromisoformat()
+
+SESSIONS_PATH = 'sessions'
+"""Path (relative to the staging area) where sessions are stored."""
+
+CHUNK_READ_SIZE = 64 * 1024
+"""Number of bytes to read at a time when copying chunks."""
+
+
+class SessionNotFound(Exception):
+    """There is no upload session with the requested identifier."""
+
+
+class ChunkChecksumMismatch(ValueError):
+    """The content of a chunk does not match the checksum sent with it."""
+
+
+class SessionIncomplete(ValueError):
+    """An upload session cannot be committed because chunks are missing."""
+
+
+@dataclass
+class Chunk:
+    """A part of a file in an upload session."""
+
+    index: int
+    """Position of the chunk in the file, starting at 0."""
+
+    size_bytes: int
+    """Size of the chunk in bytes."""
+
+    checksum: str
+    """URL-safe base64-encoded MD5 hash of the chunk content."""
+
+
+@dataclass
+class UploadSession:
+    """A file being uploaded in chunks."""
+
+    session_id: str
+    """Unique identifier for the session."""
+
+    path: str
+    """Absolute path to the directory in which the chunks are stored."""
+
+    owner_user_id: str
+    """ID of the user who created the session."""
+
+    filename: str
+    """Name of the file being uploaded."""
+
+    upload_id: Optional[int] = field(default=None)
+    """The workspace to which the file will be added; ``None`` if new."""
+
+    is_ancillary: bool = field(default=False)
+    """Whether the file is to be treated as an ancillary file."""
+
+    created_datetime: datetime = field(
+        default_factory=lambda: datetime.now(UTC)
+    )
+    """When the session was created."""
+
+    @property
+    def chunks(self) -> List[Chunk]:
+        """All of the chunks received so far, in order."""
+        chunks = []
+        for name in sorted(os.listdir(self.path)):
+            if not name.endswith('.md5'):
+                continue
+            index = int(name[:-len('.md5')])
+            with open(os.path.join(self.path, name)) as f:
+                checksum = f.read()
+            chunks.append(Chunk(index=index, checksum=checksum,
+                                size_bytes=os.path.getsize(
+                                    self._get_chunk_path(index)
+                                )))
+        return chunks
+
+    @property
+    def prefix(self) -> List[Chunk]:
+        """The chunks that form an unbroken run from the start of the file."""
+        prefix = []
+        for expected, chunk in enumerate(self.chunks):
+            if chunk.index != expected:
+                break
+            prefix.append(chunk)
+        return prefix
+
+    @property
+    def received_bytes(self) -> int:
+        """Total size of the chunks received so far."""
+        return sum(chunk.size_bytes for chunk in self.chunks)
+
+    @property
+    def is_complete(self) -> bool:
+        """Whether there are chunks, and no gaps between them."""
+        chunks = self.chunks
+        return bool(chunks) and len(self.prefix) == len(chunks)
+
+    def write_chunk(self, index: int, stream: IO[bytes],
+                    checksum: Optional[str] = None,
+                    max_bytes: Optional[int] = None) -> Chunk:
+        """
+        Store (or replace) the chunk at ``index``.
+
+        Parameters
+        ----------
+        index : int
+            Position of the chunk in the file.
+        stream : io.BufferedReader
+            Content of the chunk.
+        checksum : str or None
+            Expected URL-safe base64-encoded MD5 hash of the chunk.
+        max_bytes : int or None
+            Maximum total size of the file being uploaded.
+
+        Raises
+        ------
+        :class:`.ChunkChecksumMismatch`
+            If ``checksum`` does not match the content that was received.
+        :class:`.StagedFileTooLarge`
+            If the chunk would make the file larger than ``max_bytes``.
+
+        """
+        if max_bytes is not None:
+            max_bytes -= sum(chunk.size_bytes for chunk in self.chunks
+                             if chunk.index != index)
+        # Write to a temporary file first, so that a chunk is either
+        # complete or absent.
+        staged = StagedFile(open(os.path.join(self.path, f'.{uuid4().hex}'),
+                                 'wb'),
+                            max_bytes=max_bytes)
+        try:
+            for data in iter(lambda: stream.read(CHUNK_READ_SIZE), b''):
+                staged.write(data)
+            staged.close()
+            if checksum is not None and checksum != staged.checksum:
+                raise ChunkChecksumMismatch(f'Expected {checksum}, got'
+                                            f' {staged.checksum}')
+            os.replace(staged.path, self._get_chunk_path(index))
+            with open(self._get_chunk_path(index) + '.md5', 'w') as f:
+                f.write(staged.checksum)
+        finally:
+            staged.discard()
+        return Chunk(index=index, size_bytes=staged.size_bytes,
+                     checksum=staged.checksum)
+
+    def iter_prefix(self) -> Iterator[bytes]:
+        """Get the content of the unbroken run of chunks from the start."""
+        for chunk in self.prefix:
+            with open(self._get_chunk_path(chunk.index), 'rb') as f:
+                for data in iter(lambda: f.read(CHUNK_READ_SIZE), b''):
+                    yield data
+
+    def list_members(self) -> Optional[List[str]]:
+        """
+        List the members of a tar archive in the chunks received so far.
+
+        Only the unbroken run of chunks from the start of the file is read, so
+        that a client can see what has arrived before the upload is complete.
+        This reads (and decompresses) everything received so far, so it should
+        only be called when the client asks for it.
+
+        Returns
+        -------
+        list or None
+            Names of the complete members found so far, or ``None`` if the
+            file does not appear to be a tar archive.
+
+        """
+        members: List[str] = []
+        try:
+            reader = cast(IO[bytes], _IterReader(self.iter_prefix()))
+            with tarfile.open(fileobj=reader, mode='r|*') as tar:
+                for member in tar:
+                    members.append(member.name)
+        except tarfile.ReadError:
+            if not members:
+                return None
+        except (EOFError, zlib.error, tarfile.TarError):
+            pass    # The archive is truncated; it is still arriving.
+        return members
+
+    def assemble(self, staged: StagedFile) -> None:
+        """
+        Write the complete file to ``staged``.
+
+        Raises
+        ------
+        :class:`.SessionIncomplete`
+            If any chunks are missing.
+
+        """
+        if not self.is_complete:
+            raise SessionIncomplete(f'Missing chunks in {self.session_id}')
+        for data in self.iter_prefix():
+            staged.write(data)
+        staged.close()
+
+    def delete(self) -> None:
+        """Remove the session and all of its chunks."""
+        shutil.rmtree(self.path)
+
+    def _get_chunk_path(self, index: int) -> str:
+        return os.path.join(self.path, f'{index:08d}')
+
+
+class _IterReader(io.RawIOBase):
+    """A readable stream over an iterator of bytes."""
+
+    def __init__(self, iterable: Iterator[bytes]) -> None:
+        self._iterable = iterable
+        self._buffer = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._iterable)
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def create(adapter: SimpleStorageAdapter, owner_user_id: str, filename: str,
+           upload_id: Optional[int] = None,
+           is_ancillary: bool = False) -> UploadSession:
+    """Start a new upload session."""
+    session_id = uuid4().hex
+    session = UploadSession(
+        session_id=session_id,
+        path=adapter.get_staging_path(SESSIONS_PATH, session_id),
+        owner_user_id=owner_user_id,
+        filename=filename,
+        upload_id=upload_id,
+        is_ancillary=is_ancillary
+    )
+    os.makedirs(session.path)
+    with open(os.path.join(session.path, 'session.json'), 'w') as f:
+        json.dump(_to_dict(session), f)
+    logger.debug('Created upload session %s', session_id)
+    return session
+
+
+def retrieve(adapter: SimpleStorageAdapter, session_id: str) -> UploadSession:
+    """Get an existing upload session."""
+    if not session_id.isalnum():
+        raise SessionNotFound(session_id)
+    path = adapter.get_staging_path(SESSIONS_PATH, session_id)
+    try:
+        with open(os.path.join(path, 'session.json')) as f:
+            data: Dict[str, Any] = json.load(f)
+    except FileNotFoundError as e:
+        raise SessionNotFound(session_id) from e
+    # fromisoformat() is backported from 3.7.
+    data['created_datetime'] = datetime.fromisoformat(  # type: ignore
+        data['created_datetime']
+    )
+    return UploadSession(path=path, **data)
+
+
+def expire(adapter: SimpleStorageAdapter, before: datetime,
+           dry_run: bool = False) -> int:
+    """
+    Remove sessions that have not received a chunk since ``before``.
+
+    Clients that give up on an upload do not tell us, so their chunks would
+    otherwise stay in the staging area forever.
+
+    Parameters
+    ----------
+    adapter : :class:`.SimpleStorageAdapter`
+        Storage adapter with the staging area in which sessions are stored.
+    before : datetime
+        Sessions last written to before this time are removed.
+    dry_run : bool
+        If ``True``, only count the sessions that would be removed.
+
+    Returns
+    -------
+    int
+        Number of sessions removed (or that would be removed).
+
+    """
+    path = adapter.get_staging_path(SESSIONS_PATH)
+    try:
+        entries = list(os.scandir(path))
+    except FileNotFoundError:
+        return 0
+    expired = 0
+    for entry in entries:
+        if not entry.is_dir(follow_symlinks=False):
+            continue
+        # Writing a chunk creates and renames files in the session directory.
+        last_active = datetime.fromtimestamp(entry.stat().st_mtime, tz=UTC)
+        if last_active >= before:
+            continue
+        expired += 1
+        if not dry_run:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            logger.debug('Expired upload session %s', entry.name)
+    return expired
+
+
+def _to_dict(session: UploadSession) -> Dict[str, Any]:
+    data = asdict(session)
+    data.pop('path')
+    data['created_datetime'] = session.created_datetime.isoformat()
+    return data
@@ -0,0 +1,17 @@
+"""
+Entry-point for the upload processing worker.
+
+Start the worker with::
+
+    celery -A filemanager.worker worker
+
+The worker must be able to reach the same storage volumes and database as the
+web application.
+"""
+
+from .factory import create_web_app
+from .services import jobs
+
+app = create_web_app()
+jobs.init_worker(app)
+celery_app = jobs.celery_app
@@ -10,6 +10,12 @@ from filemanager.factory import create_web_app
 app = create_web_app()
 app.app_context().push()
 
+DEFAULT_SCOPE = ('upload:read,upload:update,upload:delete,'
+                 'upload:delete_workspace,upload:create_checkpoint,'
+                 'upload:read_checkpoints,upload:restore_checkpoint,'
+                 'upload:delete_checkpoint,upload:release,upload:read_logs')
+"""Scopes for all of the file management API, for the workspace owner."""
+
 
 @app.cli.command()
 @click.option('--user_id', prompt='Numeric user ID')
@@ -29,7 +35,7 @@ app.app_context().push()
 @click.option('--endorsements', prompt='Endorsement categories (comma delim)',
               default='astro-ph.CO,astro-ph.GA')
 @click.option('--scope', prompt='Authorization scope (comma delim)',
-              default='upload:read,upload:write,upload:admin')
+              default=DEFAULT_SCOPE)
 def generate_token(user_id: str, email: str, username: str,
                    first_name: str = 'Jane', last_name: str = 'Doe',
                    suffix_name: str = 'IV',
@@ -39,7 +45,7 @@ def generate_token(user_id: str, email: str, username: str,
                    default_category: str = 'astro-ph.GA',
                    submission_groups: str = 'grp_physics',
                    endorsements: str = 'astro-ph.CO,astro-ph.GA',
-                   scope: str = 'upload:read,upload:write,upload:admin') \
+                   scope: str = DEFAULT_SCOPE) \
         -> None:
     """
     Generate a custom auth token given parameters.
@@ -73,6 +79,27 @@ def generate_token(user_id: str, email: str, username: str,
     scope : str
         Comma separated list of scope permissions for this token owner.
 
+    """
+    click.echo(create_token(app.config['JWT_SECRET'], user_id, email,
+                            username, first_name, last_name, suffix_name,
+                            affiliation, rank, country, default_category,
+                            submission_groups, endorsements, scope))
+
+
+def create_token(secret: str, user_id: str, email: str, username: str,
+                 first_name: str = 'Jane', last_name: str = 'Doe',
+                 suffix_name: str = 'IV',
+                 affiliation: str = 'Cornell University',
+                 rank: int = 3,
+                 country: str = 'us',
+                 default_category: str = 'astro-ph.GA',
+                 submission_groups: str = 'grp_physics',
+                 endorsements: str = 'astro-ph.CO,astro-ph.GA',
+                 scope: str = DEFAULT_SCOPE) -> str:
+    """
+    Create an auth token signed with ``secret``.
+
+    See :func:`generate_token` for the meaning of the other parameters.
     """
     # Specify the validity period for the session.
     start = datetime.now(tz=UTC)
@@ -96,13 +123,14 @@ def generate_token(user_id: str, email: str, username: str,
             )
         ),
         authorizations=domain.Authorizations(
-            scopes=[scope.split(',')],
+            scopes=[domain.Scope(*name.split(':'))
+                    for name in scope.split(',')],
             endorsements=[domain.Category(cat.split('.', 1))
                           for cat in endorsements.split(',')]
         )
     )
-    token = auth.tokens.encode(session, app.config['JWT_SECRET'])
-    click.echo(token)
+    token: str = auth.tokens.encode(session, secret)
+    return token
 
 
 if __name__ == '__main__':
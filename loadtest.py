@@ -0,0 +1,285 @@
+"""
+Load tests the file manager API with realistic submissions.
+
+Each simulated client runs a session that exercises the API in the way that
+the submission UI does: it uploads a generated submission, polls the workspace
+summary, downloads a file and the whole source package, creates a checkpoint,
+deletes a file, and finally deletes the workspace. Requests are authorized
+with JWTs made by :func:`generate_token.create_token`.
+
+By default the app is run in-process by ``--workers`` processes (like the
+uWSGI workers in production), with SQLite and a temporary directory standing
+in for the database and the storage volume::
+
+    python loadtest.py --workers 8 --sessions 20 --files 200
+
+To test a running service instead, pass its base URL and the JWT secret that
+it uses::
+
+    python loadtest.py --url http://localhost:8000 --secret foosecret
+
+Latency percentiles and throughput are reported for each endpoint, and can
+also be written as JSON with ``--output``.
+"""
+
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import click
+from pytz import UTC
+
+API = '/filemanager/api'
+
+Sample = Tuple[str, int, float]
+"""An endpoint (as a route template), response status, and seconds taken."""
+
+Client = Callable[..., Tuple[int, bytes]]
+"""Makes a request, and gets the response status and body."""
+
+
+def make_submission(n_files: int, figure_bytes: int) -> bytes:
+    """
+    Generate a gzipped tarball that looks like a typical TeX submission.
+
+    There is a main TeX file that inputs a section file for each ten or so
+    files, with EPS figures and a ``.bbl`` file alongside.
+    """
+    members: Dict[str, bytes] = {}
+    n_sections = max(1, n_files // 10)
+    n_figures = max(0, n_files - n_sections - 2)
+    sections = []
+    for i in range(n_sections):
+        sections.append(f'\\input{{sections/sec{i}}}')
+        figures = ''.join(
+            f'\\includegraphics{{figures/fig{j}.eps}}\n'
+            for j in range(i, n_figures, n_sections)
+        )
+        members[f'sections/sec{i}.tex'] = (
+            f'\\section{{Section {i}}}\nSome text \\cite{{ref{i}}}.\n'
+            f'{figures}' + 'More text about the results.\n' * 50
+        ).encode()
+    header = b'%!PS-Adobe-3.0 EPSF-3.0\n%%BoundingBox: 0 0 100 100\n'
+    line = b'0 0 moveto 100 100 lineto stroke\n'
+    for j in range(n_figures):
+        members[f'figures/fig{j}.eps'] = \
+            header + line * max(1, (figure_bytes - len(header)) // len(line))
+    members['main.bbl'] = b''.join(
+        f'\\bibitem{{ref{i}}} A. Author, Title {i}.\n'.encode()
+        for i in range(n_sections)
+    )
+    members['main.tex'] = (
+        '\\documentclass{article}\n\\usepackage{graphicx}\n'
+        '\\begin{document}\n' + '\n'.join(sections)
+        + '\n\\bibliographystyle{plain}\n\\bibliography{refs}\n'
+        '\\end{document}\n'
+    ).encode()
+
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def run_session(request: Client, submission: bytes,
+                poll: int) -> List[Sample]:
+    """Run one client session against the API, timing each request."""
+    samples: List[Sample] = []
+
+    def timed(endpoint: str, method: str, path: str, **kwargs: Any) \
+            -> Tuple[int, bytes]:
+        start = time.monotonic()
+        status_code, body = request(method, path, **kwargs)
+        samples.append((f'{method} {endpoint}', status_code,
+                        time.monotonic() - start))
+        return status_code, body
+
+    status_code, body = timed('/', 'POST', f'{API}/',
+                              files={'file': ('submission.tar.gz',
+                                              submission)})
+    if status_code != 201:
+        return samples
+    upload_id = json.loads(body)['upload_id']
+    base = f'{API}/{upload_id}'
+
+    summary: Dict[str, Any] = {}
+    for _ in range(poll):
+        status_code, body = timed('/{upload_id}', 'GET', base)
+        if status_code == 200:
+            summary = json.loads(body)
+    files = [f['public_filepath'] for f in summary.get('files', [])]
+    if files:
+        timed('/{upload_id}/{file}/content', 'GET',
+              f'{base}/{files[0]}/content')
+    timed('/{upload_id}/content', 'GET', f'{base}/content')
+    timed('/{upload_id}/checkpoint', 'POST', f'{base}/checkpoint')
+    if files:
+        timed('/{upload_id}/{file}', 'DELETE', f'{base}/{files[-1]}')
+    timed('/{upload_id}', 'DELETE', base)
+    return samples
+
+
+def _in_process_client(token: str) -> Client:
+    """Make requests against an app in this process."""
+    from filemanager.factory import create_web_app
+    client = create_web_app().test_client()
+
+    def request(method: str, path: str, files: Optional[dict] = None) \
+            -> Tuple[int, bytes]:
+        kwargs: Dict[str, Any] = {'headers': {'Authorization': token}}
+        if files:
+            kwargs['content_type'] = 'multipart/form-data'
+            kwargs['data'] = {name: (io.BytesIO(content), filename)
+                              for name, (filename, content) in files.items()}
+        response = client.open(path, method=method, **kwargs)
+        return response.status_code, response.get_data()
+    return request
+
+
+def _remote_client(url: str, token: str) -> Client:
+    """Make requests against a running service."""
+    import requests
+    session = requests.Session()
+    session.headers['Authorization'] = token
+
+    def request(method: str, path: str, files: Optional[dict] = None) \
+            -> Tuple[int, bytes]:
+        response = session.request(method, url.rstrip('/') + path,
+                                   files=files)
+        return response.status_code, response.content
+    return request
+
+
+def _worker(args: Tuple[int, Optional[str], str, int, bytes, int]) \
+        -> List[Sample]:
+    index, url, secret, sessions, submission, poll = args
+    from generate_token import create_token
+    token = create_token(secret, str(1000 + index),
+                         f'loadtest{index}@example.com', f'loadtest{index}')
+    request = _remote_client(url, token) if url \
+        else _in_process_client(token)
+    samples: List[Sample] = []
+    for _ in range(sessions):
+        samples.extend(run_session(request, submission, poll))
+    return samples
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(samples: List[Sample], elapsed: float) \
+        -> Dict[str, Dict[str, Any]]:
+    """Get latency percentiles and throughput for each endpoint."""
+    by_endpoint: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+    for endpoint, status_code, seconds in samples:
+        by_endpoint[endpoint].append((status_code, seconds))
+    summary = {}
+    for endpoint, results in by_endpoint.items():
+        latencies = sorted(seconds for _, seconds in results)
+        statuses: Dict[int, int] = defaultdict(int)
+        for status_code, _ in results:
+            statuses[status_code] += 1
+        summary[endpoint] = {
+            'count': len(results),
+            'errors': sum(1 for code, _ in results if code >= 400),
+            'statuses': dict(statuses),
+            'p50': _percentile(latencies, 0.5),
+            'p90': _percentile(latencies, 0.9),
+            'p99': _percentile(latencies, 0.99),
+            'max': latencies[-1],
+            'per_second': len(results) / elapsed
+        }
+    return summary
+
+
+@click.command()
+@click.option('--url', default=None,
+              help='Base URL of a running service (default: in-process).')
+@click.option('--secret', default='foosecret', show_default=True,
+              help='Secret used to sign JWTs.')
+@click.option('--workers', type=int, default=8, show_default=True,
+              help='Concurrent clients, each in its own process.')
+@click.option('--sessions', type=int, default=5, show_default=True,
+              help='Sessions run by each client.')
+@click.option('--files', type=int, default=50, show_default=True,
+              help='Files in each generated submission.')
+@click.option('--figure-bytes', type=int, default=64 * 1024,
+              show_default=True, help='Size of each generated figure.')
+@click.option('--poll', type=int, default=3, show_default=True,
+              help='Times each session gets the workspace summary.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False),
+              default=None, help='Also write the results as JSON.')
+def loadtest(url: Optional[str], secret: str, workers: int, sessions: int,
+             files: int, figure_bytes: int, poll: int,
+             output: Optional[str]) -> None:
+    """Run concurrent client sessions, and report on each endpoint."""
+    workdir: Optional[str] = None
+    if not url:
+        # Config is read from the environment when the app is imported, so
+        # these must be set before the workers start.
+        workdir = tempfile.mkdtemp()
+        os.environ['SQLALCHEMY_DATABASE_URI'] = \
+            f'sqlite:///{os.path.join(workdir, "loadtest.db")}'
+        os.environ['STORAGE_BASE_PATH'] = os.path.join(workdir, 'storage')
+        os.environ['JWT_SECRET'] = secret
+        os.makedirs(os.environ['STORAGE_BASE_PATH'])
+        from filemanager.factory import create_web_app
+        from filemanager.services import database
+        with create_web_app().app_context():
+            database.db.create_all()
+
+    submission = make_submission(files, figure_bytes)
+    click.echo(f'{workers} clients x {sessions} sessions, submission of'
+               f' {files} files ({len(submission)} bytes)')
+    try:
+        start = time.monotonic()
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(_worker, [
+                (index, url, secret, sessions, submission, poll)
+                for index in range(workers)
+            ])
+        elapsed = time.monotonic() - start
+    finally:
+        if workdir is not None:
+            shutil.rmtree(workdir)
+
+    summary = summarize([s for samples in results for s in samples], elapsed)
+    click.echo(f'{"endpoint":36} {"count":>6} {"errors":>6} {"p50":>8}'
+               f' {"p90":>8} {"p99":>8} {"max":>8} {"req/s":>7}')
+    for endpoint, stats in summary.items():
+        click.echo(f'{endpoint:36} {stats["count"]:6} {stats["errors"]:6}'
+                   + ''.join(f' {stats[p] * 1000:6.0f}ms'
+                             for p in ('p50', 'p90', 'p99', 'max'))
+                   + f' {stats["per_second"]:7.2f}')
+    click.echo(f'Total: {elapsed:.1f}s')
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump({
+                'created': datetime.now(UTC).isoformat(),
+                'params': {'url': url, 'workers': workers,
+                           'sessions': sessions, 'files': files,
+                           'figure_bytes': figure_bytes, 'poll': poll},
+                'elapsed_seconds': elapsed,
+                'endpoints': summary
+            }, f, indent=2)
+    if any(stats['errors'] for stats in summary.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    loadtest()
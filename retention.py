@@ -0,0 +1,59 @@
+"""
+Removes content from the storage volume according to the retention policy.
+
+Meant to be run periodically (e.g. as a cron job) with the same configuration
+as the application; see :mod:`filemanager.controllers.retention`. Settings of
+the policy can be overridden with options::
+
+    python retention.py --dry-run
+    python retention.py --removed-days 7 --checkpoint-bytes 104857600
+
+The report is written to stdout as JSON.
+"""
+
+import json
+from typing import Any, Optional
+
+import click
+
+from filemanager.factory import create_web_app
+from filemanager.controllers import retention
+
+
+@click.command()
+@click.option('--dry-run', is_flag=True,
+              help='Report what would be removed, without removing it.')
+@click.option('--removed-days', type=int,
+              help='Days for which removed files are kept.')
+@click.option('--released-days', type=int,
+              help='Days for which released workspaces are kept.')
+@click.option('--checkpoint-bytes', type=int,
+              help='Most bytes that the checkpoints of a workspace may use.')
+@click.option('--deleted-log-days', type=int,
+              help='Days for which the logs of deleted workspaces are kept.')
+@click.option('--staging-hours', type=float,
+              help='Hours for which idle upload sessions are kept.')
+@click.option('--batch-size', type=int,
+              help='Workspaces to retrieve from the database at a time.')
+@click.option('--batch-delay', type=float,
+              help='Seconds to wait between batches.')
+@click.option('--after', type=int, default=0, show_default=True,
+              help='Only visit workspaces with ids greater than this.')
+@click.option('--limit', type=int,
+              help='The most workspaces to visit (default: all).')
+def collect(dry_run: bool, after: int, limit: Optional[int],
+            **overrides: Any) -> None:
+    """Collect garbage according to the configured retention policy."""
+    app = create_web_app()
+    with app.app_context():
+        policy = retention.RetentionPolicy.from_config(app.config)
+        for name, value in overrides.items():
+            if value is not None:
+                setattr(policy, name, value)
+        report = retention.collect_garbage(policy, dry_run=dry_run,
+                                           after=after, limit=limit)
+    click.echo(json.dumps(report.to_dict(), indent=2))
+
+
+if __name__ == '__main__':
+    collect()
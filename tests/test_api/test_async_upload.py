@@ -0,0 +1,155 @@
+"""Tests for asynchronous upload processing."""
+
+import os
+import json
+import shutil
+import tempfile
+import threading
+from http import HTTPStatus as status
+from unittest import TestCase, mock
+
+from celery.exceptions import Retry
+
+from arxiv.users import auth
+
+from filemanager.controllers import upload
+from filemanager.domain import Workspace
+from filemanager.factory import create_web_app
+from filemanager.services import database, jobs, storage
+
+from .util import generate_token
+
+
+class TestAsyncUpload(TestCase):
+    """Clients can ask for uploads to be processed after responding."""
+
+    DATA_PATH = os.path.join(os.path.split(os.path.abspath(__file__))[0], '..')
+
+    def setUp(self) -> None:
+        """Initialize the Flask application, and get a client for testing."""
+        self.workdir = tempfile.mkdtemp()
+        self.app = create_web_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['SERVER_NAME'] = 'fooserver.localdomain'
+        self.app.config['STORAGE_BASE_PATH'] = self.workdir
+        jobs.celery_app.conf.task_always_eager = True
+
+        os.environ['JWT_SECRET'] = self.app.config.get('JWT_SECRET')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            database.db.create_all()
+
+        self.token = generate_token(self.app, [auth.scopes.READ_UPLOAD,
+                                               auth.scopes.WRITE_UPLOAD])
+
+    def tearDown(self):
+        """Remove the temporary directory for files."""
+        jobs.celery_app.conf.task_always_eager = False
+        shutil.rmtree(self.workdir)
+
+    def upload(self):
+        filepath = os.path.join(self.DATA_PATH,
+                                'test_files_upload/upload2.tar.gz')
+        return self.client.post(
+            '/filemanager/api/',
+            data={'file': (open(filepath, 'rb'),
+                           os.path.basename(filepath)),},
+            headers={'Authorization': self.token,
+                     'Prefer': 'respond-async'},
+            content_type='multipart/form-data'
+        )
+
+    def get_job(self, location: str) -> dict:
+        response = self.client.get(location,
+                                   headers={'Authorization': self.token})
+        self.assertEqual(response.status_code, status.OK)
+        return json.loads(response.data)
+
+    def test_upload_async(self):
+        """The upload is accepted, and processed by a worker."""
+        response = self.upload()
+        self.assertEqual(response.status_code, status.ACCEPTED)
+        self.assertEqual(response.headers['Preference-Applied'],
+                         'respond-async')
+        data = json.loads(response.data)
+        self.assertIn('job_id', data)
+
+        job = self.get_job(response.headers['Location'])
+        self.assertEqual(job['stage'], 'COMPLETED')
+
+        response = self.client.get(f'/filemanager/api/{job["upload_id"]}',
+                                   headers={'Authorization': self.token})
+        files = [f['name'] for f in json.loads(response.data)['files']]
+        self.assertIn('main_a.tex', files)
+
+    def test_queued(self):
+        """Progress can be polled while the job waits for a worker."""
+        with mock.patch.object(upload.process_upload, 'delay') as m_delay:
+            response = self.upload()
+        location = response.headers['Location']
+        self.assertEqual(self.get_job(location)['stage'], 'QUEUED')
+
+        # This is what the worker does with the task.
+        with self.app.app_context():
+            upload.process_upload(*m_delay.call_args[0])
+        self.assertEqual(self.get_job(location)['stage'], 'COMPLETED')
+
+    def hold_lock(self, upload_id: int) -> threading.Event:
+        """Hold the workspace lock, as another process would."""
+        acquired, release = threading.Event(), threading.Event()
+
+        def hold():
+            with self.app.app_context():
+                adapter = storage.create_adapter(self.app)
+            with adapter.lock(upload_id):
+                acquired.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        acquired.wait()
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+        return release
+
+    def test_busy(self):
+        """A job whose workspace is busy is retried, rather than failed."""
+        self.app.config['WORKSPACE_LOCK_TIMEOUT'] = 0
+        with mock.patch.object(upload.process_upload, 'delay') as m_delay:
+            response = self.upload()
+        location = response.headers['Location']
+        self.hold_lock(m_delay.call_args[0][0])
+
+        with self.app.app_context(), \
+                mock.patch.object(upload.process_upload, 'retry') as m_retry:
+            m_retry.side_effect = Retry()
+            with self.assertRaises(Retry):
+                upload.process_upload(*m_delay.call_args[0])
+        self.assertEqual(m_retry.call_args[1]['countdown'],
+                         self.app.config['UPLOAD_JOB_RETRY_DELAY'])
+        self.assertEqual(self.get_job(location)['stage'], 'QUEUED')
+
+        self.app.config['UPLOAD_JOB_RETRIES'] = 0
+        with self.app.app_context():
+            upload.process_upload(*m_delay.call_args[0])
+        self.assertEqual(self.get_job(location)['stage'], 'FAILED',
+                         'Out of retries')
+
+    def test_failure(self):
+        """A failure in the worker is reported on the job."""
+        with mock.patch.object(Workspace, 'perform_checks') as m_checks:
+            m_checks.side_effect = RuntimeError('Something went wrong')
+            response = self.upload()
+        self.assertEqual(response.status_code, status.ACCEPTED)
+
+        job = self.get_job(response.headers['Location'])
+        self.assertEqual(job['stage'], 'FAILED')
+        self.assertEqual(job['reason'], 'Something went wrong')
+
+    def test_no_such_job(self):
+        """A job that does not exist is not found."""
+        response = self.upload()
+        upload_id = json.loads(response.data)['upload_id']
+        response = self.client.get(f'/filemanager/api/{upload_id}/job/foo',
+                                   headers={'Authorization': self.token})
+        self.assertEqual(response.status_code, status.NOT_FOUND)
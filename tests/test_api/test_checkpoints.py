@@ -227,6 +227,26 @@ class TestCheckpoints(TestCase):
 
         self.assertEqual(len(checkpoints), 3,
                          "So far we've created three checkpoints.")
+        self.assertEqual(upload_data['total'], 3)
+
+        # List a page of checkpoints, newest first
+        response = self.client.get(
+            f"/filemanager/api/{upload_data['upload_id']}/list_checkpoints"
+            "?sort=created&order=desc&offset=1&limit=1",
+            headers={'Authorization': checkpoint_token}
+        )
+        self.assertEqual(response.status_code, status.OK)
+        page = json.loads(response.data)
+        self.assertEqual(page['total'], 3)
+        self.assertEqual([item['checksum'] for item in page['checkpoints']],
+                         [checkpoints[1]['checksum']])
+
+        response = self.client.get(
+            f"/filemanager/api/{upload_data['upload_id']}/list_checkpoints"
+            "?sort=color",
+            headers={'Authorization': checkpoint_token}
+        )
+        self.assertEqual(response.status_code, status.BAD_REQUEST)
 
         # Locate the first checkpoint
         for item in checkpoints:
@@ -271,7 +291,8 @@ class TestCheckpoints(TestCase):
             headers={'Authorization': checkpoint_token}
         )
         self.assertEqual(response.status_code, status.OK)
-        self.assertIn('ETag', response.headers, "Returns an ETag header")
+        self.assertEqual(response.headers['ETag'], checkpoint_checksum,
+                         "Returns an ETag header, like the other routes")
 
         workdir = tempfile.mkdtemp()
         with tarfile.open(fileobj=BytesIO(response.data)) as tar:
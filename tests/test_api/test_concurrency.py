@@ -0,0 +1,98 @@
+"""Tests for concurrent requests that modify the same workspace."""
+
+import os
+import json
+import shutil
+import tempfile
+import threading
+from http import HTTPStatus as status
+from unittest import TestCase
+
+from arxiv.users import auth
+
+from filemanager.factory import create_web_app
+from filemanager.services import database, storage
+
+from .util import generate_token
+
+
+class TestWorkspaceLocking(TestCase):
+    """Requests that modify a workspace hold an exclusive lock on it."""
+
+    DATA_PATH = os.path.join(os.path.split(os.path.abspath(__file__))[0], '..')
+
+    def setUp(self) -> None:
+        """Initialize the Flask application, and get a client for testing."""
+        self.workdir = tempfile.mkdtemp()
+        self.app = create_web_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['SERVER_NAME'] = 'fooserver.localdomain'
+        self.app.config['STORAGE_BASE_PATH'] = self.workdir
+        self.app.config['WORKSPACE_LOCK_TIMEOUT'] = 0
+
+        os.environ['JWT_SECRET'] = self.app.config.get('JWT_SECRET')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            database.db.create_all()
+
+        self.token = generate_token(self.app, [auth.scopes.READ_UPLOAD,
+                                               auth.scopes.WRITE_UPLOAD])
+
+        filepath = os.path.join(self.DATA_PATH,
+                                'test_files_upload/upload2.tar.gz')
+        response = self.client.post(
+            '/filemanager/api/',
+            data={'file': (open(filepath, 'rb'),
+                           os.path.basename(filepath)),},
+            headers={'Authorization': self.token},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(response.status_code, status.CREATED)
+        self.upload_id = json.loads(response.data)['upload_id']
+
+    def tearDown(self):
+        """Remove the temporary directory for files."""
+        shutil.rmtree(self.workdir)
+
+    def hold_lock(self) -> threading.Event:
+        """Hold the workspace lock, as another process would."""
+        acquired, release = threading.Event(), threading.Event()
+
+        def hold():
+            with self.app.app_context():
+                adapter = storage.create_adapter(self.app)
+            with adapter.lock(self.upload_id):
+                acquired.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        acquired.wait()
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+        return release
+
+    def test_modify_busy_workspace(self):
+        """A workspace cannot be modified while another request holds it."""
+        release = self.hold_lock()
+        response = self.client.post(f'/filemanager/api/{self.upload_id}/lock',
+                                    headers={'Authorization': self.token})
+        self.assertEqual(response.status_code, status.CONFLICT)
+        self.assertIn('reason', json.loads(response.data))
+
+        release.set()
+        response = self.client.post(f'/filemanager/api/{self.upload_id}/lock',
+                                    headers={'Authorization': self.token})
+        self.assertEqual(response.status_code, status.OK)
+
+    def test_read_busy_workspace(self):
+        """Reads do not wait for the lock."""
+        self.hold_lock()
+        response = self.client.get(f'/filemanager/api/{self.upload_id}',
+                                   headers={'Authorization': self.token})
+        self.assertEqual(response.status_code, status.OK)
+        response = self.client.get(
+            f'/filemanager/api/{self.upload_id}/content',
+            headers={'Authorization': self.token}
+        )
+        self.assertEqual(response.status_code, status.OK)
@@ -0,0 +1,140 @@
+"""Tests for conditional GET requests on content routes."""
+
+import os
+import io
+import json
+import shutil
+import tempfile
+from unittest import TestCase, mock
+from http import HTTPStatus as status
+
+from arxiv.users import auth
+
+from filemanager.factory import create_web_app
+from filemanager.services import database
+from filemanager.services.storage import SimpleStorageAdapter
+
+from .util import generate_token
+
+
+class TestConditionalRequests(TestCase):
+    """Clients can avoid re-downloading content that has not changed."""
+
+    DATA_PATH = os.path.join(os.path.split(os.path.abspath(__file__))[0], '..')
+
+    def setUp(self) -> None:
+        """Initialize the Flask application, and get a client for testing."""
+        self.workdir = tempfile.mkdtemp()
+        self.app = create_web_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['SERVER_NAME'] = 'fooserver.localdomain'
+        self.app.config['STORAGE_BASE_PATH'] = self.workdir
+
+        os.environ['JWT_SECRET'] = self.app.config.get('JWT_SECRET')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            database.db.create_all()
+
+        self.token = generate_token(self.app, [auth.scopes.READ_UPLOAD,
+                                               auth.scopes.WRITE_UPLOAD,
+                                               auth.scopes.READ_UPLOAD_LOGS])
+
+        filepath = os.path.join(self.DATA_PATH,
+                                'test_files_upload/upload2.tar.gz')
+        response = self.client.post(
+            '/filemanager/api/',
+            data={'file': (open(filepath, 'rb'),
+                           os.path.basename(filepath)),},
+            headers={'Authorization': self.token},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(response.status_code, status.CREATED)
+        self.upload_id = json.loads(response.data)['upload_id']
+
+    def tearDown(self):
+        """Remove the temporary directory for files."""
+        shutil.rmtree(self.workdir)
+
+    def assert_not_modified(self, path: str) -> None:
+        """The resource at ``path`` supports ``If-None-Match``."""
+        response = self.client.get(path,
+                                   headers={'Authorization': self.token})
+        self.assertEqual(response.status_code, status.OK)
+        etag = response.headers['ETag']
+
+        with mock.patch.object(SimpleStorageAdapter, 'open_pointer') as m_open:
+            response = self.client.get(path, headers={
+                'Authorization': self.token,
+                'If-None-Match': etag
+            })
+        self.assertEqual(response.status_code, status.NOT_MODIFIED)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertFalse(m_open.called, 'Content is not opened')
+
+        response = self.client.get(path, headers={
+            'Authorization': self.token,
+            'If-None-Match': 'nope'
+        })
+        self.assertEqual(response.status_code, status.OK)
+
+    def test_source_package(self):
+        """The source package supports conditional requests."""
+        self.assert_not_modified(f'/filemanager/api/{self.upload_id}/content')
+
+    def test_file_content(self):
+        """Individual files support conditional requests."""
+        self.assert_not_modified(
+            f'/filemanager/api/{self.upload_id}/main_a.tex/content'
+        )
+
+    def test_source_log(self):
+        """The source log supports conditional requests."""
+        self.assert_not_modified(f'/filemanager/api/{self.upload_id}/log')
+
+    def test_if_modified_since(self):
+        """``If-Modified-Since`` is supported, too."""
+        path = f'/filemanager/api/{self.upload_id}/main_a.tex/content'
+        response = self.client.get(path,
+                                   headers={'Authorization': self.token})
+        last_modified = response.headers['Last-Modified']
+
+        response = self.client.get(path, headers={
+            'Authorization': self.token,
+            'If-Modified-Since': last_modified
+        })
+        self.assertEqual(response.status_code, status.NOT_MODIFIED)
+
+        response = self.client.get(path, headers={
+            'Authorization': self.token,
+            'If-Modified-Since': 'Thu, 01 Jan 1970 00:00:00 GMT'
+        })
+        self.assertEqual(response.status_code, status.OK)
+
+    def test_upload_summary(self):
+        """The summary changes when the state of the workspace changes."""
+        path = f'/filemanager/api/{self.upload_id}'
+        response = self.client.get(path,
+                                   headers={'Authorization': self.token})
+        etag = response.headers['ETag']
+
+        with mock.patch('filemanager.controllers.upload.transform_workspace')\
+                as m_transform:
+            response = self.client.get(path, headers={
+                'Authorization': self.token,
+                'If-None-Match': etag
+            })
+        self.assertEqual(response.status_code, status.NOT_MODIFIED)
+        self.assertFalse(m_transform.called, 'Summary is not generated')
+
+        response = self.client.post(f'{path}/lock',
+                                    headers={'Authorization': self.token})
+        self.assertEqual(response.status_code, status.OK)
+
+        response = self.client.get(path, headers={
+            'Authorization': self.token,
+            'If-None-Match': etag
+        })
+        self.assertEqual(response.status_code, status.OK)
+        self.assertEqual(json.loads(response.data)['lock_state'], 'LOCKED')
+        self.assertNotEqual(response.headers['ETag'], etag)
@@ -0,0 +1,79 @@
+"""Tests for retrieving the dependency graph of a workspace."""
+
+import os
+import json
+import shutil
+import tempfile
+from http import HTTPStatus as status
+from unittest import TestCase
+
+from arxiv.users import auth
+
+from filemanager.factory import create_web_app
+from filemanager.services import database
+
+from .util import generate_token
+
+
+class TestDependencies(TestCase):
+    """Clients can see which files each TeX source file uses."""
+
+    DATA_PATH = os.path.join(os.path.split(os.path.abspath(__file__))[0], '..')
+
+    def setUp(self) -> None:
+        """Initialize the Flask application, and upload some files."""
+        self.workdir = tempfile.mkdtemp()
+        self.app = create_web_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['SERVER_NAME'] = 'fooserver.localdomain'
+        self.app.config['STORAGE_BASE_PATH'] = self.workdir
+
+        os.environ['JWT_SECRET'] = self.app.config.get('JWT_SECRET')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            database.db.create_all()
+
+        self.token = generate_token(self.app, [auth.scopes.READ_UPLOAD,
+                                               auth.scopes.WRITE_UPLOAD])
+
+        filepath = os.path.join(self.DATA_PATH,
+                                'test_files_upload/upload2.tar.gz')
+        response = self.client.post(
+            '/filemanager/api/',
+            data={'file': (open(filepath, 'rb'),
+                           os.path.basename(filepath)),},
+            headers={'Authorization': self.token},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(response.status_code, status.CREATED)
+        self.upload_id = json.loads(response.data)['upload_id']
+
+    def tearDown(self):
+        """Remove the temporary directory for files."""
+        shutil.rmtree(self.workdir)
+
+    def test_get_dependencies(self):
+        """The main file depends on its class file and bibliography."""
+        response = self.client.get(
+            f'/filemanager/api/{self.upload_id}/dependencies',
+            headers={'Authorization': self.token}
+        )
+        self.assertEqual(response.status_code, status.OK)
+        data = json.loads(response.data)
+        self.assertEqual(data['dependencies'],
+                         {'main_a.tex': ['gtart_a.cls', 'main_a.bbl']})
+        self.assertEqual(data['unresolved'], [])
+        self.assertEqual(data['unreferenced'], ['00README.XXX'])
+
+        response = self.client.get(
+            f'/filemanager/api/{self.upload_id}/dependencies',
+            headers={'Authorization': self.token,
+                     'If-None-Match': response.headers['ETag']}
+        )
+        self.assertEqual(response.status_code, status.NOT_MODIFIED)
+
+    def test_no_such_workspace(self):
+        """Returns 404 for a workspace that does not exist."""
+        response = self.client.get('/filemanager/api/999999/dependencies',
+                                   headers={'Authorization': self.token})
+        self.assertEqual(response.status_code, status.NOT_FOUND)
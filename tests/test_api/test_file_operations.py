@@ -0,0 +1,171 @@
+"""Tests for deleting and renaming several files in one request."""
+
+import os
+import json
+import shutil
+import tempfile
+from http import HTTPStatus as status
+from unittest import TestCase, mock
+
+from arxiv.users import auth
+
+from filemanager.domain import Workspace
+from filemanager.factory import create_web_app
+from filemanager.services import database
+
+from .util import generate_token
+
+
+class TestFileOperations(TestCase):
+    """Clients can apply a list of deletes and renames to a workspace."""
+
+    DATA_PATH = os.path.join(os.path.split(os.path.abspath(__file__))[0], '..')
+
+    def setUp(self) -> None:
+        """Initialize the Flask application, and upload some files."""
+        self.workdir = tempfile.mkdtemp()
+        self.app = create_web_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['SERVER_NAME'] = 'fooserver.localdomain'
+        self.app.config['STORAGE_BASE_PATH'] = self.workdir
+
+        os.environ['JWT_SECRET'] = self.app.config.get('JWT_SECRET')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            database.db.create_all()
+
+        self.token = generate_token(self.app, [auth.scopes.READ_UPLOAD,
+                                               auth.scopes.WRITE_UPLOAD])
+
+        filepath = os.path.join(self.DATA_PATH,
+                                'test_files_upload/upload2.tar.gz')
+        response = self.client.post(
+            '/filemanager/api/',
+            data={'file': (open(filepath, 'rb'),
+                           os.path.basename(filepath)),},
+            headers={'Authorization': self.token},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(response.status_code, status.CREATED)
+        self.upload_id = json.loads(response.data)['upload_id']
+
+    def tearDown(self):
+        """Remove the temporary directory for files."""
+        shutil.rmtree(self.workdir)
+
+    def apply(self, operations):
+        return self.client.post(f'/filemanager/api/{self.upload_id}/operations',
+                                data=json.dumps({'operations': operations}),
+                                headers={'Authorization': self.token},
+                                content_type='application/json')
+
+    def test_delete_and_rename(self):
+        """Files are deleted and renamed, and the outcome of each reported."""
+        response = self.apply([
+            {'op': 'delete', 'path': 'main_a.bbl'},
+            {'op': 'rename', 'path': 'main_a.tex', 'to': 'ms/main.tex'},
+            {'op': 'delete', 'path': 'nope.tex'},
+            {'op': 'rename', 'path': 'gtart_a.cls', 'to': '../../escape.cls'},
+            {'op': 'rename', 'path': '00README.XXX', 'to': 'ms/main.tex'},
+            {'op': 'frobnicate', 'path': 'gtart_a.cls'},
+        ])
+        self.assertEqual(response.status_code, status.OK)
+        data = json.loads(response.data)
+        self.assertEqual([result['status'] for result in data['operations']],
+                         [200, 200, 404, 400, 409, 400])
+
+        files = [f['public_filepath'] for f in data['files']]
+        self.assertNotIn('main_a.bbl', files)
+        self.assertNotIn('main_a.tex', files)
+        self.assertIn('ms/main.tex', files)
+        self.assertIn('gtart_a.cls', files)
+        self.assertFalse(os.path.exists(os.path.join(self.workdir,
+                                                     'escape.cls')))
+
+    def test_invalid_new_path(self):
+        """A rename to a path that cannot be a file is rejected up front."""
+        response = self.apply([
+            {'op': 'rename', 'path': 'main_a.tex', 'to': 'ms/main.tex'},
+            {'op': 'rename', 'path': 'main_a.bbl', 'to': ''},
+            {'op': 'rename', 'path': 'main_a.bbl', 'to': 'bib/'},
+            {'op': 'rename', 'path': 'main_a.bbl', 'to': 'ms'},
+            {'op': 'rename', 'path': 'main_a.bbl', 'to': 'ms/main.tex/x'},
+            {'op': 'rename', 'path': 'main_a.bbl', 'to': 'ms/../../x.bbl'},
+            {'op': 'rename', 'path': 'main_a.bbl', 'to': 'ms/./main.bbl'},
+        ])
+        self.assertEqual(response.status_code, status.OK)
+        data = json.loads(response.data)
+        self.assertEqual([result['status'] for result in data['operations']],
+                         [200, 400, 400, 400, 400, 400, 200])
+        files = [f['public_filepath'] for f in data['files']]
+        self.assertIn('ms/main.bbl', files)
+
+    def test_operations_see_earlier_operations(self):
+        """Each operation is checked as the earlier ones leave the workspace."""
+        response = self.apply([
+            {'op': 'delete', 'path': 'main_a.bbl'},
+            {'op': 'rename', 'path': '00README.XXX', 'to': 'main_a.bbl'},
+            {'op': 'rename', 'path': 'main_a.bbl', 'to': 'readme.txt'},
+            {'op': 'delete', 'path': '00README.XXX'},
+        ])
+        self.assertEqual(response.status_code, status.OK)
+        data = json.loads(response.data)
+        self.assertEqual([result['status'] for result in data['operations']],
+                         [200, 200, 200, 404])
+        files = [f['public_filepath'] for f in data['files']]
+        self.assertIn('readme.txt', files)
+        self.assertNotIn('main_a.bbl', files)
+        self.assertNotIn('00README.XXX', files)
+
+    def test_chained_renames(self):
+        """A file renamed twice is no longer at its intermediate path."""
+        response = self.apply([
+            {'op': 'rename', 'path': '00README.XXX', 'to': 'a.txt'},
+            {'op': 'rename', 'path': 'a.txt', 'to': 'b.txt'},
+            {'op': 'delete', 'path': 'a.txt'},
+        ])
+        self.assertEqual(response.status_code, status.OK)
+        data = json.loads(response.data)
+        self.assertEqual([result['status'] for result in data['operations']],
+                         [200, 200, 404])
+        files = [f['public_filepath'] for f in data['files']]
+        self.assertIn('b.txt', files)
+        self.assertNotIn('a.txt', files)
+
+    def test_rename_onto_freed_path(self):
+        """A path that a renamed file has left can be renamed onto."""
+        response = self.apply([
+            {'op': 'rename', 'path': '00README.XXX', 'to': 'a.txt'},
+            {'op': 'rename', 'path': 'a.txt', 'to': 'b.txt'},
+            {'op': 'rename', 'path': 'main_a.bbl', 'to': 'a.txt'},
+        ])
+        self.assertEqual(response.status_code, status.OK)
+        data = json.loads(response.data)
+        self.assertEqual([result['status'] for result in data['operations']],
+                         [200, 200, 200])
+        files = [f['public_filepath'] for f in data['files']]
+        self.assertIn('a.txt', files)
+        self.assertIn('b.txt', files)
+        self.assertNotIn('main_a.bbl', files)
+
+    def test_checks_run_once(self):
+        """The workspace is checked and stored once for the whole batch."""
+        with mock.patch.object(Workspace, 'perform_deletion_checks') \
+                as checks, mock.patch.object(database, 'update') as update:
+            response = self.apply([
+                {'op': 'delete', 'path': 'main_a.bbl'},
+                {'op': 'delete', 'path': '00README.XXX'},
+            ])
+        self.assertEqual(response.status_code, status.OK)
+        self.assertEqual(checks.call_count, 1)
+        self.assertEqual(update.call_count, 1)
+
+    def test_not_a_list(self):
+        """The request must contain a list of operations."""
+        response = self.client.post(
+            f'/filemanager/api/{self.upload_id}/operations',
+            data=json.dumps({'operations': 'delete everything'}),
+            headers={'Authorization': self.token},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.BAD_REQUEST)
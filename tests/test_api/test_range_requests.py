@@ -0,0 +1,152 @@
+"""Tests for byte range requests on content routes."""
+
+import os
+import json
+import shutil
+import tempfile
+from unittest import TestCase, mock
+from http import HTTPStatus as status
+
+from arxiv.users import auth
+
+from filemanager.factory import create_web_app
+from filemanager.services import database
+
+from .util import generate_token
+
+
+class TestRangeRequests(TestCase):
+    """Clients can download part of a file, e.g. to resume a download."""
+
+    DATA_PATH = os.path.join(os.path.split(os.path.abspath(__file__))[0], '..')
+
+    def setUp(self) -> None:
+        """Initialize the Flask application, and get a client for testing."""
+        self.workdir = tempfile.mkdtemp()
+        self.app = create_web_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['SERVER_NAME'] = 'fooserver.localdomain'
+        self.app.config['STORAGE_BASE_PATH'] = self.workdir
+
+        os.environ['JWT_SECRET'] = self.app.config.get('JWT_SECRET')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            database.db.create_all()
+
+        self.token = generate_token(self.app, [auth.scopes.READ_UPLOAD,
+                                               auth.scopes.WRITE_UPLOAD,
+                                               auth.scopes.READ_UPLOAD_LOGS])
+
+        filepath = os.path.join(self.DATA_PATH,
+                                'test_files_upload/upload2.tar.gz')
+        response = self.client.post(
+            '/filemanager/api/',
+            data={'file': (open(filepath, 'rb'),
+                           os.path.basename(filepath)),},
+            headers={'Authorization': self.token},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(response.status_code, status.CREATED)
+        self.upload_id = json.loads(response.data)['upload_id']
+        self.path = f'/filemanager/api/{self.upload_id}/main_a.tex/content'
+        response = self.client.get(self.path,
+                                   headers={'Authorization': self.token})
+        self.content = response.data
+        self.etag = response.headers['ETag']
+
+    def tearDown(self):
+        """Remove the temporary directory for files."""
+        shutil.rmtree(self.workdir)
+
+    def get(self, path: str, **headers: str):
+        headers['Authorization'] = self.token
+        return self.client.get(path, headers=headers)
+
+    def test_full_content(self):
+        """Without a range, the complete content is sent."""
+        response = self.get(self.path)
+        self.assertEqual(response.status_code, status.OK)
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        self.assertEqual(int(response.headers['Content-Length']),
+                         len(self.content))
+
+    def test_file_wrapper(self):
+        """The server's file wrapper is used for complete content."""
+        wrapper = mock.MagicMock(
+            side_effect=lambda fp, size: iter(lambda: fp.read(size), b'')
+        )
+        response = self.client.get(
+            self.path,
+            headers={'Authorization': self.token},
+            environ_overrides={'wsgi.file_wrapper': wrapper}
+        )
+        self.assertEqual(response.status_code, status.OK)
+        self.assertEqual(response.data, self.content)
+        self.assertEqual(wrapper.call_count, 1)
+
+    def test_single_range(self):
+        """A single range is sent as partial content."""
+        response = self.get(self.path, Range='bytes=10-19')
+        self.assertEqual(response.status_code, status.PARTIAL_CONTENT)
+        self.assertEqual(response.data, self.content[10:20])
+        self.assertEqual(response.headers['Content-Range'],
+                         f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(int(response.headers['Content-Length']), 10)
+        self.assertEqual(response.headers['ETag'], self.etag)
+
+    def test_open_and_suffix_ranges(self):
+        """Open-ended and suffix ranges are supported."""
+        response = self.get(self.path, Range='bytes=100-')
+        self.assertEqual(response.status_code, status.PARTIAL_CONTENT)
+        self.assertEqual(response.data, self.content[100:])
+
+        response = self.get(self.path, Range='bytes=-25')
+        self.assertEqual(response.status_code, status.PARTIAL_CONTENT)
+        self.assertEqual(response.data, self.content[-25:])
+
+    def test_multiple_ranges(self):
+        """Multiple ranges are sent as a multipart document."""
+        response = self.get(self.path, Range='bytes=0-4,20-29')
+        self.assertEqual(response.status_code, status.PARTIAL_CONTENT)
+        self.assertEqual(response.mimetype, 'multipart/byteranges')
+        self.assertEqual(int(response.headers['Content-Length']),
+                         len(response.data))
+        boundary = response.mimetype_params['boundary'].encode('ascii')
+        parts = response.data.split(b'--' + boundary)
+        self.assertEqual(len(parts), 4, 'Two parts plus preamble and end')
+        self.assertTrue(parts[1].endswith(b'\r\n\r\n' + self.content[0:5]
+                                          + b'\r\n'))
+        self.assertIn(f'Content-Range: bytes 20-29/{len(self.content)}'
+                      .encode('ascii'), parts[2])
+        self.assertTrue(parts[2].endswith(b'\r\n\r\n' + self.content[20:30]
+                                          + b'\r\n'))
+        self.assertEqual(parts[3], b'--\r\n')
+
+    def test_unsatisfiable_range(self):
+        """A range beyond the end of the content cannot be satisfied."""
+        response = self.get(self.path,
+                            Range=f'bytes={len(self.content) + 10}-')
+        self.assertEqual(response.status_code,
+                         status.REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response.headers['Content-Range'],
+                         f'bytes */{len(self.content)}')
+
+    def test_if_range(self):
+        """The range is ignored if the content has changed."""
+        response = self.get(self.path, Range='bytes=0-9',
+                            **{'If-Range': f'"{self.etag}"'})
+        self.assertEqual(response.status_code, status.PARTIAL_CONTENT)
+        self.assertEqual(response.data, self.content[:10])
+
+        response = self.get(self.path, Range='bytes=0-9',
+                            **{'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, status.OK)
+        self.assertEqual(response.data, self.content)
+
+    def test_source_package_range(self):
+        """The source package supports ranges, e.g. to resume downloads."""
+        path = f'/filemanager/api/{self.upload_id}/content'
+        content = self.get(path).data
+        response = self.get(path, Range='bytes=512-')
+        self.assertEqual(response.status_code, status.PARTIAL_CONTENT)
+        self.assertEqual(response.data, content[512:])
@@ -0,0 +1,168 @@
+"""Tests for resumable (chunked) uploads."""
+
+import os
+import json
+import shutil
+import tempfile
+from base64 import b64encode
+from hashlib import md5
+from http import HTTPStatus as status
+from unittest import TestCase
+
+from arxiv.users import auth
+
+from filemanager.factory import create_web_app
+from filemanager.services import database
+
+from .util import generate_token
+
+
+class TestResumableUpload(TestCase):
+    """Large files can be uploaded in chunks, and resumed."""
+
+    DATA_PATH = os.path.join(os.path.split(os.path.abspath(__file__))[0], '..')
+    CHUNK_SIZE = 1024
+
+    def setUp(self) -> None:
+        """Initialize the Flask application, and get a client for testing."""
+        self.workdir = tempfile.mkdtemp()
+        self.app = create_web_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['SERVER_NAME'] = 'fooserver.localdomain'
+        self.app.config['STORAGE_BASE_PATH'] = self.workdir
+
+        os.environ['JWT_SECRET'] = self.app.config.get('JWT_SECRET')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            database.db.create_all()
+
+        self.token = generate_token(self.app, [auth.scopes.READ_UPLOAD,
+                                               auth.scopes.WRITE_UPLOAD])
+        with open(os.path.join(self.DATA_PATH,
+                               'test_files_upload/upload2.tar.gz'), 'rb') as f:
+            self.content = f.read()
+        self.chunks = [self.content[i:i + self.CHUNK_SIZE]
+                       for i in range(0, len(self.content), self.CHUNK_SIZE)]
+
+    def tearDown(self):
+        """Remove the temporary directory for files."""
+        shutil.rmtree(self.workdir)
+
+    def start(self, path: str = '/filemanager/api/upload_session') -> str:
+        response = self.client.post(path, data={'filename': 'upload2.tar.gz'},
+                                    headers={'Authorization': self.token})
+        self.assertEqual(response.status_code, status.CREATED)
+        return json.loads(response.data)['session_id']
+
+    def put(self, session_id: str, index: int, content: bytes,
+            checksum: bytes = None):
+        headers = {'Authorization': self.token}
+        if checksum is not None:
+            headers['Content-MD5'] = b64encode(checksum).decode('ascii')
+        return self.client.put(
+            f'/filemanager/api/upload_session/{session_id}/{index}',
+            data=content, headers=headers,
+            content_type='application/octet-stream'
+        )
+
+    def get(self, session_id: str, members: bool = False) -> dict:
+        response = self.client.get(
+            f'/filemanager/api/upload_session/{session_id}',
+            query_string={'members': '1' if members else '0'},
+            headers={'Authorization': self.token}
+        )
+        self.assertEqual(response.status_code, status.OK)
+        return json.loads(response.data)
+
+    def commit(self, session_id: str):
+        return self.client.post(
+            f'/filemanager/api/upload_session/{session_id}/commit',
+            headers={'Authorization': self.token}
+        )
+
+    def test_upload_in_chunks(self):
+        """A new workspace is created from a chunked upload."""
+        session_id = self.start()
+        # Chunks may arrive in any order.
+        for index in reversed(range(len(self.chunks))):
+            response = self.put(session_id, index, self.chunks[index],
+                                md5(self.chunks[index]).digest())
+            self.assertEqual(response.status_code, status.OK)
+
+        data = self.get(session_id, members=True)
+        self.assertTrue(data['is_complete'])
+        self.assertEqual(data['received_bytes'], len(self.content))
+        self.assertIn('main_a.tex', data['members'])
+
+        response = self.commit(session_id)
+        self.assertEqual(response.status_code, status.CREATED)
+        upload_id = json.loads(response.data)['upload_id']
+        response = self.client.get(
+            f'/filemanager/api/{upload_id}/main_a.tex/content',
+            headers={'Authorization': self.token}
+        )
+        self.assertEqual(response.status_code, status.OK)
+
+        response = self.client.get(
+            f'/filemanager/api/upload_session/{session_id}',
+            headers={'Authorization': self.token}
+        )
+        self.assertEqual(response.status_code, status.NOT_FOUND,
+                         'Session is removed once committed')
+
+    def test_resume(self):
+        """A client can find out which chunks are missing."""
+        session_id = self.start()
+        self.put(session_id, 0, self.chunks[0])
+        self.put(session_id, 2, self.chunks[2])
+
+        data = self.get(session_id)
+        self.assertFalse(data['is_complete'])
+        self.assertEqual([chunk['index'] for chunk in data['chunks']], [0, 2])
+        self.assertNotIn('members', data, 'Members are only listed on request')
+        data = self.get(session_id, members=True)
+        self.assertIsInstance(data['members'], list,
+                              'Archive can be listed before it is complete')
+
+        response = self.commit(session_id)
+        self.assertEqual(response.status_code, status.BAD_REQUEST)
+
+        for index in range(len(self.chunks)):
+            self.put(session_id, index, self.chunks[index])
+        self.assertEqual(self.commit(session_id).status_code, status.CREATED)
+
+    def test_existing_workspace(self):
+        """A chunked upload can add a file to an existing workspace."""
+        session_id = self.start()
+        for index, chunk in enumerate(self.chunks):
+            self.put(session_id, index, chunk)
+        upload_id = json.loads(self.commit(session_id).data)['upload_id']
+
+        session_id = self.start(f'/filemanager/api/{upload_id}/upload_session')
+        self.assertEqual(self.get(session_id)['upload_id'], upload_id)
+        self.put(session_id, 0, b'foo content')
+        response = self.commit(session_id)
+        self.assertEqual(response.status_code, status.CREATED)
+        self.assertEqual(json.loads(response.data)['upload_id'], upload_id)
+
+    def test_checksum_mismatch(self):
+        """A chunk that does not match its checksum is rejected."""
+        session_id = self.start()
+        response = self.put(session_id, 0, self.chunks[0],
+                            md5(b'something else').digest())
+        self.assertEqual(response.status_code, status.BAD_REQUEST)
+        self.assertEqual(self.get(session_id)['chunks'], [])
+
+    def test_no_such_session(self):
+        """A session that does not exist is not found."""
+        response = self.put('doesnotexist', 0, b'foo')
+        self.assertEqual(response.status_code, status.NOT_FOUND)
+
+    def test_abandoned_session_expires(self):
+        """A session that stops receiving chunks is eventually removed."""
+        session_id = self.start()
+        self.put(session_id, 0, self.chunks[0])
+        self.app.config['UPLOAD_SESSION_EXPIRY_HOURS'] = 0
+        self.start()     # Expired sessions are removed when one is started.
+        response = self.put(session_id, 1, self.chunks[1])
+        self.assertEqual(response.status_code, status.NOT_FOUND)
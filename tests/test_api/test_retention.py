@@ -0,0 +1,209 @@
+"""Tests for garbage collection and per-user quotas."""
+
+import os
+import json
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from http import HTTPStatus as status
+from unittest import TestCase
+
+from pytz import UTC
+
+from arxiv.users import auth
+
+from filemanager.factory import create_web_app
+from filemanager.controllers import retention
+from filemanager.domain import Status
+from filemanager.services import database, storage, upload_sessions
+
+from .util import generate_token
+
+
+class TestRetention(TestCase):
+    """Content that is no longer to be kept is removed."""
+
+    DATA_PATH = os.path.join(os.path.split(os.path.abspath(__file__))[0], '..')
+
+    def setUp(self) -> None:
+        """We have a workspace with a file that was removed when unpacking."""
+        self.workdir = tempfile.mkdtemp()
+        self.app = create_web_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['SERVER_NAME'] = 'fooserver.localdomain'
+        self.app.config['STORAGE_BASE_PATH'] = self.workdir
+        self.app.config['RETENTION_BATCH_DELAY'] = 0
+
+        os.environ['JWT_SECRET'] = self.app.config.get('JWT_SECRET')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            database.db.create_all()
+
+        self.token = generate_token(self.app, [auth.scopes.READ_UPLOAD,
+                                               auth.scopes.WRITE_UPLOAD])
+        response = self.upload('upload2.tar.gz')
+        self.assertEqual(response.status_code, status.CREATED)
+        self.upload_id = json.loads(response.data)['upload_id']
+
+    def tearDown(self):
+        """Remove the temporary directory for files."""
+        shutil.rmtree(self.workdir)
+
+    def upload(self, name, upload_id=None):
+        """Upload one of the test files."""
+        filepath = os.path.join(self.DATA_PATH, 'test_files_upload', name)
+        return self.client.post(
+            f'/filemanager/api/{upload_id or ""}',
+            data={'file': (open(filepath, 'rb'), name)},
+            headers={'Authorization': self.token},
+            content_type='multipart/form-data'
+        )
+
+    def collect(self, days, dry_run=False, **policy):
+        """Collect garbage as though ``days`` had passed."""
+        with self.app.app_context():
+            return retention.collect_garbage(
+                retention.RetentionPolicy(**policy), dry_run=dry_run,
+                now=datetime.now(UTC) + timedelta(days=days)
+            )
+
+    def removed_files(self):
+        with self.app.app_context():
+            workspace = database.retrieve(self.upload_id)
+            return [f for f in workspace.iter_files(allow_removed=True)
+                    if f.is_removed]
+
+    def test_removed_files(self):
+        """Removed files are deleted once they are old enough."""
+        self.assertEqual(len(self.removed_files()), 1, 'The tarball')
+        with self.app.app_context():
+            modified = database.retrieve(self.upload_id).modified_datetime
+
+        # Removing a file (here, by unpacking it) does not change its
+        # modification time; its age is measured from when it was removed.
+        with self.app.app_context():
+            workspace = database.retrieve(self.upload_id)
+            removed, = [f for f in workspace.iter_files(allow_removed=True)
+                        if f.is_removed]
+            self.assertIsNotNone(removed.removed_datetime)
+            removed.last_modified -= timedelta(days=30)
+            database.update(workspace)
+
+        report = self.collect(days=3, removed_days=7)
+        self.assertEqual(report.removed_files, 0, 'Not old enough')
+
+        report = self.collect(days=8, removed_days=7, dry_run=True)
+        self.assertEqual(report.removed_files, 1)
+        self.assertGreater(report.freed_bytes, 0)
+        self.assertEqual(len(self.removed_files()), 1, 'Nothing is deleted')
+
+        report = self.collect(days=8, removed_days=7)
+        self.assertEqual(report.removed_files, 1)
+        self.assertEqual(len(self.removed_files()), 0)
+        with self.app.app_context():
+            self.assertEqual(
+                database.retrieve(self.upload_id).modified_datetime,
+                modified, 'Collecting garbage is not a modification'
+            )
+
+    def test_released_workspaces(self):
+        """Released workspaces are deleted once they expire."""
+        response = self.client.post(
+            f'/filemanager/api/{self.upload_id}/release',
+            headers={'Authorization': self.token}
+        )
+        self.assertEqual(response.status_code, status.OK)
+
+        report = self.collect(days=1, released_days=7)
+        self.assertEqual(report.deleted_workspaces, 0)
+
+        report = self.collect(days=8, released_days=7)
+        self.assertEqual(report.deleted_workspaces, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.workdir,
+                                                     str(self.upload_id))))
+        with self.app.app_context():
+            workspace = database.retrieve(self.upload_id)
+            self.assertEqual(workspace.status, Status.DELETED)
+            self.assertEqual(database.get_stored_bytes('1'), 0)
+
+    def test_batches(self):
+        """Workspaces are visited in batches, and can be visited in parts."""
+        second = json.loads(self.upload('1801.03879-1.tar.gz').data)
+        report = self.collect(days=0, batch_size=1, removed_days=7)
+        self.assertEqual(report.workspaces, 2)
+        self.assertIsNone(report.next)
+
+        with self.app.app_context():
+            report = retention.collect_garbage(retention.RetentionPolicy(),
+                                               limit=1)
+        self.assertEqual(report.workspaces, 1)
+        self.assertEqual(report.next, self.upload_id)
+
+        with self.app.app_context():
+            report = retention.collect_garbage(retention.RetentionPolicy(),
+                                               after=report.next)
+        self.assertEqual(report.workspaces, 1)
+        self.assertGreater(second['upload_id'], self.upload_id)
+
+    def test_staging_area(self):
+        """Abandoned upload sessions and orphaned staged files are deleted."""
+        with self.app.app_context():
+            adapter = storage.create_adapter(self.app)
+            session_path = adapter.get_staging_path(
+                upload_sessions.SESSIONS_PATH, 'abandoned'
+            )
+            staged_path = adapter.get_staging_path('upload-orphaned')
+        os.makedirs(session_path)
+        with open(staged_path, 'wb') as f:
+            f.write(b'x' * 100)
+        then = (datetime.now(UTC) - timedelta(hours=2)).timestamp()
+        for path in (session_path, staged_path):
+            os.utime(path, (then, then))
+
+        report = self.collect(days=0, staging_hours=3)
+        self.assertEqual(report.expired_sessions, 0, 'Not old enough')
+        self.assertEqual(report.staged_files, 0, 'Not old enough')
+
+        report = self.collect(days=0, staging_hours=1, dry_run=True)
+        self.assertEqual(report.expired_sessions, 1)
+        self.assertEqual(report.staged_files, 1)
+        self.assertTrue(os.path.exists(staged_path), 'Nothing is deleted')
+
+        report = self.collect(days=0, staging_hours=1)
+        self.assertEqual(report.expired_sessions, 1)
+        self.assertEqual(report.staged_files, 1)
+        self.assertEqual(report.freed_bytes, 100)
+        self.assertFalse(os.path.exists(session_path))
+        self.assertFalse(os.path.exists(staged_path))
+
+    def test_quota(self):
+        """Uploads that would put the owner over quota are refused."""
+        with self.app.app_context():
+            stored_bytes = database.get_stored_bytes('1')
+        self.assertGreater(stored_bytes, 0)
+
+        self.app.config['USER_QUOTA_BYTES'] = stored_bytes + 1
+        report = self.collect(days=0, quota_bytes=stored_bytes - 1)
+        self.assertEqual(report.over_quota, {'1': stored_bytes})
+
+        response = self.upload('1801.03879-1.tar.gz')
+        self.assertEqual(response.status_code, status.REQUEST_ENTITY_TOO_LARGE)
+
+    def test_api(self):
+        """Garbage can be collected via the API."""
+        response = self.client.post('/filemanager/api/retention?dry_run=1',
+                                    headers={'Authorization': self.token})
+        self.assertEqual(response.status_code, status.FORBIDDEN)
+
+        token = generate_token(self.app,
+                               [auth.scopes.DELETE_UPLOAD_WORKSPACE])
+        response = self.client.post('/filemanager/api/retention?dry_run=1',
+                                    headers={'Authorization': token})
+        self.assertEqual(response.status_code, status.OK)
+        report = json.loads(response.data)
+        self.assertTrue(report['dry_run'])
+        self.assertEqual(report['workspaces'], 1)
+
+        response = self.client.post('/filemanager/api/retention?limit=-1',
+                                    headers={'Authorization': token})
+        self.assertEqual(response.status_code, status.BAD_REQUEST)
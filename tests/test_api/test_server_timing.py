@@ -0,0 +1,82 @@
+"""Tests for per-stage timing of upload processing."""
+
+import os
+import json
+import shutil
+import tempfile
+from http import HTTPStatus as status
+from unittest import TestCase, mock
+
+from arxiv.users import auth
+
+from filemanager.factory import create_web_app
+from filemanager.process import timing
+from filemanager.services import database
+
+from .util import generate_token
+
+
+class TestServerTiming(TestCase):
+    """Timings are reported when ``TIMING_ENABLED`` is set."""
+
+    DATA_PATH = os.path.join(os.path.split(os.path.abspath(__file__))[0], '..')
+
+    def create_app(self, **config):
+        """Create the app with the given (string) config from the env."""
+        with mock.patch.dict(os.environ, config):
+            app = create_web_app()
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['SERVER_NAME'] = 'fooserver.localdomain'
+        app.config['STORAGE_BASE_PATH'] = self.workdir
+        os.environ['JWT_SECRET'] = app.config.get('JWT_SECRET')
+        with app.app_context():
+            database.db.create_all()
+        return app
+
+    def setUp(self) -> None:
+        """Create a working directory for files."""
+        self.workdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the temporary directory for files."""
+        shutil.rmtree(self.workdir)
+
+    def upload(self, app):
+        token = generate_token(app, [auth.scopes.READ_UPLOAD,
+                                     auth.scopes.WRITE_UPLOAD])
+        filepath = os.path.join(self.DATA_PATH,
+                                'test_files_upload/upload2.tar.gz')
+        with open(filepath, 'rb') as f:
+            response = app.test_client().post(
+                '/filemanager/api/',
+                data={'file': (f, os.path.basename(filepath))},
+                headers={'Authorization': token},
+                content_type='multipart/form-data'
+            )
+        self.assertEqual(response.status_code, status.CREATED)
+        return response
+
+    def test_server_timing(self):
+        """Each stage is reported in the ``Server-Timing`` header."""
+        app = self.create_app(TIMING_ENABLED='1', TIMING_METRICS_ENABLED='1')
+        response = self.upload(app)
+        metrics = [metric.split(';')[0] for metric
+                   in response.headers['Server-Timing'].split(', ')]
+        for name in ['receive', 'check', 'check.UnpackCompressedTarFiles',
+                     'check.InferFileType', 'persist', 'pack', 'db', 'total']:
+            self.assertIn(name, metrics)
+
+        response = app.test_client().get('/metrics')
+        self.assertEqual(response.status_code, status.OK)
+        self.assertIn(b'filemanager_stage_seconds_total{stage="pack",'
+                      b'process="%d"}' % os.getpid(), response.data)
+
+    def test_disabled(self):
+        """Nothing is recorded unless timing is enabled."""
+        app = self.create_app(TIMING_ENABLED='0')
+        response = self.upload(app)
+        self.assertNotIn('Server-Timing', response.headers)
+        self.assertEqual(app.test_client().get('/metrics').status_code,
+                         status.NOT_FOUND)
+        self.assertIs(timing.stage('check'), timing.stage('persist'),
+                      'A shared do-nothing stage is used')
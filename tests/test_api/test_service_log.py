@@ -5,7 +5,7 @@ import json
 import shutil
 import tempfile
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from unittest import TestCase, mock
 from http import HTTPStatus as status
 
@@ -142,4 +142,47 @@ class TestAccessServiceLog(TestCase):
         with open(log_path, 'wb') as fileH:
             fileH.write(response.data)
         # Highlight log download. Remove at some point.
-        logger.debug(f"FYI: SAVED SERVICE LOG FILE TO DISK AT: {log_path}\n")
\ No newline at end of file
+        logger.debug(f"FYI: SAVED SERVICE LOG FILE TO DISK AT: {log_path}\n")
+
+    def test_get_log_not_modified(self):
+        """Requests for the log do not change it, so they can be cached."""
+        admin_token = generate_token(self.app, [
+            auth.scopes.READ_UPLOAD_SERVICE_LOGS
+        ])
+        response = self.client.get(f"/filemanager/api/log",
+                                   headers={'Authorization': admin_token})
+        self.assertEqual(response.status_code, status.OK)
+        etag = response.headers['ETag']
+
+        for _ in range(2):
+            response = self.client.get(f"/filemanager/api/log",
+                                       headers={'Authorization': admin_token,
+                                                'If-None-Match': etag})
+            self.assertEqual(response.status_code, status.NOT_MODIFIED)
+        response = self.client.head(f"/filemanager/api/log",
+                                    headers={'Authorization': admin_token})
+        self.assertEqual(response.headers['ETag'], etag)
+
+    def test_query_log(self):
+        """Make GET request for the records about one upload workspace."""
+        admin_token = generate_token(self.app, [
+            auth.scopes.READ_UPLOAD_SERVICE_LOGS
+        ])
+        since = datetime.now(UTC) - timedelta(minutes=5)
+        response = self.client.get(
+            f"/filemanager/api/log",
+            query_string={'upload_id': self.upload_id,
+                          'since': since.isoformat()},
+            headers={'Authorization': admin_token}
+        )
+        self.assertEqual(response.status_code, status.OK)
+        self.assertIn('ETag', response.headers, "Returns an ETag header")
+        lines = response.data.decode('utf-8').splitlines()
+        self.assertGreater(len(lines), 0, 'Upload was logged')
+        for line in lines:
+            self.assertIn(f' {self.upload_id}: ', line)
+
+        response = self.client.get(f"/filemanager/api/log",
+                                   query_string={'since': 'yesterday'},
+                                   headers={'Authorization': admin_token})
+        self.assertEqual(response.status_code, status.BAD_REQUEST)
@@ -4,6 +4,7 @@ import os
 import io
 import json
 import shutil
+import tarfile
 import tempfile
 import logging
 from datetime import datetime
@@ -154,3 +155,118 @@ class TestSourcePackage(TestCase):
         self.assertIsNotNone(third_checksum)
         self.assertEqual(second_checksum, third_checksum)
 
+
+
+class TestLazySourcePackage(TestCase):
+    """With ``LAZY_SOURCE_PACKAGE``, the package is built when requested."""
+
+    DATA_PATH = os.path.join(os.path.split(os.path.abspath(__file__))[0], '..')
+
+    def setUp(self) -> None:
+        """Initialize the Flask application, and get a client for testing."""
+        self.workdir = tempfile.mkdtemp()
+        self.server_name = 'fooserver.localdomain'
+        self.app = create_web_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['SERVER_NAME'] = self.server_name
+        self.app.config['STORAGE_BASE_PATH'] = self.workdir
+        self.app.config['LAZY_SOURCE_PACKAGE'] = True
+
+        os.environ['JWT_SECRET'] = self.app.config.get('JWT_SECRET')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            database.db.create_all()
+
+        self.token = generate_token(self.app, [auth.scopes.READ_UPLOAD,
+                                               auth.scopes.WRITE_UPLOAD,
+                                               auth.scopes.DELETE_UPLOAD_FILE])
+
+        filepath = os.path.join(self.DATA_PATH,
+                                'test_files_upload/upload2.tar.gz')
+        response = self.client.post(
+            '/filemanager/api/',
+            data={'file': (open(filepath, 'rb'),
+                           os.path.basename(filepath)),},
+            headers={'Authorization': self.token},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(response.status_code, status.CREATED,
+                         "Accepted and processed uploaded Submission Contents")
+        self.upload_id = json.loads(response.data)['upload_id']
+        self.original_checksum = response.headers.get('ETag')
+
+    def tearDown(self):
+        """Remove the temporary directory for files."""
+        shutil.rmtree(self.workdir)
+
+    def get_package_path(self) -> str:
+        """Get the path to the source package, if it exists."""
+        for dirpath, _, filenames in os.walk(self.workdir):
+            if f'{self.upload_id}.tar.gz' in filenames:
+                return os.path.join(dirpath, f'{self.upload_id}.tar.gz')
+        return None
+
+    def test_package_is_not_built_on_upload(self):
+        """Uploading content does not build the source package."""
+        self.assertIsNone(self.get_package_path())
+
+        response = self.client.head(
+            f'/filemanager/api/{self.upload_id}/content',
+            headers={'Authorization': self.token}
+        )
+        self.assertEqual(response.status_code, status.OK)
+        self.assertEqual(response.headers.get('ETag'), self.original_checksum)
+        self.assertIsNone(self.get_package_path(),
+                          'HEAD request does not build the package')
+
+    def test_package_is_built_on_download(self):
+        """The package is built on the first download, and then reused."""
+        response = self.client.get(
+            f'/filemanager/api/{self.upload_id}/content',
+            headers={'Authorization': self.token}
+        )
+        self.assertEqual(response.status_code, status.OK)
+        self.assertEqual(response.headers.get('ETag'), self.original_checksum)
+        package_path = self.get_package_path()
+        self.assertIsNotNone(package_path)
+        self.assertTrue(tarfile.is_tarfile(package_path))
+        self.assertEqual(int(response.headers['Content-Length']),
+                         os.path.getsize(package_path))
+        built_at = os.path.getmtime(package_path)
+
+        response = self.client.get(
+            f'/filemanager/api/{self.upload_id}/content',
+            headers={'Authorization': self.token}
+        )
+        self.assertEqual(response.status_code, status.OK)
+        self.assertEqual(response.headers.get('ETag'), self.original_checksum)
+        self.assertEqual(os.path.getmtime(package_path), built_at,
+                         'Package is not rebuilt')
+
+    def test_package_is_rebuilt_after_change(self):
+        """A change to the workspace makes the built package stale."""
+        self.client.get(f'/filemanager/api/{self.upload_id}/content',
+                        headers={'Authorization': self.token})
+        package_path = self.get_package_path()
+        built_at = os.path.getmtime(package_path)
+
+        response = self.client.post(
+            f'/filemanager/api/{self.upload_id}',
+            data={'file': (io.BytesIO(b'foocontent'), 'foo.txt'),},
+            headers={'Authorization': self.token},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(response.status_code, status.CREATED)
+        new_checksum = response.headers.get('ETag')
+        self.assertNotEqual(new_checksum, self.original_checksum)
+        self.assertEqual(os.path.getmtime(package_path), built_at,
+                         'Package is not rebuilt on upload')
+
+        response = self.client.get(
+            f'/filemanager/api/{self.upload_id}/content',
+            headers={'Authorization': self.token}
+        )
+        self.assertEqual(response.headers.get('ETag'), new_checksum)
+        self.assertGreater(os.path.getmtime(package_path), built_at)
+        with tarfile.open(package_path) as tar:
+            self.assertIn('./foo.txt', tar.getnames())
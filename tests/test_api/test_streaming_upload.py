@@ -0,0 +1,121 @@
+"""Tests for streaming upload content to the storage volume."""
+
+import io
+import os
+import json
+import shutil
+import tempfile
+from base64 import urlsafe_b64encode
+from hashlib import md5
+from http import HTTPStatus as status
+from unittest import TestCase, mock
+
+from arxiv.users import auth
+
+from filemanager.factory import create_web_app
+from filemanager.services import database, storage
+
+from .util import generate_token
+
+
+class TestStreamingUpload(TestCase):
+    """Uploaded files are written once, as they arrive."""
+
+    def setUp(self) -> None:
+        """Initialize the Flask application, and get a client for testing."""
+        self.workdir = tempfile.mkdtemp()
+        self.app = create_web_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['SERVER_NAME'] = 'fooserver.localdomain'
+        self.app.config['STORAGE_BASE_PATH'] = self.workdir
+
+        os.environ['JWT_SECRET'] = self.app.config.get('JWT_SECRET')
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            database.db.create_all()
+
+        self.token = generate_token(self.app, [auth.scopes.READ_UPLOAD,
+                                               auth.scopes.WRITE_UPLOAD])
+        self.staging_path = os.path.join(self.workdir,
+                                         storage.SimpleStorageAdapter.STAGING_PATH)
+
+    def tearDown(self):
+        """Remove the temporary directory for files."""
+        shutil.rmtree(self.workdir)
+
+    def upload(self, content: bytes, filename: str = 'foo.tex'):
+        return self.client.post(
+            '/filemanager/api/',
+            data={'file': (io.BytesIO(content), filename)},
+            headers={'Authorization': self.token},
+            content_type='multipart/form-data'
+        )
+
+    def test_upload_is_staged_and_adopted(self):
+        """The staged file is moved into the workspace, not copied."""
+        content = b'\\documentclass{article}\n' * 1000
+        with mock.patch.object(storage.SimpleStorageAdapter, 'copy') as m_copy:
+            response = self.upload(content)
+        self.assertEqual(response.status_code, status.CREATED)
+        self.assertFalse(m_copy.called)
+        self.assertEqual(os.listdir(self.staging_path), [],
+                         'Nothing is left in the staging area')
+
+        upload_id = json.loads(response.data)['upload_id']
+        response = self.client.get(
+            f'/filemanager/api/{upload_id}/foo.tex/content',
+            headers={'Authorization': self.token}
+        )
+        self.assertEqual(response.data, content)
+        self.assertEqual(
+            response.headers['ETag'],
+            urlsafe_b64encode(md5(content).digest()).decode('utf-8'),
+            'Checksum is calculated as the content arrives'
+        )
+
+    def test_empty_upload(self):
+        """Empty uploads are still rejected, and cleaned up."""
+        response = self.upload(b'')
+        self.assertEqual(response.status_code, status.BAD_REQUEST)
+        self.assertEqual(os.listdir(self.staging_path), [])
+
+    def test_upload_too_large(self):
+        """Uploads that exceed ``MAX_CONTENT_LENGTH`` are rejected."""
+        self.app.config['MAX_CONTENT_LENGTH'] = 1024
+        response = self.upload(b'a' * 2048)
+        self.assertEqual(response.status_code, status.REQUEST_ENTITY_TOO_LARGE)
+
+
+class TestStagedFile(TestCase):
+    """A :class:`.StagedFile` hashes and caps content as it is written."""
+
+    def setUp(self) -> None:
+        """Create a staging volume."""
+        self.workdir = tempfile.mkdtemp()
+        self.adapter = storage.SimpleStorageAdapter(self.workdir)
+
+    def tearDown(self):
+        """Remove the staging volume."""
+        shutil.rmtree(self.workdir)
+
+    def test_write(self):
+        """Content is counted and hashed."""
+        staged = storage.StagedFile(self.adapter.open_staging_file())
+        staged.write(b'foo')
+        staged.write(b'bar')
+        staged.close()
+        self.assertEqual(staged.size_bytes, 6)
+        self.assertEqual(staged.checksum,
+                         urlsafe_b64encode(md5(b'foobar').digest()).decode())
+        with open(staged.path, 'rb') as f:
+            self.assertEqual(f.read(), b'foobar')
+
+    def test_max_bytes(self):
+        """Writing more than ``max_bytes`` raises an exception."""
+        staged = storage.StagedFile(self.adapter.open_staging_file(),
+                                    max_bytes=4)
+        staged.write(b'foo')
+        with self.assertRaises(storage.StagedFileTooLarge):
+            staged.write(b'bar')
+        staged.discard()
+        self.assertFalse(os.path.exists(staged.path))
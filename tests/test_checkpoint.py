@@ -229,4 +229,133 @@ class TestCheckpointable(TestCase):
 
         # Create a second checkpoint
         with self.assertRaises(NoSourceFilesToCheckpoint):
-            self.wks.create_checkpoint(None)
\ No newline at end of file
+            self.wks.create_checkpoint(None)
+    def test_unchanged_files_are_stored_once(self) -> None:
+        """Files that are in several checkpoints are only copied once."""
+        blobs_path = os.path.join(self.base_path, self.test_id, 'checkpoint',
+                                  'blobs')
+        for name in ('main.tex', 'figure.eps'):
+            with self.wks.open(self.wks.create(name), 'w') as f:
+                f.write(f'Contents of {name}')
+        first = self.wks.create_checkpoint(None)
+        self.assertEqual(len(os.listdir(blobs_path)), 2)
+
+        with self.wks.open(self.wks.get('main.tex'), 'w') as f:
+            f.write('New contents')
+        second = self.wks.create_checkpoint(None)
+        self.assertEqual(len(os.listdir(blobs_path)), 3,
+                         'Only the changed file is copied')
+
+        self.wks.delete_checkpoint(first, None)
+        self.assertEqual(len(os.listdir(blobs_path)), 2,
+                         'Blobs used by the other checkpoint are kept')
+
+        self.wks.delete_all_files()
+        self.wks.restore_checkpoint(second, None)
+        with self.wks.open(self.wks.get('main.tex')) as f:
+            self.assertEqual(f.read(), 'New contents')
+        with self.wks.open(self.wks.get('figure.eps')) as f:
+            self.assertEqual(f.read(), 'Contents of figure.eps')
+
+    def test_blob_references(self) -> None:
+        """Blob uses are counted without reading the other manifests."""
+        blobs_path = os.path.join(self.base_path, self.test_id, 'checkpoint',
+                                  'blobs')
+        with self.wks.open(self.wks.create('main.tex'), 'w') as f:
+            f.write('Hello')
+        first = self.wks.create_checkpoint(None)
+        with mock.patch.object(self.wks, '_read_manifest') as m_read:
+            second = self.wks.create_checkpoint(None)
+        self.assertEqual(m_read.call_count, 0)
+
+        # Workspaces from before the references were kept have them counted.
+        self.wks.delete(self.wks.get('checkpoint/blob_references.json',
+                                     is_system=True))
+        with mock.patch.object(self.wks, '_read_manifest',
+                               wraps=self.wks._read_manifest) as m_read:
+            self.wks.delete_checkpoint(first, None)
+        self.assertEqual(m_read.call_count, 3,
+                         'Its own manifest, and then all of them')
+        self.assertEqual(len(os.listdir(blobs_path)), 1,
+                         'The blob is still used by the other checkpoint')
+
+        with mock.patch.object(self.wks, '_read_manifest',
+                               wraps=self.wks._read_manifest) as m_read:
+            self.wks.delete_checkpoint(second, None)
+        self.assertEqual(m_read.call_count, 1, 'Only its own manifest is read')
+        self.assertEqual(os.listdir(blobs_path), [])
+
+    def test_restore_only_changed_files(self) -> None:
+        """Restoring a checkpoint only touches files that differ from it."""
+        for name in ('main.tex', 'figure.eps', 'anc/notes.txt'):
+            with self.wks.open(self.wks.create(name), 'w') as f:
+                f.write(f'Contents of {name}')
+        checksum = self.wks.create_checkpoint(None)
+
+        with self.wks.open(self.wks.get('main.tex'), 'w') as f:
+            f.write('A mistake')
+        self.wks.delete(self.wks.get('anc/notes.txt'))
+        self.wks.create('extra/extra.tex')
+
+        with mock.patch.object(self.storage, 'copy',
+                               wraps=self.storage.copy) as m_copy:
+            self.wks.restore_checkpoint(checksum, None)
+        restored = {call[0][2].path for call in m_copy.call_args_list}
+        self.assertEqual(restored, {'main.tex', 'notes.txt'},
+                         'Only changed and missing files are copied')
+
+        self.assertFalse(self.wks.exists('extra/extra.tex'))
+        self.assertFalse(os.path.exists(os.path.join(
+            self.base_path, self.test_id, 'src', 'extra'
+        )), 'Files that are not in the checkpoint are deleted')
+        for name in ('main.tex', 'figure.eps', 'anc/notes.txt'):
+            with self.wks.open(self.wks.get(name)) as f:
+                self.assertEqual(f.read(), f'Contents of {name}')
+
+    def test_list_from_summaries(self) -> None:
+        """Checkpoints are listed without reading their manifests."""
+        with self.wks.open(self.wks.create('main.tex'), 'w') as f:
+            f.write('Hello')
+        first = self.wks.create_checkpoint(None, 'First draft')
+        with self.wks.open(self.wks.create('figure.eps'), 'w') as f:
+            f.write('A figure')
+        second = self.wks.create_checkpoint(None)
+
+        with mock.patch.object(self.wks, '_read_manifest') as m_read:
+            checkpoints = self.wks.list_checkpoints(None)
+        self.assertEqual(m_read.call_count, 0)
+        self.assertEqual([c.checksum for c in checkpoints], [first, second])
+        self.assertEqual(checkpoints[0].description, 'First draft')
+        self.assertEqual(checkpoints[0].file_count, 1)
+        self.assertEqual(checkpoints[1].file_count, 2)
+        self.assertEqual(checkpoints[1].size_bytes, 13)
+
+        self.wks.delete_checkpoint(first, None)
+        self.assertEqual([c.checksum for c in self.wks.list_checkpoints(None)],
+                         [second])
+
+    def test_trim_checkpoints(self) -> None:
+        """The oldest checkpoints are deleted until the rest fit."""
+        checksums = []
+        for i in range(3):
+            with self.wks.open(self.wks.create(f'file{i}.tex'), 'w') as f:
+                f.write('x' * 10000)    # Same content, stored once.
+            with self.wks.open(self.wks.create('main.tex'), 'w') as f:
+                f.write(f'Version {i}' * 100)
+            checksums.append(self.wks.create_checkpoint(None))
+
+        trimmed = self.wks.trim_checkpoints(0, dry_run=True)
+        self.assertEqual([c.checksum for c in trimmed], checksums[:2],
+                         'The newest checkpoint is kept')
+        self.assertEqual(len(self.wks.list_checkpoints(None)), 3)
+        for checkpoint in trimmed:
+            self.assertLess(checkpoint.size_bytes, 10000,
+                            'Shared content is not freed')
+
+        self.wks.trim_checkpoints(0)
+        self.assertEqual([c.checksum for c in self.wks.list_checkpoints(None)],
+                         checksums[2:])
+        self.wks.delete(self.wks.get('file0.tex'))
+        self.wks.restore_checkpoint(checksums[2], None)
+        with self.wks.open(self.wks.get('file0.tex')) as f:
+            self.assertEqual(f.read(), 'x' * 10000)
@@ -7,11 +7,17 @@ filemanager.process.check.file_type). -- Erick 2019-06-10
 """
 
 import os
+import shutil
+import tempfile
+from datetime import datetime
 from unittest import TestCase, mock
 
 from arxiv.base import logging
 from filemanager.domain import Workspace, UserFile, FileType
 from filemanager.process.check.file_type import InferFileType
+from filemanager.process.check.tex_dependencies import ScanTeXDependencies
+from filemanager.process.strategy import SynchronousCheckingStrategy
+from filemanager.services.storage import SimpleStorageAdapter
 logger = logging.getLogger(__name__)
 
 parent, _ = os.path.split(os.path.abspath(__file__))
@@ -150,3 +156,56 @@ class TestInferFileType(TestCase):
                 (test_file, test_file_type, mock_file.file_type.value, note)
 
             self.assertEqual(mock_file.file_type, test_file_type, msg)
+
+
+class TestTeXFacts(TestCase):
+    """Facts about TeX files are recorded, and used to find the main file."""
+
+    def setUp(self):
+        """Create a workspace with a few TeX files."""
+        self.basedir = tempfile.mkdtemp()
+        self.workspace = Workspace(
+            upload_id=1234,
+            owner_user_id='98765',
+            created_datetime=datetime.now(),
+            modified_datetime=datetime.now(),
+            _strategy=SynchronousCheckingStrategy(),
+            _storage=SimpleStorageAdapter(self.basedir),
+            checkers=[InferFileType(), ScanTeXDependencies()]
+        )
+        self.workspace.initialize()
+        content = {
+            'template.tex': b'\\documentclass{article}\n',
+            'paper.tex': (b'%!TEX program = XeLaTeX\n\\pdfoutput=1\n'
+                          b'\\documentclass{article}\n'
+                          b'\\usepackage{amsmath,fontspec}\n'
+                          b'\\begin{document}\n\\input{intro}\n'
+                          b'\\end{document}\n'),
+            'intro.tex': b'\\section{Introduction}\n\\begin{equation}\n',
+            'paper.bbl': b'\\begin{thebibliography}{1}\n',
+        }
+        for path, data in content.items():
+            u_file = self.workspace.create(path)
+            with self.workspace.open(u_file, 'wb') as f:
+                f.write(data)
+        self.workspace.perform_checks()
+
+    def tearDown(self):
+        """Remove the temporary workspace files."""
+        shutil.rmtree(self.basedir)
+
+    def test_tex_facts(self):
+        """The preamble of each TeX file is scanned once."""
+        facts = self.workspace.get('paper.tex').tex_facts
+        self.assertTrue(facts.has_documentclass)
+        self.assertTrue(facts.has_begin_document)
+        self.assertTrue(facts.pdfoutput)
+        self.assertEqual(facts.engine_hints, ['xelatex', 'lualatex'])
+        self.assertFalse(
+            self.workspace.get('intro.tex').tex_facts.is_main_candidate
+        )
+
+    def test_main_tex_candidates(self):
+        """The file with a matching .bbl is most likely the main file."""
+        self.assertEqual([f.path for f in self.workspace.main_tex_candidates],
+                         ['paper.tex', 'template.tex'])
@@ -0,0 +1,52 @@
+"""Tests for :mod:`filemanager.domain.codec`."""
+
+from datetime import datetime
+from unittest import TestCase
+
+from pytz import UTC
+
+from arxiv.util.serialize import dumps
+
+from filemanager.domain import codec, UserFile
+
+
+class TestCodecs(TestCase):
+    """File indexes can be written and read by each codec."""
+
+    def setUp(self):
+        """We have a file, as it is stored."""
+        self.u_file = UserFile(workspace=None, path='main.tex',
+                               size_bytes=42,
+                               last_modified=datetime.now(UTC))
+
+    def test_round_trip(self):
+        """Files are the same after encoding and decoding."""
+        for name in ('iso8601', 'json'):
+            encoded = codec.get_codec(name).dumps(self.u_file.to_dict())
+            loaded = UserFile.from_dict(codec.loads(encoded), None)
+            self.assertEqual(loaded.last_modified, self.u_file.last_modified)
+            self.assertEqual(loaded, self.u_file)
+
+    def test_versioned(self):
+        """The json codec tags documents, and writes timestamps."""
+        encoded = codec.get_codec('json').dumps(self.u_file.to_dict())
+        self.assertIn('"_version":2', encoded)
+        self.assertEqual(codec.loads(encoded)['last_modified'],
+                         self.u_file.last_modified.timestamp())
+
+    def test_legacy(self):
+        """Documents written before there were codecs can be read."""
+        data = codec.loads(dumps(self.u_file.to_dict()))
+        self.assertEqual(UserFile.from_dict(data, None), self.u_file)
+
+    def test_no_such_codec(self):
+        """Only known codecs can be used."""
+        with self.assertRaises(ValueError):
+            codec.use('pickle')
+
+    def test_default(self):
+        """The original format is written unless another codec is chosen."""
+        from filemanager.config import SERIALIZATION_CODEC
+        self.assertEqual(SERIALIZATION_CODEC, 'iso8601')
+        encoded = codec.get_codec(SERIALIZATION_CODEC).dumps({'a': 1})
+        self.assertNotIn('_version', encoded)
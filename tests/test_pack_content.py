@@ -98,3 +98,60 @@ class TestPackContent(TestCase):
         self.workspace.source_package.pack()
         with self.workspace.source_package.open() as pointer:
             self.assertTrue(hasattr(pointer, 'read'), "Yields an IO")
+
+
+class TestManifestChecksum(TestCase):
+    """The manifest checksum describes the package without building it."""
+
+    DATA_PATH = os.path.split(os.path.abspath(__file__))[0]
+
+    def setUp(self):
+        """We have a workspace with some content."""
+        self.base_path = tempfile.mkdtemp()
+        self.workspace = Workspace(
+            upload_id=5432,
+            owner_user_id='98765',
+            created_datetime=datetime.now(),
+            modified_datetime=datetime.now(),
+            _strategy=SynchronousCheckingStrategy(),
+            _storage=SimpleStorageAdapter(self.base_path),
+            checkers=get_default_checkers()
+        )
+        self.workspace.initialize()
+        self.u_file = self.workspace.create('foo.tex')
+        with self.workspace.open(self.u_file, 'w') as f:
+            f.write('\\documentclass{article}')
+
+    def tearDown(self):
+        """Remove the temporary directory for files."""
+        shutil.rmtree(self.base_path)
+
+    def test_does_not_build_package(self):
+        """The checksum can be obtained before the package is built."""
+        checksum = self.workspace.source_package.manifest_checksum
+        self.assertFalse(self.workspace.source_package.is_built)
+        self.workspace.source_package.pack()
+        self.assertEqual(self.workspace.source_package.manifest_checksum,
+                         checksum, 'Packing does not change the checksum')
+
+    def test_content_change(self):
+        """The checksum changes when content changes, even if size does not."""
+        checksum = self.workspace.source_package.manifest_checksum
+        with self.workspace.open(self.u_file, 'w') as f:
+            f.write('\\documentclass{amsbook}')
+        self.assertEqual(self.u_file.size_bytes, 23)
+        self.assertNotEqual(self.workspace.source_package.manifest_checksum,
+                            checksum)
+
+    def test_unchanged_files_are_not_read(self):
+        """Only files that changed are re-hashed."""
+        self.workspace.source_package.manifest_checksum
+        other = self.workspace.create('bar.tex')
+        with self.workspace.open(other, 'w') as f:
+            f.write('bar')
+
+        with mock.patch.object(self.workspace.storage, 'open',
+                               wraps=self.workspace.storage.open) as m_open:
+            self.workspace.source_package.manifest_checksum
+        self.assertEqual(m_open.call_count, 1, 'Only bar.tex is read')
+        self.assertEqual(m_open.call_args[0][1], other)
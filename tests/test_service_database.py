@@ -223,6 +223,7 @@ class TestUploadUpdater(TestCase):
             _strategy=mock.MagicMock(),
             _storage=SimpleStorageAdapter(self.base_path)
         )
+        an_upload.initialize()
         self.database.update(an_upload)  # type: ignore
 
         dbupload = self.database.db.session \
@@ -231,6 +232,28 @@ class TestUploadUpdater(TestCase):
 
         # TODO: more assertions here.
         self.assertEqual(dbupload.status, an_upload.status.value)
+        self.assertEqual(dbupload.manifest_checksum,
+                         an_upload.source_package.manifest_checksum)
+
+    def test_lost_update_is_detected(self) -> None:
+        """An update based on an outdated version of the upload is refused."""
+        def load() -> Workspace:
+            return Workspace(
+                upload_id=self.dbupload.upload_id,
+                owner_user_id='dlf2',
+                created_datetime=datetime.now(UTC),
+                modified_datetime=datetime.now(UTC),
+                _strategy=mock.MagicMock(),
+                _storage=SimpleStorageAdapter(self.base_path)
+            )
+        first, second = load(), load()
+        first.initialize()
+        second.initialize()
+        self.database.update(first)  # type: ignore
+        self.assertEqual(first.version, 2, 'Version is incremented')
+
+        with self.assertRaises(self.database.ConcurrentUpdate):  # type: ignore
+            self.database.update(second)  # type: ignore
 
     @mock.patch('filemanager.services.database.db.session.query')
     def test_operationalerror_is_handled(self, mock_query: Any) -> None:
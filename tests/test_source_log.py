@@ -0,0 +1,108 @@
+"""Tests for :class:`.SourceLog`."""
+
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest import TestCase, mock
+
+from flask import Flask
+
+from filemanager.domain import SourceLog
+from filemanager.domain.uploads import Workspace
+from filemanager.services import storage
+
+
+class TestSourceLog(TestCase):
+    """Records are buffered, and appended to the log file in one write."""
+
+    def setUp(self):
+        """We have a workspace with a log, created during a request."""
+        self.context = Flask('test').app_context()
+        self.context.push()
+        self.base_path = tempfile.mkdtemp()
+        self.storage = storage.SimpleStorageAdapter(self.base_path)
+        self.wks = Workspace(
+            upload_id=1234,
+            owner_user_id='98765',
+            created_datetime=datetime.now(),
+            modified_datetime=datetime.now(),
+            _storage=self.storage,
+            _strategy=mock.MagicMock()
+        )
+        self.wks.initialize()
+        self.path = self.wks.get_full_path(self.wks.log.file, is_system=True)
+
+    def tearDown(self):
+        """Clean up."""
+        SourceLog.flush_all()
+        self.context.pop()
+        shutil.rmtree(self.base_path)
+
+    def read(self):
+        with open(self.path) as f:
+            return f.read()
+
+    def test_buffered(self):
+        """Nothing is written until the log is flushed."""
+        with mock.patch.object(self.storage, 'open',
+                               wraps=self.storage.open) as m_open:
+            for i in range(100):
+                self.wks.log.info(f'Message {i}')
+            self.assertEqual(self.read(), '')
+
+            SourceLog.flush_all(self.wks.upload_id)
+            self.assertEqual(m_open.call_count, 1, 'Written in one go')
+        lines = self.read().splitlines()
+        self.assertEqual(len(lines), 100)
+        self.assertTrue(lines[-1].endswith(' Message 99'))
+
+    def test_read(self):
+        """Buffered records are written before the log is read."""
+        self.wks.log.info('Hello')
+        self.assertGreater(self.wks.log.size_bytes, 0)
+        with self.wks.log.open('r') as f:
+            self.assertTrue(f.read().endswith(' Hello\n'))
+
+    def test_error(self):
+        """Errors are written straight away."""
+        self.wks.log.info('Something')
+        self.wks.log.error('Something bad')
+        self.assertIn('Something bad', self.read())
+
+    def test_cannot_write(self):
+        """If the log cannot be written, records go to the service log."""
+        self.wks.log.info('Hello')
+        shutil.rmtree(os.path.dirname(self.path))
+        with self.assertLogs('filemanager.domain.uploads') as logs:
+            self.wks.log.flush()
+        self.assertTrue(any('Hello' in line for line in logs.output))
+
+    def test_other_context(self):
+        """Only logs created in the current application context are flushed."""
+        self.wks.log.info('Hello')
+        with Flask('other').app_context():
+            SourceLog.flush_all()
+        self.assertEqual(self.read(), '')
+        SourceLog.flush_all()
+        self.assertIn('Hello', self.read())
+
+    def test_outside_context(self):
+        """Outside of an application context, records are not buffered."""
+        self.context.pop()
+        try:
+            wks = Workspace(
+                upload_id=5678,
+                owner_user_id='98765',
+                created_datetime=datetime.now(),
+                modified_datetime=datetime.now(),
+                _storage=self.storage,
+                _strategy=mock.MagicMock()
+            )
+            wks.initialize()
+            wks.log.info('Hello')
+            path = wks.get_full_path(wks.log.file, is_system=True)
+            with open(path) as f:
+                self.assertIn('Hello', f.read())
+        finally:
+            self.context.push()
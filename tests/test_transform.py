@@ -96,6 +96,7 @@ class TestTransformWorkspace(TestCase):
             _storage=mock_storage
         )
         workspace.initialize()
+        workspace.source_package.pack()
         expected = {'upload_id': 5432, 'upload_total_size': 0,
                     'upload_compressed_size': 1234,
                     'created_datetime': workspace.created_datetime,
@@ -103,7 +104,7 @@ class TestTransformWorkspace(TestCase):
                     'files': [], 'errors': [],
                     'readiness': 'READY', 'upload_status': 'ACTIVE',
                     'lock_state': 'UNLOCKED', 'source_format': 'unknown',
-                    'checksum': 'rL0Y20zC-Fzt72VPzMSk2A=='}
+                    'checksum': '1B2M2Y8AsgTpgAmY7PhCfg=='}
         data = transform_workspace(workspace)
         for key, value in expected.items():
             self.assertEqual(data.get(key), value, f'{key} should match')